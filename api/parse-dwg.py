@@ -1,85 +1,157 @@
 import sys, os; sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 """
-DWG Parser endpoint – utolsó tartalék, ha a CloudConvert DWG→DXF konverzió sikertelen.
-Stratégia: bináris szöveg kinyerés az ASCII stringekből (rétegnevek, blokk nevek, szöveg entitások).
+DWG Parser endpoint – a CloudConvert DWG→DXF konverzió nélkül.
+Stratégia:
+1. Natív olvasás (dwg_reader, R2000–R2018 kivéve R2007; csak DWG_NATIVE_READ=1 esetén):
+   rétegtábla, blokk rekordok, INSERT darabszámok/pozíciók és vonalhosszak a
+   parse_dxf_bytes sémájában.
+2. Tartalék: bináris szöveg kinyerés (rétegnevek, blokk nevek, szöveg entitások) – a verzió
+   szerint választott módon (scan_strategy), ill. azonnali "konvertáld DXF-be" válasz.
 Vision AI NINCS – csak a tényleges fájl adataiból dolgozunk.
 """
 from http.server import BaseHTTPRequestHandler
-import json, base64, traceback, os, sys, re
-from collections import Counter
-from security_helpers import send_cors_headers, check_origin, check_rate_limit, require_auth, safe_error_response, rate_limit_response
+import traceback, os, sys, re, math
+from collections import Counter, defaultdict
+from security_helpers import (
+    send_cors_headers, check_origin, check_rate_limit, require_auth, safe_error_response, rate_limit_response,
+    read_upload, UploadError, send_json,
+)
+from dwg_reader import read_dwg, object_data, dwg_version, RELEASES, DwgError, DwgUnsupported
+from parse_worker import register, run_task, WorkerLimitError
+from keyword_classifier import SYMBOL_KEYWORDS, KeywordClassifier
 MAX_UPLOAD_MB  = int(os.environ.get('MAX_UPLOAD_MB', '30'))
+# Natív olvasás időkorlátja (izolált worker) – utána a szöveg-kinyerés fut
+DWG_NATIVE_TIMEOUT_S = float(os.environ.get('DWG_NATIVE_TIMEOUT_S', '20'))
+# Natív olvasás bekapcsolása – alapból ki, amíg valódi CAD programmal készült R2000 / R2004 /
+# R2010+ mintafájlokon nincs ellenőrizve; addig a szöveg-kinyerés fut
+DWG_NATIVE_READ = os.environ.get('DWG_NATIVE_READ', '') == '1'
 
-SYMBOL_KEYWORDS = {
-    'dugalj':        ['dugalj', 'konnektor', 'socket', 'aljzat'],
-    'kapcsolo':      ['kapcsoló', 'kapcsolo', 'switch', 'villanykapcs'],
-    'lampa':         ['lámpa', 'lampa', 'light', 'luminaire', 'ledfény', 'downlight'],
-    'fi_rele':       ['fi relé', 'fi rele', 'rcd', 'rcbo'],
-    'kismegszakito': ['kismegszakító', 'kismegszakito', 'mcb', 'megszakít'],
-    'panel':         ['elosztó', 'eloszto', 'panel', 'szekrény', 'szekreny', 'tábla'],
-    'kabel':         ['kábel', 'kabel', 'cable', 'vezeték', 'nayy', 'nyy', 'cyky', 'nym'],
+# INSUNITS → (név, méter szorzó); a DWG-ben a *Model_Space blokk rekord hordozza (R2007+)
+INSUNITS_MAP = {
+    1: ('inches', 0.0254), 2: ('feet', 0.3048), 4: ('mm', 0.001), 5: ('cm', 0.01),
+    6: ('m', 1.0), 7: ('km', 1000.0), 10: ('yards', 0.9144), 14: ('decimeters', 0.1),
 }
 
+# Bájt-regexek – a feltöltött buffert (bytes / memoryview / mmap) dekódolás és másolás nélkül
+# pásztázzuk; csak a talált szövegfutamok (kis bájtsorozatok) kerülnek a memóriába
+# Legalább 5 karakteres printable ASCII sorozatok – kevesebb bináris szemét
+_RUN_RE = re.compile(rb'[ -~\t]{5,}')
+# Csak értelmes szavakat tartalmazó futamok (legalább 3 betű egymás után)
+_WORD_RE = re.compile(rb'[A-Za-z]{3,}')
+# Latin-1 betűk (× és ÷ nélkül) – a dekódolt UTF-16 szöveg ékezetes szavaihoz
+_L1_LETTER = rb'A-Za-z\xc0-\xd6\xd8-\xf6\xf8-\xff'
+_L1_WORD_RE = re.compile(rb'[' + _L1_LETTER + rb']{3,}')
+# UTF-16LE szövegfutam: ASCII, Latin-1 betűk és ő/ű/Ő/Ű (U+0150/0151/0170/0171)
+_UTF16_RUN = re.compile(rb'(?:[\t\x20-\x7e\xc0-\xff]\x00|[\x50\x51\x70\x71]\x01){5,}')
+# Explicit mennyiségek (pl. "24 db dugalj" vagy "dugalj: 24 db")
+_QTY_RES = (re.compile(rb'(\d+)\s*db\s+([\w' + _L1_LETTER + rb']+)'),
+            re.compile(rb'([\w' + _L1_LETTER + rb']+)[:\s]+(\d+)\s*db'))
+# Kábelhossz numerikus értékekből (fm, m, méter)
+_LENGTH_RE = re.compile(rb'(\d+[\.,]?\d*)\s*(fm|m\b|m\xe9ter|lm)')
+# A puffert ekkora ablakokban (nem szöveg bájtnál vágva) pásztázzuk – a futamok
+# listája és az összefűzött szöveg ablakonként él, a regexek C-ben futnak
+_SCAN_WINDOW_BYTES = 4 * 1024 * 1024
+_NON_TEXT_RE = re.compile(rb'[^ -~\t]')
+# A kisbetűs bájtszövegen futó kulcsszó-osztályozó (egy menet az összes kulcsszóra)
+_SYMBOLS = KeywordClassifier(SYMBOL_KEYWORDS, encoding='latin-1')
 
-def extract_text_from_dwg(file_bytes):
+
+def scan_strategy(version):
+    """
+    Szöveg-kinyerési stratégia a 6 bájtos verzió-azonosító alapján:
+    - 'ascii':    nem DWG / R13–R2000 – tömörítetlen, 8 bites stringek a fájlban
+    - 'sections': R2004 – az objektum szekció kitömörítve, 8 bites stringek
+    - 'utf16':    R2010+ – az objektum szekció kitömörítve, UTF-16LE stringek
+    - 'convert':  R2007 és ismeretlen (újabb) verziók – a szekciók nem olvashatók,
+                  a nyers fájlban keresés biztosan eredménytelen → azonnali válasz
+    """
+    if version is None or version < 'AC1018':
+        return 'ascii'
+    if version == 'AC1021' or version not in RELEASES:
+        return 'convert'
+    return 'utf16' if version >= 'AC1024' else 'sections'
+
+
+def _text_batches(buf, encoding):
+    """
+    Kisbetűs szövegblokkok (generátor): egy-egy ablak szót tartalmazó futamai
+    szóközzel összefűzve. A buffert nem szeleteljük – a regexek pos/endpos-szal
+    futnak rajta.
+    """
+    if encoding == 'utf-16-le':
+        # A dekódolt UTF-16 futam már szövegfutam: kisbetűsítés a dekódolt szövegen
+        # (ékezetes betűk is), majd Latin-1 bájtok – az ASCII futam-szűrő nem
+        # vágja szét az ékezetes szavakat
+        batch, size = [], 0
+        for m in _UTF16_RUN.finditer(buf):
+            run = m.group().decode('utf-16-le').lower().encode('latin-1', 'replace')
+            if not _L1_WORD_RE.search(run):
+                continue
+            batch.append(run)
+            size += len(run) + 1
+            if size >= _SCAN_WINDOW_BYTES:
+                yield b' '.join(batch)
+                batch, size = [], 0
+        if batch:
+            yield b' '.join(batch)
+        return
+    pos, n = 0, len(buf)
+    while pos < n:
+        end = n
+        if pos + _SCAN_WINDOW_BYTES < n:
+            m = _NON_TEXT_RE.search(buf, pos + _SCAN_WINDOW_BYTES)
+            end = m.start() if m else n
+        runs = [r for r in _RUN_RE.findall(buf, pos, end) if _WORD_RE.search(r)]
+        if runs:
+            yield b' '.join(runs).lower()
+        pos = end + 1 if end < n else n
+
+
+def extract_text_from_dwg(file_bytes, encoding='latin-1'):
     """
     DWG fájlok binárisban ASCII stringeket tartalmaznak.
     Legalább 5 karakteres, érvényes ASCII karaktereket tartalmazó sorozatokat nyerünk ki.
     A 3-4 karakteres stringek kizárása csökkenti a bináris szemét mennyiségét.
-    DWG AC1015+ (2000+) verzióknál a rétegnevek, blokk nevek és szöveg entitások
-    általában kinyerhetők.
+    encoding='utf-16-le' (R2010+ objektum szekció): előbb a UTF-16 futamokat dekódoljuk.
+    file_bytes bármilyen bájt-buffer lehet (bytes, memoryview, mmap) – nem másoljuk;
+    a futamokat egy menetben, korlátos blokkokban adjuk a kulcsszó-számlálónak és a
+    mennyiség/hossz kinyerőknek.
     """
-    raw = file_bytes.decode('latin-1', errors='replace')
-
-    # Legalább 5 karakteres printable ASCII sorozatok – kevesebb bináris szemét
-    strings = re.findall(r'[ -~\t]{5,}', raw)
-    # Szűrés: csak értelmes szavakat tartalmazó sorok (legalább 1 betű)
-    strings = [s for s in strings if re.search(r'[A-Za-záéíóöőúüűÁÉÍÓÖŐÚÜŰ]{3,}', s)]
-    text = ' '.join(strings).lower()
-
-    # Kulcsszó találatok számlálása
-    counts = Counter()
-    for symbol, keywords in SYMBOL_KEYWORDS.items():
-        for kw in keywords:
-            hits = text.count(kw.lower())
-            if hits > 0:
-                counts[symbol] += hits
-
-    # Explicit mennyiségek keresése (pl. "24 db dugalj" vagy "dugalj: 24 db")
-    qty_patterns = [
-        r'(\d+)\s*db\s+(\w+)',
-        r'(\w+)[:\s]+(\d+)\s*db',
-    ]
-    explicit = Counter()
-    for pat in qty_patterns:
-        for m in re.finditer(pat, text):
-            try:
-                qty = int(m.group(1))
-                if qty > 500:
-                    continue  # valószínűtlen érték, kihagyjuk
-                word = m.group(2).lower()
-                for symbol, keywords in SYMBOL_KEYWORDS.items():
-                    if any(kw in word for kw in keywords):
+    counts, explicit = Counter(), Counter()
+    word_symbols = {}           # szó → illeszkedő szimbólumok (a szavak sokszor ismétlődnek)
+    lengths, seen_vals = [], set()
+    for text in _text_batches(file_bytes, encoding):
+        # Kulcsszó találatok számlálása
+        counts.update(_SYMBOLS.counts(text))
+
+        for pat in _QTY_RES:
+            for m in pat.finditer(text):
+                try:
+                    qty = int(m.group(1))
+                    if qty > 500:
+                        continue  # valószínűtlen érték, kihagyjuk
+                    word = m.group(2)
+                    symbols = word_symbols.get(word)
+                    if symbols is None:
+                        symbols = word_symbols[word] = _SYMBOLS.symbols_in(word)
+                    for symbol in symbols:
                         explicit[symbol] = max(explicit.get(symbol, 0), qty)
+                except Exception:
+                    pass
+
+        for m in _LENGTH_RE.finditer(text):
+            try:
+                val = float(m.group(1).replace(b',', b'.'))
+                if 5 < val < 50000 and val not in seen_vals:
+                    seen_vals.add(val)
+                    lengths.append({'layer': 'DWG_TEXT', 'length': val, 'length_raw': val, 'info': None})
             except Exception:
                 pass
 
-    final = {**counts}
+    final = {s: counts[s] for s in SYMBOL_KEYWORDS if s in counts}
     for s, q in explicit.items():
         final[s] = q
 
-    # Kábelhossz keresése numerikus értékekből (fm, m, méter)
-    lengths = []
-    seen_vals = set()
-    for m in re.finditer(r'(\d+[\.,]?\d*)\s*(fm|m\b|méter|lm)', text):
-        try:
-            val = float(m.group(1).replace(',', '.'))
-            if 5 < val < 50000 and val not in seen_vals:
-                seen_vals.add(val)
-                lengths.append({'layer': 'DWG_TEXT', 'length': val, 'length_raw': val, 'info': None})
-        except Exception:
-            pass
-
     blocks = [
         {'name': n, 'layer': 'DWG', 'count': int(c)}
         for n, c in final.items() if c > 0
@@ -89,6 +161,181 @@ def extract_text_from_dwg(file_bytes):
     return blocks, lengths, found_something
 
 
+# ── Natív DWG olvasás ─────────────────────────────────────────────────────────
+
+def _bulge_length(x1, y1, x2, y2, bulge):
+    chord = math.hypot(x2 - x1, y2 - y1)
+    theta = 4 * math.atan(abs(bulge))
+    if chord == 0 or theta == 0:
+        return chord
+    return chord / (2 * math.sin(theta / 2)) * theta
+
+
+def _path_length(verts, closed):
+    seq = verts + [verts[0]] if closed else verts
+    total = 0.0
+    for a, b in zip(seq, seq[1:]):
+        total += _bulge_length(a[0], a[1], b[0], b[1], a[2]) if a[2] else math.hypot(b[0] - a[0], b[1] - a[1])
+    return total
+
+
+def parse_dwg_native(file_bytes):
+    """
+    Natív DWG olvasás (dwg_reader) → a parse_dxf_bytes sémájának megfelelő eredmény:
+    blokkszámok rétegenként, beágyazott blokkok (blokk-definíciókon át), rétegenkénti
+    hosszak (LINE, LWPOLYLINE, ARC, CIRCLE), INSERT pozíciók és befoglaló téglalap.
+    DwgError, ha a fájl natívan nem olvasható.
+    """
+    dwg = read_dwg(file_bytes)
+    layer_names, block_records = dwg['layers'], dwg['blocks']
+    # Modell- és papírtér rekordjaihoz tartozó entitások a "felső szintűek"
+    top_owners = {h for h, b in block_records.items() if b['name'].upper() in ('*MODEL_SPACE', '*PAPER_SPACE')}
+
+    inf = float('inf')
+    bbox = [inf, inf, -inf, -inf]
+    def grow(x, y):
+        if x < bbox[0]: bbox[0] = x
+        if x > bbox[2]: bbox[2] = x
+        if y < bbox[1]: bbox[1] = y
+        if y > bbox[3]: bbox[3] = y
+
+    block_counts, all_layers = Counter(), set()
+    lengths_by_layer = defaultdict(float)
+    inserts = []
+    # Blokk-definíciók: rekord handle → {hosszak, belső INSERT-ek}
+    defs = defaultdict(lambda: {'lengths': defaultdict(float), 'inserts': []})
+    # Felső szintű INSERT-ek összesítve: (rekord, réteg) → [darab, skála összeg]
+    expand = defaultdict(lambda: [0, 0.0])
+    for kind, owner, layer_h, block_h, f in dwg['entities']:
+        layer = layer_names.get(layer_h, '0')
+        top = owner is None or owner in top_owners
+        acc = lengths_by_layer if top else defs[owner]['lengths']
+        if top:
+            all_layers.add(layer)
+        if kind == 'INSERT':
+            record = block_records.get(block_h)
+            if record is None:
+                continue
+            x, y, sx, sy, _, n = f
+            if not top:
+                defs[owner]['inserts'].append((block_h, layer, sx, sy, n))
+                continue
+            block_counts[(record['name'], layer)] += n
+            e = expand[(block_h, layer)]
+            e[0] += n
+            e[1] += abs(sx * sy) ** 0.5 * n
+            inserts.append({'name': record['name'], 'layer': layer, 'x': x, 'y': y, 'attribs': None})
+            grow(x, y)
+        elif kind == 'LINE':
+            x1, y1, x2, y2 = f
+            acc[layer] += math.hypot(x2 - x1, y2 - y1)
+            if top:
+                grow(x1, y1); grow(x2, y2)
+        elif kind == 'ARC':
+            _, _, r, a0, a1 = f
+            acc[layer] += math.radians((a1 - a0) % 360.0 or 360.0) * r
+        elif kind == 'LWPOLYLINE':
+            verts, closed = f
+            acc[layer] += _path_length(verts, closed)
+
+    # Blokk összesítők (memoizálva) – a '0' rétegű elemek az INSERT rétegét öröklik.
+    # Mélységi bejárás explicit veremmel: a beágyazás mélységét nem a rekurziós limit korlátozza
+    summaries = {}
+    def combine(d):
+        lengths, counts = defaultdict(float, d['lengths']), Counter()
+        for child, layer, sx, sy, n in d['inserts']:
+            record = block_records.get(child)
+            counts[(record['name'], layer)] += n
+            cs = summaries.get(child)
+            if cs is None:
+                continue
+            k = abs(sx * sy) ** 0.5 * n
+            for l, v in cs['lengths'].items():
+                lengths[layer if l == '0' else l] += v * k
+            for (cn, cl), c in cs['counts'].items():
+                counts[(cn, layer if cl == '0' else cl)] += c * n
+        return {'lengths': lengths, 'counts': counts}
+
+    def summary(h):
+        if h in summaries or h not in defs:
+            return summaries.get(h)
+        stack, path = [[h, 0]], {h}
+        while stack:
+            frame = stack[-1]
+            inserts = defs[frame[0]]['inserts']
+            while frame[1] < len(inserts):
+                child = inserts[frame[1]][0]
+                frame[1] += 1
+                if child not in summaries and child in defs and child not in path:
+                    stack.append([child, 0])
+                    path.add(child)
+                    break
+            else:
+                cur = stack.pop()[0]
+                path.discard(cur)
+                summaries[cur] = combine(defs[cur])
+        return summaries[h]
+
+    nested_counts = Counter()
+    for (block_h, layer), (n, k) in expand.items():
+        bs = summary(block_h)
+        if bs is None:
+            continue
+        for l, v in bs['lengths'].items():
+            target = layer if l == '0' else l
+            lengths_by_layer[target] += v * k
+            if v > 0: all_layers.add(target)
+        for (cn, cl), c in bs['counts'].items():
+            nested_counts[(cn, layer if cl == '0' else cl)] += c * n
+
+    geom_bounds = None
+    if bbox[0] <= bbox[2]:
+        geom_bounds = {'minX': bbox[0], 'maxX': bbox[2], 'minY': bbox[1], 'maxY': bbox[3],
+                       'width': bbox[2] - bbox[0], 'height': bbox[3] - bbox[1]}
+
+    # Mértékegység: a *Model_Space rekord INSUNITS értéke (R2007+), különben becslés
+    # a kiterjedésből – ugyanazok a küszöbök, mint a DXF feldolgozásnál
+    insunits = next((b['units'] for b in block_records.values()
+                     if b['name'].upper() == '*MODEL_SPACE' and b['units']), 0)
+    unit_name, unit_factor = INSUNITS_MAP.get(insunits, ('unknown', None))
+    if not unit_factor:
+        span = max(geom_bounds['width'], geom_bounds['height']) if geom_bounds else 0
+        ref = max(max(lengths_by_layer.values(), default=0), span)
+        if ref > 10000: unit_name, unit_factor = 'mm (guessed)', 0.001
+        elif ref > 100: unit_name, unit_factor = 'cm (guessed)', 0.01
+        else: unit_name, unit_factor = 'm (guessed)', 1.0
+
+    blocks = [{'name': n, 'layer': l, 'count': c} for (n, l), c in block_counts.most_common(300)]
+    lengths = [{'layer': l, 'length': round(v * unit_factor, 3), 'length_raw': round(v, 4), 'info': None}
+               for l, v in sorted(lengths_by_layer.items(), key=lambda x: -x[1]) if v > 0.01]
+    return {
+        'success': True, 'blocks': blocks, 'lengths': lengths,
+        'layers': sorted(all_layers),
+        'units': {'insunits': insunits, 'name': unit_name, 'factor': unit_factor, 'auto_detected': True},
+        'title_block': {},
+        'all_text': [],
+        'textEntities': [],
+        'circuits': [],
+        'inserts': inserts,
+        'geomBounds': geom_bounds,
+        'nested_blocks': [{'name': n, 'layer': l, 'count': c} for (n, l), c in nested_counts.most_common(300)],
+        'summary': {'total_block_types': len(set(b['name'] for b in blocks)),
+                    'total_blocks': sum(b['count'] for b in blocks),
+                    'total_layers': len(all_layers), 'layers_with_lines': len(lengths),
+                    'total_inserts': len(inserts),
+                    'block_definitions': sum(1 for b in block_records.values() if not b['name'].startswith('*'))},
+        'partial': False,
+        '_source': 'dwg_native',
+        # Teljes rétegtábla és a kihagyott (nem dekódolható) objektumok száma
+        'dwg': {'version': dwg['version'], 'release': dwg['release'], 'strategy': 'native', 'objects': dwg['objects'],
+                'skipped': dwg['skipped'], 'layerTable': sorted(set(layer_names.values())),
+                'blockRecords': len(block_records)},
+    }
+
+
+register('parse-dwg-native', parse_dwg_native)
+
+
 class handler(BaseHTTPRequestHandler):
 
     def do_OPTIONS(self):
@@ -102,30 +349,57 @@ class handler(BaseHTTPRequestHandler):
         if not require_auth(self): return
         filename = 'file.dwg'
         try:
-            length = int(self.headers.get('Content-Length', 0))
-            max_bytes = MAX_UPLOAD_MB * 1024 * 1024
-            if length > max_bytes:
-                return self._respond(413, {
-                    'success': False,
-                    'error': f'A feltöltött fájl túl nagy ({length // (1024*1024)} MB). '
-                             f'Maximum megengedett méret: {MAX_UPLOAD_MB} MB.',
-                    'warnings': [],
-                })
-            body = self.rfile.read(length)
-            payload = json.loads(body)
-
-            file_b64 = payload.get('dwg_base64') or payload.get('data', '')
+            file_bytes, payload = read_upload(self, MAX_UPLOAD_MB * 1024 * 1024,
+                                              file_fields=('dwg_base64', 'data'))
             filename = payload.get('filename', 'file.dwg')
 
-            if not file_b64:
+            if not file_bytes:
                 raise ValueError('dwg_base64 mező hiányzik')
 
-            file_bytes = base64.b64decode(file_b64)
             warnings = []
+            version = dwg_version(file_bytes)
+            strategy = scan_strategy(version)
+
+            # ── Natív olvasás ─────────────────────────────────────────────────
+            if version and DWG_NATIVE_READ:
+                try:
+                    result = run_task('parse-dwg-native', file_bytes, timeout=DWG_NATIVE_TIMEOUT_S)
+                    return self._respond(200, {
+                        **result, '_confidence': 0.9, '_filename': filename,
+                        '_note': f"Natív DWG olvasás ({result['dwg']['release']}) – rétegek, blokkok és vonalhosszak a fájlból.",
+                        'warnings': warnings,
+                    })
+                except DwgUnsupported as ex:
+                    warnings.append(f'Natív DWG olvasás nem támogatott: {ex}')
+                except DwgError as ex:
+                    warnings.append(f'Natív DWG olvasás sikertelen: {ex}')
+                except WorkerLimitError as ex:
+                    warnings.append(f'Natív DWG olvasás túllépte az erőforrás-korlátot ({ex.reason}).')
+
+            # ── Bináris szöveg kinyerés (tartalék) ────────────────────────────
+            data = file_bytes
+            if strategy in ('sections', 'utf16'):
+                try:
+                    data = object_data(file_bytes)
+                except DwgError as ex:
+                    strategy = 'convert'
+                    warnings.append(f'DWG szekciók nem olvashatók: {ex}')
+            dwg_info = {'version': version, 'release': RELEASES.get(version), 'strategy': strategy}
+
+            if strategy == 'convert':
+                warnings.append(
+                    'Ebből a DWG verzióból szöveg nem nyerhető ki. Exportálj DXF formátumba az AutoCAD / '
+                    'DWG TrueView programból: Fájl → Mentés másként → AutoCAD DXF (*.dxf).'
+                )
+                return self._respond(200, self._build_result(
+                    [], [{'layer': 'DWG', 'length': 0.0, 'length_raw': 0.0, 'info': None}], 'dwg_text', 0.1,
+                    filename, warnings,
+                    f'{dwg_info["release"] or version} DWG – konvertálás DXF formátumba javasolt.', dwg_info,
+                ))
 
-            # ── Bináris szöveg kinyerés ───────────────────────────────────────
             try:
-                blocks, lengths, found = extract_text_from_dwg(file_bytes)
+                blocks, lengths, found = extract_text_from_dwg(
+                    data, 'utf-16-le' if strategy == 'utf16' else 'latin-1')
             except Exception as ex:
                 blocks, lengths, found = [], [], False
                 warnings.append(f'Bináris kinyerési hiba: {ex}')
@@ -148,9 +422,11 @@ class handler(BaseHTTPRequestHandler):
                 )
 
             self._respond(200, self._build_result(
-                blocks, lengths, 'dwg_text', confidence, filename, warnings, note
+                blocks, lengths, 'dwg_text', confidence, filename, warnings, note, dwg_info
             ))
 
+        except UploadError as e:
+            return self._respond(e.status, {'success': False, 'error': e.message, 'warnings': []})
         except Exception as e:
             self._respond(200, {
                 'success': True,
@@ -167,7 +443,7 @@ class handler(BaseHTTPRequestHandler):
                 'warnings': [str(e)],
             })
 
-    def _build_result(self, blocks, lengths, source, confidence, filename, warnings, note):
+    def _build_result(self, blocks, lengths, source, confidence, filename, warnings, note, dwg_info=None):
         return {
             'success': True,
             'blocks': blocks,
@@ -186,13 +462,11 @@ class handler(BaseHTTPRequestHandler):
             '_filename': filename,
             '_note': note,
             'warnings': warnings,
+            # Verzió és a választott kinyerési stratégia (scan_strategy)
+            'dwg': dwg_info,
         }
 
     def _respond(self, code, data):
-        self.send_response(code)
-        send_cors_headers(self)
-        self.send_header('Content-Type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(data, ensure_ascii=False).encode())
+        send_json(self, code, data, ensure_ascii=False)
 
     def log_message(self, *a): pass
@@ -1,8 +1,34 @@
 import sys, os; sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 from http.server import BaseHTTPRequestHandler
-import json, tempfile, os, sys, base64, traceback
-from security_helpers import send_cors_headers, check_origin, check_rate_limit, require_auth, safe_error_response, rate_limit_response
+import json, tempfile, os, sys, base64, fnmatch, hashlib, heapq, math, multiprocessing, re, struct, time, traceback
+from array import array
+from bisect import bisect_right
+from collections import Counter, OrderedDict, defaultdict
+from itertools import chain, compress
+from operator import sub
+from urllib.parse import parse_qs, urlsplit
+from security_helpers import (
+    send_cors_headers, check_origin, check_rate_limit, require_auth, safe_error_response, rate_limit_response,
+    read_upload, read_batch_upload, UploadError, send_json, send_ndjson,
+)
+from parse_cache import cached_json, CACHE_HEADER
+from parse_worker import register, run_task, run_batch, report_progress, WorkerLimitError, PARSE_WORKERS
+from plan_store import FileSystemPlanStore
 MAX_UPLOAD_MB  = int(os.environ.get('MAX_UPLOAD_MB', '30'))  # DXF can be larger
+TILE_DIR       = os.environ.get('DXF_TILE_DIR') or os.path.join(tempfile.gettempdir(), 'takeoffpro-dxf-tiles')
+# Stored plans + plan index sidecars (plan_store.PlanStore; swap for an object store)
+PLAN_STORE = FileSystemPlanStore(TILE_DIR)
+MAX_TILES_PER_REQUEST = 64
+# Default ENTITIES scan budget – leaves headroom for the rest of the request
+# under the 30 s maxDuration (vercel.json)
+DXF_TIME_BUDGET_S = float(os.environ.get('DXF_TIME_BUDGET_S', '20'))
+# Past the scan budget: pyramid, spatial index and plan store write – what is
+# not done by then is dropped (partial result), leaving time to encode and send
+DXF_FINISH_BUDGET_S = float(os.environ.get('DXF_FINISH_BUDGET_S', '4'))
+# Hard wall-clock limit of the isolated parse worker (parse_worker.py)
+DXF_HARD_TIMEOUT_S = float(os.environ.get('DXF_HARD_TIMEOUT_S', '27'))
+# Bump when parse_dxf_bytes output changes – invalidates cached results
+PARSER_VERSION = 'dxf-13'
 
 
 # DXF $INSUNITS values → (unit_name, factor_to_meters)
@@ -31,179 +57,2464 @@ INSUNITS_MAP = {
 }
 
 
-def parse_dxf_bytes(file_bytes):
+# ASCII DXF is tokenized this many bytes at a time (cut at a line break)
+_TOKEN_WINDOW_BYTES = 256 * 1024
+
+
+def iter_dxf_tokens(data, start=0, end=None):
     """
-    Server-side DXF parser using stdlib only (no ezdxf).
-    This is a fallback – primary parsing runs client-side in the browser.
+    Iterate (group_code, value) pairs straight from the raw DXF bytes.
+    The bytes are split into lines one bounded window at a time – no
+    full-text decode, no whole-file line list – and each window's pairs
+    come from zip/map in C. Values are stripped byte slices; float()/int()
+    accept bytes directly, so callers only decode the strings they keep.
+    start/end restrict the walk to one byte range (a parallel scan chunk);
+    start must be at the beginning of a group-code line.
     """
+    end = len(data) if end is None else end
+    return chain.from_iterable(_token_windows(data, start, end))
+
+
+def _token_windows(data, pos, end):
+    """Per window of iter_dxf_tokens: an iterator over its (code, value) pairs."""
+    while pos < end:
+        cut = end
+        if pos + _TOKEN_WINDOW_BYTES < end:
+            cut = data.rfind(b'\n', pos, pos + _TOKEN_WINDOW_BYTES) + 1 or data.find(b'\n', pos, end) + 1 or end
+        lines = data[pos:cut].split(b'\n')
+        if cut < end or not lines[-1]:
+            lines.pop()                 # '' after the window's last line break
+        if len(lines) & 1:
+            # A group code without its value: take the next line in too ('' at the end)
+            nl = data.find(b'\n', cut, end)
+            lines.append(data[cut:end if nl < 0 else nl])
+            cut = end if nl < 0 else nl + 1
+        pos = cut
+        try:
+            codes = list(map(int, lines[::2]))
+        except ValueError:
+            # A malformed group code line: that pair is skipped
+            yield [(code, val.strip()) for code, val in zip(map(_int_or_none, lines[::2]), lines[1::2])
+                   if code is not None]
+            continue
+        yield zip(codes, map(bytes.strip, lines[1::2]))
+
+
+def _int_or_none(raw):
     try:
-        from collections import Counter, defaultdict
-        import re
+        return int(raw)
+    except ValueError:
+        return None
 
-        text = file_bytes.decode('utf-8', errors='replace')
-        lines = text.split('\n')
 
-        # Tokenize DXF: alternating group_code / value lines
-        tokens = []
-        for i in range(0, len(lines) - 1, 2):
-            try:
-                code = int(lines[i].strip())
-                val = lines[i + 1].strip()
-                tokens.append((code, val))
-            except ValueError:
+# Binary DXF: 22-byte sentinel, then (group code, typed value) records.
+# R13+ writes 2-byte little-endian group codes, R12 a single byte
+# (255 escapes to a following 2-byte code).
+BINARY_DXF_SENTINEL = b'AutoCAD Binary DXF\r\n\x1a\x00'
+
+
+def _binary_group_kind(code):
+    """Value encoding for a group code in binary DXF (per the DXF reference ranges)."""
+    if (10 <= code <= 59 or 110 <= code <= 149 or 210 <= code <= 239
+            or 460 <= code <= 469 or 1010 <= code <= 1059):
+        return 'd'      # 8-byte double
+    if (60 <= code <= 79 or 170 <= code <= 179 or 270 <= code <= 289
+            or 370 <= code <= 389 or 400 <= code <= 409 or 1060 <= code <= 1070):
+        return 'h'      # 2-byte int
+    if 90 <= code <= 99 or 420 <= code <= 429 or 440 <= code <= 459 or code == 1071:
+        return 'i'      # 4-byte int
+    if 160 <= code <= 169:
+        return 'q'      # 8-byte int
+    if 290 <= code <= 299:
+        return '?'      # 1-byte bool
+    if 310 <= code <= 319 or code == 1004:
+        return 'b'      # length-prefixed binary chunk
+    return 's'          # null-terminated string
+
+
+_BINARY_KINDS = [_binary_group_kind(c) for c in range(1072)]
+_BINARY_STRUCTS = {k: struct.Struct('<' + k) for k in 'dhiq?'}
+
+
+def iter_binary_dxf_tokens(data):
+    """
+    Yield (group_code, value) pairs from a binary DXF.
+    Strings come back as bytes (same as iter_dxf_tokens), numbers already
+    unpacked – no text-to-float conversion at all.
+    """
+    pos, end = len(BINARY_DXF_SENTINEL), len(data)
+    wide_codes = data[pos:pos + 2] == b'\x00\x00'   # first record is (0, 'SECTION')
+    find = data.find
+    unpack_code = struct.Struct('<H').unpack_from
+    unpackers = {k: (st.unpack_from, st.size) for k, st in _BINARY_STRUCTS.items()}
+    while pos < end:
+        if wide_codes:
+            code = unpack_code(data, pos)[0]; pos += 2
+        else:
+            code = data[pos]; pos += 1
+            if code == 255:
+                code = unpack_code(data, pos)[0]; pos += 2
+        kind = _BINARY_KINDS[code] if code < 1072 else 's'
+        if kind == 's':
+            nul = find(b'\x00', pos)
+            if nul < 0: nul = end
+            val = data[pos:nul].strip()
+            pos = nul + 1
+        elif kind == 'b':
+            n = data[pos]
+            val = data[pos + 1:pos + 1 + n]
+            pos += 1 + n
+        else:
+            unpack, size = unpackers[kind]
+            if pos + size > end:
+                return
+            val = unpack(data, pos)[0]
+            pos += size
+        yield code, val
+
+
+# ── Curve geometry ────────────────────────────────────────────────────────────
+# Curves are measured analytically where a closed form exists (ARC, CIRCLE,
+# bulge segments) and tessellated otherwise (ELLIPSE, SPLINE). Tessellated
+# points double as overlay geometry.
+ARC_STEP_DEG = 10.0         # overlay tessellation step for arcs / bulges
+ELLIPSE_SEGMENTS = 64       # per full turn
+SPLINE_MAX_SAMPLES = 512
+
+
+def _arc_points(cx, cy, r, a0, a1):
+    """Points along a CCW arc from a0 to a1 (degrees)."""
+    sweep = (a1 - a0) % 360.0 or 360.0
+    n = max(2, int(math.ceil(sweep / ARC_STEP_DEG)))
+    step = math.radians(sweep) / n
+    a = math.radians(a0)
+    return [(cx + r * math.cos(a + i * step), cy + r * math.sin(a + i * step)) for i in range(n + 1)]
+
+
+def _bulge_arc(x1, y1, x2, y2, bulge):
+    """Arc length and intermediate overlay points for a bulged polyline segment."""
+    vx, vy = x2 - x1, y2 - y1
+    c = math.hypot(vx, vy)
+    if c == 0:
+        return 0.0, []
+    theta = 4.0 * math.atan(bulge)              # signed included angle
+    half = theta / 2.0
+    length = abs(theta) * c / (2.0 * abs(math.sin(half)))
+    off = (c / 2.0) / math.tan(half)            # centre offset left of the chord
+    cx = (x1 + x2) / 2.0 - vy / c * off
+    cy = (y1 + y2) / 2.0 + vx / c * off
+    r = math.hypot(x1 - cx, y1 - cy)
+    a = math.atan2(y1 - cy, x1 - cx)
+    n = max(2, int(math.ceil(abs(math.degrees(theta)) / ARC_STEP_DEG)))
+    return length, [(cx + r * math.cos(a + theta * i / n), cy + r * math.sin(a + theta * i / n))
+                    for i in range(1, n)]
+
+
+def _ellipse_points(cx, cy, mx, my, ratio, t0, t1):
+    """Points along an ELLIPSE (major axis vector mx/my, params in radians)."""
+    if t1 <= t0:
+        t1 += 2 * math.pi
+    n = max(4, int(math.ceil(ELLIPSE_SEGMENTS * (t1 - t0) / (2 * math.pi))))
+    nx, ny = -my * ratio, mx * ratio
+    out = []
+    for i in range(n + 1):
+        t = t0 + (t1 - t0) * i / n
+        c, s = math.cos(t), math.sin(t)
+        out.append((cx + mx * c + nx * s, cy + my * c + ny * s))
+    return out
+
+
+def _spline_points(degree, knots, ctrl, weights):
+    """Sample a (rational) B-spline with de Boor's algorithm; None if the data is inconsistent."""
+    n, p = len(ctrl), degree
+    if p < 1 or n <= p or len(knots) != n + p + 1:
+        return None
+    if len(weights) != n:
+        weights = [1.0] * n
+    hom = [(x * w, y * w, w) for (x, y), w in zip(ctrl, weights)]
+    t0, t1 = knots[p], knots[n]
+    if t1 <= t0:
+        return None
+    samples = min(SPLINE_MAX_SAMPLES, max(16, 8 * (n - 1)))
+    out = []
+    for i in range(samples + 1):
+        t = t0 + (t1 - t0) * i / samples
+        k = min(max(bisect_right(knots, t) - 1, p), n - 1)
+        d = [hom[j + k - p] for j in range(p + 1)]
+        for r in range(1, p + 1):
+            for j in range(p, r - 1, -1):
+                i0 = j + k - p
+                denom = knots[i0 + p + 1 - r] - knots[i0]
+                al = (t - knots[i0]) / denom if denom else 0.0
+                a, b = d[j - 1], d[j]
+                d[j] = (a[0] + al * (b[0] - a[0]), a[1] + al * (b[1] - a[1]), a[2] + al * (b[2] - a[2]))
+        x, y, w = d[p]
+        if w:
+            out.append((x / w, y / w))
+    return out
+
+
+class _LayerLengths:
+    """
+    Per-layer length totals. Straight segments are buffered as coordinate
+    deltas in array('d') per layer and reduced in batches with
+    map(math.hypot, …) rather than one ** 0.5 expression per segment.
+    """
+    BATCH = 1 << 16
+
+    def __init__(self):
+        self._totals = defaultdict(float)
+        self._dx = {}
+        self._dy = {}
+
+    def add_length(self, layer, length):
+        self._totals[layer] += length
+
+    def add_segment(self, layer, dx, dy):
+        buf = self._dx.get(layer)
+        if buf is None:
+            buf = self._dx[layer] = array('d'); self._dy[layer] = array('d')
+        buf.append(dx); self._dy[layer].append(dy)
+        if len(buf) >= self.BATCH:
+            self._reduce(layer)
+
+    def add_points(self, layer, points, closed=False):
+        """Straight segments between consecutive points (plus the closing one)."""
+        if len(points) < 2:
+            return
+        xs = [pt[0] for pt in points]
+        ys = [pt[1] for pt in points]
+        if closed:
+            xs.append(xs[0]); ys.append(ys[0])
+        buf = self._dx.get(layer)
+        if buf is None:
+            buf = self._dx[layer] = array('d'); self._dy[layer] = array('d')
+        buf.extend(map(sub, xs[1:], xs))
+        self._dy[layer].extend(map(sub, ys[1:], ys))
+        if len(buf) >= self.BATCH:
+            self._reduce(layer)
+
+    def _reduce(self, layer):
+        dx, dy = self._dx[layer], self._dy[layer]
+        self._totals[layer] += math.fsum(map(math.hypot, dx, dy))
+        del dx[:], dy[:]
+
+    def totals(self):
+        for layer in self._dx:
+            self._reduce(layer)
+        return self._totals
+
+
+def _measure_vertices(acc, layer, verts, closed):
+    """
+    Measure [x, y, bulge] polyline vertices into acc. Straight runs go to the
+    batched buffers; bulged segments are measured as arcs. Returns the overlay
+    points with bulges tessellated.
+    """
+    if not any(v[2] for v in verts):
+        pts = [(v[0], v[1]) for v in verts]
+        acc.add_points(layer, pts, closed)
+        return pts
+    pts = []
+    seq = verts + [verts[0]] if closed else verts
+    for a, b in zip(seq, seq[1:]):
+        pts.append((a[0], a[1]))
+        if a[2]:
+            length, mid = _bulge_arc(a[0], a[1], b[0], b[1], a[2])
+            acc.add_length(layer, length)
+            pts.extend(mid)
+        else:
+            acc.add_segment(layer, b[0] - a[0], b[1] - a[1])
+    if not closed:
+        pts.append((verts[-1][0], verts[-1][1]))
+    return pts
+
+
+def _insert_scale(sx, sy):
+    """Length multiplier for an INSERT scale (exact when uniform, geometric mean otherwise)."""
+    return abs(sx * sy) ** 0.5
+
+
+def _transform_bbox(bb, base, x, y, sx, sy, rot):
+    """Map a block-local [minX, minY, maxX, maxY] through an INSERT placement."""
+    c, s = math.cos(math.radians(rot)), math.sin(math.radians(rot))
+    bx, by = base
+    out = None
+    for px, py in ((bb[0], bb[1]), (bb[2], bb[1]), (bb[0], bb[3]), (bb[2], bb[3])):
+        lx, ly = (px - bx) * sx, (py - by) * sy
+        gx, gy = x + lx * c - ly * s, y + lx * s + ly * c
+        if out is None:
+            out = [gx, gy, gx, gy]
+        else:
+            if gx < out[0]: out[0] = gx
+            if gx > out[2]: out[2] = gx
+            if gy < out[1]: out[1] = gy
+            if gy > out[3]: out[3] = gy
+    return out
+
+
+def _bbox_grow(bb, x, y):
+    if x < bb[0]: bb[0] = x
+    if x > bb[2]: bb[2] = x
+    if y < bb[1]: bb[1] = y
+    if y > bb[3]: bb[3] = y
+
+
+def _bbox_union(bb, other):
+    _bbox_grow(bb, other[0], other[1])
+    _bbox_grow(bb, other[2], other[3])
+
+
+# ── Array-backed overlay geometry ────────────────────────────────────────────
+# Overlay features are stored column-wise while parsing: a layer string table
+# plus flat typed arrays, instead of one tuple/dict per segment. The same
+# columns feed the tile pyramid, the tile store and the opt-in columnar
+# response format (format='columnar'):
+#
+#   geometry: {format: 'columnar-1', layers: [str], names: [str],
+#              lines:     {count, layer: u32, xy: f64 [x1,y1,x2,y2,…], id?: u32},
+#              polylines: {count, layer: u32, closed: u8, offsets: u32 (count+1,
+#                          in points), xy: f64 [x,y,…], id?: u32},
+#              inserts:   {count, name: u32, layer: u32, xy: f64,
+#                          attribs: {"<idx>": [{tag, value}]}}}
+#
+# Typed columns are base64 of little-endian arrays (Float64Array / Uint32Array /
+# Uint8Array on the client). float64 keeps surveyed coordinates (EOV, mm units)
+# exact.
+#
+# format='quantized' is the same object with {format: 'quantized-1', origin:
+# [x, y], step} and every xy column as i32 grid steps instead of f64: value k
+# is the grid index of coordinate k minus that of coordinate k-2 (x from the
+# previous x, y from the previous y, across feature boundaries; the first pair
+# is absolute). The client restores x = origin + step * prefix_sum. Step
+# defaults to 1 mm at the detected unit factor – the small integers are a
+# quarter of the text size of decimal floats and compress far better.
+GEOMETRY_FORMATS = ('json', 'columnar', 'quantized')
+QUANTIZE_MM = 1.0
+_QUANTIZE_MAX_STEPS = 1 << 30   # span / step cap – every delta fits in int32
+
+
+def _b64_column(arr):
+    if sys.byteorder != 'little':
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return base64.b64encode(arr.tobytes()).decode('ascii')
+
+
+def _quantized_column(xy, quantize):
+    """Interleaved f64 x, y → base64 i32 grid deltas (see the quantized format above)."""
+    ox, oy, step = quantize
+    inv = 1.0 / step
+    out = [0] * len(xy)
+    for k, o in ((0, ox), (1, oy)):
+        q = [round((v - o) * inv) for v in xy[k::2]]
+        out[k::2] = map(sub, q, [0] + q[:-1])
+    return _b64_column(array('i', out))
+
+
+def quantize_params(unit_factor, box, quantize_mm=QUANTIZE_MM):
+    """(origin x, origin y, step) for coordinates inside box [minX, minY, maxX, maxY]."""
+    step = quantize_mm * 0.001 / (unit_factor or 1.0)
+    span = max(box[2] - box[0], box[3] - box[1], 0.0)
+    return box[0], box[1], max(step, span / _QUANTIZE_MAX_STEPS)
+
+
+def _column_from_b64(typecode, text):
+    arr = array(typecode)
+    arr.frombytes(base64.b64decode(text))
+    if sys.byteorder != 'little':
+        arr.byteswap()
+    return arr
+
+
+class _Geometry:
+    """Overlay geometry columns: lines, polylines (flat points + offsets), inserts."""
+
+    _COLUMNS = ('line_layer', 'line_xy', 'poly_layer', 'poly_closed', 'poly_start', 'poly_xy',
+                'insert_name', 'insert_layer', 'insert_xy', 'insert_handle')
+
+    def __init__(self):
+        self.layers, self._layer_ids = [], {}
+        self.names, self._name_ids = [], {}
+        self.line_layer, self.line_xy = array('I'), array('d')
+        self.poly_layer, self.poly_closed = array('I'), array('B')
+        self.poly_start, self.poly_xy = array('I', [0]), array('d')
+        self.insert_name, self.insert_layer, self.insert_xy = array('I'), array('I'), array('d')
+        self.insert_handle = array('Q')     # DXF entity handle (group 5), 0 = none
+        self.insert_attribs = {}            # insert idx → [{tag, value}] (sparse)
+
+    @staticmethod
+    def _intern(value, table, ids):
+        i = ids.get(value)
+        if i is None:
+            i = ids[value] = len(table)
+            table.append(value)
+        return i
+
+    def add_line(self, layer, x1, y1, x2, y2):
+        self.line_layer.append(self._intern(layer, self.layers, self._layer_ids))
+        self.line_xy.extend((x1, y1, x2, y2))
+
+    def add_poly(self, layer, points, closed):
+        self.poly_layer.append(self._intern(layer, self.layers, self._layer_ids))
+        self.poly_closed.append(1 if closed else 0)
+        xy = self.poly_xy
+        for px, py in points:
+            xy.append(px); xy.append(py)
+        self.poly_start.append(len(xy) // 2)
+
+    def add_insert(self, name, layer, x, y, handle=0):
+        self.insert_handle.append(handle)
+        self.insert_name.append(self._intern(name, self.names, self._name_ids))
+        self.insert_layer.append(self._intern(layer, self.layers, self._layer_ids))
+        self.insert_xy.extend((x, y))
+
+    @property
+    def line_count(self):
+        return len(self.line_layer)
+
+    @property
+    def poly_count(self):
+        return len(self.poly_layer)
+
+    @property
+    def insert_count(self):
+        return len(self.insert_name)
+
+    def line(self, i):
+        j = 4 * i
+        xy = self.line_xy
+        return self.layers[self.line_layer[i]], xy[j], xy[j + 1], xy[j + 2], xy[j + 3]
+
+    def poly_len(self, i):
+        return self.poly_start[i + 1] - self.poly_start[i]
+
+    def poly_points(self, i):
+        xy = self.poly_xy[2 * self.poly_start[i]:2 * self.poly_start[i + 1]]
+        return list(zip(xy[0::2], xy[1::2]))
+
+    def poly(self, i):
+        return self.layers[self.poly_layer[i]], self.poly_points(i), bool(self.poly_closed[i])
+
+    def insert_dicts(self):
+        xy, names, layers = self.insert_xy, self.names, self.layers
+        attribs = self.insert_attribs
+        return [{'name': names[n], 'layer': layers[l], 'x': xy[2 * i], 'y': xy[2 * i + 1],
+                 'attribs': attribs.get(i)}
+                for i, (n, l) in enumerate(zip(self.insert_name, self.insert_layer))]
+
+    def columnar(self, line_ids=None, poly_entries=None, with_ids=False, inserts=True, quantize=None):
+        """
+        Encode (a subset of) the geometry in the columnar response format.
+        line_ids: line indices (None = all); poly_entries: [[poly idx,
+        simplified points | None]] as stored in pyramid tiles (None = all).
+        quantize: (origin x, origin y, step) → the quantized format.
+        """
+        if line_ids is None:
+            line_layer, line_xy = self.line_layer, self.line_xy
+            line_ids = range(self.line_count)
+        else:
+            line_layer, line_xy = array('I'), array('d')
+            src = self.line_xy
+            for i in line_ids:
+                line_layer.append(self.line_layer[i])
+                line_xy.extend(src[4 * i:4 * i + 4])
+        if poly_entries is None:
+            poly_layer, poly_closed = self.poly_layer, self.poly_closed
+            poly_start, poly_xy = self.poly_start, self.poly_xy
+            poly_ids = range(self.poly_count)
+        else:
+            poly_layer, poly_closed = array('I'), array('B')
+            poly_start, poly_xy = array('I', [0]), array('d')
+            poly_ids = array('I')
+            src, start = self.poly_xy, self.poly_start
+            for i, pts in poly_entries:
+                poly_ids.append(i)
+                poly_layer.append(self.poly_layer[i])
+                poly_closed.append(self.poly_closed[i])
+                if pts is None:
+                    poly_xy.extend(src[2 * start[i]:2 * start[i + 1]])
+                else:
+                    for px, py in pts:
+                        poly_xy.append(px); poly_xy.append(py)
+                poly_start.append(len(poly_xy) // 2)
+        xy_column = _b64_column if quantize is None else (lambda xy: _quantized_column(xy, quantize))
+        lines = {'count': len(line_layer), 'layer': _b64_column(line_layer), 'xy': xy_column(line_xy)}
+        polys = {'count': len(poly_layer), 'layer': _b64_column(poly_layer),
+                 'closed': _b64_column(poly_closed), 'offsets': _b64_column(poly_start),
+                 'xy': xy_column(poly_xy)}
+        if with_ids:
+            lines['id'] = _b64_column(array('I', line_ids))
+            polys['id'] = _b64_column(array('I', poly_ids))
+        out = {'format': 'columnar-1', 'layers': self.layers, 'lines': lines, 'polylines': polys}
+        if quantize is not None:
+            out.update(format='quantized-1', origin=[quantize[0], quantize[1]], step=quantize[2])
+        if inserts:
+            out.update(self.insert_columns(quantize))
+        return out
+
+    def insert_columns(self, quantize=None):
+        xy = self.insert_xy
+        return {'names': self.names,
+                'inserts': {'count': self.insert_count, 'name': _b64_column(self.insert_name),
+                            'layer': _b64_column(self.insert_layer),
+                            'xy': _b64_column(xy) if quantize is None else _quantized_column(xy, quantize),
+                            'attribs': {str(i): a for i, a in self.insert_attribs.items()}}}
+
+    def to_state(self):
+        """Serializable snapshot for the tile store."""
+        return {'layers': self.layers, 'names': self.names,
+                'attribs': {str(i): a for i, a in self.insert_attribs.items()},
+                'columns': {k: _b64_column(getattr(self, k)) for k in self._COLUMNS}}
+
+    @classmethod
+    def from_state(cls, state):
+        geo = cls()
+        geo.layers, geo.names = state['layers'], state['names']
+        geo._layer_ids = {v: i for i, v in enumerate(geo.layers)}
+        geo._name_ids = {v: i for i, v in enumerate(geo.names)}
+        geo.insert_attribs = {int(i): a for i, a in state.get('attribs', {}).items()}
+        for k in cls._COLUMNS:
+            setattr(geo, k, _column_from_b64(getattr(geo, k).typecode, state['columns'][k]))
+        return geo
+
+    def extend(self, other):
+        """Append another geometry (a later chunk of the same drawing), remapping table ids."""
+        layer_map = [self._intern(v, self.layers, self._layer_ids) for v in other.layers]
+        name_map = [self._intern(v, self.names, self._name_ids) for v in other.names]
+        self.line_layer.extend(layer_map[i] for i in other.line_layer)
+        self.line_xy.extend(other.line_xy)
+        base = self.poly_start[-1]
+        self.poly_layer.extend(layer_map[i] for i in other.poly_layer)
+        self.poly_closed.extend(other.poly_closed)
+        self.poly_start.extend(base + s for s in other.poly_start[1:])
+        self.poly_xy.extend(other.poly_xy)
+        offset = self.insert_count
+        self.insert_name.extend(name_map[i] for i in other.insert_name)
+        self.insert_layer.extend(layer_map[i] for i in other.insert_layer)
+        self.insert_xy.extend(other.insert_xy)
+        self.insert_handle.extend(other.insert_handle)
+        for i, a in other.insert_attribs.items():
+            self.insert_attribs[offset + i] = a
+
+
+# ── Level-of-detail geometry pyramid ─────────────────────────────────────────
+# Overlay geometry is no longer truncated. All LINE/polyline features go into a
+# quadtree over the drawing extent: a tile whose features fit the vertex budget
+# is a leaf holding them at full detail; a denser tile keeps a simplified
+# overview (sub-pixel features dropped, polylines Douglas–Peucker-simplified,
+# largest features first) and is split into four children. The parse response
+# carries tile 0/0/0 only, so its size stays bounded however large the drawing.
+# The parse builds the tree; overviews below the root are simplified when a
+# tile is first requested (mode='tiles'), each polyline ranked once for all.
+#
+# Tile (z, x, y) spans origin + (x, y) * size / 2**z with side size / 2**z;
+# y grows with drawing Y (DXF orientation, not screen orientation).
+TILE_VERTEX_BUDGET = 16000  # lines cost 2, polylines their point count
+TILE_PIXELS = 512           # simplification tolerance = tile side / TILE_PIXELS
+TILE_MAX_ZOOM = 10
+TILE_SPLIT_GROWTH = 2.5      # stop splitting when children would duplicate this much
+
+
+def _simplify_dp(points, tol):
+    """Douglas–Peucker polyline simplification (iterative, keeps end points)."""
+    n = len(points)
+    if n < 3 or tol <= 0:
+        return points
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    tol2 = tol * tol
+    while stack:
+        i, j = stack.pop()
+        ax, ay = points[i]
+        bx, by = points[j]
+        dx, dy = bx - ax, by - ay
+        dd = dx * dx + dy * dy
+        best, best_k = -1.0, -1
+        for k in range(i + 1, j):
+            px, py = points[k]
+            if dd:
+                t = ((px - ax) * dx + (py - ay) * dy) / dd
+                t = 0.0 if t < 0 else 1.0 if t > 1 else t
+                ex, ey = ax + t * dx - px, ay + t * dy - py
+            else:
+                ex, ey = px - ax, py - ay
+            d2 = ex * ex + ey * ey
+            if d2 > best:
+                best, best_k = d2, k
+        if best > tol2:
+            keep[best_k] = True
+            stack.append((i, best_k))
+            stack.append((best_k, j))
+    return [pt for pt, k in zip(points, keep) if k]
+
+
+class _DpRanks:
+    """
+    Douglas–Peucker ranks of one polyline (flat xy), refined on demand: the
+    vertices ranked above tol² are exactly those _simplify_dp(points, tol)
+    keeps. The splits DP picks do not depend on the tolerance, only where it
+    stops – so the split tree is expanded lazily, down to the finest
+    tolerance asked for so far, and each segment is scanned once however
+    many tiles and levels read the polyline.
+    """
+
+    __slots__ = ('xy', 'ranks', 'pending')
+
+    def __init__(self, xy):
+        n = len(xy) // 2
+        self.xy = xy
+        self.ranks = [0.0] * n
+        self.ranks[0] = self.ranks[-1] = float('inf')
+        self.pending = []       # heap of (-split distance², i, j, split vertex)
+        self._split(0, n - 1, float('inf'))
+
+    def _split(self, i, j, cap):
+        if j - i < 2:
+            return
+        xy = self.xy
+        ax, ay, bx, by = xy[2 * i], xy[2 * i + 1], xy[2 * j], xy[2 * j + 1]
+        dx, dy = bx - ax, by - ay
+        dd = dx * dx + dy * dy
+        best, best_k = -1.0, -1
+        for k in range(i + 1, j):
+            px, py = xy[2 * k], xy[2 * k + 1]
+            if dd:
+                t = ((px - ax) * dx + (py - ay) * dy) / dd
+                t = 0.0 if t < 0 else 1.0 if t > 1 else t
+                ex, ey = ax + t * dx - px, ay + t * dy - py
+            else:
+                ex, ey = px - ax, py - ay
+            d2 = ex * ex + ey * ey
+            if d2 > best:
+                best, best_k = d2, k
+        # A split below a coarser one never outranks it (DP stops at the parent)
+        heapq.heappush(self.pending, (-min(best, cap), i, j, best_k))
+
+    def keep(self, tol2):
+        """Keep-mask of the vertices for tolerance² tol2."""
+        pending, ranks = self.pending, self.ranks
+        while pending and -pending[0][0] > tol2:
+            d2, i, j, k = heapq.heappop(pending)
+            ranks[k] = -d2
+            self._split(i, k, -d2)
+            self._split(k, j, -d2)
+        return list(map(tol2.__lt__, ranks))
+
+
+def _simplify_vw(points, tol):
+    """
+    Visvalingam–Whyatt simplification (keeps end points): repeatedly drops the
+    vertex whose triangle with its neighbours has the smallest area, while that
+    area is below tol² / 2 – smoother than DP on dense tessellated curves.
+    """
+    n = len(points)
+    if n < 3 or tol <= 0:
+        return points
+    limit = tol * tol / 2
+    prev, nxt = list(range(-1, n - 1)), list(range(1, n + 1))
+
+    def area(i):
+        (ax, ay), (bx, by), (cx, cy) = points[prev[i]], points[i], points[nxt[i]]
+        return abs((bx - ax) * (cy - ay) - (cx - ax) * (by - ay)) / 2
+
+    cur = [0.0] * n
+    heap = []
+    for i in range(1, n - 1):
+        cur[i] = area(i)
+        heap.append((cur[i], i))
+    heapq.heapify(heap)
+    removed = [False] * n
+    while heap:
+        a, i = heapq.heappop(heap)
+        if removed[i] or a != cur[i]:
+            continue                # stale entry
+        if a > limit:
+            break
+        removed[i] = True
+        p, q = prev[i], nxt[i]
+        nxt[p], prev[q] = q, p
+        for j in (p, q):
+            if 0 < j < n - 1:
+                # A neighbour never ranks below the point just removed
+                cur[j] = max(area(j), a)
+                heapq.heappush(heap, (cur[j], j))
+    return [pt for pt, r in zip(points, removed) if not r]
+
+
+def _segment_hits_rect(x1, y1, x2, y2, rx0, ry0, rx1, ry1):
+    """Liang–Barsky test: does the segment touch the rectangle?"""
+    t0, t1 = 0.0, 1.0
+    dx, dy = x2 - x1, y2 - y1
+    for p, q in ((-dx, x1 - rx0), (dx, rx1 - x1), (-dy, y1 - ry0), (dy, ry1 - y1)):
+        if p == 0:
+            if q < 0:
+                return False
+        else:
+            t = q / p
+            if p < 0:
+                if t > t1: return False
+                if t > t0: t0 = t
+            else:
+                if t < t0: return False
+                if t < t1: t1 = t
+    return True
+
+
+def _poly_boxes(geo):
+    pxy, pstart = geo.poly_xy, geo.poly_start
+    boxes = []
+    for i in range(geo.poly_count):
+        xy = pxy[2 * pstart[i]:2 * pstart[i + 1]]
+        xs, ys = xy[0::2], xy[1::2]
+        boxes.append((min(xs), min(ys), max(xs), max(ys)))
+    return boxes
+
+
+def build_geometry_pyramid(geo, deadline=None):
+    """
+    Build the LOD quadtree over a _Geometry. Tiles reference features by index:
+    {'l': [line idx], 'p': [[poly idx, simplified points | None]], 'leaf': bool}.
+    Only the tree is built here; a split tile holds all its features and
+    'pending': True until tile_overview() first reduces it to its overview.
+    None when the deadline (time.monotonic() value) passes first.
+    """
+    n_lines, n_polys = geo.line_count, geo.poly_count
+    lxy, pstart = geo.line_xy, geo.poly_start
+    pboxes = _poly_boxes(geo)
+    plen = [pstart[i + 1] - pstart[i] for i in range(n_polys)]
+    ext = [float('inf'), float('inf'), float('-inf'), float('-inf')]
+    if n_lines:
+        xs, ys = lxy[0::2], lxy[1::2]
+        _bbox_union(ext, (min(xs), min(ys), max(xs), max(ys)))
+    for pb in pboxes:
+        _bbox_union(ext, pb)
+    if ext[0] > ext[2]:
+        ext = [0.0, 0.0, 0.0, 0.0]
+    size = max(ext[2] - ext[0], ext[3] - ext[1]) or 1.0
+    ox, oy = ext[0], ext[1]
+    tiles = {}
+    max_z = 0
+
+    stack = [(0, 0, 0, list(range(n_lines)), list(range(n_polys)))]
+    while stack:
+        if deadline is not None and not len(tiles) & 63 and time.monotonic() > deadline:
+            return None
+        z, tx, ty, li, pi = stack.pop()
+        max_z = max(max_z, z)
+        cost = 2 * len(li) + sum(plen[i] for i in pi)
+        entry = {'l': li, 'p': [[i, None] for i in pi], 'leaf': True}
+        tiles[f'{z}/{tx}/{ty}'] = entry
+        if cost <= TILE_VERTEX_BUDGET or z >= TILE_MAX_ZOOM:
+            continue
+
+        half = size / (1 << z) / 2
+        # Child rectangles; [cx * 2 + cy] below
+        rects = [(ox + (tx * 2 + cx) * half, oy + (ty * 2 + cy) * half) for cx in (0, 1) for cy in (0, 1)]
+        rects = [(x0, y0, x0 + half, y0 + half) for x0, y0 in rects]
+        west_x, east_x = rects[0][2], rects[2][0]       # the split line, as each side computes it
+        south_y, north_y = rects[0][3], rects[1][1]
+        cls, cps = ([], [], [], []), ([], [], [], [])
+        for i in li:
+            j = 4 * i
+            x1, y1, x2, y2 = lxy[j], lxy[j + 1], lxy[j + 2], lxy[j + 3]
+            w, e = x1 <= west_x or x2 <= west_x, x1 >= east_x or x2 >= east_x
+            s, n = y1 <= south_y or y2 <= south_y, y1 >= north_y or y2 >= north_y
+            if w != e and s != n:
+                # Within one quadrant of a tile it touches: touches that child
+                cls[2 * e + n].append(i)
                 continue
+            for q in ((0, 1) if w else ()) + ((2, 3) if e else ()):
+                if (s if q & 1 == 0 else n) and _segment_hits_rect(x1, y1, x2, y2, *rects[q]):
+                    cls[q].append(i)
+        for i in pi:
+            b = pboxes[i]
+            w, e, s, n = b[0] <= west_x, b[2] >= east_x, b[1] <= south_y, b[3] >= north_y
+            if w:
+                if s: cps[0].append(i)
+                if n: cps[1].append(i)
+            if e:
+                if s: cps[2].append(i)
+                if n: cps[3].append(i)
+        children = []
+        child_cost = 0
+        for q in (0, 1, 2, 3):
+            cl, cp = cls[q], cps[q]
+            if cl or cp:
+                children.append((z + 1, tx * 2 + (q >> 1), ty * 2 + (q & 1), cl, cp))
+                child_cost += 2 * len(cl) + sum(plen[i] for i in cp)
+        if z > 0 and child_cost > TILE_SPLIT_GROWTH * cost:
+            # Features span the whole tile – splitting only duplicates them.
+            # (The root always splits so the parse response stays bounded.)
+            continue
+        entry['leaf'] = False
+        entry['pending'] = True
+        stack.extend(children)
+
+    return {'origin': [ox, oy], 'size': size, 'maxZoom': max_z, 'geometry': geo, 'tiles': tiles}
+
+
+def tile_overview(pyr, key):
+    """
+    The tile, a split one reduced to its overview on first use: largest
+    features first, polylines Douglas–Peucker-simplified to the tile's pixel
+    tolerance, sub-pixel detail only while the vertex budget lasts. Each
+    polyline is ranked once per pyramid (_DpRanks) for every tile and level.
+    """
+    t = pyr['tiles'].get(key)
+    if t is None or not t.get('pending'):
+        return t
+    geo = pyr['geometry']
+    lxy, pxy, pstart = geo.line_xy, geo.poly_xy, geo.poly_start
+    ranks = pyr.setdefault('ranks', {})
+    side = pyr['size'] / (1 << int(key.split('/', 1)[0]))
+    tol2 = (side / TILE_PIXELS) ** 2
+    ranked = []
+    for i in t['l']:
+        j = 4 * i
+        ranked.append((max(abs(lxy[j + 2] - lxy[j]), abs(lxy[j + 3] - lxy[j + 1])), 0, i))
+    for i, _ in t['p']:
+        xy = pxy[2 * pstart[i]:2 * pstart[i + 1]]
+        xs, ys = xy[0::2], xy[1::2]
+        ranked.append((max(max(xs) - min(xs), max(ys) - min(ys)), 1, i))
+    ranked.sort(key=lambda r: -r[0])
+    keep_l, keep_p, spent = [], [], 0
+    for _, kind, i in ranked:
+        if kind == 0:
+            if spent + 2 > TILE_VERTEX_BUDGET:
+                break
+            spent += 2
+            keep_l.append(i)
+            continue
+        r = ranks.get(i)
+        if r is None:
+            r = ranks[i] = _DpRanks(pxy[2 * pstart[i]:2 * pstart[i + 1]])
+        mask = r.keep(tol2)
+        kept = sum(mask)
+        if spent + kept > TILE_VERTEX_BUDGET:
+            break
+        spent += kept
+        keep_p.append([i, list(compress(geo.poly_points(i), mask)) if kept < len(mask) else None])
+    t = pyr['tiles'][key] = {'l': keep_l, 'p': keep_p, 'leaf': False}
+    return t
+
+
+def pyramid_tile(pyr, key, with_ids=True, geometry_format='json', simplify=None, quantize=None):
+    """
+    Materialize one tile into the lineGeom / polylineGeom schema (or the
+    columnar one; quantized with quantize=(origin x, origin y, step)).
+    simplify=(tolerance, method) further simplifies the tile's polylines for
+    display; the tile then reports the vertex counts under 'simplify'.
+    """
+    t = tile_overview(pyr, key)
+    if t is None:
+        return None
+    geo = pyr['geometry']
+    entries, info = t['p'], None
+    if simplify is not None:
+        entries, info = _simplify_entries(geo, entries, *simplify)
+    if geometry_format != 'json':
+        out = {'geometry': geo.columnar(t['l'], entries, with_ids=with_ids, inserts=False,
+                                        quantize=quantize if geometry_format == 'quantized' else None),
+               'leaf': t['leaf']}
+        if info is not None:
+            out['simplify'] = info
+        return out
+    line_geom = []
+    for i in t['l']:
+        layer, x1, y1, x2, y2 = geo.line(i)
+        g = {'layer': layer, 'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2}
+        if with_ids: g['id'] = i
+        line_geom.append(g)
+    polyline_geom = []
+    for i, pts in entries:
+        g = {'layer': geo.layers[geo.poly_layer[i]], 'points': pts if pts is not None else geo.poly_points(i),
+             'closed': bool(geo.poly_closed[i])}
+        if with_ids: g['id'] = i
+        polyline_geom.append(g)
+    out = {'lineGeom': line_geom, 'polylineGeom': polyline_geom, 'leaf': t['leaf']}
+    if info is not None:
+        out['simplify'] = info
+    return out
+
+
+# ── Display simplification ───────────────────────────────────────────────────
+# Optional, per request: polylines of the returned overlay (parse response
+# tile 0/0/0, or tiles in mode='tiles') are simplified to a tolerance derived
+# from the drawing extent and the client's viewport, so sub-pixel vertices of
+# tessellated curves and hatch-like walls are not shipped. Lengths, the stored
+# plan and the spatial index always keep full resolution.
+SIMPLIFY_METHODS = {'dp': _simplify_dp, 'vw': _simplify_vw}
+SIMPLIFY_PIXEL_FRACTION = 0.5   # tolerance = half a screen pixel
+SIMPLIFY_MAX_VIEWPORT = 16384
+
+
+def parse_simplify(payload):
+    """
+    Display simplification options of a request, or None:
+    viewport: [width_px, height_px] (or one number) the overlay is drawn at,
+    simplify_tolerance: explicit tolerance in drawing units (wins),
+    simplify: 'dp' (Douglas–Peucker, default) | 'vw' (Visvalingam–Whyatt).
+    """
+    viewport, tol = payload.get('viewport'), payload.get('simplify_tolerance')
+    if viewport is None and tol is None:
+        return None
+    method = payload.get('simplify') or 'dp'
+    if method not in SIMPLIFY_METHODS:
+        raise ValueError(f'simplify: {" | ".join(SIMPLIFY_METHODS)}')
+    out = {'method': method}
+    if tol is not None:
+        out['tolerance'] = float(tol)
+        if not out['tolerance'] > 0:
+            raise ValueError('simplify_tolerance must be positive')
+        return out
+    if not isinstance(viewport, list):
+        viewport = [viewport, viewport]
+    if len(viewport) != 2:
+        raise ValueError('viewport: [width, height]')
+    w, h = (float(v) for v in viewport)
+    if not (0 < w <= SIMPLIFY_MAX_VIEWPORT and 0 < h <= SIMPLIFY_MAX_VIEWPORT):
+        raise ValueError(f'viewport: 1…{SIMPLIFY_MAX_VIEWPORT} px')
+    out['viewport'] = [w, h]
+    return out
+
+
+def simplify_tolerance(spec, width, height):
+    """Tolerance (drawing units) for an area width × height shown at spec's viewport."""
+    if 'tolerance' in spec:
+        return spec['tolerance']
+    w, h = spec['viewport']
+    return max(width / w, height / h) * SIMPLIFY_PIXEL_FRACTION
+
+
+def _simplify_entries(geo, entries, tol, method):
+    """Tile polyline entries simplified to tol → (entries, {tolerance, method, vertex counts})."""
+    fn = SIMPLIFY_METHODS[method]
+    out, n_in, n_out = [], 0, 0
+    for i, pts in entries:
+        full = pts if pts is not None else geo.poly_points(i)
+        simple = fn(full, tol)
+        n_in += len(full)
+        n_out += len(simple)
+        out.append([i, simple if len(simple) < geo.poly_len(i) else None])
+    return out, {'tolerance': tol, 'method': method, 'verticesIn': n_in, 'verticesOut': n_out}
+
+
+def plan_id_for(file_bytes, projection, opts, start=None, stop=None, stopped=False):
+    """
+    Id of the plan a parse stores: the file's SHA-256, extended by everything
+    that makes the stored plan differ from the complete parse's – layer / type
+    filters, a field projection that skips the inserts or the spatial index,
+    a byte range (partial / resumed scan). The complete parse keeps the bare
+    file hash that mode='index' and mode='diff' address.
+    """
+    h = hashlib.sha256(file_bytes)
+    filters = {k: projection[k] for k in ('layers', 'exclude_layers', 'entities') if k in (projection or {})}
+    if filters:
+        h.update(json.dumps(filters, sort_keys=True).encode())
+    without = [k for k in ('capture_inserts', 'want_index') if not opts[k]]
+    if without:
+        h.update(json.dumps({'without': without}).encode())
+    if stopped or start is not None:
+        # Partial / resumed scans cover a byte range of the file only
+        h.update(f"range:{start}-{stop}".encode())
+    return h.hexdigest()
+
+
+def _stores_plan_index(projection, opts, start=None, stopped=False):
+    """Does the parse also store the plan index? Complete, unprojected parses of the whole file only."""
+    filtered = any(k in (projection or {}) for k in ('layers', 'exclude_layers', 'entities'))
+    return (opts['capture_overlay'] and opts['out_fields'] is None and not filtered
+            and start is None and not stopped)
+
+
+def stored_plan_objects(file_bytes, projection, opts, start=None):
+    """PLAN_STORE names a complete parse with these options writes (re-checked on a result-cache hit)."""
+    if not opts['capture_overlay']:
+        return []
+    plan_id = plan_id_for(file_bytes, projection, opts, start)
+    names = [f'{plan_id}.json']
+    if _stores_plan_index(projection, opts, start):
+        names.append(f'{plan_id}.index.json')
+    return names
+
+
+# Stored plans (pyramid + spatial index + geometry) of recent parses: small
+# in-process LRU in front of PLAN_STORE
+_pyramids = OrderedDict()
+_PYRAMID_MEMORY_SLOTS = 4
+
+
+def _remember_pyramid(plan_id, pyr):
+    _pyramids[plan_id] = pyr
+    _pyramids.move_to_end(plan_id)
+    while len(_pyramids) > _PYRAMID_MEMORY_SLOTS:
+        _pyramids.popitem(last=False)
+
+
+def save_geometry_pyramid(plan_id, pyr):
+    _remember_pyramid(plan_id, pyr)
+    state = {**pyr, 'geometry': pyr['geometry'].to_state()}
+    state.pop('ranks', None)        # in-memory simplification state of tile_overview()
+    if pyr.get('index') is not None:
+        state['index'] = pyr['index'].to_state()
+    # C encoder; json.dump() streams in pure Python
+    PLAN_STORE.put(f'{plan_id}.json', json.dumps(state, separators=(',', ':')).encode())
+
+
+def load_geometry_pyramid(plan_id):
+    pyr = _pyramids.get(plan_id)
+    if pyr is not None:
+        _pyramids.move_to_end(plan_id)
+        return pyr
+    data = PLAN_STORE.get(f'{plan_id}.json')
+    if data is None:
+        return None
+    try:
+        pyr = json.loads(data)
+        pyr['geometry'] = _Geometry.from_state(pyr['geometry'])
+        if pyr.get('index') is not None:
+            pyr['index'] = _GridIndex.from_state(pyr['index'])
+    except (ValueError, KeyError, TypeError):
+        return None
+    _remember_pyramid(plan_id, pyr)
+    return pyr
+
+
+# ── Plan index sidecar ───────────────────────────────────────────────────────
+# Every complete, unfiltered parse also stores a compact, versioned summary
+# next to its geometry, keyed by the file's SHA-256: counts, per-layer
+# lengths, bounds, units and the descriptors of the stored tiles and spatial
+# index. Reopening a project fetches it by hash (mode='index') instead of
+# uploading and re-parsing the drawing; overlay tiles then come from
+# mode='tiles' and hit tests from mode='query' with the same id.
+PLAN_INDEX_VERSION = 1
+_PLAN_INDEX_FIELDS = ('blocks', 'nested_blocks', 'lengths', 'layers', 'units', 'title_block',
+                      'circuits', 'geomBounds', 'spatialIndex', 'summary')
+
+
+def build_plan_index(plan_id, result, pyr, file_size):
+    geo = pyr['geometry']
+    return {
+        'version': PLAN_INDEX_VERSION, 'parser': PARSER_VERSION, 'id': plan_id,
+        'fileBytes': file_size, 'created': int(time.time()),
+        **{k: result.get(k) for k in _PLAN_INDEX_FIELDS},
+        # Always present (also for single-tile plans): fetch '0/0/0' for the overview
+        'tiles': {'id': plan_id, 'origin': pyr['origin'], 'size': pyr['size'], 'maxZoom': pyr['maxZoom'],
+                  'tileCount': len(pyr['tiles']), 'totalLines': geo.line_count,
+                  'totalPolylines': geo.poly_count},
+    }
+
+
+def save_plan_index(plan_id, index):
+    PLAN_STORE.put(f'{plan_id}.index.json', json.dumps(index, ensure_ascii=False).encode())
+
+
+def load_plan_index(plan_id):
+    """Stored index of the current version/parser, or None (missing or stale)."""
+    data = PLAN_STORE.get(f'{plan_id}.index.json')
+    if data is None:
+        return None
+    try:
+        index = json.loads(data)
+    except ValueError:
+        return None
+    if index.get('version') != PLAN_INDEX_VERSION or index.get('parser') != PARSER_VERSION:
+        return None
+    return index
+
+
+# ── Spatial index ────────────────────────────────────────────────────────────
+# Uniform grid over inserts, lines and polylines, stored CSR-style (cell →
+# slice of item refs) so it persists as two flat columns next to the pyramid.
+# An item is registered in every cell its bounding box covers; items covering
+# more than INDEX_MAX_SPAN_CELLS cells (long cable runs, frames) go to a
+# separate list that every query checks. Item ref = index << 2 | kind.
+INDEX_ITEMS_PER_CELL = 2
+INDEX_MAX_CELLS = 1 << 20
+INDEX_MAX_SPAN_CELLS = 64
+QUERY_MAX_RESULTS = 10000
+_KIND_INSERT, _KIND_LINE, _KIND_POLY = 0, 1, 2
+_KIND_NAMES = ('insert', 'line', 'polyline')
+
+
+def _point_segment_dist2(px, py, x1, y1, x2, y2):
+    dx, dy = x2 - x1, y2 - y1
+    dd = dx * dx + dy * dy
+    t = ((px - x1) * dx + (py - y1) * dy) / dd if dd else 0.0
+    t = 0.0 if t < 0 else 1.0 if t > 1 else t
+    ex, ey = x1 + t * dx - px, y1 + t * dy - py
+    return ex * ex + ey * ey
+
+
+def _path_segments(pts, closed):
+    segs = list(zip(pts, pts[1:]))
+    if closed and len(pts) > 2:
+        segs.append((pts[-1], pts[0]))
+    return segs
+
+
+class _GridIndex:
+    """CSR grid over a _Geometry; see build_spatial_index()."""
+
+    def __init__(self, origin, cell, cols, rows, cell_start, refs, big):
+        self.origin, self.cell, self.cols, self.rows = origin, cell, cols, rows
+        self.cell_start, self.refs, self.big = cell_start, refs, big
+
+    def describe(self):
+        return {'origin': self.origin, 'cellSize': self.cell, 'cols': self.cols, 'rows': self.rows,
+                'items': len(self.refs), 'oversize': len(self.big)}
+
+    def to_state(self):
+        return {**self.describe(), 'cellStart': _b64_column(self.cell_start),
+                'refs': _b64_column(self.refs), 'big': _b64_column(self.big)}
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state['origin'], state['cellSize'], state['cols'], state['rows'],
+                   _column_from_b64('I', state['cellStart']), _column_from_b64('I', state['refs']),
+                   _column_from_b64('I', state['big']))
+
+    def cell_of(self, x, y):
+        """Unclamped (col, row) of a point."""
+        return (math.floor((x - self.origin[0]) / self.cell),
+                math.floor((y - self.origin[1]) / self.cell))
+
+    def cell_refs(self, i, j):
+        c = j * self.cols + i
+        return self.refs[self.cell_start[c]:self.cell_start[c + 1]]
+
+    def rect_refs(self, x0, y0, x1, y1):
+        """Candidate refs whose cells intersect the rectangle (deduplicated)."""
+        i0, j0 = self.cell_of(x0, y0)
+        i1, j1 = self.cell_of(x1, y1)
+        i0, j0 = max(i0, 0), max(j0, 0)
+        i1, j1 = min(i1, self.cols - 1), min(j1, self.rows - 1)
+        out = set(self.big)
+        for j in range(j0, j1 + 1):
+            for i in range(i0, i1 + 1):
+                out.update(self.cell_refs(i, j))
+        return out
+
+
+def _feature_bbox(geo, kind, idx):
+    if kind == _KIND_INSERT:
+        x, y = geo.insert_xy[2 * idx], geo.insert_xy[2 * idx + 1]
+        return x, y, x, y
+    if kind == _KIND_LINE:
+        x1, y1, x2, y2 = geo.line_xy[4 * idx:4 * idx + 4]
+        return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+    xy = geo.poly_xy[2 * geo.poly_start[idx]:2 * geo.poly_start[idx + 1]]
+    xs, ys = xy[0::2], xy[1::2]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def build_spatial_index(geo):
+    n_items = geo.insert_count + geo.line_count + geo.poly_count
+    boxes = []                              # (ref, minx, miny, maxx, maxy)
+    for kind, count in ((_KIND_INSERT, geo.insert_count), (_KIND_LINE, geo.line_count),
+                        (_KIND_POLY, geo.poly_count)):
+        for idx in range(count):
+            boxes.append(((idx << 2) | kind,) + _feature_bbox(geo, kind, idx))
+    ext = [float('inf'), float('inf'), float('-inf'), float('-inf')]
+    for b in boxes:
+        _bbox_union(ext, b[1:])
+    if ext[0] > ext[2]:
+        ext = [0.0, 0.0, 0.0, 0.0]
+    w, h = ext[2] - ext[0], ext[3] - ext[1]
+    target = min(max(n_items // INDEX_ITEMS_PER_CELL, 1), INDEX_MAX_CELLS)
+    if w > 0 and h > 0:
+        cell = math.sqrt(w * h / target)
+    else:
+        cell = max(w, h) / target
+    cell = max(cell, max(w, h) / INDEX_MAX_CELLS ** 0.5, 1e-9)
+    cols, rows = int(w // cell) + 1, int(h // cell) + 1
+    index = _GridIndex([ext[0], ext[1]], cell, cols, rows, None, None, array('I'))
+
+    counts = array('I', bytes(4 * (cols * rows + 1)))
+    spans = []
+    for ref, x0, y0, x1, y1 in boxes:
+        i0, j0 = index.cell_of(x0, y0)
+        i1, j1 = index.cell_of(x1, y1)
+        i1, j1 = min(i1, cols - 1), min(j1, rows - 1)
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > INDEX_MAX_SPAN_CELLS:
+            index.big.append(ref)
+            continue
+        spans.append((ref, i0, j0, i1, j1))
+        for j in range(j0, j1 + 1):
+            for i in range(i0, i1 + 1):
+                counts[j * cols + i + 1] += 1
+    for c in range(1, len(counts)):
+        counts[c] += counts[c - 1]
+    refs = array('I', bytes(4 * counts[-1]))
+    fill = array('I', counts)
+    for ref, i0, j0, i1, j1 in spans:
+        for j in range(j0, j1 + 1):
+            for i in range(i0, i1 + 1):
+                c = j * cols + i
+                refs[fill[c]] = ref
+                fill[c] += 1
+    index.cell_start, index.refs = counts, refs
+    return index
+
 
-        # Detect $INSUNITS
-        insunits = 0
-        in_header, current_var = False, None
-        for code, val in tokens:
-            if code == 0 and val == 'SECTION': in_header = False
-            if code == 2 and val == 'HEADER': in_header = True
-            if code == 2 and val != 'HEADER' and in_header: current_var = val
-            if in_header and current_var == '$INSUNITS' and code == 70:
-                insunits = int(val); break
-
-        unit_name, unit_factor = INSUNITS_MAP.get(insunits, ('unknown', None))
-
-        # Find ENTITIES section start
-        entity_start = 0
-        section_name, in_section = '', False
-        for i, (code, val) in enumerate(tokens):
-            if code == 0 and val == 'SECTION': in_section = True
-            elif in_section and code == 2:
-                section_name = val; in_section = False
-                if val == 'ENTITIES': entity_start = i + 1; break
-
-        block_counts = Counter()
-        lengths_by_layer = defaultdict(float)
-        all_layers = set()
-
-        # Geometry capture (matching client parser schema)
-        insert_positions = []       # [{name, layer, x, y}]
-        line_geom = []              # [{layer, x1, y1, x2, y2}]
-        polyline_geom = []          # [{layer, points, closed}]
-        MAX_LINES = 3000
-        MAX_POLYS = 800
-
-        etype, elayer = None, 'DEFAULT'
-        pts, pt_x, pt_y = [], None, None
-        closed, line_start = False, None
-        # INSERT tracking
-        ins_name, ins_x, ins_y = None, None, None
-
-        def flush_poly():
-            if etype == 'LWPOLYLINE' and len(pts) > 1:
-                L = sum(((pts[j+1][0]-pts[j][0])**2+(pts[j+1][1]-pts[j][1])**2)**0.5
-                        for j in range(len(pts)-1))
-                if closed:
-                    L += ((pts[0][0]-pts[-1][0])**2+(pts[0][1]-pts[-1][1])**2)**0.5
-                lengths_by_layer[elayer] += L
-                # Capture polyline geometry
-                if len(polyline_geom) < MAX_POLYS:
-                    pts_copy = list(pts)
-                    if pt_x is not None:
-                        pts_copy.append((pt_x, pt_y or 0))
-                    if len(pts_copy) > 1:
-                        polyline_geom.append({'layer': elayer, 'points': pts_copy, 'closed': closed})
-
-        def flush_insert():
-            if etype == 'INSERT' and ins_name is not None and ins_x is not None:
-                key = (ins_name, elayer)
-                block_counts[key] += 1
-                insert_positions.append({'name': ins_name, 'layer': elayer, 'x': ins_x, 'y': ins_y or 0})
-
-        i = entity_start
-        while i < len(tokens):
-            code, val = tokens[i]
-            if code == 0 and val == 'ENDSEC':
-                flush_poly()
-                flush_insert()
+def _feature_out(geo, ref, dist=None):
+    kind, idx = ref & 3, ref >> 2
+    if kind == _KIND_INSERT:
+        g = {'kind': 'insert', 'id': idx, 'name': geo.names[geo.insert_name[idx]],
+             'layer': geo.layers[geo.insert_layer[idx]],
+             'x': geo.insert_xy[2 * idx], 'y': geo.insert_xy[2 * idx + 1],
+             'attribs': geo.insert_attribs.get(idx)}
+    elif kind == _KIND_LINE:
+        layer, x1, y1, x2, y2 = geo.line(idx)
+        g = {'kind': 'line', 'id': idx, 'layer': layer, 'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2}
+    else:
+        layer, pts, closed = geo.poly(idx)
+        g = {'kind': 'polyline', 'id': idx, 'layer': layer, 'points': pts, 'closed': closed}
+    if dist is not None:
+        g['distance'] = dist
+    return g
+
+
+def _feature_dist2(geo, ref, px, py):
+    kind, idx = ref & 3, ref >> 2
+    if kind == _KIND_INSERT:
+        dx, dy = geo.insert_xy[2 * idx] - px, geo.insert_xy[2 * idx + 1] - py
+        return dx * dx + dy * dy
+    if kind == _KIND_LINE:
+        return _point_segment_dist2(px, py, *geo.line_xy[4 * idx:4 * idx + 4])
+    _, pts, closed = geo.poly(idx)
+    return min(_point_segment_dist2(px, py, a[0], a[1], b[0], b[1]) for a, b in _path_segments(pts, closed))
+
+
+def _feature_hits_rect(geo, ref, x0, y0, x1, y1):
+    kind, idx = ref & 3, ref >> 2
+    if kind == _KIND_INSERT:
+        x, y = geo.insert_xy[2 * idx], geo.insert_xy[2 * idx + 1]
+        return x0 <= x <= x1 and y0 <= y <= y1
+    if kind == _KIND_LINE:
+        return _segment_hits_rect(*geo.line_xy[4 * idx:4 * idx + 4], x0, y0, x1, y1)
+    bx0, by0, bx1, by1 = _feature_bbox(geo, kind, idx)
+    if bx0 > x1 or bx1 < x0 or by0 > y1 or by1 < y0:
+        return False
+    _, pts, closed = geo.poly(idx)
+    return any(_segment_hits_rect(a[0], a[1], b[0], b[1], x0, y0, x1, y1)
+               for a, b in _path_segments(pts, closed))
+
+
+def query_spatial_index(pyr, query):
+    """
+    Run one query against a stored plan (pyramid + index):
+      {query: 'bbox',    bbox: [minX, minY, maxX, maxY]}
+      {query: 'radius',  point: [x, y], radius: r}
+      {query: 'nearest', point: [x, y], k: n}
+    Optional filters: layers: [name], kinds: ['insert' | 'line' | 'polyline'],
+    names: [block name] (inserts only), limit (bbox / radius).
+    Returns the matching features (radius / nearest sorted by distance).
+    """
+    geo, index = pyr['geometry'], pyr['index']
+    layers = set(query['layers']) if query.get('layers') else None
+    kinds = {_KIND_NAMES.index(k) for k in query['kinds'] if k in _KIND_NAMES} if query.get('kinds') else None
+    names = set(query['names']) if query.get('names') else None
+    limit = min(int(query.get('limit') or QUERY_MAX_RESULTS), QUERY_MAX_RESULTS)
+
+    def wanted(ref):
+        kind, idx = ref & 3, ref >> 2
+        if kinds is not None and kind not in kinds:
+            return False
+        if kind == _KIND_INSERT:
+            if names is not None and geo.names[geo.insert_name[idx]] not in names:
+                return False
+            layer_id = geo.insert_layer[idx]
+        else:
+            if names is not None:
+                return False
+            layer_id = (geo.line_layer if kind == _KIND_LINE else geo.poly_layer)[idx]
+        return layers is None or geo.layers[layer_id] in layers
+
+    qtype = query.get('query')
+    if qtype == 'bbox':
+        x0, y0, x1, y1 = (float(v) for v in query['bbox'])
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
+        hits = sorted(r for r in index.rect_refs(x0, y0, x1, y1)
+                      if wanted(r) and _feature_hits_rect(geo, r, x0, y0, x1, y1))
+        return [_feature_out(geo, r) for r in hits[:limit]], len(hits)
+
+    px, py = (float(v) for v in query['point'])
+    if qtype == 'radius':
+        radius = float(query['radius'])
+        r2 = radius * radius
+        hits = []
+        for r in index.rect_refs(px - radius, py - radius, px + radius, py + radius):
+            if wanted(r):
+                d2 = _feature_dist2(geo, r, px, py)
+                if d2 <= r2:
+                    hits.append((d2, r))
+        hits.sort()
+        return [_feature_out(geo, r, math.sqrt(d2)) for d2, r in hits[:limit]], len(hits)
+
+    if qtype == 'nearest':
+        k = max(1, min(int(query.get('k') or 1), QUERY_MAX_RESULTS))
+        best = []                           # (d2, ref), kept sorted, len <= k
+        seen = set()
+
+        def consider(refs):
+            for r in refs:
+                if r in seen:
+                    continue
+                seen.add(r)
+                if not wanted(r):
+                    continue
+                d2 = _feature_dist2(geo, r, px, py)
+                if len(best) < k or d2 < best[-1][0]:
+                    best.insert(bisect_right(best, (d2, r)), (d2, r))
+                    if len(best) > k:
+                        best.pop()
+
+        consider(index.big)
+        ci, cj = index.cell_of(px, py)
+        # Rings of cells by Chebyshev distance; start at the first ring that
+        # touches the grid, stop once the k-th hit is closer than any unseen cell
+        r0 = max(0, -ci, ci - (index.cols - 1), -cj, cj - (index.rows - 1))
+        r_max = max(abs(ci), abs(ci - (index.cols - 1)), abs(cj), abs(cj - (index.rows - 1)))
+        for r in range(r0, r_max + 1):
+            for j in range(max(cj - r, 0), min(cj + r, index.rows - 1) + 1):
+                edge = j == cj - r or j == cj + r
+                for i in (range(max(ci - r, 0), min(ci + r, index.cols - 1) + 1) if edge
+                          else (ci - r, ci + r)):
+                    if 0 <= i < index.cols:
+                        consider(index.cell_refs(i, j))
+            if len(best) == k and best[-1][0] <= (r * index.cell) ** 2:
+                break
+        return [_feature_out(geo, r, math.sqrt(d2)) for d2, r in best], len(best)
+
+    raise ValueError(f'unknown query: {qtype}')
+
+
+# ── Revision diff ────────────────────────────────────────────────────────────
+# mode='diff' compares two stored plans. INSERTs are paired in three passes,
+# each linear in the number of inserts:
+#   1. same entity handle (group 5) – survives edits in the same drawing;
+#      a moved handle is reported as moved, a handle whose block changed as
+#      removed + added
+#   2. same block name at (almost) the same position – spatial hash with
+#      DIFF_SAME_TOLERANCE cells (re-exported drawings get new handles)
+#   3. same block name within DIFF_MOVE_RADIUS – nearest pair reported as moved
+# Tolerances are fractions of the larger plan extent, overridable per request.
+DIFF_SAME_TOLERANCE = 1e-6
+DIFF_MOVE_RADIUS = 0.01
+DIFF_MAX_LISTED = 5000
+
+
+def _insert_record(geo, i):
+    rec = {'name': geo.names[geo.insert_name[i]], 'layer': geo.layers[geo.insert_layer[i]],
+           'x': geo.insert_xy[2 * i], 'y': geo.insert_xy[2 * i + 1]}
+    if geo.insert_handle[i]:
+        rec['handle'] = format(geo.insert_handle[i], 'X')
+    return rec
+
+
+def _pair_by_position(base, head, b_left, h_left, radius):
+    """Greedy nearest pairing of same-name inserts within radius (spatial hash)."""
+    if not b_left or not h_left or radius <= 0:
+        return []
+    grid = defaultdict(list)
+    for i in b_left:
+        x, y = base.insert_xy[2 * i], base.insert_xy[2 * i + 1]
+        grid[(base.names[base.insert_name[i]], math.floor(x / radius), math.floor(y / radius))].append(i)
+    candidates = []
+    for j in h_left:
+        x, y = head.insert_xy[2 * j], head.insert_xy[2 * j + 1]
+        name = head.names[head.insert_name[j]]
+        cx, cy = math.floor(x / radius), math.floor(y / radius)
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                for i in grid.get((name, gx, gy), ()):
+                    d = math.hypot(base.insert_xy[2 * i] - x, base.insert_xy[2 * i + 1] - y)
+                    if d <= radius:
+                        candidates.append((d, i, j))
+    candidates.sort()
+    pairs, used_b, used_h = [], set(), set()
+    for d, i, j in candidates:
+        if i not in used_b and j not in used_h:
+            used_b.add(i); used_h.add(j)
+            pairs.append((i, j, d))
+    return pairs
+
+
+def diff_plans(base_pyr, head_pyr, same_tolerance=None, move_radius=None):
+    base, head = base_pyr['geometry'], head_pyr['geometry']
+    extent = max(base_pyr['size'], head_pyr['size'])
+    for geo in (base, head):
+        if geo.insert_count:
+            xs, ys = geo.insert_xy[0::2], geo.insert_xy[1::2]
+            extent = max(extent, max(xs) - min(xs), max(ys) - min(ys))
+    tol = same_tolerance if same_tolerance is not None else DIFF_SAME_TOLERANCE * extent
+    tol = max(tol, 1e-9)
+    radius = move_radius if move_radius is not None else DIFF_MOVE_RADIUS * extent
+
+    moved, unchanged = [], 0
+    b_left = set(range(base.insert_count))
+    h_left = set(range(head.insert_count))
+
+    # 1. handles
+    by_handle = {}
+    for i in range(base.insert_count):
+        h = base.insert_handle[i]
+        if h:
+            by_handle[h] = i
+    for j in range(head.insert_count):
+        i = by_handle.get(head.insert_handle[j]) if head.insert_handle[j] else None
+        if i is None or i not in b_left:
+            continue
+        if base.names[base.insert_name[i]] != head.names[head.insert_name[j]]:
+            continue
+        b_left.discard(i); h_left.discard(j)
+        d = math.hypot(base.insert_xy[2 * i] - head.insert_xy[2 * j],
+                       base.insert_xy[2 * i + 1] - head.insert_xy[2 * j + 1])
+        if d > tol:
+            moved.append((i, j, d))
+        else:
+            unchanged += 1
+
+    # 2. unchanged position, 3. moved within radius
+    for r, is_move in ((tol, False), (radius, True)):
+        for i, j, d in _pair_by_position(base, head, sorted(b_left), sorted(h_left), r):
+            b_left.discard(i); h_left.discard(j)
+            if is_move and d > tol:
+                moved.append((i, j, d))
+            else:
+                unchanged += 1
+
+    removed = [_insert_record(base, i) for i in sorted(b_left)]
+    added = [_insert_record(head, j) for j in sorted(h_left)]
+    moved_out = []
+    for i, j, d in sorted(moved, key=lambda m: -m[2]):
+        rec = _insert_record(head, j)
+        rec.update({'from': {'x': base.insert_xy[2 * i], 'y': base.insert_xy[2 * i + 1]},
+                    'distance': d})
+        moved_out.append(rec)
+
+    base_counts = Counter((base.names[n], base.layers[l]) for n, l in zip(base.insert_name, base.insert_layer))
+    head_counts = Counter((head.names[n], head.layers[l]) for n, l in zip(head.insert_name, head.insert_layer))
+    counts = [{'name': n, 'layer': l, 'base': base_counts[(n, l)], 'head': head_counts[(n, l)],
+               'delta': head_counts[(n, l)] - base_counts[(n, l)]}
+              for n, l in sorted(set(base_counts) | set(head_counts))
+              if base_counts[(n, l)] != head_counts[(n, l)]]
+
+    bf, hf = base_pyr.get('unitFactor') or 1.0, head_pyr.get('unitFactor') or 1.0
+    bl, hl = base_pyr['lengths'], head_pyr['lengths']
+    lengths = []
+    for layer in sorted(set(bl) | set(hl)):
+        b_m, h_m = bl.get(layer, 0.0) * bf, hl.get(layer, 0.0) * hf
+        if abs(h_m - b_m) > 0.001:
+            lengths.append({'layer': layer, 'base': round(b_m, 3), 'head': round(h_m, 3),
+                            'delta': round(h_m - b_m, 3),
+                            'base_raw': round(bl.get(layer, 0.0), 4), 'head_raw': round(hl.get(layer, 0.0), 4)})
+    lengths.sort(key=lambda e: -abs(e['delta']))
+
+    return {
+        'inserts': {'added': added[:DIFF_MAX_LISTED], 'removed': removed[:DIFF_MAX_LISTED],
+                    'moved': moved_out[:DIFF_MAX_LISTED],
+                    'summary': {'added': len(added), 'removed': len(removed), 'moved': len(moved_out),
+                                'unchanged': unchanged}},
+        'counts': counts,
+        'lengths': lengths,
+        'tolerances': {'same': tol, 'move': radius},
+    }
+
+
+# ── Text, attributes and circuit labels ──────────────────────────────────────
+# TEXT / MTEXT in model space are returned with positions (textEntities, same
+# schema as the browser parser); ATTRIBs following an INSERT become its
+# `attribs`. Circuit labels ("K12", "F3", "L1.2") are then joined to INSERTs:
+# a circuit-like attribute wins, otherwise the nearest circuit-like text
+# within CIRCUIT_LABEL_RADIUS text heights, found through a spatial hash of
+# the labels (one cell lookup per insert instead of an inserts × texts scan).
+CIRCUIT_LABEL_RE = re.compile(r'^[A-ZÁÉÍÓÖŐÚÜŰ]{1,3}-?\d{1,3}(?:[./]\d{1,3})?$')
+CIRCUIT_ATTRIB_TAGS = frozenset(('CIRCUIT', 'CKT', 'KOR', 'KÖR', 'AK', 'ARAMKOR', 'ÁRAMKÖR', 'AKN'))
+CIRCUIT_LABEL_RADIUS = 6.0      # × text height
+CIRCUIT_FALLBACK_RADIUS = 0.01  # × drawing extent, for texts without height
+TITLE_LAYER_KEYS = ('TITLE', 'CIM', 'FEJLEC', 'BORDER', 'KERET')
+
+_MTEXT_CODES = re.compile(r'\\[ACcFfHhQTWp][^;\\]*;|\\[LlOoKk]|[{}]')
+_UNICODE_ESC = re.compile(r'\\U\+([0-9A-Fa-f]{4})')
+
+
+def _plain_text(raw, mtext=False):
+    """Decode a DXF string value; strip MTEXT inline formatting."""
+    s = raw.decode('utf-8', errors='replace') if isinstance(raw, bytes) else str(raw)
+    s = _UNICODE_ESC.sub(lambda m: chr(int(m.group(1), 16)), s)
+    if mtext:
+        s = s.replace('\\P', ' ').replace('\\~', ' ')
+        s = _MTEXT_CODES.sub('', s)
+    return s.replace('%%c', 'Ø').replace('%%d', '°').replace('%%p', '±').strip()
+
+
+def _circuit_label(text):
+    t = text.strip().upper()
+    return t if CIRCUIT_LABEL_RE.match(t) else None
+
+
+def join_circuit_labels(geo, texts, extent):
+    """
+    Assign a circuit label to each top-level INSERT of geo (attributes from
+    geo.insert_attribs). texts: [(text, x, y, layer, height)];
+    extent: drawing size used for texts without a height.
+    Returns [{insert, name, layer, x, y, circuit, source, distance}].
+    """
+    labels = []                         # (x, y, label, radius)
+    for text, x, y, _, height in texts:
+        label = _circuit_label(text)
+        if label:
+            r = CIRCUIT_LABEL_RADIUS * height if height > 0 else CIRCUIT_FALLBACK_RADIUS * extent
+            if r > 0:
+                labels.append((x, y, label, r))
+    grid = defaultdict(list)
+    cell = 1.0
+    if labels:
+        radii = sorted(l[3] for l in labels)
+        cell = max(radii[len(radii) // 2], radii[-1] / 8)
+        for li, (x, y, _, r) in enumerate(labels):
+            for gx in range(math.floor((x - r) / cell), math.floor((x + r) / cell) + 1):
+                for gy in range(math.floor((y - r) / cell), math.floor((y + r) / cell) + 1):
+                    grid[(gx, gy)].append(li)
+
+    out = []
+    xy, names, layers = geo.insert_xy, geo.names, geo.layers
+    for i in range(geo.insert_count):
+        x, y = xy[2 * i], xy[2 * i + 1]
+        hit = None
+        for a in geo.insert_attribs.get(i, ()):
+            label = _circuit_label(a['value'])
+            if label and (a['tag'].upper() in CIRCUIT_ATTRIB_TAGS or hit is None):
+                hit = (label, 'attrib', 0.0)
+                if a['tag'].upper() in CIRCUIT_ATTRIB_TAGS:
+                    break
+        if hit is None and labels:
+            best = None
+            for li in grid.get((math.floor(x / cell), math.floor(y / cell)), ()):
+                lx, ly, label, r = labels[li]
+                d = math.hypot(lx - x, ly - y)
+                if d <= r and (best is None or d < best[2]):
+                    best = (label, 'text', d)
+            hit = best
+        if hit is not None:
+            out.append({'insert': i, 'name': names[geo.insert_name[i]], 'layer': layers[geo.insert_layer[i]],
+                        'x': x, 'y': y, 'circuit': hit[0], 'source': hit[1], 'distance': hit[2]})
+    return out
+
+
+# ── Request projection ───────────────────────────────────────────────────────
+# Callers that only need block counts / cable lengths can narrow the parse:
+#   layers:          glob allow-list ('KABEL*', 'E-*'), case-insensitive
+#   exclude_layers:  glob deny-list
+#   entities:        entity types to read (LINE, LWPOLYLINE, INSERT, …)
+#   fields:          response keys to return (e.g. ['blocks', 'lengths'])
+# Layer / type filters are applied in the token loop: a rejected entity's
+# remaining group codes are skipped without float parsing or allocation.
+# Overlay geometry, the tile pyramid and the spatial index are only built when
+# a requested field needs them.
+_STRUCTURAL_ENTITIES = frozenset((b'BLOCK', b'ENDBLK'))
+_ALWAYS_FIELDS = ('success', 'units', 'error', 'partial', 'progress', 'cursor', '_source')
+_OVERLAY_FIELDS = frozenset(('lineGeom', 'polylineGeom', 'geomTiles', 'geometry', 'simplification'))
+
+
+def _glob_regex(patterns):
+    if not patterns:
+        return None
+    return re.compile('|'.join(fnmatch.translate(p) for p in patterns), re.I)
+
+
+def parse_projection(payload):
+    """
+    Normalize projection parameters from a request payload (lists, or
+    comma-separated strings from multipart / header metadata).
+    Returns None when nothing is narrowed; raises ValueError on bad input.
+    """
+    out = {}
+    for key in ('layers', 'exclude_layers', 'entities', 'fields'):
+        v = payload.get(key)
+        if v in (None, '', []):
+            continue
+        if isinstance(v, str):
+            v = [p.strip() for p in v.split(',') if p.strip()]
+        if not isinstance(v, list) or not all(isinstance(p, str) for p in v):
+            raise ValueError(f'{key}: string list expected')
+        out[key] = sorted(set(p.upper() for p in v) if key == 'entities' else set(v))
+    return out or None
+
+
+def _block_summary(block_defs, block_summaries, name):
+    """
+    Memoized per-block summary: {base, lengths, counts, bbox} (None = unresolvable).
+    Nested definitions are resolved depth-first with an explicit stack, so the
+    nesting depth is limited by the drawing, not by the interpreter's recursion
+    limit; a block that (indirectly) inserts itself contributes nothing there.
+    """
+    if name in block_summaries or name not in block_defs:
+        return block_summaries.get(name)
+    stack = [[name, 0]]         # [block, index of its next insert to resolve]
+    path = {name}
+    while stack:
+        frame = stack[-1]
+        inserts = block_defs[frame[0]]['inserts']
+        while frame[1] < len(inserts):
+            child = inserts[frame[1]][0]
+            frame[1] += 1
+            if child not in block_summaries and child in block_defs and child not in path:
+                stack.append([child, 0])
+                path.add(child)
+                break
+        else:
+            cur = stack.pop()[0]
+            path.discard(cur)
+            block_summaries[cur] = _combine_block(block_defs[cur], block_summaries)
+    return block_summaries[name]
+
+
+def _combine_block(d, block_summaries):
+    """Summary of one definition whose resolvable children are already summarized."""
+    lengths = defaultdict(float, d['lengths'].totals())
+    counts = Counter()
+    bb = list(d['bbox'])
+    for child, layer, x, y, sx, sy, rot, n in d['inserts']:
+        counts[(child, layer)] += n
+        cs = block_summaries.get(child)
+        if cs is None:
+            continue
+        k = _insert_scale(sx, sy) * n
+        # Entities on layer '0' inherit the layer of the INSERT that places them
+        for l, v in cs['lengths'].items():
+            lengths[layer if l == '0' else l] += v * k
+        for (cn, cl), c in cs['counts'].items():
+            counts[(cn, layer if cl == '0' else cl)] += c * n
+        if cs['bbox'][0] <= cs['bbox'][2]:
+            _bbox_union(bb, _transform_bbox(cs['bbox'], cs['base'], x, y, sx, sy, rot))
+    return {'base': d['base'], 'lengths': lengths, 'counts': counts, 'bbox': bb}
+
+
+def _parse_options(projection):
+    """Flags derived once from a parse_projection() result (shared by all scan chunks)."""
+    projection = projection or {}
+    allow_layers = _glob_regex(projection.get('layers'))
+    deny_layers = _glob_regex(projection.get('exclude_layers'))
+    entity_types = None
+    if projection.get('entities'):
+        entity_types = {t.encode() for t in projection['entities']}
+        if b'POLYLINE' in entity_types:
+            entity_types |= {b'VERTEX', b'SEQEND'}
+        if b'INSERT' in entity_types:
+            entity_types |= {b'ATTRIB', b'SEQEND'}
+    out_fields = set(projection['fields']) if projection.get('fields') else None
+
+    def wants(*keys):
+        return out_fields is None or not out_fields.isdisjoint(keys)
+
+    want_index = wants('spatialIndex')
+    want_circuits = wants('circuits')
+    capture_overlay = want_index or wants(*_OVERLAY_FIELDS)
+    capture_inserts = want_index or want_circuits or wants('inserts', 'geometry')
+    capture_text = want_circuits or wants('textEntities', 'all_text', 'title_block')
+
+    return {'allow_layers': allow_layers, 'deny_layers': deny_layers, 'entity_types': entity_types,
+            'out_fields': out_fields, 'want_index': want_index, 'want_circuits': want_circuits,
+            'capture_overlay': capture_overlay, 'capture_inserts': capture_inserts,
+            'capture_text': capture_text}
+
+
+def _scan_dxf(tokens, opts, prelude=None, deadline=None):
+    """
+    One streaming pass over DXF tokens; returns the raw aggregates for
+    _finish_dxf(). prelude = state of an earlier scan over HEADER … BLOCKS:
+    the tokens are then the body of the ENTITIES section only (a parallel
+    chunk), and block definitions / units come from the prelude.
+    deadline (time.monotonic() value) stops the scan between two top-level
+    entities; 'entities' counts the ENTITIES-section entities scanned.
+    """
+    allow_layers, deny_layers = opts['allow_layers'], opts['deny_layers']
+    entity_types = opts['entity_types']
+    capture_overlay, capture_inserts = opts['capture_overlay'], opts['capture_inserts']
+    capture_text = opts['capture_text']
+
+    # Layer filter verdicts per raw layer value
+    layer_verdicts = {}
+    def layer_allowed(raw):
+        ok = layer_verdicts.get(raw)
+        if ok is None:
+            name = raw.decode('utf-8', errors='replace')
+            ok = ((allow_layers is None or allow_layers.match(name) is not None)
+                  and (deny_layers is None or deny_layers.match(name) is None))
+            layer_verdicts[raw] = ok
+        return ok
+    filter_layers = allow_layers is not None or deny_layers is not None
+
+    # Decoded names are cached per raw value – every entity on a layer
+    # shares one str instead of decoding (and allocating) it again.
+    names = {}
+    def name_of(raw):
+        s = names.get(raw)
+        if s is None:
+            s = names[raw] = raw.decode('utf-8', errors='replace')
+        return s
+
+    insunits = prelude['insunits'] if prelude else 0
+    block_counts = Counter()
+    layer_lengths = _LayerLengths()
+    all_layers = set()
+
+    # Geometry capture – uncapped, array-backed; the overlay is served
+    # through the LOD pyramid
+    geo = _Geometry()
+    last_insert = None          # idx of the INSERT that following ATTRIBs belong to
+    texts = []                  # model-space TEXT/MTEXT: (text, x, y, layer, height)
+    all_text = []
+    title_block = {}
+
+    # Running bounds [minX, minY, maxX, maxY] over inserts + line end points,
+    # updated as entities are flushed (no coordinate lists to re-walk later)
+    inf = float('inf')
+    bbox = [inf, inf, -inf, -inf]
+
+    # BLOCKS: raw definitions while streaming, memoized summaries on first use
+    block_defs = prelude['block_defs'] if prelude else {}   # name → {base, lengths, bbox, inserts}
+    block_summaries = prelude['block_summaries'] if prelude else {}
+    cur_block = None            # definition being filled inside BLOCK … ENDBLK
+    blocks_done = prelude is not None
+    # Top-level INSERT expansion, aggregated: (name, layer) → [count, scale_sum]
+    expand = defaultdict(lambda: [0, 0.0])
+    deferred_bounds = []        # inserts seen before their BLOCKS section
+
+    def place_bounds(name, x, y, sx, sy, rot):
+        bs = _block_summary(block_defs, block_summaries, name)
+        if bs is not None and bs['bbox'][0] <= bs['bbox'][2]:
+            _bbox_union(bbox, _transform_bbox(bs['bbox'], bs['base'], x, y, sx, sy, rot))
+
+    # Per-entity registers. Scalar group codes are kept raw in `fields` and
+    # only converted in flush_entity for the codes an entity type needs;
+    # repeated codes (polyline vertices, spline data) are collected in lists.
+    etype, elayer, fields = None, 'DEFAULT', {}
+    verts = []                  # LWPOLYLINE: [x, y, bulge]; SPLINE: control points
+    fit, knots, weights = [], [], []
+    text_chunks = []            # MTEXT code 3 continuation chunks
+    open_poly = None            # POLYLINE being filled by VERTEX … SEQEND
+
+    def num(code, default=0.0):
+        v = fields.get(code)
+        return default if v is None else float(v)
+
+    def emit_path(acc_layer, points, closed):
+        """Overlay/bbox sink for a measured path."""
+        if len(points) < 2:
+            return
+        if cur_block is not None:
+            for px, py in points:
+                _bbox_grow(cur_block['bbox'], px, py)
+        elif capture_overlay:
+            geo.add_poly(acc_layer, points, closed)
+
+    def flush_entity():
+        nonlocal open_poly, last_insert
+        blk = cur_block
+        acc = blk['lengths'] if blk is not None else layer_lengths
+        if etype == b'LINE':
+            if 10 not in fields or 11 not in fields:
+                return
+            x1, y1, x2, y2 = float(fields[10]), num(20), float(fields[11]), num(21)
+            acc.add_segment(elayer, x2 - x1, y2 - y1)
+            if blk is not None:
+                _bbox_grow(blk['bbox'], x1, y1); _bbox_grow(blk['bbox'], x2, y2)
+                return
+            _bbox_grow(bbox, x1, y1); _bbox_grow(bbox, x2, y2)
+            if capture_overlay:
+                geo.add_line(elayer, x1, y1, x2, y2)
+        elif etype == b'LWPOLYLINE':
+            if len(verts) < 2:
+                return
+            closed = bool(int(num(70)) & 1)
+            emit_path(elayer, _measure_vertices(acc, elayer, verts, closed), closed)
+        elif etype == b'INSERT':
+            if 2 not in fields or 10 not in fields:
+                return
+            ins_name = name_of(fields[2])
+            x, y = float(fields[10]), num(20)
+            sx, sy, rot = num(41, 1.0), num(42, 1.0), num(50)
+            n = max(int(num(70, 1)), 1) * max(int(num(71, 1)), 1)   # MINSERT grid
+            if blk is not None:
+                blk['inserts'].append((ins_name, elayer, x, y, sx, sy, rot, n))
+                _bbox_grow(blk['bbox'], x, y)
+                return
+            key = (ins_name, elayer)
+            block_counts[key] += n
+            e = expand[key]
+            e[0] += n
+            e[1] += _insert_scale(sx, sy) * n
+            if capture_inserts:
+                last_insert = geo.insert_count
+                handle = fields.get(5)
+                try:
+                    handle = int(handle, 16) if handle else 0
+                except ValueError:
+                    handle = 0
+                geo.add_insert(ins_name, elayer, x, y, handle)
+            _bbox_grow(bbox, x, y)
+            if blocks_done:
+                place_bounds(ins_name, x, y, sx, sy, rot)
+            else:
+                deferred_bounds.append((ins_name, x, y, sx, sy, rot))
+        elif etype == b'ARC' or etype == b'CIRCLE':
+            r = num(40)
+            if r <= 0:
+                return
+            cx, cy = num(10), num(20)
+            if etype == b'CIRCLE':
+                a0, a1 = 0.0, 360.0
+            else:
+                a0, a1 = num(50), num(51)
+            if num(230, 1.0) < 0:
+                # Mirrored OCS (extrusion 0,0,-1): flip X and reverse the sweep
+                cx, a0, a1 = -cx, 180.0 - a1, 180.0 - a0
+            sweep = (a1 - a0) % 360.0 or 360.0
+            acc.add_length(elayer, math.radians(sweep) * r)
+            emit_path(elayer, _arc_points(cx, cy, r, a0, a1), etype == b'CIRCLE')
+        elif etype == b'ELLIPSE':
+            mx, my = num(11), num(21)
+            if not (mx or my):
+                return
+            t0, t1 = num(41), num(42, 2 * math.pi)
+            pts = _ellipse_points(num(10), num(20), mx, my, num(40, 1.0), t0, t1)
+            acc.add_points(elayer, pts)
+            emit_path(elayer, pts, abs((t1 - t0) % (2 * math.pi)) < 1e-9)
+        elif etype == b'SPLINE':
+            closed = bool(int(num(70)) & 1)
+            pts = _spline_points(int(num(71, 3)), knots, [(v[0], v[1]) for v in verts], weights)
+            if pts is None:
+                pts = [tuple(p) for p in fit] if len(fit) > 1 else [(v[0], v[1]) for v in verts]
+            acc.add_points(elayer, pts)
+            emit_path(elayer, pts, closed)
+        elif etype == b'POLYLINE':
+            flags = int(num(70))
+            # 16 = polygon mesh, 64 = polyface mesh – surfaces, not runs
+            open_poly = None if flags & (16 | 64) else {
+                'layer': elayer, 'closed': bool(flags & 1), 'verts': []}
+        elif etype == b'VERTEX':
+            # 16 = spline frame control point, 128 = polyface face record
+            if open_poly is not None and 10 in fields and not int(num(70)) & (16 | 128):
+                open_poly['verts'].append([float(fields[10]), num(20), num(42)])
+        elif etype == b'SEQEND':
+            if open_poly is not None and len(open_poly['verts']) > 1:
+                pl = open_poly
+                emit_path(pl['layer'], _measure_vertices(acc, pl['layer'], pl['verts'], pl['closed']), pl['closed'])
+            open_poly = None
+        elif etype == b'ATTRIB':
+            if last_insert is not None and 2 in fields and 1 in fields:
+                geo.insert_attribs.setdefault(last_insert, []).append(
+                    {'tag': _plain_text(fields[2]), 'value': _plain_text(fields[1])})
+        elif (etype == b'TEXT' or etype == b'MTEXT') and blk is None and capture_text:
+            raw = b''.join(text_chunks) + fields[1] if text_chunks and 1 in fields else fields.get(1)
+            if raw is None or 10 not in fields:
+                return
+            text = _plain_text(raw, mtext=etype == b'MTEXT')
+            if len(text) <= 1:
+                return
+            all_text.append(text)
+            texts.append((text, float(fields[10]), num(20), elayer, num(40)))
+            lu = elayer.upper()
+            if any(k in lu for k in TITLE_LAYER_KEYS):
+                title_block.setdefault(elayer, []).append(text)
+        elif etype == b'BLOCK' and blk is not None:
+            if 2 in fields:
+                blk['name'] = name_of(fields[2])
+            blk['base'] = (num(10), num(20))
+
+    # Section state machine: (0,SECTION) → (2,<name>) … (0,ENDSEC)
+    section = b'ENTITIES' if prelude else None
+    want_section_name, header_var = False, None
+    skip = False                # current entity rejected by the projection
+    entities, stopped = 0, False
+    for code, val in tokens:
+        if code == 0:
+            if val == b'SECTION':
+                want_section_name = True
+                continue
+            if etype != b'ATTRIB' and etype != b'SEQEND':
+                last_insert = None      # set again by flushing a top-level INSERT
+            if (section == b'ENTITIES' or section == b'BLOCKS') and not skip:
+                flush_entity()
+            if val == b'ENDSEC':
+                if section == b'BLOCKS':
+                    blocks_done = True
+                section, etype, cur_block, skip = None, None, None, False
+                continue
+            if val == b'EOF':
                 break
-            if code == 0:
-                flush_poly()
-                flush_insert()
-                etype, elayer = val, 'DEFAULT'
-                pts, pt_x, pt_y, closed, line_start = [], None, None, False, None
-                ins_name, ins_x, ins_y = None, None, None
-                i += 1; continue
-            if code == 8:
-                elayer = val; all_layers.add(val)
-            if etype == 'INSERT':
-                if code == 2: ins_name = val
-                if code == 10: ins_x = float(val)
-                if code == 20: ins_y = float(val)
-            if etype == 'LWPOLYLINE':
-                if code == 70: closed = bool(int(val) & 1)
-                if code == 10:
-                    if pt_x is not None: pts.append((pt_x, pt_y or 0))
-                    pt_x = float(val); pt_y = None
-                if code == 20: pt_y = float(val)
-            if etype == 'LINE':
-                if code == 10: line_start = [float(val), 0]
-                if code == 20 and line_start: line_start[1] = float(val)
-                if code == 11 and line_start:
-                    ex = float(val)
-                    ey = float(tokens[i+1][1]) if i+1 < len(tokens) and tokens[i+1][0] == 21 else 0
-                    dx, dy = ex - line_start[0], ey - line_start[1]
-                    lengths_by_layer[elayer] += (dx*dx + dy*dy)**0.5
-                    # Capture line geometry
-                    if len(line_geom) < MAX_LINES:
-                        line_geom.append({'layer': elayer, 'x1': line_start[0], 'y1': line_start[1], 'x2': ex, 'y2': ey})
-                    line_start = None
-            i += 1
-        flush_poly()
-        flush_insert()
-
-        # Compute bounding box from all geometry (must happen before unit auto-detection)
-        all_x = [ins['x'] for ins in insert_positions]
-        all_y = [ins['y'] for ins in insert_positions]
-        for lg in line_geom:
-            all_x.extend([lg['x1'], lg['x2']])
-            all_y.extend([lg['y1'], lg['y2']])
-        if all_x:
-            geom_bounds = {
-                'minX': min(all_x), 'maxX': max(all_x),
-                'minY': min(all_y), 'maxY': max(all_y),
-                'width': max(all_x) - min(all_x),
-                'height': max(all_y) - min(all_y),
-            }
+            if section == b'ENTITIES' and val not in _CONTINUATION_ENTITIES:
+                # Clock checked every 1024 entities, only at a top-level entity start
+                if deadline is not None and not entities & 1023 and time.monotonic() > deadline:
+                    section, stopped = None, True
+                    break
+                entities += 1
+            if section == b'BLOCKS':
+                if val == b'BLOCK':
+                    cur_block = {'name': None, 'base': (0.0, 0.0), 'lengths': _LayerLengths(),
+                                 'bbox': [inf, inf, -inf, -inf], 'inserts': []}
+                elif val == b'ENDBLK':
+                    if cur_block is not None and cur_block['name'] is not None:
+                        block_defs[cur_block['name']] = cur_block
+                    cur_block = None
+            etype, elayer, fields = val, 'DEFAULT', {}
+            skip = (entity_types is not None and val not in entity_types
+                    and val not in _STRUCTURAL_ENTITIES)
+            if verts: verts = []
+            if text_chunks: text_chunks = []
+            if etype == b'SPLINE':
+                fit, knots, weights = [], [], []
+            continue
+        if want_section_name:
+            want_section_name = False
+            if code == 2:
+                section = val
+                continue
+        if section == b'HEADER':
+            # Header variable names use group code 9
+            if code == 9: header_var = val
+            elif code == 70 and header_var == b'$INSUNITS': insunits = int(val)
+            continue
+        if section == b'BLOCKS':
+            if cur_block is None:
+                continue
+        elif section != b'ENTITIES':
+            continue
+        if skip:
+            continue
+        if code == 8:
+            if etype == b'VERTEX' or etype == b'SEQEND' or etype == b'ATTRIB':
+                continue        # vertices / attributes belong to their POLYLINE / INSERT
+            # Layer '0' inside a block takes the INSERT's layer – decided there
+            if (filter_layers and etype not in _STRUCTURAL_ENTITIES
+                    and not (cur_block is not None and val == b'0') and not layer_allowed(val)):
+                skip = True
+                if etype == b'POLYLINE':
+                    open_poly = None
+                continue
+            elayer = name_of(val)
+            if cur_block is None: all_layers.add(elayer)
+        elif etype == b'LWPOLYLINE':
+            if code == 10: verts.append([float(val), 0.0, 0.0])
+            elif code == 20: verts[-1][1] = float(val)
+            elif code == 42: verts[-1][2] = float(val)
+            else: fields[code] = val
+        elif etype == b'MTEXT' and code == 3:
+            text_chunks.append(val)
+        elif etype == b'SPLINE':
+            if code == 10: verts.append([float(val), 0.0])
+            elif code == 20: verts[-1][1] = float(val)
+            elif code == 11: fit.append([float(val), 0.0])
+            elif code == 21: fit[-1][1] = float(val)
+            elif code == 40: knots.append(float(val))
+            elif code == 41: weights.append(float(val))
+            else: fields[code] = val
         else:
-            geom_bounds = None
-
-        if not unit_factor:
-            max_raw = max(lengths_by_layer.values(), default=0)
-            # Also check bounding box span for more reliable detection
-            span = max(geom_bounds['width'], geom_bounds['height']) if geom_bounds else 0
-            ref = max(max_raw, span)
-            if ref > 10000: unit_name, unit_factor = 'mm (guessed)', 0.001
-            elif ref > 100: unit_name, unit_factor = 'cm (guessed)', 0.01
-            else: unit_name, unit_factor = 'm (guessed)', 1.0
-
-        blocks = [{'name': n, 'layer': l, 'count': c}
-                  for (n, l), c in block_counts.most_common(300)]
-        lengths = [{'layer': l, 'length': round(v * unit_factor, 3),
-                    'length_raw': round(v, 4), 'info': None}
-                   for l, v in sorted(lengths_by_layer.items(), key=lambda x: -x[1]) if v > 0.01]
-
-        return {
-            'success': True, 'blocks': blocks, 'lengths': lengths,
-            'layers': sorted(all_layers),
-            'units': {'insunits': insunits, 'name': unit_name, 'factor': unit_factor, 'auto_detected': True},
-            'title_block': {},
-            # Geometry for SVG viewer overlay (matching client parser schema)
-            'inserts': insert_positions,
-            'lineGeom': line_geom,
-            'polylineGeom': polyline_geom,
-            'geomBounds': geom_bounds,
-            'summary': {'total_block_types': len(set(b['name'] for b in blocks)),
-                        'total_blocks': sum(b['count'] for b in blocks),
-                        'total_layers': len(all_layers), 'layers_with_lines': len(lengths),
-                        'total_inserts': len(insert_positions)},
-            '_source': 'server_stdlib',
+            fields[code] = val
+    if section == b'ENTITIES' and not skip:
+        flush_entity()
+
+    return {'insunits': insunits, 'block_counts': block_counts, 'layer_totals': layer_lengths.totals(),
+            'all_layers': all_layers, 'geo': geo, 'texts': texts, 'all_text': all_text,
+            'title_block': title_block, 'bbox': bbox, 'block_defs': block_defs,
+            'block_summaries': block_summaries, 'expand': expand, 'deferred_bounds': deferred_bounds,
+            'entities': entities, 'stopped': stopped}
+
+
+def _finish_dxf(st, file_bytes, opts, projection, geometry_format, simplify=None, quantize_mm=QUANTIZE_MM,
+                deadline=None):
+    """
+    Block expansion, overlay pyramid / index, units and the response dict.
+    When the deadline (time.monotonic() value) passes before the pyramid and
+    index are built and stored, they are dropped: the overlay is left empty
+    and the result is partial with progress.stage = 'finish'.
+    """
+    geo, bbox, all_layers, texts = st['geo'], st['bbox'], st['all_layers'], st['texts']
+    block_defs, block_summaries = st['block_defs'], st['block_summaries']
+    insunits, block_counts = st['insunits'], st['block_counts']
+    all_text, title_block = st['all_text'], st['title_block']
+    out_fields, want_index, want_circuits = opts['out_fields'], opts['want_index'], opts['want_circuits']
+    capture_overlay = opts['capture_overlay']
+    projection = projection or {}
+
+    def place_bounds(name, x, y, sx, sy, rot):
+        bs = _block_summary(block_defs, block_summaries, name)
+        if bs is not None and bs['bbox'][0] <= bs['bbox'][2]:
+            _bbox_union(bbox, _transform_bbox(bs['bbox'], bs['base'], x, y, sx, sy, rot))
+
+    lengths_by_layer = st['layer_totals']
+
+    # Expand top-level INSERTs through the cached block summaries:
+    # one multiply per (block, layer) pair instead of one walk per insert
+    nested_counts = Counter()
+    for (name, layer), (n, k) in st['expand'].items():
+        bs = _block_summary(block_defs, block_summaries, name)
+        if bs is None:
+            continue
+        for l, v in bs['lengths'].items():
+            target = layer if l == '0' else l
+            lengths_by_layer[target] += v * k
+            if v > 0: all_layers.add(target)
+        for (cn, cl), c in bs['counts'].items():
+            nested_counts[(cn, layer if cl == '0' else cl)] += c * n
+    for args in st['deferred_bounds']:
+        place_bounds(*args)
+
+    # Bounding box (must be resolved before unit auto-detection)
+    if bbox[0] <= bbox[2]:
+        geom_bounds = {
+            'minX': bbox[0], 'maxX': bbox[2],
+            'minY': bbox[1], 'maxY': bbox[3],
+            'width': bbox[2] - bbox[0],
+            'height': bbox[3] - bbox[1],
         }
+    else:
+        geom_bounds = None
+
+    unit_name, unit_factor = INSUNITS_MAP.get(insunits, ('unknown', None))
+
+    if not unit_factor:
+        max_raw = max(lengths_by_layer.values(), default=0)
+        # Also check bounding box span for more reliable detection
+        span = max(geom_bounds['width'], geom_bounds['height']) if geom_bounds else 0
+        ref = max(max_raw, span)
+        if ref > 10000: unit_name, unit_factor = 'mm (guessed)', 0.001
+        elif ref > 100: unit_name, unit_factor = 'cm (guessed)', 0.01
+        else: unit_name, unit_factor = 'm (guessed)', 1.0
+
+    # Overlay geometry: tile 0/0/0 of the pyramid. Small drawings fit in a
+    # single leaf tile (full detail, nothing else to fetch); larger ones
+    # get a bounded overview plus the tiles mode. Every plan is stored with
+    # its spatial index for the query mode. A filtered or narrowed parse is
+    # stored under its own id (plan_id_for) so it never shadows the full plan.
+    def out_of_time():
+        return deadline is not None and time.monotonic() > deadline
+
+    root, geom_tiles, spatial_index = None, None, None
+    # Quantization grid over geomBounds ∪ the pyramid extent (polylines are
+    # not in geomBounds)
+    quant_box = list(bbox) if geom_bounds else [0.0, 0.0, 0.0, 0.0]
+    pyr = build_geometry_pyramid(geo, deadline) if capture_overlay and not out_of_time() else None
+    if pyr is not None and want_index:
+        pyr['index'] = None if out_of_time() else build_spatial_index(geo)
+        if pyr['index'] is None:
+            pyr = None
+    if pyr is not None:
+        plan_id = plan_id_for(file_bytes, projection, opts, st['start'], st['stop'], st['stopped'])
+        (ox, oy), size = pyr['origin'], pyr['size']
+        if geo.line_count or geo.poly_count:
+            _bbox_union(quant_box, (ox, oy, ox + size, oy + size))
+        tol = None
+        if simplify is not None:
+            # geomBounds covers inserts and lines only – polyline-only drawings
+            # fall back to the pyramid extent
+            area = (geom_bounds['width'], geom_bounds['height']) if geom_bounds else (size, size)
+            tol = (simplify_tolerance(simplify, *area), simplify['method'])
+    quantize = quantize_params(unit_factor, quant_box, quantize_mm) if geometry_format == 'quantized' else None
+    if pyr is not None:
+        root = pyramid_tile(pyr, '0/0/0', with_ids=False, geometry_format=geometry_format,
+                            simplify=tol, quantize=quantize)
+        if out_of_time():
+            # Too late to store the plan: tile / query ids would point nowhere
+            pyr, root = None, None
+    # Overlay dropped for time – the client retries or resumes
+    finish_cut = capture_overlay and pyr is None
+    if pyr is not None:
+        if root and not root['leaf']:
+            geom_tiles = {'id': plan_id, 'origin': pyr['origin'], 'size': pyr['size'],
+                          'maxZoom': pyr['maxZoom'], 'tileCount': len(pyr['tiles']),
+                          'totalLines': geo.line_count, 'totalPolylines': geo.poly_count}
+        if want_index:
+            spatial_index = {'id': plan_id, **pyr['index'].describe()}
+    if geometry_format != 'json':
+        overlay = {'geometry': {**(root['geometry'] if root else geo.columnar([], [], inserts=False, quantize=quantize)),
+                                **geo.insert_columns(quantize)}}
+    else:
+        overlay = {'inserts': geo.insert_dicts(),
+                   'lineGeom': root['lineGeom'] if root else [],
+                   'polylineGeom': root['polylineGeom'] if root else []}
+
+    circuits = []
+    if want_circuits:
+        extent = max(geom_bounds['width'], geom_bounds['height']) if geom_bounds else 0.0
+        circuits = join_circuit_labels(geo, texts, extent)
+
+    if pyr is not None:
+        # Stored plan also carries the per-layer totals for mode='diff'
+        pyr['lengths'] = dict(lengths_by_layer)
+        pyr['unitFactor'] = unit_factor
+        save_geometry_pyramid(plan_id, pyr)
+
+    blocks = [{'name': n, 'layer': l, 'count': c}
+              for (n, l), c in block_counts.most_common(300)]
+    lengths = [{'layer': l, 'length': round(v * unit_factor, 3),
+                'length_raw': round(v, 4), 'info': None}
+               for l, v in sorted(lengths_by_layer.items(), key=lambda x: -x[1]) if v > 0.01]
+
+    result = {
+        'success': True, 'blocks': blocks, 'lengths': lengths,
+        'layers': sorted(all_layers),
+        'units': {'insunits': insunits, 'name': unit_name, 'factor': unit_factor, 'auto_detected': True},
+        'title_block': title_block,
+        'all_text': all_text,
+        'textEntities': [{'text': t, 'x': x, 'y': y, 'layer': l} for t, x, y, l, _ in texts],
+        # Circuit label per INSERT (attribute, else nearest circuit-like text)
+        'circuits': circuits,
+        # Geometry for SVG viewer overlay (matching client parser schema,
+        # or the columnar `geometry` object when requested)
+        **overlay,
+        'geomBounds': geom_bounds,
+        # LOD tile pyramid descriptor (None when lineGeom/polylineGeom are complete)
+        'geomTiles': geom_tiles,
+        # Display simplification of the returned polylines (None = full detail)
+        'simplification': root.get('simplify') if root else None,
+        # Grid index over inserts/lines/polylines for mode='query' (ids = feature indices)
+        'spatialIndex': spatial_index,
+        # Symbols placed inside other blocks (via the cached block summaries)
+        'nested_blocks': [{'name': n, 'layer': l, 'count': c}
+                          for (n, l), c in nested_counts.most_common(300)],
+        'summary': {'total_block_types': len(set(b['name'] for b in blocks)),
+                    'total_blocks': sum(b['count'] for b in blocks),
+                    'total_layers': len(all_layers), 'layers_with_lines': len(lengths),
+                    'total_inserts': geo.insert_count,
+                    'block_definitions': len(block_defs)},
+        # Time budget: partial=True → entities from `cursor` on were not scanned,
+        # or (progress.stage = 'finish') the overlay / stored plan was dropped
+        'partial': st['stopped'] or finish_cut,
+        'progress': {'start': st['start'] or 0,
+                     'bytesProcessed': st['stop'] if st['stopped'] else len(file_bytes),
+                     'bytesTotal': len(file_bytes), 'entitiesProcessed': st['entities']},
+        'cursor': st['stop'],
+        '_source': 'server_stdlib',
+    }
+    if finish_cut:
+        result['progress']['stage'] = 'finish'
+    elif _stores_plan_index(projection, opts, st['start'], st['stopped']):
+        # Complete, unprojected parse of the whole file: plan_id is the file hash
+        save_plan_index(plan_id, build_plan_index(plan_id, result, pyr, len(file_bytes)))
+    if out_fields is not None:
+        result = {k: v for k, v in result.items() if k in out_fields or k in _ALWAYS_FIELDS}
+    return result
+
+
+# ── Parallel ENTITIES scan ───────────────────────────────────────────────────
+# Large ASCII files: HEADER … BLOCKS are scanned once in-process (the prelude:
+# units and block definitions), then the ENTITIES body is cut at 0-code entity
+# boundaries into byte ranges scanned by forked workers. Each chunk returns
+# the same aggregates as a serial scan (counters, per-layer totals, geometry
+# columns, text); merged in chunk order they give the serial result. Small
+# files, binary DXF and unusual section layouts stay single-process.
+#
+# The same prelude + range scan resumes a time-budgeted parse: a partial
+# result's `cursor` is the byte offset of the first entity not scanned.
+#
+# Processes per parse (chunk 0 in the parse worker itself): up to
+# PARSE_WORKERS parses run at once (run_batch), so by default they share the
+# CPUs – a full batch runs about cpu_count() scanning processes, not
+# PARSE_WORKERS × cpu_count().
+DXF_PARSE_WORKERS = int(os.environ.get('DXF_PARSE_WORKERS') or max(1, (os.cpu_count() or 1) // max(1, PARSE_WORKERS)))
+DXF_PARALLEL_MIN_MB = float(os.environ.get('DXF_PARALLEL_MIN_MB', '8'))
+
+_ENTITIES_START_RE = re.compile(rb'(?:^|\n)[ \t]*0\r?\nSECTION\r?\n[ \t]*2\r?\nENTITIES\r?\n')
+_SECTION_NAME_RE = re.compile(rb'\n[ \t]*0\r?\nSECTION\r?\n[ \t]*2\r?\n(HEADER|BLOCKS|ENTITIES)\r?\n')
+_ENDSEC_RE = re.compile(rb'\n[ \t]*0\r?\nENDSEC\r?\n')
+# A value line always follows a code line, so "0" then a name starting with a
+# letter can only be a real entity start
+_ENTITY_START_RE = re.compile(rb'\n[ \t]*0\r?\n([A-Za-z_][A-Za-z0-9_]*)\r?\n')
+# Never split a POLYLINE from its VERTEXes or an INSERT from its ATTRIBs
+_CONTINUATION_ENTITIES = frozenset((b'VERTEX', b'SEQEND', b'ATTRIB'))
+
+
+def _entity_section(data):
+    """(body_start, body_end) of the ENTITIES section, or None when the layout is
+    not safe to split (no ENTITIES, or HEADER / BLOCKS / a second ENTITIES after it)."""
+    m = _ENTITIES_START_RE.search(data)
+    if m is None:
+        return None
+    body = m.end()
+    m = _ENDSEC_RE.search(data, body - 1)
+    if m is None or _SECTION_NAME_RE.search(data, m.end() - 1) is not None:
+        return None
+    return body, m.start() + 1
+
+
+def _entity_offset(data, start, end, n):
+    """Byte offset of the n-th (0-based) top-level entity from start; end when there are fewer."""
+    for e in _ENTITY_START_RE.finditer(data, start - 1, end):
+        if e.group(1) in _CONTINUATION_ENTITIES:
+            continue
+        if n == 0:
+            return e.start() + 1
+        n -= 1
+    return end
+
+
+def _entity_chunks(data, n, start=None):
+    """
+    (prelude_end, [(start, end), …]) for the ENTITIES body from `start` (a
+    resume cursor, default the section start) split into up to n ranges, or
+    None when the layout is unsplittable or start is not an entity boundary.
+    """
+    section = _entity_section(data)
+    if section is None:
+        return None
+    body, body_end = section
+    if start is None:
+        start = body
+    elif not body <= start <= body_end:
+        return None
+    elif start < body_end:
+        e = _ENTITY_START_RE.match(data, start - 1)
+        if e is None or e.group(1) in _CONTINUATION_ENTITIES:
+            return None
+    bounds = [start]
+    step = (body_end - start) // n
+    for k in range(1, n):
+        pos = max(start + k * step, bounds[-1]) - 1
+        while True:
+            e = _ENTITY_START_RE.search(data, pos, body_end)
+            if e is None or e.group(1) not in _CONTINUATION_ENTITIES:
+                break
+            pos = e.end() - 1
+        if e is None:
+            break
+        if e.start() + 1 > bounds[-1]:
+            bounds.append(e.start() + 1)
+    bounds.append(body_end)
+    return body, list(zip(bounds, bounds[1:]))
+
+
+def _chunk_payload(st):
+    """Picklable part of a chunk's scan state (no closures, no _Geometry instance)."""
+    geo = st['geo']
+    return {'block_counts': st['block_counts'], 'layer_totals': dict(st['layer_totals']),
+            'all_layers': st['all_layers'], 'texts': st['texts'], 'all_text': st['all_text'],
+            'title_block': st['title_block'], 'bbox': st['bbox'], 'expand': dict(st['expand']),
+            'entities': st['entities'], 'stopped': st['stopped'],
+            'geo': {'layers': geo.layers, 'names': geo.names, 'attribs': geo.insert_attribs,
+                    'columns': {k: getattr(geo, k) for k in _Geometry._COLUMNS}}}
+
+
+def _scan_chunk_worker(conn, data, start, end, opts, prelude, deadline):
+    try:
+        st = _scan_dxf(iter_dxf_tokens(data, start, end), opts, prelude, deadline)
+        conn.send(_chunk_payload(st))
+    except Exception as e:
+        conn.send({'error': f'{type(e).__name__}: {e}'})
+    finally:
+        conn.close()
+
+
+def _merge_scan(st, part):
+    """Fold a later chunk's payload into the running scan state (chunk order)."""
+    st['block_counts'].update(part['block_counts'])
+    totals = st['layer_totals']
+    for layer, v in part['layer_totals'].items():
+        totals[layer] += v
+    st['all_layers'] |= part['all_layers']
+    st['texts'].extend(part['texts'])
+    st['all_text'].extend(part['all_text'])
+    for layer, items in part['title_block'].items():
+        st['title_block'].setdefault(layer, []).extend(items)
+    if part['bbox'][0] <= part['bbox'][2]:
+        _bbox_union(st['bbox'], part['bbox'])
+    for key, (n, k) in part['expand'].items():
+        e = st['expand'][key]
+        e[0] += n
+        e[1] += k
+    st['entities'] += part['entities']
+    g = part['geo']
+    other = _Geometry()
+    other.layers, other.names, other.insert_attribs = g['layers'], g['names'], g['attribs']
+    for k, col in g['columns'].items():
+        setattr(other, k, col)
+    st['geo'].extend(other)
+
+
+def _scan_chunked(data, opts, start=None, deadline=None, workers=1):
+    """
+    Scan state for an ASCII DXF: prelude + the ENTITIES body from `start`,
+    chunks 1…n in forked workers while this process scans chunk 0. None when
+    the layout cannot be split / resumed. A chunk that stops at the deadline
+    ends the merge there: state['stop'] is the cursor of the first entity not
+    scanned (None = complete).
+    """
+    ctx = None
+    if workers > 1:
+        try:
+            ctx = multiprocessing.get_context('fork')
+        except ValueError:
+            workers = 1
+    layout = _entity_chunks(data, workers, start)
+    if layout is None:
+        return None
+    prelude_end, chunks = layout
+    prelude = _scan_dxf(iter_dxf_tokens(data, 0, prelude_end), opts)
+
+    procs = []      # (process, pipe) per chunk 1…n; None = scan it in-process
+    try:
+        for c_start, c_end in chunks[1:]:
+            recv, send = ctx.Pipe(duplex=False)
+            p = ctx.Process(target=_scan_chunk_worker,
+                            args=(send, data, c_start, c_end, opts, prelude, deadline), daemon=True)
+            try:
+                p.start()
+            except OSError as e:
+                print(f"[DXF] chunk worker unavailable ({e}), scanning in-process", file=sys.stderr)
+                recv.close()
+                procs.append(None)
+            else:
+                procs.append((p, recv))
+            finally:
+                send.close()
+        state = _scan_dxf(iter_dxf_tokens(data, *chunks[0]), opts, prelude, deadline)
+        stop = _entity_offset(data, *chunks[0], state['entities']) if state['stopped'] else None
+        for i, proc in enumerate(procs, 1):
+            part = None
+            if proc is not None:
+                try:
+                    part = proc[1].recv()
+                except EOFError:
+                    part = {'error': 'worker exited'}
+                if 'error' in part:
+                    print(f"[DXF] parallel chunk failed ({part['error']}), rescanning in-process", file=sys.stderr)
+                    part = None
+            if stop is not None:
+                continue    # an earlier chunk ran out of time – later ones are dropped
+            if part is None:
+                part = _chunk_payload(_scan_dxf(iter_dxf_tokens(data, *chunks[i]), opts, prelude, deadline))
+            _merge_scan(state, part)
+            if part['stopped']:
+                state['stopped'] = True
+                stop = _entity_offset(data, *chunks[i], part['entities'])
+    finally:
+        for proc in procs:
+            if proc is None:
+                continue
+            p, recv = proc
+            recv.close()
+            p.join(timeout=1)
+            if p.is_alive():
+                p.terminate()
+    state['insunits'] = prelude['insunits']
+    state['stop'] = stop
+    return state
+
+
+def parse_dxf_bytes(file_bytes, geometry_format='json', projection=None,
+                    time_budget=DXF_TIME_BUDGET_S, cursor=None, simplify=None, quantize_mm=QUANTIZE_MM):
+    """
+    Server-side DXF parser using stdlib only (no ezdxf).
+    This is a fallback – primary parsing runs client-side in the browser.
+    Single streaming pass over the token generator (HEADER → BLOCKS → ENTITIES),
+    so peak memory is bounded by the captured geometry, not the file size.
+    Accepts both ASCII and binary DXF (detected by the binary sentinel).
+
+    Measured entities: LINE, LWPOLYLINE and POLYLINE/VERTEX (with bulges),
+    ARC, CIRCLE, ELLIPSE, SPLINE. Block definitions are reduced to cached
+    summaries (per-layer lengths, nested insert counts, bbox); each INSERT
+    applies its scale/rotation to the summary instead of re-walking the block.
+
+    geometry_format='columnar' replaces inserts / lineGeom / polylineGeom with
+    the compact `geometry` object (see _Geometry); 'quantized' is the same
+    with coordinates on a quantize_mm grid, delta-coded. projection: see
+    parse_projection().
+
+    time_budget (seconds, None = unlimited) bounds the ENTITIES scan: when it
+    runs out the result so far is returned with partial=True, `progress` and
+    a `cursor`; passing that cursor back scans the remaining entities only
+    (ASCII DXF). The overlay pyramid and index must be stored within
+    DXF_FINISH_BUDGET_S after that, or they are dropped (partial, progress.stage
+    'finish'). simplify: display simplification of the returned overlay, see
+    parse_simplify().
+    """
+    try:
+        report_progress(stage='scan', bytesTotal=len(file_bytes))
+        opts = _parse_options(projection)
+        deadline = time.monotonic() + time_budget if time_budget else None
+        finish_deadline = deadline + DXF_FINISH_BUDGET_S if deadline is not None else None
+        binary = file_bytes.startswith(BINARY_DXF_SENTINEL)
+        state = None
+        if not binary:
+            big = len(file_bytes) >= DXF_PARALLEL_MIN_MB * 1024 * 1024
+            if big or cursor is not None:
+                state = _scan_chunked(file_bytes, opts, cursor, deadline,
+                                      DXF_PARSE_WORKERS if big else 1)
+        if state is None:
+            if cursor is not None:
+                return {'success': False, 'error': 'Érvénytelen folytatási pozíció (cursor).'}
+            tokens = iter_binary_dxf_tokens(file_bytes) if binary else iter_dxf_tokens(file_bytes)
+            state = _scan_dxf(tokens, opts, deadline=deadline)
+            state['stop'] = None
+            section = None if binary or not state['stopped'] else _entity_section(file_bytes)
+            if section is not None:
+                state['stop'] = _entity_offset(file_bytes, *section, state['entities'])
+        state['start'] = cursor
+        report_progress(stage='finish', entitiesProcessed=state['entities'], cursor=state['stop'])
+        return _finish_dxf(state, file_bytes, opts, projection, geometry_format, simplify, quantize_mm,
+                           finish_deadline)
+    except MemoryError:
+        raise           # a resource limit, not a parse error – see parse_worker
     except Exception as e:
         return {'success': False, 'error': str(e), 'trace': traceback.format_exc()}
 
+
+register('parse-dxf', parse_dxf_bytes)
+
+
+# ── Batch parse ──────────────────────────────────────────────────────────────
+# ?mode=batch: the sheets of a project in one request, parsed concurrently on
+# the parse_worker pool under one shared deadline (the function's 30 s
+# maxDuration), streamed back as NDJSON as each file completes. Files that
+# did not fit are reported with code 'batch_deadline' for the client to resend.
+DXF_BATCH_MAX_FILES = int(os.environ.get('DXF_BATCH_MAX_FILES', '40'))
+DXF_BATCH_MAX_MB = int(os.environ.get('DXF_BATCH_MAX_MB', '120'))
+DXF_BATCH_BUDGET_S = float(os.environ.get('DXF_BATCH_BUDGET_S', str(DXF_HARD_TIMEOUT_S)))
+# Below this much scan time a file is not started (reported as batch_deadline)
+_BATCH_MIN_SCAN_S = 1.0
+
+
+def merge_batch_summary(results):
+    """
+    Project totals over the per-file results of a batch: block counts by
+    (name, layer) and lengths by layer (in the unit-scaled `length`, files
+    may use different drawing units). Failed files are listed, not merged.
+    """
+    blocks, nested, lengths, layers = Counter(), Counter(), Counter(), set()
+    failed, partial = [], []
+    for i, result in sorted(results.items()):
+        if not result.get('success'):
+            failed.append(i)
+            continue
+        if result.get('partial'):
+            partial.append(i)
+        for b in result.get('blocks') or ():
+            blocks[(b['name'], b['layer'])] += b['count']
+        for b in result.get('nested_blocks') or ():
+            nested[(b['name'], b['layer'])] += b['count']
+        for l in result.get('lengths') or ():
+            lengths[l['layer']] += l['length']
+        layers.update(result.get('layers') or ())
+    merged_blocks = [{'name': n, 'layer': l, 'count': c} for (n, l), c in blocks.most_common()]
+    return {
+        'files': len(results), 'parsed': len(results) - len(failed), 'failed': failed, 'partial': partial,
+        'blocks': merged_blocks,
+        'nested_blocks': [{'name': n, 'layer': l, 'count': c} for (n, l), c in nested.most_common()],
+        'lengths': [{'layer': l, 'length': round(v, 3)} for l, v in lengths.most_common()],
+        'layers': sorted(layers),
+        'summary': {'total_block_types': len(set(b['name'] for b in merged_blocks)),
+                    'total_blocks': sum(blocks.values()),
+                    'total_layers': len(layers), 'layers_with_lines': len(lengths)},
+    }
+
+
 class handler(BaseHTTPRequestHandler):
 
     def do_OPTIONS(self):
@@ -215,33 +2526,294 @@ class handler(BaseHTTPRequestHandler):
         if not check_rate_limit(self): return rate_limit_response(self)
         if not require_auth(self): return
         try:
-            length = int(self.headers.get('Content-Length', 0))
-            max_bytes = MAX_UPLOAD_MB * 1024 * 1024
-            if length > max_bytes:
-                return self._respond(413, {
-                    'success': False,
-                    'error': f'A feltöltött fájl túl nagy ({length // (1024*1024)} MB). '
-                             f'Maximum megengedett méret: {MAX_UPLOAD_MB} MB.'
-                })
-            body = self.rfile.read(length)
-            payload = json.loads(body)
-            file_bytes = base64.b64decode(payload.get('data', ''))
-            if len(file_bytes) > max_bytes:
+            if parse_qs(urlsplit(self.path or '').query).get('mode') == ['batch']:
+                return self._respond_batch()
+            # JSON {data: base64}, raw bytes (application/dxf, octet-stream) or multipart
+            file_bytes, payload = read_upload(self, MAX_UPLOAD_MB * 1024 * 1024, file_fields=('data',))
+            formats, error = self._format_options(payload)
+            if error:
+                return self._respond(*error)
+            fmt, quantize_mm = formats
+            if payload.get('mode') == 'tiles':
+                return self._respond_tiles(payload, fmt, quantize_mm)
+            if payload.get('mode') == 'query':
+                return self._respond_query(payload)
+            if payload.get('mode') == 'index':
+                return self._respond_index(payload)
+            if payload.get('mode') == 'diff':
+                return self._respond_diff(payload, file_bytes)
+            if not file_bytes:
+                return self._respond(400, {'success': False, 'error': 'Hiányzó DXF fájl.'})
+            options, error = self._request_options(payload)
+            if error:
+                return self._respond(*error)
+            body, cache_status = self._cached_parse(file_bytes, fmt, quantize_mm, DXF_HARD_TIMEOUT_S, **options)
+            self._respond(200, body, cache_status)
+        except UploadError as e:
+            self._respond(e.status, {'success': False, 'error': e.message})
+        except WorkerLimitError as e:
+            self._respond(422, self._too_complex(e))
+        except Exception as e:
+            safe_error_response(self, 500, 'DXF feldolgozás sikertelen', exc=e)
+
+    @staticmethod
+    def _format_options(payload):
+        """format + quantize_mm → ((fmt, quantize_mm), None) or (None, (status, error body))"""
+        fmt = payload.get('format') or 'json'
+        if fmt not in GEOMETRY_FORMATS:
+            return None, (400, {'success': False, 'error': f'Ismeretlen geometria formátum: {fmt}'})
+        # format='quantized': grid step in mm
+        try:
+            quantize_mm = float(payload['quantize_mm']) if payload.get('quantize_mm') is not None else QUANTIZE_MM
+        except (TypeError, ValueError):
+            quantize_mm = -1.0
+        if not 0 < quantize_mm <= 1000:
+            return None, (400, {'success': False, 'error': 'Érvénytelen kvantálási lépés (quantize_mm).'})
+        return (fmt, quantize_mm), None
+
+    @staticmethod
+    def _request_options(payload):
+        """
+        Projection, simplification, scan budget and cursor of a parse request
+        → (kwargs for _cached_parse, None) or (None, (status, error body)).
+        """
+        try:
+            projection = parse_projection(payload)
+        except ValueError as e:
+            return None, (400, {'success': False, 'error': f'Érvénytelen szűrő: {e}'})
+        try:
+            simplify = parse_simplify(payload)
+        except (TypeError, ValueError) as e:
+            return None, (400, {'success': False, 'error': f'Érvénytelen egyszerűsítés: {e}'})
+        # Optional shorter scan budget (never above the default) and the
+        # cursor of a previous partial result to continue from
+        try:
+            budget = DXF_TIME_BUDGET_S
+            if payload.get('time_budget') is not None:
+                budget = min(max(float(payload['time_budget']), 0.1), DXF_TIME_BUDGET_S)
+            cursor = int(payload['cursor']) if payload.get('cursor') is not None else None
+        except (TypeError, ValueError):
+            return None, (400, {'success': False, 'error': 'Érvénytelen time_budget / cursor.'})
+        return {'projection': projection, 'simplify': simplify, 'budget': budget, 'cursor': cursor}, None
+
+    @staticmethod
+    def _cached_parse(file_bytes, fmt, quantize_mm, timeout, projection, simplify, budget, cursor):
+        """Parse in a worker through the result cache → (body bytes, cache status)."""
+        # Partial results are never cached – a later request may have the time to finish.
+        # A hit whose stored plan / index has since been evicted is parsed again.
+        stored = stored_plan_objects(file_bytes, projection, _parse_options(projection), cursor)
+        return cached_json('parse-dxf', file_bytes,
+                           lambda: run_task('parse-dxf', file_bytes, fmt, projection, budget,
+                                            cursor, simplify, quantize_mm, timeout=timeout),
+                           PARSER_VERSION,
+                           params={'format': fmt, 'projection': projection, 'cursor': cursor,
+                                   'simplify': simplify,
+                                   'quantize_mm': quantize_mm if fmt == 'quantized' else None},
+                           cacheable=lambda r: not r.get('partial'),
+                           fresh=lambda: all([PLAN_STORE.touch(name) for name in stored]))
+
+    def _respond_batch(self):
+        """
+        ?mode=batch: several DXF files – multipart (one part per file) or JSON
+        {files: [{name, data: base64}, …]} – with the single-file options
+        (format, fields, layers, simplify, time_budget, …) applied to each;
+        cursor is per file and not accepted here. Streams NDJSON:
+          {type: 'file', index, name, cache, result}   per file, as it completes
+          {type: 'summary', …merge_batch_summary()}    last
+        `result` is the single-file response body (or its error body).
+        """
+        files, payload = read_batch_upload(self, MAX_UPLOAD_MB * 1024 * 1024, DXF_BATCH_MAX_MB * 1024 * 1024,
+                                           DXF_BATCH_MAX_FILES)
+        formats, error = self._format_options(payload)
+        if not error and payload.get('cursor') is not None:
+            error = (400, {'success': False, 'error': 'Kötegelt feldolgozásban nem adható meg cursor.'})
+        if not error:
+            options, error = self._request_options(payload)
+        if error:
+            return self._respond(*error)
+        fmt, quantize_mm = formats
+        headroom = DXF_HARD_TIMEOUT_S - DXF_TIME_BUDGET_S       # finish + encode after the scan
+
+        def parse_one(item, remaining):
+            budget = min(options['budget'], remaining - headroom)
+            if budget < _BATCH_MIN_SCAN_S:
+                raise WorkerLimitError('deadline', {'elapsedS': round(DXF_BATCH_BUDGET_S - remaining, 2)})
+            return self._cached_parse(item[1], fmt, quantize_mm, remaining, **{**options, 'budget': budget})
+
+        def lines():
+            results = {}
+            for i, value, error in run_batch(parse_one, files, DXF_BATCH_BUDGET_S):
+                head = {'type': 'file', 'index': i, 'name': files[i][0], 'cache': value[1] if value else None}
+                if value is not None:
+                    body = value[0]
+                    results[i] = json.loads(body)
+                elif isinstance(error, WorkerLimitError) and error.reason == 'deadline':
+                    results[i] = {'success': False, 'code': 'batch_deadline',
+                                  'error': 'A köteg időkerete elfogyott – küldd újra ezt a fájlt.'}
+                    body = json.dumps(results[i], ensure_ascii=False).encode()
+                else:
+                    if isinstance(error, WorkerLimitError):
+                        results[i] = self._too_complex(error)
+                    else:
+                        print(f"[parse-dxf] batch file {i} failed: {error!r}", file=sys.stderr)
+                        results[i] = {'success': False, 'error': 'DXF feldolgozás sikertelen'}
+                    body = json.dumps(results[i], ensure_ascii=False).encode()
+                # The cached body is spliced in as-is, not re-encoded
+                yield json.dumps(head, ensure_ascii=False).encode()[:-1] + b', "result": ' + body + b'}'
+            yield {'type': 'summary', **merge_batch_summary(results)}
+
+        send_ndjson(self, 200, lines())
+
+    @staticmethod
+    def _too_complex(e):
+        return {'success': False, 'code': 'too_complex', 'reason': e.reason, 'stats': e.stats,
+                'error': 'A DXF túl összetett a szerveroldali feldolgozáshoz '
+                         '(idő- vagy memóriakorlát) – próbáld rétegszűréssel vagy kisebb részletekben.'}
+
+    def _respond_tiles(self, payload, fmt='json', quantize_mm=QUANTIZE_MM):
+        """
+        mode='tiles': {id, tiles: [[z, x, y], …]} → {tiles: {'z/x/y': {lineGeom, polylineGeom, leaf}}}
+        (format='columnar' / 'quantized': {'z/x/y': {geometry, leaf}}; quantized
+        tiles share one grid over the pyramid extent). With viewport (the
+        pixel size a tile is drawn at) or simplify_tolerance the polylines are
+        display-simplified per tile.
+        """
+        plan_id = str(payload.get('id', ''))
+        if not re.fullmatch(r'[0-9a-f]{64}', plan_id):
+            return self._respond(400, {'success': False, 'error': 'Érvénytelen terv azonosító.'})
+        wanted = payload.get('tiles') or []
+        if not isinstance(wanted, list) or len(wanted) > MAX_TILES_PER_REQUEST:
+            return self._respond(400, {
+                'success': False,
+                'error': f'Egy kérésben legfeljebb {MAX_TILES_PER_REQUEST} csempe kérhető.'
+            })
+        try:
+            simplify = parse_simplify(payload)
+        except (TypeError, ValueError) as e:
+            return self._respond(400, {'success': False, 'error': f'Érvénytelen egyszerűsítés: {e}'})
+        pyr = load_geometry_pyramid(plan_id)
+        if pyr is None:
+            return self._respond(404, {
+                'success': False, 'code': 'tiles_expired',
+                'error': 'A terv geometriája már nem elérhető – töltsd fel újra a DXF fájlt.'
+            })
+        quantize = None
+        if fmt == 'quantized':
+            (ox, oy), size = pyr['origin'], pyr['size']
+            quantize = quantize_params(pyr.get('unitFactor'), (ox, oy, ox + size, oy + size), quantize_mm)
+        tiles = {}
+        for t in wanted:
+            try:
+                z, tx, ty = int(t[0]), int(t[1]), int(t[2])
+            except (TypeError, ValueError, IndexError):
+                continue
+            key = f'{z}/{tx}/{ty}'
+            tol = None
+            if simplify is not None and key in pyr['tiles']:
+                side = pyr['size'] / (1 << z)
+                tol = (simplify_tolerance(simplify, side, side), simplify['method'])
+            # Absent tiles are empty (no geometry there) – returned as null
+            tiles[key] = pyramid_tile(pyr, key, geometry_format=fmt, simplify=tol, quantize=quantize)
+        self._respond(200, {'success': True, 'id': plan_id, 'tiles': tiles})
+
+    def _respond_index(self, payload):
+        """mode='index': {id: sha256 of the file} → stored plan index, no upload"""
+        plan_id = str(payload.get('id', ''))
+        if not re.fullmatch(r'[0-9a-f]{64}', plan_id):
+            return self._respond(400, {'success': False, 'error': 'Érvénytelen terv azonosító.'})
+        index = load_plan_index(plan_id)
+        if index is None:
+            return self._respond(404, {
+                'success': False, 'code': 'index_missing',
+                'error': 'Ehhez a fájlhoz nincs tárolt tervindex – töltsd fel a DXF fájlt.'
+            })
+        self._respond(200, {'success': True, **index})
+
+    def _respond_query(self, payload):
+        """mode='query': {id, query: 'bbox' | 'radius' | 'nearest', …} → {features, total}"""
+        plan_id = str(payload.get('id', ''))
+        if not re.fullmatch(r'[0-9a-f]{64}', plan_id):
+            return self._respond(400, {'success': False, 'error': 'Érvénytelen terv azonosító.'})
+        pyr = load_geometry_pyramid(plan_id)
+        if pyr is None or pyr.get('index') is None:
+            return self._respond(404, {
+                'success': False, 'code': 'tiles_expired',
+                'error': 'A terv geometriája már nem elérhető – töltsd fel újra a DXF fájlt.'
+            })
+        try:
+            features, total = query_spatial_index(pyr, payload)
+        except (KeyError, TypeError, ValueError):
+            return self._respond(400, {
+                'success': False,
+                'error': 'Érvénytelen lekérdezés (query: bbox | radius | nearest; bbox / point / radius / k).'
+            })
+        self._respond(200, {'success': True, 'id': plan_id, 'features': features, 'total': total})
+
+    def _diff_side(self, plan_id, file_bytes):
+        """
+        Stored plan for one diff side: by id, or parsed (and stored) from the
+        file. Returns ((plan_id, plan), None) or (None, (status, error body)).
+        """
+        if file_bytes:
+            plan_id = hashlib.sha256(file_bytes).hexdigest()
+        elif not re.fullmatch(r'[0-9a-f]{64}', plan_id or ''):
+            return None, (400, {'success': False, 'error': 'Érvénytelen terv azonosító.'})
+        expired = (404, {
+            'success': False, 'code': 'tiles_expired',
+            'error': 'A terv geometriája már nem elérhető – töltsd fel újra a DXF fájlt.'
+        })
+        pyr = load_geometry_pyramid(plan_id)
+        if pyr is None or 'lengths' not in pyr:
+            if not file_bytes:
+                return None, expired
+            try:
+                result = run_task('parse-dxf', file_bytes, timeout=DXF_HARD_TIMEOUT_S)
+            except WorkerLimitError as e:
+                return None, (422, self._too_complex(e))
+            if not result.get('success'):
+                return None, (422, {'success': False, 'error': result.get('error') or 'DXF feldolgozás sikertelen'})
+            if result.get('partial'):
+                return None, (422, {'success': False, 'code': 'partial',
+                                    'error': 'A DXF feldolgozása nem fért bele az időkeretbe – az összehasonlítás nem teljes.'})
+            # The store may have evicted (or failed to write) the fresh plan
+            pyr = load_geometry_pyramid(plan_id)
+            if pyr is None or 'lengths' not in pyr:
+                return None, expired
+        return (plan_id, pyr), None
+
+    def _respond_diff(self, payload, file_bytes):
+        """
+        mode='diff': base = stored plan id (`base`) or file (`base_data`, base64);
+        head = the uploaded file or a stored plan id (`head`).
+        → {inserts: {added, removed, moved, summary}, counts, lengths}
+        """
+        base_bytes = None
+        if payload.get('base_data'):
+            try:
+                base_bytes = base64.b64decode(payload['base_data'], validate=True)
+            except (TypeError, ValueError):          # binascii.Error, non-ASCII str, non-string
+                return self._respond(400, {'success': False, 'error': 'Érvénytelen base64 adat (base_data).'})
+            if len(base_bytes) > MAX_UPLOAD_MB * 1024 * 1024:
                 return self._respond(413, {
                     'success': False,
-                    'error': f'A DXF fájl mérete ({len(file_bytes) // (1024*1024)} MB) '
-                             f'meghaladja a {MAX_UPLOAD_MB} MB-os limitet.'
+                    'error': f'A DXF fájl mérete meghaladja a {MAX_UPLOAD_MB} MB-os limitet.'
                 })
-            result = parse_dxf_bytes(file_bytes)
-            self._respond(200, result)
-        except Exception as e:
-            safe_error_response(self, 500, 'DXF feldolgozás sikertelen', exc=e)
+        sides = []
+        for plan_id, data in ((payload.get('base'), base_bytes), (payload.get('head'), file_bytes)):
+            side, error = self._diff_side(plan_id, data)
+            if side is None:
+                return self._respond(*error)
+            sides.append(side)
+        (base_id, base_pyr), (head_id, head_pyr) = sides
+        try:
+            tol = float(payload['tolerance']) if payload.get('tolerance') is not None else None
+            radius = float(payload['move_radius']) if payload.get('move_radius') is not None else None
+        except (TypeError, ValueError):
+            return self._respond(400, {'success': False, 'error': 'Érvénytelen tolerancia.'})
+        diff = diff_plans(base_pyr, head_pyr, tol, radius)
+        self._respond(200, {'success': True, 'base': base_id, 'head': head_id, **diff})
 
-    def _respond(self, code, data):
-        self.send_response(code)
-        send_cors_headers(self)
-        self.send_header('Content-Type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+    def _respond(self, code, data, cache_status=None):
+        send_json(self, code, data, {CACHE_HEADER: cache_status})
 
     def log_message(self, *a): pass
@@ -6,10 +6,19 @@ Villamos szimbólumok számlálása szín és méret alapján.
 Kábelvonalak hossza réteg/szín alapján, léptékkel korrigálva.
 """
 from http.server import BaseHTTPRequestHandler
-import json, base64, traceback, io, math, os, sys
+import json, traceback, io, math, os, sys
 from collections import defaultdict
-from security_helpers import send_cors_headers, check_origin, check_rate_limit, require_auth, safe_error_response, rate_limit_response
+from security_helpers import (
+    send_cors_headers, check_origin, check_rate_limit, require_auth, safe_error_response, rate_limit_response,
+    read_upload, UploadError, send_json,
+)
+from parse_cache import cached_json, CACHE_HEADER
+from parse_worker import register, run_task, report_progress, WorkerLimitError
 MAX_UPLOAD_MB  = int(os.environ.get('MAX_UPLOAD_MB', '20'))
+# Hard wall-clock limit of the isolated parse worker (maxDuration 30 s)
+HARD_TIMEOUT_S = float(os.environ.get('PDF_VECTORS_HARD_TIMEOUT_S', '27'))
+# Bump when analyze_pdf_vectors output changes – invalidates cached results
+PARSER_VERSION = 'pdf-vectors-1'
 
 def classify_color(c, threshold_r=0.75):
     """Szín kategorizálás (tuple/list of floats 0..1)"""
@@ -84,6 +93,7 @@ def analyze_pdf_vectors(file_bytes, filename='', scale_override=None):
     scale_info = None
 
     for page_num, page in enumerate(doc):
+        report_progress(pages=total_pages, pagesDone=page_num, symbolsSoFar=len(all_symbols))
         paths = page.get_drawings()
 
         # Lépték detektálás az első oldalon
@@ -303,6 +313,9 @@ def analyze_pdf_vectors(file_bytes, filename='', scale_override=None):
     }
 
 
+register('parse-pdf-vectors', analyze_pdf_vectors)
+
+
 class handler(BaseHTTPRequestHandler):
 
     def do_OPTIONS(self):
@@ -315,19 +328,10 @@ class handler(BaseHTTPRequestHandler):
         if not check_rate_limit(self): return rate_limit_response(self)
         if not require_auth(self): return
         try:
-            length = int(self.headers.get('Content-Length', 0))
-            max_bytes = MAX_UPLOAD_MB * 1024 * 1024
-            if length > max_bytes:
-                return self._respond(413, {
-                    'success': False,
-                    'error': f'A feltöltött fájl túl nagy ({length // (1024*1024)} MB). '
-                             f'Maximum megengedett méret: {MAX_UPLOAD_MB} MB.'
-                })
-            body = self.rfile.read(length)
-            payload = json.loads(body or b'{}')
-
-            b64 = payload.get('pdf_base64') or payload.get('data') or ''
-            if not b64:
+            pdf_bytes, payload = read_upload(self, MAX_UPLOAD_MB * 1024 * 1024,
+                                             file_fields=('pdf_base64', 'data'),
+                                             json_fields=('scale_override',))
+            if not pdf_bytes:
                 raise ValueError('pdf_base64 mező hiányzik')
             filename = payload.get('filename', '')
             scale_override = payload.get('scale_override')  # opcionális (pl. 50, 100)
@@ -337,24 +341,26 @@ class handler(BaseHTTPRequestHandler):
             except ImportError:
                 raise RuntimeError('PyMuPDF nincs telepítve')
 
-            pdf_bytes = base64.b64decode(b64)
-            if len(pdf_bytes) > max_bytes:
-                return self._respond(413, {
-                    'success': False,
-                    'error': f'A PDF fájl mérete ({len(pdf_bytes) // (1024*1024)} MB) '
-                             f'meghaladja a {MAX_UPLOAD_MB} MB-os limitet.'
-                })
-            result = analyze_pdf_vectors(pdf_bytes, filename, scale_override)
-            self._respond(200, result)
-
+            body, cache_status = cached_json(
+                'parse-pdf-vectors', pdf_bytes,
+                lambda: run_task('parse-pdf-vectors', pdf_bytes, filename, scale_override,
+                                 timeout=HARD_TIMEOUT_S),
+                PARSER_VERSION, params={'scale_override': scale_override},
+                dumps=lambda r: json.dumps(r, ensure_ascii=False))
+            self._respond(200, body, cache_status)
+
+        except UploadError as e:
+            self._respond(e.status, {'success': False, 'error': e.message})
+        except WorkerLimitError as e:
+            self._respond(422, {
+                'success': False, 'code': 'too_complex', 'reason': e.reason, 'stats': e.stats,
+                'error': 'A PDF túl összetett a vektoros elemzéshez (idő- vagy memóriakorlát) '
+                         '– próbáld a raszteres feldolgozást.'
+            })
         except Exception as e:
             safe_error_response(self, 500, 'PDF vektor elemzés sikertelen', exc=e)
 
-    def _respond(self, code, data):
-        self.send_response(code)
-        send_cors_headers(self)
-        self.send_header('Content-Type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(data, ensure_ascii=False).encode())
+    def _respond(self, code, data, cache_status=None):
+        send_json(self, code, data, {CACHE_HEADER: cache_status}, ensure_ascii=False)
 
     def log_message(self, *a): pass
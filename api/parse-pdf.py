@@ -1,25 +1,26 @@
 import sys, os; sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 from http.server import BaseHTTPRequestHandler
 import json, base64, traceback, io, re, os, sys
-from collections import Counter
 from security_helpers import (
     send_cors_headers, check_origin, check_rate_limit,
-    require_auth, safe_error_response, rate_limit_response
+    require_auth, safe_error_response, rate_limit_response,
+    read_upload, UploadError, send_json,
 )
+from parse_cache import cached_json, CACHE_HEADER
+from keyword_classifier import SYMBOL_KEYWORDS as BASE_SYMBOL_KEYWORDS, KeywordClassifier
 
 OPENAI_API_KEY  = os.environ.get('OPENAI_API_KEY', '')
 MAX_UPLOAD_MB   = int(os.environ.get('MAX_UPLOAD_MB', '20'))  # default 20 MB
+# Bump when parse_pdf_bytes output or the Vision prompts change – invalidates cached results
+PARSER_VERSION  = 'pdf-1'
 
+# A közös kulcsszótábla, PDF-specifikus kiegészítésekkel (spot lámpa, kábeltálca)
 SYMBOL_KEYWORDS = {
-    'dugalj':        ['dugalj', 'konnektor', 'socket', 'aljzat'],
-    'kapcsolo':      ['kapcsoló', 'kapcsolo', 'switch', 'villanykapcs'],
-    'lampa':         ['lámpa', 'lampa', 'light', 'luminaire', 'ledfény', 'downlight', 'spot'],
-    'fi_rele':       ['fi relé', 'fi rele', 'rcd', 'rcbo'],
-    'kismegszakito': ['kismegszakító', 'kismegszakito', 'mcb', 'megszakít'],
-    'panel':         ['elosztó', 'eloszto', 'panel', 'szekrény', 'szekreny', 'tábla'],
-    'kabel':         ['kábel', 'kabel', 'cable', 'vezeték', 'nayy', 'nyy', 'cyky', 'nym'],
+    **BASE_SYMBOL_KEYWORDS,
+    'lampa':         BASE_SYMBOL_KEYWORDS['lampa'] + ['spot'],
     'kabeltalca':    ['kábeltálca', 'kabeltalca', 'tálca', 'talca', 'cable tray', 'tray'],
 }
+SYMBOL_CLASSIFIER = KeywordClassifier(SYMBOL_KEYWORDS)
 
 # ── Prompt: tervrajz elemzés (kábeltálca, erőátviteli vonalrajz) ───────────────
 VISION_PROMPT_PLAN = """Te egy tapasztalt magyar villamos tervező mérnök asszisztens vagy.
@@ -219,12 +220,7 @@ def parse_pdf_text_fallback(file_bytes):
     all_text = [page.get_text('text') for page in doc]
     full_text = '\n'.join(all_text).lower()
 
-    counts = Counter()
-    for symbol, keywords in SYMBOL_KEYWORDS.items():
-        for kw in keywords:
-            hits = full_text.count(kw.lower())
-            if hits > 0:
-                counts[symbol] += hits
+    counts = SYMBOL_CLASSIFIER.counts(full_text)
 
     blocks = [{'name': n, 'layer': 'PDF', 'count': int(c)} for n, c in counts.items() if c > 0]
     lengths = []
@@ -473,58 +469,34 @@ class handler(BaseHTTPRequestHandler):
         if not check_rate_limit(self): return rate_limit_response(self)
         if not require_auth(self): return
         try:
-            length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(length)
-            content_type = self.headers.get('Content-Type', '')
-
-            pdf_bytes = None
-            filename = ''
-            legend_context = None
-
-            # ── Méretlimit ellenőrzés (DoS-védelemhez) ──────────────────────
-            max_bytes = MAX_UPLOAD_MB * 1024 * 1024
-            if length > max_bytes:
-                return self._respond(413, {
-                    'success': False,
-                    'error': f'A feltöltött fájl túl nagy ({length // (1024*1024)} MB). '
-                             f'Maximum megengedett méret: {MAX_UPLOAD_MB} MB.'
-                })
-
-            if 'application/json' in content_type:
-                payload = json.loads(body or b'{}')
-                b64 = payload.get('pdf_base64') or payload.get('data') or ''
-                if not b64:
-                    raise ValueError('pdf_base64 mező hiányzik')
-                pdf_bytes = base64.b64decode(b64)
-                # Decoded size check (base64 can be up to ~33% larger than binary)
-                if len(pdf_bytes) > max_bytes:
-                    return self._respond(413, {
-                        'success': False,
-                        'error': f'A PDF fájl mérete ({len(pdf_bytes) // (1024*1024)} MB) '
-                                 f'meghaladja a {MAX_UPLOAD_MB} MB-os limitet.'
-                    })
-                filename = payload.get('filename', '')
-                legend_context = payload.get('legend_context')  # opcionális: [{symbol, meaning, type}]
-            else:
-                try:
-                    pdf_bytes = base64.b64decode(body)
-                except Exception:
-                    pdf_bytes = body
+            # JSON {pdf_base64, filename, legend_context}, raw PDF bytes + X-Upload-Meta,
+            # or multipart (legend_context as a JSON-encoded form field)
+            pdf_bytes, payload = read_upload(self, MAX_UPLOAD_MB * 1024 * 1024,
+                                             file_fields=('pdf_base64', 'data'),
+                                             json_fields=('legend_context',))
+            filename = payload.get('filename', '')
+            legend_context = payload.get('legend_context')  # opcionális: [{symbol, meaning, type}]
 
             if not pdf_bytes:
                 raise ValueError('Üres PDF tartalom.')
 
-            result = parse_pdf_bytes(pdf_bytes, filename=filename, legend_context=legend_context)
-            self._respond(200, result)
-
+            body, cache_status = cached_json(
+                'parse-pdf', pdf_bytes,
+                lambda: parse_pdf_bytes(pdf_bytes, filename=filename, legend_context=legend_context),
+                PARSER_VERSION,
+                params={'legend_context': legend_context, 'is_legend': is_legend_file(filename),
+                        'vision': bool(OPENAI_API_KEY)},
+                dumps=lambda r: json.dumps(r, ensure_ascii=False),
+                # A Vision outage degrades to the text fallback with a warning – don't pin that
+                cacheable=lambda r: not r.get('warnings'))
+            self._respond(200, body, cache_status)
+
+        except UploadError as e:
+            self._respond(e.status, {'success': False, 'error': e.message})
         except Exception as e:
             safe_error_response(self, 500, 'Internal server error', exc=e)
 
-    def _respond(self, code, data):
-        self.send_response(code)
-        send_cors_headers(self)
-        self.send_header('Content-Type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(data, ensure_ascii=False).encode())
+    def _respond(self, code, data, cache_status=None):
+        send_json(self, code, data, {CACHE_HEADER: cache_status}, ensure_ascii=False)
 
     def log_message(self, *a): pass
@@ -0,0 +1,784 @@
+"""
+Native reader for AutoCAD DWG drawings (parse-dwg): the layer table, block
+records and the entities a takeoff needs – INSERT / MINSERT placements and
+LINE, LWPOLYLINE, ARC and CIRCLE geometry – decoded straight from the
+object stream, no DWG→DXF conversion round trip.
+
+Releases: R2000 (AC1015), R2004 (AC1018), R2010 (AC1024), R2013 (AC1027)
+and R2018 (AC1032). R2007 (AC1021) uses its own container (Reed–Solomon
+coded pages, a different compressor) and pre-2000 files another object
+layout; both raise DwgUnsupported so the caller can fall back.
+
+Layout (Open Design Alliance, "Open Design Specification for .dwg files"):
+- R2000: section locator records in the file header; record 2 is the
+  object map (handle → absolute file offset).
+- R2004+: XOR-encrypted file header → section page map → section info.
+  Data sections are LZ77-compressed pages with encrypted page headers;
+  AcDb:Handles maps handles to offsets in AcDb:AcDbObjects.
+- Objects are bit streams: the data part, (R2007+) a string stream at its
+  end, then the handle stream whose references give an entity's owner,
+  layer and block.
+
+Objects that fail to decode are skipped and counted – a damaged object
+loses that entity, not the drawing.
+"""
+
+import math
+import struct
+
+RELEASES = {
+    'AC1012': 'R13', 'AC1014': 'R14', 'AC1015': 'R2000', 'AC1018': 'R2004',
+    'AC1021': 'R2007', 'AC1024': 'R2010', 'AC1027': 'R2013', 'AC1032': 'R2018',
+}
+SUPPORTED_VERSIONS = frozenset(('AC1015', 'AC1018', 'AC1024', 'AC1027', 'AC1032'))
+
+# Version ordinals for the R2000 … R2018 field differences
+_R2000, _R2004, _R2007, _R2010, _R2013, _R2018 = range(6)
+_ORDINALS = {'AC1015': _R2000, 'AC1018': _R2004, 'AC1021': _R2007,
+             'AC1024': _R2010, 'AC1027': _R2013, 'AC1032': _R2018}
+
+# DWG header codepage number → Python codec (R2000/R2004 strings are 8-bit)
+_CODEPAGES = {
+    2: 'iso8859-1', 3: 'iso8859-2', 4: 'iso8859-3', 5: 'iso8859-4', 6: 'iso8859-5',
+    7: 'iso8859-6', 8: 'iso8859-7', 9: 'iso8859-8', 10: 'iso8859-9', 11: 'cp437',
+    12: 'cp850', 13: 'cp852', 14: 'cp855', 15: 'cp857', 16: 'cp860', 17: 'cp861',
+    18: 'cp863', 19: 'cp864', 20: 'cp865', 21: 'cp869', 22: 'cp932', 24: 'big5',
+    25: 'cp949', 26: 'johab', 27: 'cp866', 28: 'cp1250', 29: 'cp1251', 30: 'cp1252',
+    31: 'gb2312', 32: 'cp1253', 33: 'cp1254', 34: 'cp1255', 35: 'cp1256', 36: 'cp1257',
+    37: 'cp874', 38: 'cp932', 39: 'gbk', 40: 'cp949', 41: 'cp950', 42: 'johab', 44: 'cp1258',
+}
+
+# Fixed object type numbers
+_INSERT, _MINSERT, _ARC, _CIRCLE, _LINE = 7, 8, 17, 18, 19
+_BLOCK_HEADER, _LAYER, _LWPOLYLINE = 49, 51, 77
+_ENTITY_TYPES = frozenset((_INSERT, _MINSERT, _ARC, _CIRCLE, _LINE, _LWPOLYLINE))
+_WANTED_TYPES = _ENTITY_TYPES | {_BLOCK_HEADER, _LAYER}
+
+# R2004+ container constants
+_PAGE_MAP_TYPE = 0x41630E3B
+_SECTION_MAP_TYPE = 0x4163003B
+_DATA_PAGE_TYPE = 0x4163043B
+_DATA_PAGE_MASK = 0x4164536B
+_FILE_ID = b'AcFssFcAJMB'
+_MAX_PAGE_BYTES = 0x100000         # AutoCAD writes 0x7400-byte data pages
+
+
+class DwgError(ValueError):
+    """The file is not a readable DWG (truncated, corrupt or encrypted)."""
+
+
+class DwgUnsupported(DwgError):
+    """A DWG release (or feature) this reader does not handle."""
+
+
+def dwg_version(data):
+    """The 6-byte version magic ('AC1015', …) or None when data is not a DWG."""
+    magic = bytes(data[:6])
+    if len(magic) == 6 and magic[:2] == b'AC' and magic[2:].isdigit():
+        return magic.decode('ascii')
+    return None
+
+
+# ── Bit stream ───────────────────────────────────────────────────────────────
+
+class _Truncated(Exception):
+    pass
+
+
+class _Bits:
+    """MSB-first bit reader over bytes with the DWG bit-coded types."""
+
+    __slots__ = ('data', 'pos', 'end', 'codec')
+
+    def __init__(self, data, pos, end, codec='cp1252'):
+        self.data, self.pos, self.end, self.codec = data, pos, end, codec
+
+    def bits(self, n):
+        pos = self.pos
+        nxt = pos + n
+        if nxt > self.end:
+            raise _Truncated()
+        self.pos = nxt
+        if n <= 8:
+            # Most reads (codes, RC) span at most two bytes – no slicing
+            i, shift = pos >> 3, 16 - (pos & 7) - n
+            if shift >= 8:
+                return (self.data[i] >> (shift - 8)) & ((1 << n) - 1)
+            return (((self.data[i] << 8) | self.data[i + 1]) >> shift) & ((1 << n) - 1)
+        last = (nxt + 7) >> 3
+        chunk = int.from_bytes(self.data[pos >> 3:last], 'big')
+        return (chunk >> ((last << 3) - nxt)) & ((1 << n) - 1)
+
+    def b(self):
+        pos = self.pos
+        if pos >= self.end:
+            raise _Truncated()
+        self.pos = pos + 1
+        return (self.data[pos >> 3] >> (7 - (pos & 7))) & 1
+
+    def bb(self):
+        return self.bits(2)
+
+    def rc(self):
+        return self.bits(8)
+
+    def _raw(self, n):
+        """n raw bytes in stream order"""
+        if not self.pos & 7:
+            start = self.pos >> 3
+            if self.pos + 8 * n > self.end:
+                raise _Truncated()
+            self.pos += 8 * n
+            return bytes(self.data[start:start + n])
+        return self.bits(8 * n).to_bytes(n, 'big')
+
+    def rs(self):
+        return int.from_bytes(self._raw(2), 'little')
+
+    def rl(self):
+        return int.from_bytes(self._raw(4), 'little')
+
+    def rd(self):
+        return struct.unpack('<d', self._raw(8))[0]
+
+    def bs(self):
+        code = self.bits(2)
+        if code == 0:
+            return self.rs()
+        if code == 1:
+            return self.rc()
+        return 0 if code == 2 else 256
+
+    def bl(self):
+        code = self.bits(2)
+        if code == 0:
+            return self.rl()
+        if code == 1:
+            return self.rc()
+        return 0
+
+    def bll(self):
+        n = self.bits(3)
+        return int.from_bytes(self._raw(n), 'little') if n else 0
+
+    def bd(self):
+        code = self.bits(2)
+        if code == 0:
+            return self.rd()
+        return 1.0 if code == 1 else 0.0
+
+    def dd(self, default):
+        code = self.bits(2)
+        if code == 0:
+            return default
+        if code == 3:
+            return self.rd()
+        raw = bytearray(struct.pack('<d', default))
+        if code == 2:
+            raw[4:6] = self._raw(2)
+        raw[0:4] = self._raw(4)
+        return struct.unpack('<d', bytes(raw))[0]
+
+    def bt(self):
+        return 0.0 if self.b() else self.bd()
+
+    def be(self):
+        return (0.0, 0.0, 1.0) if self.b() else (self.bd(), self.bd(), self.bd())
+
+    def bd3(self):
+        return self.bd(), self.bd(), self.bd()
+
+    def umc(self):
+        result, shift = 0, 0
+        for _ in range(8):
+            byte = self.rc()
+            result |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                return result
+            shift += 7
+        raise _Truncated()
+
+    def ot(self):
+        """R2010+ object type"""
+        code = self.bits(2)
+        if code == 0:
+            return self.rc()
+        if code == 1:
+            return self.rc() + 0x1F0
+        return self.rs()
+
+    def h(self):
+        """(code, value) of a handle reference"""
+        head = self.rc()
+        counter = head & 0x0F
+        return head >> 4, int.from_bytes(self._raw(counter), 'big') if counter else 0
+
+    def href(self, own):
+        """Absolute handle of a reference relative to the object's own handle"""
+        code, value = self.h()
+        if code == 6:
+            return own + 1
+        if code == 8:
+            return own - 1
+        if code == 0xA:
+            return own + value
+        if code == 0xC:
+            return own - value
+        return value
+
+    def tv(self):
+        n = self.bs()
+        return self._raw(n).split(b'\0', 1)[0].decode(self.codec, errors='replace')
+
+    def tu(self):
+        n = self.bs()
+        return self._raw(2 * n).decode('utf-16-le', errors='replace').split('\0', 1)[0]
+
+    def skip(self, nbits):
+        if self.pos + nbits > self.end:
+            raise _Truncated()
+        self.pos += nbits
+
+
+def _modular_char(buf, p, signed):
+    """MC / UMC at byte offset p → (value, next offset)"""
+    result, shift = 0, 0
+    while True:
+        if p >= len(buf):
+            raise DwgError('object map truncated')
+        byte = buf[p]
+        p += 1
+        if not byte & 0x80:
+            if signed and byte & 0x40:
+                return -(result | (byte & 0x3F) << shift), p
+            return result | byte << shift, p
+        result |= (byte & 0x7F) << shift
+        shift += 7
+
+
+def _object_map(buf, start, end):
+    """
+    handle → offset from the object map: big-endian sized pages of
+    (UMC handle delta, MC offset delta) pairs, each page followed by a CRC.
+    """
+    handles = {}
+    pos = start
+    while pos + 2 <= end:
+        size = buf[pos] << 8 | buf[pos + 1]      # includes the two size bytes
+        if size <= 2:
+            break
+        page_end = min(pos + size, end)
+        p, handle, offset = pos + 2, 0, 0
+        while p < page_end:
+            delta, p = _modular_char(buf, p, False)
+            move, p = _modular_char(buf, p, True)
+            handle += delta
+            offset += move
+            handles[handle] = offset
+        pos = page_end + 2
+    return handles
+
+
+# ── R2004+ container ─────────────────────────────────────────────────────────
+
+def _decrypt_header(enc):
+    out = bytearray(len(enc))
+    seed = 1
+    for i, c in enumerate(enc):
+        seed = (seed * 0x343FD + 0x269EC3) & 0xFFFFFFFF
+        out[i] = c ^ (seed >> 16) & 0xFF
+    return bytes(out)
+
+
+def decompress_r2004(src, size):
+    """LZ77 variant of R2004+ section pages; returns at most size bytes."""
+    out = bytearray()
+    n_src = len(src)
+    i = 0
+
+    def literal_length():
+        # → (length, opcode) – a byte ≥ 0x10 is the next opcode, not a length
+        nonlocal i
+        byte = src[i]
+        i += 1
+        if 0x01 <= byte <= 0x0F:
+            return byte + 3, 0
+        if byte == 0:
+            total = 0x0F
+            while src[i] == 0:
+                total += 0xFF
+                i += 1
+            total += src[i] + 3
+            i += 1
+            return total, 0
+        return 0, byte
+
+    def long_length():
+        nonlocal i
+        byte = src[i]
+        i += 1
+        total = 0
+        if byte == 0:
+            total = 0xFF
+            while src[i] == 0:
+                total += 0xFF
+                i += 1
+            byte = src[i]
+            i += 1
+        return total + byte
+
+    def two_byte_offset():
+        # → (offset, literal count packed in the low bits)
+        nonlocal i
+        first, second = src[i], src[i + 1]
+        i += 2
+        return (first >> 2) | (second << 6), first & 0x03
+
+    try:
+        lit, opcode = literal_length()
+        out += src[i:i + lit]
+        i += lit
+        while i < n_src and len(out) < size:
+            if not opcode:
+                opcode = src[i]
+                i += 1
+            if opcode >= 0x40:
+                count = (opcode >> 4) - 1
+                offset = (src[i] << 2) | ((opcode & 0x0C) >> 2)
+                i += 1
+                lit = opcode & 0x03
+            elif 0x21 <= opcode <= 0x3F:
+                count = opcode - 0x1E
+                offset, lit = two_byte_offset()
+            elif opcode == 0x20:
+                count = long_length() + 0x21
+                offset, lit = two_byte_offset()
+            elif 0x12 <= opcode <= 0x1F:
+                count = (opcode & 0x0F) + 2
+                offset, lit = two_byte_offset()
+                offset += 0x3FFF
+            elif opcode == 0x10:
+                count = long_length() + 9
+                offset, lit = two_byte_offset()
+                offset += 0x3FFF
+            elif opcode == 0x11:
+                break
+            else:
+                raise DwgError(f'bad compression opcode 0x{opcode:02x}')
+            if lit:
+                opcode = 0
+            else:
+                lit, opcode = literal_length()
+            # Back-reference (may overlap its own output), then literals
+            start = len(out) - offset - 1
+            if start < 0:
+                raise DwgError('bad compression offset')
+            while count > 0:
+                piece = out[start:start + count]
+                out += piece
+                start += len(piece)
+                count -= len(piece)
+            out += src[i:i + lit]
+            i += lit
+    except IndexError:
+        raise DwgError('compressed page truncated')
+    return bytes(out[:size])
+
+
+def _system_page(data, addr, page_type):
+    if addr + 20 > len(data):
+        raise DwgError('system page out of range')
+    ptype, dsize, csize, ctype, _ = struct.unpack_from('<5I', data, addr)
+    if ptype != page_type:
+        raise DwgError('bad system page header')
+    raw = data[addr + 20:addr + 20 + csize]
+    return decompress_r2004(raw, dsize) if ctype == 2 else bytes(raw)
+
+
+def _r2004_sections(data, wanted=('AcDb:Handles', 'AcDb:AcDbObjects')):
+    """{name: section bytes} for the wanted data sections"""
+    if len(data) < 0x100:
+        raise DwgError('file header truncated')
+    header = _decrypt_header(data[0x80:0x80 + 0x6C])
+    if header[:11] != _FILE_ID:
+        raise DwgError('file header does not decrypt')
+    page_map_addr = struct.unpack_from('<Q', header, 0x54)[0] + 0x100
+    section_map_id = struct.unpack_from('<I', header, 0x5C)[0]
+
+    # Section page map: (page number, size) in file order from 0x100;
+    # negative numbers are gaps with four extra fields
+    page_map = _system_page(data, page_map_addr, _PAGE_MAP_TYPE)
+    pages, addr, p = {}, 0x100, 0
+    while p + 8 <= len(page_map):
+        number, size = struct.unpack_from('<iI', page_map, p)
+        p += 8
+        if number < 0:
+            p += 16
+        else:
+            pages[number] = addr
+        addr += size
+    if section_map_id not in pages:
+        raise DwgError('section map page missing')
+
+    info = _system_page(data, pages[section_map_id], _SECTION_MAP_TYPE)
+    if len(info) < 20:
+        raise DwgError('section map truncated')
+    n_desc = struct.unpack_from('<I', info, 0)[0]
+    sections, p = {}, 20
+    for _ in range(n_desc):
+        if p + 96 > len(info):
+            raise DwgError('section map truncated')
+        size, n_pages, max_size, _, compressed, _, encrypted = struct.unpack_from('<Q6I', info, p)
+        name = info[p + 32:p + 96].split(b'\0', 1)[0].decode('latin-1')
+        p += 96
+        if p + 16 * n_pages > len(info):
+            raise DwgError('section map truncated')
+        page_list = [struct.unpack_from('<IIQ', info, p + 16 * k) for k in range(n_pages)]
+        p += 16 * n_pages
+        if name not in wanted:
+            continue
+        if encrypted == 1:
+            raise DwgUnsupported('encrypted (password protected) drawing')
+        # Pages hold at most _MAX_PAGE_BYTES each: a larger claim is corrupt
+        if max_size > _MAX_PAGE_BYTES or size > n_pages * max_size:
+            raise DwgError(f'section {name} too large')
+        buf = bytearray(size)
+        for number, _, offset in page_list:
+            addr = pages.get(number)
+            if addr is None or addr + 32 > len(data) or offset > size:
+                raise DwgError(f'section {name}: page {number} missing')
+            mask = _DATA_PAGE_MASK ^ addr
+            head = [v ^ mask for v in struct.unpack_from('<8I', data, addr)]
+            if head[0] != _DATA_PAGE_TYPE:
+                raise DwgError(f'section {name}: bad page header')
+            raw = data[addr + 32:addr + 32 + head[2]]
+            page = decompress_r2004(raw, max_size) if compressed == 2 else bytes(raw)
+            n = min(len(page), size - offset)
+            buf[offset:offset + n] = page[:n]
+        sections[name] = bytes(buf)
+    missing = set(wanted) - sections.keys()
+    if missing:
+        raise DwgError(f'missing section {sorted(missing)[0]}')
+    return sections
+
+
+# ── Objects ──────────────────────────────────────────────────────────────────
+
+def _object_start(buf, offset, ver):
+    """
+    MS size + type of the object at offset → (type, reader positioned after
+    the type, data start bit, data end bit (handle stream start), object end bit)
+    """
+    size, p = 0, offset
+    for shift in (0, 15):
+        if p + 2 > len(buf):
+            raise _Truncated()
+        word = buf[p] | buf[p + 1] << 8
+        p += 2
+        size |= (word & 0x7FFF) << shift
+        if not word & 0x8000:
+            break
+    start, end = p * 8, (p + size) * 8
+    if end > len(buf) * 8 or not size:
+        raise _Truncated()
+    r = _Bits(buf, start, end)
+    if ver >= _R2010:
+        handle_bits = r.umc()
+        return r.ot(), r, start, end - handle_bits, end
+    obj_type = r.bs()
+    if obj_type not in _WANTED_TYPES:
+        return obj_type, r, start, None, end
+    return obj_type, r, start, start + r.rl(), end
+
+
+def _strings(r, data_end):
+    """R2007+: reader over the string stream at the end of the data part, or None"""
+    s = _Bits(r.data, data_end - 1, data_end, r.codec)
+    if not s.b():
+        return None
+    s.pos, s.end = data_end - 17, data_end - 1
+    size = s.rs()
+    top = data_end - 17
+    if size & 0x8000:
+        s.pos, s.end = data_end - 33, data_end - 17
+        size = (size & 0x7FFF) | (s.rs() << 15)
+        top = data_end - 33
+    if size > top - r.pos:
+        raise _Truncated()
+    return _Bits(r.data, top - size, top, r.codec)
+
+
+def _common(r, ver, entity):
+    """Skip the common object / entity header; returns the entity flags used by the handle stream."""
+    own = r.h()[1]
+    while True:                         # extended entity data
+        n = r.bs()
+        if not n:
+            break
+        r.h()
+        r.skip(8 * n)
+    if not entity:
+        n_reactors = r.bl()
+        xdic_missing = r.b() if ver >= _R2004 else 0
+        if ver >= _R2013:
+            r.b()
+        return own, {'reactors': n_reactors, 'xdic_missing': xdic_missing}
+    if r.b():                           # graphic (proxy) image
+        r.skip(8 * (r.bll() if ver >= _R2010 else r.rl()))
+    f = {'entmode': r.bb(), 'reactors': r.bl()}
+    f['xdic_missing'] = r.b() if ver >= _R2004 else 0
+    if ver >= _R2013:
+        r.b()
+    f['nolinks'] = r.b() if ver == _R2000 else 1
+    color = r.bs()
+    f['color_book'] = 0
+    if ver >= _R2004:
+        flags = color >> 8
+        if flags & 0x80:
+            r.bl()                      # RGB
+        if flags & 0x20:
+            r.bl()                      # transparency
+        f['color_book'] = flags & 0x40
+    r.bd()                              # linetype scale
+    f['ltype'] = r.bb()
+    f['plotstyle'] = r.bb()
+    f['material'] = 0
+    if ver >= _R2007:
+        f['material'] = r.bb()
+        r.rc()                          # shadow flags
+    f['styles'] = (r.b(), r.b(), r.b()) if ver >= _R2010 else ()
+    r.bs()                              # invisibility
+    r.rc()                              # lineweight
+    return own, f
+
+
+def _entity_handles(h, own, f, ver):
+    """Common entity handle data → (owner handle or None, layer handle)"""
+    owner = h.href(own) if f['entmode'] == 0 else None
+    for _ in range(f['reactors']):
+        h.h()
+    if not f['xdic_missing']:
+        h.h()
+    if ver == _R2000 and not f['nolinks']:
+        h.h(); h.h()                    # previous / next entity
+    if f['color_book']:
+        h.h()
+    layer = h.href(own)
+    return owner, layer
+
+
+def _read_entity(obj_type, r, ver):
+    """Entity-specific data → record fields (without owner / layer / block)"""
+    if obj_type == _INSERT or obj_type == _MINSERT:
+        x, y, _ = r.bd3()
+        code = r.bb()
+        if code == 3:
+            sx = sy = 1.0
+        elif code == 1:
+            sx = 1.0
+            sy = r.dd(1.0)
+            r.dd(1.0)
+        elif code == 2:
+            sx = sy = r.rd()
+        else:
+            sx = r.rd()
+            sy = r.dd(sx)
+            r.dd(sx)
+        rot = r.bd()
+        r.bd3()                         # extrusion
+        has_attribs = r.b()
+        if ver >= _R2004 and has_attribs:
+            r.bl()                      # owned object count
+        n = 1
+        if obj_type == _MINSERT:
+            cols, rows = r.bs(), r.bs()
+            n = max(cols, 1) * max(rows, 1)
+        return [x, y, sx, sy, math.degrees(rot), n]
+    if obj_type == _LINE:
+        z_zero = r.b()
+        x1 = r.rd(); x2 = r.dd(x1)
+        y1 = r.rd(); y2 = r.dd(y1)
+        if not z_zero:
+            z1 = r.rd(); r.dd(z1)
+        return [x1, y1, x2, y2]
+    if obj_type == _ARC or obj_type == _CIRCLE:
+        cx, cy, _ = r.bd3()
+        radius = r.bd()
+        r.bt()
+        extrusion = r.be()
+        a0, a1 = (r.bd(), r.bd()) if obj_type == _ARC else (0.0, 2 * math.pi)
+        if extrusion[2] < 0:
+            # Mirrored OCS: flip X and reverse the sweep
+            cx, a0, a1 = -cx, math.pi - a1, math.pi - a0
+        return [cx, cy, radius, math.degrees(a0), math.degrees(a1)]
+    # LWPOLYLINE
+    flag = r.bs()
+    if flag & 4:
+        r.bd()                          # constant width
+    if flag & 8:
+        r.bd()                          # elevation
+    if flag & 2:
+        r.bd()                          # thickness
+    if flag & 1:
+        r.bd3()                         # normal
+    n_points = r.bl()
+    n_bulges = r.bl() if flag & 16 else 0
+    if ver >= _R2010 and flag & 1024:
+        r.bl()                          # vertex id count
+    if flag & 32:
+        r.bl()                          # width count
+    if n_points < 1 or n_points > (r.end - r.pos) // 2:
+        raise _Truncated()
+    x, y = r.rd(), r.rd()
+    verts = [[x, y, 0.0]]
+    for _ in range(n_points - 1):
+        x = r.dd(x)
+        y = r.dd(y)
+        verts.append([x, y, 0.0])
+    for k in range(n_bulges):
+        b = r.bd()
+        if k < len(verts):
+            verts[k][2] = b
+    return [verts, bool(flag & 512)]
+
+
+def _read_table_entry(obj_type, r, ver, data_end):
+    """LAYER / BLOCK_HEADER → record fields (name first)"""
+    if ver >= _R2007:
+        strings = _strings(r, data_end)
+        text = strings.tu if strings is not None else str
+    else:
+        text = r.tv
+    name = text()
+    if obj_type == _LAYER:
+        return [name]
+    r.b(); r.bs(); r.b()                # 64-flag, xref index, xref dependent
+    r.b(); r.b(); r.b(); r.b()          # anonymous, has attdefs, is xref, overlaid
+    r.b()                               # loaded
+    if ver >= _R2004:
+        r.bl()                          # owned object count
+    base = r.bd3()
+    text()                              # xref path
+    while r.rc():                       # insert count bytes, 0-terminated
+        pass
+    text()                              # description
+    r.skip(8 * r.bl())                  # preview
+    units = r.bs() if ver >= _R2007 else None
+    return [name, base[0], base[1], units]
+
+
+def _read_objects(buf, object_map, ver, codec):
+    layers, blocks, entities = {}, {}, []
+    skipped = 0
+    for own_handle, offset in object_map.items():
+        if offset < 0 or offset >= len(buf):
+            skipped += 1
+            continue
+        try:
+            obj_type, r, start, data_end, end = _object_start(buf, offset, ver)
+            if obj_type not in _WANTED_TYPES:
+                continue
+            r.codec = codec
+            entity = obj_type in _ENTITY_TYPES
+            own, f = _common(r, ver, entity)
+            if not entity:
+                fields = _read_table_entry(obj_type, r, ver, data_end)
+                if obj_type == _LAYER:
+                    layers[own] = fields[0]
+                else:
+                    blocks[own] = {'name': fields[0], 'base': (fields[1], fields[2]), 'units': fields[3]}
+                continue
+            fields = _read_entity(obj_type, r, ver)
+            h = _Bits(buf, data_end, end)
+            owner, layer = _entity_handles(h, own, f, ver)
+            block = None
+            if obj_type == _INSERT or obj_type == _MINSERT:
+                if f['ltype'] == 3:
+                    h.h()
+                if ver >= _R2007 and f['material'] == 3:
+                    h.h()
+                if f['plotstyle'] == 3:
+                    h.h()
+                for present in f['styles']:
+                    if present:
+                        h.h()
+                block = h.href(own)
+            entities.append((obj_type, owner, layer, block, fields))
+        except (_Truncated, struct.error, OverflowError, ValueError):
+            skipped += 1
+    return layers, blocks, entities, skipped
+
+
+_KIND = {_INSERT: 'INSERT', _MINSERT: 'INSERT', _LINE: 'LINE', _ARC: 'ARC',
+         _CIRCLE: 'ARC', _LWPOLYLINE: 'LWPOLYLINE'}
+
+
+def object_data(data):
+    """
+    Decompressed AcDb:AcDbObjects section of an R2004+ drawing (R2000 and
+    older store objects uncompressed: the file itself) – what a string scan
+    has to look at when the objects cannot be decoded. Raises DwgUnsupported
+    for R2007, DwgError for a broken container.
+    """
+    version = dwg_version(data)
+    if version is None or version < 'AC1018':
+        return data
+    if version not in SUPPORTED_VERSIONS:
+        raise DwgUnsupported(f'{version} ({RELEASES.get(version, "unknown release")}) is not supported')
+    return _r2004_sections(data, ('AcDb:AcDbObjects',))['AcDb:AcDbObjects']
+
+
+def read_dwg(data):
+    """
+    Decode a DWG file.
+
+    Returns {
+      version, release, objects (object map size), skipped (undecodable objects),
+      layers: {handle: name}, blocks: {handle: {name, base, units}},
+      entities: [(kind, owner, layer, block, fields)] – owner is None for
+        model/paper space entities, else the owning block record's handle;
+        kind 'INSERT': [x, y, sx, sy, rotation°, count]  (block = block record)
+             'LINE': [x1, y1, x2, y2]
+             'ARC': [cx, cy, r, start°, end°]  (CIRCLE: 0 … 360)
+             'LWPOLYLINE': [[[x, y, bulge], …], closed]
+    }
+    Raises DwgUnsupported / DwgError.
+    """
+    version = dwg_version(data)
+    if version is None:
+        raise DwgError('not a DWG file')
+    if version not in SUPPORTED_VERSIONS:
+        raise DwgUnsupported(f'{version} ({RELEASES.get(version, "unknown release")}) is not supported')
+    ver = _ORDINALS[version]
+    if len(data) < 0x19 + 9:
+        raise DwgError('file header truncated')
+    codec = _CODEPAGES.get(struct.unpack_from('<H', data, 0x13)[0], 'cp1252')
+
+    if ver == _R2000:
+        n_records = struct.unpack_from('<I', data, 0x15)[0]
+        records = {}
+        for k in range(min(n_records, 16, (len(data) - 0x19) // 9)):
+            number, seeker, size = struct.unpack_from('<BII', data, 0x19 + 9 * k)
+            records[number] = (seeker, size)
+        if 2 not in records:
+            raise DwgError('object map locator missing')
+        seeker, size = records[2]
+        object_map = _object_map(data, seeker, min(seeker + size, len(data)))
+        objects = data
+    else:
+        sections = _r2004_sections(data)
+        handles = sections['AcDb:Handles']
+        object_map = _object_map(handles, 0, len(handles))
+        objects = sections['AcDb:AcDbObjects']
+    if not object_map:
+        raise DwgError('empty object map')
+
+    layers, blocks, entities, skipped = _read_objects(objects, object_map, ver, codec)
+    if not layers and not entities:
+        raise DwgError('no decodable objects')
+    return {
+        'version': version, 'release': RELEASES[version],
+        'objects': len(object_map), 'skipped': skipped,
+        'layers': layers, 'blocks': blocks,
+        'entities': [(_KIND[t], owner, layer, block, fields) for t, owner, layer, block, fields in entities],
+    }
@@ -0,0 +1,106 @@
+"""
+Symbol keyword classifier shared by the text fallbacks (parse-dwg binary
+string scan, parse-pdf text layer): which electrical symbols a plan's text
+mentions, and how often.
+
+All keywords of a table compile – once, at import of the endpoint – into a
+single trie-shaped regex inside a lookahead, so one pass over the text finds
+every keyword occurrence instead of one text.count() scan per keyword. The
+trie keeps the work per text position independent of the number of
+keywords; keywords starting at the same position ('kábel' inside
+'kábeltálca') are resolved from the longest match. Counts equal
+str.count() per keyword (non-overlapping), summed per symbol.
+"""
+
+import re
+from collections import Counter
+
+SYMBOL_KEYWORDS = {
+    'dugalj':        ['dugalj', 'konnektor', 'socket', 'aljzat'],
+    'kapcsolo':      ['kapcsoló', 'kapcsolo', 'switch', 'villanykapcs'],
+    'lampa':         ['lámpa', 'lampa', 'light', 'luminaire', 'ledfény', 'downlight'],
+    'fi_rele':       ['fi relé', 'fi rele', 'rcd', 'rcbo'],
+    'kismegszakito': ['kismegszakító', 'kismegszakito', 'mcb', 'megszakít'],
+    'panel':         ['elosztó', 'eloszto', 'panel', 'szekrény', 'szekreny', 'tábla'],
+    'kabel':         ['kábel', 'kabel', 'cable', 'vezeték', 'nayy', 'nyy', 'cyky', 'nym'],
+}
+
+
+def _trie_pattern(words):
+    """Regex source matching the longest of words at a position (alternatives factored by prefix)."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[None] = {}                 # end of a word
+
+    def emit(node):
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items(), key=lambda x: x[0] or '') if ch]
+        if not alts:
+            return ''
+        body = alts[0] if len(alts) == 1 else '(?:' + '|'.join(alts) + ')'
+        return f'(?:{body})?' if None in node else body
+
+    return emit(trie)
+
+
+class KeywordClassifier:
+    """
+    Compiled matcher for a {symbol: [keywords]} table. Text is expected in
+    lower case. encoding: build a bytes matcher (keywords encoded with it,
+    unencodable ones dropped) for bytes text.
+    """
+
+    def __init__(self, symbol_keywords, encoding=None):
+        self.symbols = list(symbol_keywords)
+        keyword_symbols = {}
+        for symbol, keywords in symbol_keywords.items():
+            for kw in keywords:
+                kw = kw.lower()
+                if encoding:
+                    try:
+                        kw = kw.encode(encoding)
+                    except UnicodeEncodeError:
+                        continue
+                keyword_symbols.setdefault(kw, []).append(symbol)
+        self._symbols = keyword_symbols
+        # Longest keyword at a position → every keyword starting there (its keyword prefixes)
+        self._starting = {kw: [k for k in keyword_symbols if kw.startswith(k)] for kw in keyword_symbols}
+        # A keyword with a border ('aba') can overlap its own previous match – counting
+        # those needs positions; otherwise counts() tallies matches without a Python loop
+        self._self_overlapping = any(kw[:i] == kw[-i:] for kw in keyword_symbols for i in range(1, len(kw)))
+        source = _trie_pattern([kw.decode('latin-1') if encoding else kw for kw in keyword_symbols])
+        if encoding:
+            source = source.encode('latin-1')
+            self._pattern = re.compile(b'(?=(' + source + b'))')
+        else:
+            self._pattern = re.compile('(?=(' + source + '))')
+
+    def scan(self, text):
+        """{symbol: [match start offsets]} in table order, symbols without a match omitted."""
+        positions, last_end = {}, {}
+        for m in self._pattern.finditer(text):
+            pos = m.start()
+            for kw in self._starting[m.group(1)]:
+                if pos < last_end.get(kw, 0):
+                    continue            # overlaps this keyword's previous match
+                last_end[kw] = pos + len(kw)
+                for symbol in self._symbols[kw]:
+                    positions.setdefault(symbol, []).append(pos)
+        return {s: positions[s] for s in self.symbols if s in positions}
+
+    def counts(self, text):
+        """{symbol: occurrences} in table order, symbols without a match omitted."""
+        if self._self_overlapping:
+            return {s: len(p) for s, p in self.scan(text).items()}
+        totals = {}
+        for longest, n in Counter(self._pattern.findall(text)).items():
+            for kw in self._starting[longest]:
+                for symbol in self._symbols[kw]:
+                    totals[symbol] = totals.get(symbol, 0) + n
+        return {s: totals[s] for s in self.symbols if s in totals}
+
+    def symbols_in(self, text):
+        """Symbols with at least one keyword in text."""
+        return list(self.counts(text))
@@ -0,0 +1,153 @@
+"""
+Content-hash result cache for the parse endpoints (parse-dxf, parse-pdf,
+parse-pdf-vectors).
+
+Key = SHA-256 of the decoded file bytes + endpoint namespace + parser version
++ the request parameters that change the result (scale_override,
+legend_context, …). Values are the serialized JSON response bodies, so a hit
+is written back as-is without re-parsing or re-encoding.
+
+Tiers:
+1. In-process LRU (warm function instance)
+2. Size-bounded directory under /tmp (survives across invocations on the
+   same instance), least-recently-used files evicted first
+
+Only successful results are stored. Cache problems never fail a request –
+they degrade to a MISS.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+PARSE_CACHE_DIR = os.environ.get('PARSE_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'takeoffpro-parse-cache')
+PARSE_CACHE_MEMORY_ITEMS = int(os.environ.get('PARSE_CACHE_MEMORY_ITEMS', '16'))
+PARSE_CACHE_MEMORY_MB = int(os.environ.get('PARSE_CACHE_MEMORY_MB', '64'))
+PARSE_CACHE_DISK_MB = int(os.environ.get('PARSE_CACHE_DISK_MB', '256'))
+PARSE_CACHE_DISABLED = os.environ.get('PARSE_CACHE_DISABLED', '') == '1'
+
+# Response header reporting the outcome: HIT-MEMORY, HIT-DISK or MISS
+CACHE_HEADER = 'X-Parse-Cache'
+
+_memory = OrderedDict()
+_memory_bytes = 0
+_lock = threading.Lock()
+
+
+def cache_key(namespace, file_bytes, version, params=None):
+    h = hashlib.sha256()
+    h.update(file_bytes)
+    file_hash = h.hexdigest()
+    meta = json.dumps({'ns': namespace, 'v': version, 'p': params or {}},
+                      sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(f'{file_hash}:{meta}'.encode()).hexdigest()
+
+
+def _disk_path(key):
+    return os.path.join(PARSE_CACHE_DIR, f'{key}.json')
+
+
+def _memory_put(key, body):
+    global _memory_bytes
+    with _lock:
+        old = _memory.pop(key, None)
+        if old is not None:
+            _memory_bytes -= len(old)
+        _memory[key] = body
+        _memory_bytes += len(body)
+        limit = PARSE_CACHE_MEMORY_MB * 1024 * 1024
+        while _memory and (len(_memory) > PARSE_CACHE_MEMORY_ITEMS or _memory_bytes > limit):
+            _, dropped = _memory.popitem(last=False)
+            _memory_bytes -= len(dropped)
+
+
+def _evict_disk():
+    """Drop least-recently-used files until the directory fits PARSE_CACHE_DISK_MB."""
+    limit = PARSE_CACHE_DISK_MB * 1024 * 1024
+    entries, total = [], 0
+    with os.scandir(PARSE_CACHE_DIR) as it:
+        for e in it:
+            if not e.name.endswith('.json'):
+                continue
+            try:
+                st = e.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, e.path))
+            total += st.st_size
+    if total <= limit:
+        return
+    for _, size, path in sorted(entries):
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        if total <= limit:
+            break
+
+
+def cache_get(key):
+    """Return (body_bytes, 'HIT-MEMORY' | 'HIT-DISK') or (None, None)."""
+    if PARSE_CACHE_DISABLED:
+        return None, None
+    with _lock:
+        body = _memory.get(key)
+        if body is not None:
+            _memory.move_to_end(key)
+            return body, 'HIT-MEMORY'
+    path = _disk_path(key)
+    try:
+        with open(path, 'rb') as f:
+            body = f.read()
+        os.utime(path, None)    # mtime doubles as the LRU clock
+    except OSError:
+        return None, None
+    _memory_put(key, body)
+    return body, 'HIT-DISK'
+
+
+def cache_put(key, body):
+    if PARSE_CACHE_DISABLED or len(body) > PARSE_CACHE_DISK_MB * 1024 * 1024:
+        return
+    _memory_put(key, body)
+    try:
+        os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+        tmp = os.path.join(PARSE_CACHE_DIR, f'.{key}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(body)
+        os.replace(tmp, _disk_path(key))
+        _evict_disk()
+    except OSError as e:
+        print(f"[CACHE] disk tier write failed: {e}", file=sys.stderr)
+
+
+def cached_json(namespace, file_bytes, compute, version, params=None,
+                dumps=json.dumps, cacheable=None, fresh=None):
+    """
+    Serve a parse result from cache or compute it.
+
+    compute()   → result dict (only called on a miss)
+    dumps(obj)  → str, the endpoint's own JSON settings (e.g. ensure_ascii=False)
+    cacheable(result) → bool, extra veto on top of result['success']
+    fresh()     → bool, checked on a hit: False when state the cached body
+                  refers to (e.g. a stored plan) is gone – recomputed as a miss
+
+    Returns (body_bytes, status) where status is the CACHE_HEADER value.
+    """
+    key = cache_key(namespace, file_bytes, version, params)
+    body, status = cache_get(key)
+    if body is not None and (fresh is None or fresh()):
+        return body, status
+    t0 = time.time()
+    result = compute()
+    body = dumps(result).encode()
+    if result.get('success') and (cacheable is None or cacheable(result)):
+        cache_put(key, body)
+    print(f"[CACHE] {namespace} miss, computed in {time.time() - t0:.2f}s", file=sys.stderr)
+    return body, 'MISS'
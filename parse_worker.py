@@ -0,0 +1,395 @@
+"""
+Isolated worker processes for the parse endpoints (parse-dxf, parse-dwg,
+parse-pdf-vectors).
+
+A pathological upload (millions of vertices, malformed huge paths) must not
+take the whole function instance down. Parsers run in forked worker
+processes with RLIMIT_AS (address space) and RLIMIT_CPU set; the parent
+enforces a hard wall-clock timeout on top. A worker that hits a limit is
+killed and replaced and the caller gets a WorkerLimitError carrying the
+reason and the last progress the task reported.
+
+Workers are forked lazily, reused across requests on a warm instance
+(recycled after PARSE_WORKER_MAX_TASKS) and capped at PARSE_WORKERS.
+Tasks name a function registered with register() – the api/ handler
+modules are loaded from hyphenated files and cannot be pickled by
+reference – so only plain data crosses the pipe.
+
+The workers are not forked by the serving process itself: forking a process
+that runs threads (run_batch, a threaded server) copies locks other threads
+hold. A fork server – one single-threaded child forked before any batch
+thread starts – forks every worker, hands the parent the worker's pipe and
+reaps it on request.
+
+run_batch() runs many such tasks (a multi-file upload) concurrently on the
+same bounded pool under one shared deadline and yields results as they
+complete.
+
+Where fork or the resource module is unavailable (or PARSE_WORKER_DISABLED=1)
+tasks run in-process, unprotected.
+"""
+
+import os
+import sys
+import time
+import signal
+import atexit
+import threading
+import multiprocessing
+from multiprocessing import reduction
+from multiprocessing.connection import Connection
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import resource
+except ImportError:                     # non-POSIX – no limits, run in-process
+    resource = None
+
+PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', '2'))
+PARSE_WORKER_MEMORY_MB = int(os.environ.get('PARSE_WORKER_MEMORY_MB', '1536'))
+PARSE_WORKER_CPU_S = int(os.environ.get('PARSE_WORKER_CPU_S', '60'))
+PARSE_WORKER_MAX_TASKS = int(os.environ.get('PARSE_WORKER_MAX_TASKS', '50'))
+PARSE_WORKER_DISABLED = os.environ.get('PARSE_WORKER_DISABLED', '') == '1'
+
+_registry = {}
+_idle = []                              # ready workers
+_live = 0                               # spawned and not yet discarded
+_cond = threading.Condition()
+_server = None                          # _ForkServer, started on first use
+_server_lock = threading.Lock()
+_task_conn = None                       # inside a worker: pipe back to the parent
+_worker_pid = None
+
+
+class WorkerLimitError(Exception):
+    """
+    A task exceeded its limits. reason: 'timeout' | 'memory' | 'cpu' |
+    'crashed', or 'deadline' for a task that got no worker in time; stats:
+    elapsed time, peak RSS, input size and the last report_progress() values.
+    """
+
+    def __init__(self, reason, stats):
+        super().__init__(f'parse worker {reason}')
+        self.reason = reason
+        self.stats = stats
+
+
+def register(name, func):
+    """
+    Make func callable as run_task(name, …); call at module import, before any
+    task runs. Idle workers and the fork server predate this registration:
+    they are stopped, and the next worker comes from a new fork server.
+    """
+    global _server, _live
+    _registry[name] = func
+    with _cond:
+        while _idle:
+            _idle.pop().kill()
+            _live -= 1
+    with _server_lock:
+        if _server is not None:
+            _server.conn.close()        # EOF ends it; workers still busy are orphaned, not leaked
+            try:
+                os.waitpid(_server.pid, 0)
+            except ChildProcessError:
+                pass
+        _server = None
+
+
+def report_progress(**stats):
+    """From inside a task: latest progress, returned as partial stats if the task is killed."""
+    if _task_conn is not None and os.getpid() == _worker_pid:
+        try:
+            _task_conn.send(('progress', stats))
+        except (OSError, ValueError):
+            pass
+
+
+def _available():
+    if PARSE_WORKER_DISABLED or resource is None or PARSE_WORKERS < 1:
+        return False
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def _close_fds_except(fd):
+    """In a fresh child: drop every inherited descriptor (request sockets, other pipes) but fd."""
+    max_fd = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    os.closerange(3, fd)
+    os.closerange(fd + 1, 1 << 20 if max_fd == resource.RLIM_INFINITY else max_fd)
+
+
+# ── Worker side ──────────────────────────────────────────────────────────────
+
+def _worker_main(conn):
+    global _task_conn, _worker_pid
+    _task_conn, _worker_pid = conn, os.getpid()
+    os.setpgid(0, 0)                    # own process group – a kill also stops chunk workers
+    limit = PARSE_WORKER_MEMORY_MB * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    _, cpu_hard = resource.getrlimit(resource.RLIMIT_CPU)
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            break
+        if task is None:
+            break
+        name, args, kwargs = task
+        # RLIMIT_CPU counts the whole process lifetime: move the soft limit
+        # to "used so far + the per-task budget" for each task
+        used = resource.getrusage(resource.RUSAGE_SELF)
+        soft = int(used.ru_utime + used.ru_stime) + PARSE_WORKER_CPU_S
+        if cpu_hard == resource.RLIM_INFINITY or soft < cpu_hard:
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, cpu_hard))
+        try:
+            conn.send(('ok', _registry[name](*args, **kwargs)))
+        except MemoryError:
+            # Heap state after a failed allocation is not trusted – the
+            # worker reports and exits, the parent replaces it
+            try:
+                conn.send(('limit', 'memory'))
+            except Exception:
+                pass
+            break
+        except Exception as e:
+            try:
+                conn.send(('error', e))
+            except Exception:
+                conn.send(('error', RuntimeError(f'{type(e).__name__}: {e}')))
+    conn.close()
+    os._exit(0)
+
+
+# ── Fork server ──────────────────────────────────────────────────────────────
+
+def _fork_server_main(conn):
+    """Serve ('spawn',) and ('reap', pid) requests until the parent goes away."""
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+        if request[0] == 'spawn':
+            parent_end, child_end = multiprocessing.Pipe()
+            pid = os.fork()
+            if pid == 0:
+                # Only the parent's end of this pipe keeps the worker alive
+                _close_fds_except(child_end.fileno())
+                try:
+                    _worker_main(child_end)
+                finally:
+                    os._exit(1)
+            child_end.close()
+            conn.send(pid)
+            reduction.send_handle(conn, parent_end.fileno(), None)
+            parent_end.close()
+        else:
+            try:
+                _, status, usage = os.wait4(request[1], 0)
+            except ChildProcessError:
+                conn.send((None, None))
+                continue
+            sig = os.WTERMSIG(status) if os.WIFSIGNALED(status) else None
+            conn.send((sig, round(usage.ru_maxrss / 1024, 1)))      # ru_maxrss is in KiB on Linux
+    os._exit(0)
+
+
+class _ForkServer:
+    def __init__(self):
+        conn, child_conn = multiprocessing.Pipe()
+        pid = os.fork()
+        if pid == 0:
+            _close_fds_except(child_conn.fileno())
+            try:
+                _fork_server_main(child_conn)
+            finally:
+                os._exit(1)
+        child_conn.close()
+        self.pid, self.conn, self.lock = pid, conn, threading.Lock()
+
+    def spawn(self):
+        """Fork a worker; (pid, parent end of its pipe)."""
+        with self.lock:
+            self.conn.send(('spawn',))
+            pid = self.conn.recv()
+            fd = reduction.recv_handle(self.conn)
+        return pid, Connection(fd)
+
+    def reap(self, pid):
+        """Wait for an exited worker; (signal number or None, peak RSS MB)."""
+        try:
+            with self.lock:
+                self.conn.send(('reap', pid))
+                return self.conn.recv()
+        except (EOFError, OSError):
+            return None, None
+
+
+def _fork_server():
+    """The fork server, started on first use – call before starting threads."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = _ForkServer()
+        return _server
+
+
+@atexit.register
+def _stop_fork_server():
+    with _server_lock:
+        if _server is not None:
+            _server.conn.close()
+
+
+# ── Parent side ──────────────────────────────────────────────────────────────
+
+class _Worker:
+    def __init__(self):
+        self.server = _fork_server()
+        self.pid, self.conn = self.server.spawn()
+        self.tasks = 0
+
+    def kill(self):
+        """Stop the worker and its process group; see reap()."""
+        for target in (lambda: os.killpg(self.pid, signal.SIGKILL), lambda: os.kill(self.pid, signal.SIGKILL)):
+            try:
+                target()
+                break
+            except OSError:
+                continue
+        return self.reap()
+
+    def reap(self):
+        """Wait for the exited worker; (signal number or None, peak RSS MB)."""
+        self.conn.close()
+        return self.server.reap(self.pid)
+
+
+def _acquire(deadline):
+    """An idle or new worker, or None when none frees up before deadline."""
+    global _live
+    with _cond:
+        while not _idle and _live >= PARSE_WORKERS:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            _cond.wait(remaining)
+        if _idle:
+            return _idle.pop()
+        _live += 1
+    try:
+        return _Worker()
+    except (OSError, EOFError):
+        with _cond:
+            _live -= 1
+            _cond.notify()
+        raise
+
+
+def _release(worker, reusable):
+    global _live
+    with _cond:
+        if reusable and worker.tasks < PARSE_WORKER_MAX_TASKS:
+            _idle.append(worker)
+        else:
+            _live -= 1
+            worker.kill()
+        _cond.notify()
+
+
+@atexit.register
+def _shutdown():
+    with _cond:
+        while _idle:
+            _idle.pop().kill()
+
+
+def _exchange(worker, task, deadline, progress):
+    """Send a task and wait for ('ok' | 'error', value) or ('limit', reason)."""
+    try:
+        worker.conn.send(task)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not worker.conn.poll(remaining):
+                return 'limit', 'timeout'
+            kind, value = worker.conn.recv()
+            if kind != 'progress':
+                return kind, value
+            progress.clear()
+            progress.update(value)
+    except (EOFError, OSError):
+        return 'limit', 'crashed'
+
+
+def run_task(name, *args, timeout, **kwargs):
+    """
+    Run the registered function in a pooled worker and return its result.
+    Raises WorkerLimitError when the task runs out of memory, CPU or the
+    timeout (seconds) – waiting for a free worker counts against the timeout;
+    exceptions raised by the function are re-raised.
+    """
+    global _live
+    if not _available():
+        return _registry[name](*args, **kwargs)
+    t0 = time.monotonic()
+    input_bytes = sum(len(a) for a in args if isinstance(a, (bytes, bytearray)))
+    worker = _acquire(t0 + timeout)
+    if worker is None:
+        # Every worker stayed busy for the whole timeout – the task never started
+        raise WorkerLimitError('deadline', {'elapsedS': round(time.monotonic() - t0, 2), 'peakRssMb': None,
+                                            'inputBytes': input_bytes, 'progress': {}})
+    worker.tasks += 1
+    progress = {}
+    kind, value = _exchange(worker, (name, args, kwargs), t0 + timeout, progress)
+    if kind != 'limit':
+        _release(worker, True)
+        if kind == 'error':
+            raise value
+        return value
+
+    # The worker is unusable: kill it (replaced lazily) and report why
+    with _cond:
+        _live -= 1
+        _cond.notify()
+    sig, peak_mb = worker.kill()
+    reason = value
+    if reason == 'crashed' and sig == signal.SIGXCPU:
+        reason = 'cpu'
+    elif reason == 'crashed' and sig == signal.SIGKILL:
+        reason = 'memory'               # OOM killer
+    stats = {'elapsedS': round(time.monotonic() - t0, 2), 'peakRssMb': peak_mb,
+             'inputBytes': input_bytes,
+             'progress': progress}
+    print(f"[WORKER] {name} {reason}: {stats}", file=sys.stderr)
+    raise WorkerLimitError(reason, stats)
+
+
+def run_batch(func, items, budget):
+    """
+    Call func(item, remaining_s) for every item, at most PARSE_WORKERS at a
+    time, within budget seconds overall. func normally wraps run_task (and
+    any caching) and should bound its own work by remaining_s.
+
+    Yields (index, result, error) in completion order – error is the
+    exception raised by func, or WorkerLimitError('deadline') for items not
+    started in time.
+    """
+    deadline = time.monotonic() + budget
+
+    def call(item):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise WorkerLimitError('deadline', {'elapsedS': round(budget, 2)})
+        return func(item, remaining)
+
+    # In-process fallback: parsers hold the GIL, threads would only interleave
+    threads = max(1, PARSE_WORKERS) if _available() else 1
+    if threads > 1:
+        _fork_server()                  # forked here, before the pool's threads exist
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = {pool.submit(call, item): i for i, item in enumerate(items)}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
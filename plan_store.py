@@ -0,0 +1,141 @@
+"""
+Blob store for parsed plan artifacts (parse-dxf): the stored geometry
+pyramid behind the tiles / query / diff modes and the versioned plan index
+sidecar served for project reopen.
+
+Objects are addressed by flat names ('<sha256>.json', '<sha256>.index.json')
+so the same layout maps onto a local directory or an object-store bucket.
+PlanStore is the interface; FileSystemPlanStore is the implementation used
+on a function instance (and in tests). An object-store backend only has to
+implement get / put / delete / touch.
+
+Store problems never fail a parse – writes log and give up, reads degrade
+to "not found".
+
+On a function instance the directory shares /tmp with the parse cache, so
+FileSystemPlanStore is bounded like its disk tier: one byte budget for all
+objects (plans and index sidecars alike) and a maximum age, least-recently
+used objects evicted first (mtime is the LRU clock; reads refresh it).
+"""
+
+import os
+import re
+import sys
+import time
+import threading
+
+PLAN_STORE_MB = int(os.environ.get('PLAN_STORE_MB', '160'))
+PLAN_STORE_MAX_AGE_H = float(os.environ.get('PLAN_STORE_MAX_AGE_H', '24'))
+
+_NAME_RE = re.compile(r'[0-9A-Za-z][0-9A-Za-z._-]{0,127}')
+
+
+class PlanStore:
+    """Interface: bytes in, bytes out, by object name."""
+
+    def get(self, name):
+        """Stored bytes, or None when missing / unreadable."""
+        raise NotImplementedError
+
+    def put(self, name, data):
+        """Store bytes under name (replacing); returns True on success."""
+        raise NotImplementedError
+
+    def delete(self, name):
+        raise NotImplementedError
+
+    def touch(self, name):
+        """Mark name as recently used; False when it is not stored."""
+        raise NotImplementedError
+
+    @staticmethod
+    def check_name(name):
+        if not _NAME_RE.fullmatch(name) or '..' in name:
+            raise ValueError(f'invalid plan store object name: {name!r}')
+        return name
+
+
+class FileSystemPlanStore(PlanStore):
+    """
+    One file per object under root; writes are atomic (temp file + rename).
+    After each write the directory is trimmed to max_mb and max_age_h.
+    """
+
+    def __init__(self, root, max_mb=PLAN_STORE_MB, max_age_h=PLAN_STORE_MAX_AGE_H):
+        self.root = root
+        self.max_bytes = max_mb * 1024 * 1024
+        self.max_age_s = max_age_h * 3600
+
+    def _path(self, name):
+        return os.path.join(self.root, self.check_name(name))
+
+    def get(self, name):
+        path = self._path(name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path, None)    # mtime doubles as the LRU clock
+            return data
+        except OSError:
+            return None
+
+    def put(self, name, data):
+        path = self._path(name)
+        if len(data) > self.max_bytes:
+            print(f"[PLAN-STORE] {name} ({len(data)} bytes) exceeds the store budget, not stored", file=sys.stderr)
+            return False
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            tmp = os.path.join(self.root, f'.{name}.{os.getpid()}.{threading.get_ident()}.tmp')
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self._evict()
+            return True
+        except OSError as e:
+            print(f"[PLAN-STORE] write of {name} failed: {e}", file=sys.stderr)
+            return False
+
+    def _evict(self):
+        """Drop expired objects, then least-recently-used ones until the directory fits max_bytes."""
+        expired = time.time() - self.max_age_s
+        entries, total = [], 0
+        with os.scandir(self.root) as it:
+            for e in it:
+                if e.name.startswith('.'):
+                    continue        # a write in progress
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                if st.st_mtime < expired:
+                    try:
+                        os.remove(e.path)
+                    except OSError:
+                        pass
+                    continue
+                entries.append((st.st_mtime, st.st_size, e.path))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def delete(self, name):
+        try:
+            os.remove(self._path(name))
+        except OSError:
+            pass
+
+    def touch(self, name):
+        try:
+            os.utime(self._path(name), None)
+            return True
+        except OSError:
+            return False
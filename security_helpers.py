@@ -5,16 +5,33 @@ Layers:
 1. Origin validation (fail-closed in production, blocks cross-origin browser abuse)
 2. Supabase JWT verification (real auth — blocks unauthenticated access to costly endpoints)
 3. Rate limiting (per-IP abuse guard)
-4. Request size limits
+4. Request size limits + bounded upload reading (JSON/base64, raw binary, multipart,
+   gzip/deflate/br Content-Encoding, multi-file batches), compressed JSON
+   responses and streamed NDJSON responses
 5. Required env checks (fail-closed)
 6. Safe error responses (no stack traces)
 """
 
 import os
+import re
 import sys
 import json
+import mmap
 import time
+import zlib
+import base64
+import tempfile
 import traceback
+from urllib.parse import unquote
+
+try:
+    import brotli                       # optional – br is only negotiated when installed
+except ImportError:
+    brotli = None
+# br request bodies need a decoder that can cap its output per call
+# (brotli >= 1.2: process(..., output_buffer_limit) + can_accept_more_data);
+# older bindings inflate a whole chunk at once, so br uploads are refused
+_BROTLI_BOUNDED = hasattr(getattr(brotli, 'Decompressor', None), 'can_accept_more_data')
 
 # ── Environment detection ────────────────────────────────────────────────────
 _VERCEL_ENV = os.environ.get('VERCEL_ENV', '')
@@ -117,7 +134,8 @@ def send_cors_headers(handler, origin=None):
         origin = get_cors_origin(handler)
     handler.send_header('Access-Control-Allow-Origin', origin)
     handler.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
-    handler.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+    handler.send_header('Access-Control-Allow-Headers', 'Content-Type, Content-Encoding, Authorization, X-Upload-Meta')
+    handler.send_header('Access-Control-Expose-Headers', 'X-Parse-Cache')
     handler.send_header('Access-Control-Max-Age', '86400')
 
 
@@ -243,6 +261,374 @@ def check_required_env(handler, *env_vars):
     return True
 
 
+# ── Upload reading ───────────────────────────────────────────────────────────
+# Three request shapes are accepted by the file endpoints:
+#   application/json       {<file field>: base64, ...metadata}  (legacy, +33% transfer;
+#                          also text/plain, or bare base64 as text/plain)
+#   multipart/form-data    file part + plain form fields
+#   anything else          the raw file bytes as the body; metadata as a JSON
+#                          object in the X-Upload-Meta header, percent-encoded
+#                          (encodeURIComponent(JSON.stringify(meta)))
+# Raw and multipart bodies never go through a JSON string or base64 copy, and
+# multipart bodies are streamed to a temp file and scanned through mmap, so
+# only the file part is ever materialized in memory.
+# Any shape may be sent with Content-Encoding: gzip / deflate (/ br when the
+# installed brotli module can bound its output, see _BROTLI_BOUNDED); it is
+# decompressed while streaming and the size limit applies to the decompressed
+# body.
+
+_UPLOAD_CHUNK = 1024 * 1024
+_INFLATE_CHUNK = 64 * 1024              # compressed input per step – bounds inflate bursts
+_MULTIPART_OVERHEAD = 64 * 1024         # headers + small fields on top of the file
+
+
+class UploadError(Exception):
+    """Rejected upload; status + user-facing message for the handler to return."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _too_large(size, max_bytes):
+    return UploadError(413, f'A feltöltött fájl túl nagy ({size // (1024*1024)} MB). '
+                            f'Maximum megengedett méret: {max_bytes // (1024*1024)} MB.')
+
+
+def _header_meta(handler):
+    raw = handler.headers.get('X-Upload-Meta', '')
+    if not raw:
+        return {}
+    try:
+        meta = json.loads(unquote(raw))
+    except ValueError:
+        raise UploadError(400, 'Érvénytelen X-Upload-Meta fejléc.')
+    if not isinstance(meta, dict):
+        raise UploadError(400, 'Érvénytelen X-Upload-Meta fejléc.')
+    return meta
+
+
+def _parse_multipart(fp, size, boundary, file_fields, json_fields, multi=False):
+    """
+    Scan a multipart body written to fp; returns (file_bytes, fields).
+    multi: every file part is kept – file_bytes is a list of (filename, bytes).
+    """
+    file_bytes, fields = ([] if multi else None), {}
+    delim = b'--' + boundary
+    with mmap.mmap(fp.fileno(), size, access=mmap.ACCESS_READ) as mm:
+        pos = mm.find(delim)
+        while pos >= 0:
+            pos += len(delim)
+            if mm[pos:pos + 2] == b'--':
+                break                                   # closing delimiter
+            head_end = mm.find(b'\r\n\r\n', pos)
+            if head_end < 0:
+                break
+            headers = mm[pos:head_end].decode('utf-8', errors='replace')
+            body_start = head_end + 4
+            nxt = mm.find(b'\r\n' + delim, body_start)
+            if nxt < 0:
+                raise UploadError(400, 'Hibás multipart kérés.')
+            disp = re.search(r'content-disposition:[^\r\n]*', headers, re.I)
+            disp = disp.group(0) if disp else ''
+            name = re.search(r'\bname="([^"]*)"', disp)
+            name = name.group(1) if name else ''
+            filename = re.search(r'\bfilename="([^"]*)"', disp)
+            if multi and (name in file_fields or filename):
+                label = filename.group(1) if filename and filename.group(1) else f'{name or "file"}-{len(file_bytes) + 1}'
+                file_bytes.append((label, mm[body_start:nxt]))
+            elif file_bytes is None and (name in file_fields or filename):
+                file_bytes = mm[body_start:nxt]
+                if filename and filename.group(1):
+                    fields.setdefault('filename', filename.group(1))
+            elif name:
+                value = mm[body_start:nxt].decode('utf-8', errors='replace')
+                if name in json_fields:
+                    try:
+                        value = json.loads(value)
+                    except ValueError:
+                        raise UploadError(400, f'Érvénytelen JSON mező: {name}')
+                fields[name] = value
+            pos = nxt + 2
+    return file_bytes, fields
+
+
+class _Inflater:
+    """Streaming decoder for one Content-Encoding with a per-call output cap."""
+
+    def __init__(self, encoding):
+        self._br = None
+        if encoding == 'gzip' or encoding == 'x-gzip':
+            self._z = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            self._z = None                      # zlib-wrapped or raw – decided on first bytes
+        elif encoding == 'br' and _BROTLI_BOUNDED:
+            self._br = brotli.Decompressor()
+        else:
+            raise UploadError(415, f'Nem támogatott Content-Encoding: {encoding}')
+        self._deflate = encoding == 'deflate'
+
+    def feed(self, data, max_out):
+        """Decompress data; returns at most max_out + 1 bytes so overflow is detectable."""
+        if self._br is not None:
+            out = [self._br.process(data, output_buffer_limit=max_out + 1)]
+            n = len(out[0])
+            while n <= max_out and not self._br.can_accept_more_data():
+                out.append(self._br.process(b'', output_buffer_limit=max_out + 1 - n))
+                if not out[-1]:
+                    break
+                n += len(out[-1])
+            return b''.join(out)
+        if self._z is None:
+            # RFC 9110 'deflate' is zlib-wrapped, but some clients send raw deflate
+            raw = len(data) >= 2 and (data[0] * 256 + data[1]) % 31 != 0
+            self._z = zlib.decompressobj(-zlib.MAX_WBITS if raw else zlib.MAX_WBITS)
+        out = [self._z.decompress(data, max_out + 1)]
+        n = len(out[0])
+        while self._z.unconsumed_tail and n <= max_out:
+            out.append(self._z.decompress(self._z.unconsumed_tail, max_out + 1 - n))
+            n += len(out[-1])
+        return b''.join(out)
+
+
+def _iter_body(handler, length, limit):
+    """
+    Yield the request body in chunks, decoding Content-Encoding on the fly.
+    Raises UploadError(413) as soon as the (decoded) body exceeds limit.
+    """
+    encoding = (handler.headers.get('Content-Encoding', '') or '').strip().lower()
+    if encoding in ('', 'identity'):
+        remaining = length
+        while remaining > 0:
+            chunk = handler.rfile.read(min(_UPLOAD_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+        return
+    inflater = _Inflater(encoding)
+    remaining, total = length, 0
+    try:
+        while remaining > 0:
+            chunk = handler.rfile.read(min(_INFLATE_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            out = inflater.feed(chunk, limit - total)
+            total += len(out)
+            if total > limit:
+                raise UploadError(413, f'A kicsomagolt kérés meghaladja a(z) {limit // (1024*1024)} MB-os limitet.')
+            if out:
+                yield out
+    except (zlib.error, getattr(brotli, 'error', zlib.error)) as e:
+        raise UploadError(400, f'Hibás tömörített kérés ({encoding}): {e}')
+
+
+def _read_multipart(handler, length, limit, content_type, file_fields, json_fields, multi=False):
+    m = re.search(r'boundary="?([^";]+)"?', content_type)
+    if not m:
+        raise UploadError(400, 'Hiányzó multipart boundary.')
+    with tempfile.TemporaryFile() as fp:
+        for chunk in _iter_body(handler, length, limit):
+            fp.write(chunk)
+        fp.flush()
+        size = fp.tell()
+        if not size:
+            raise UploadError(400, 'Üres multipart kérés.')
+        file_bytes, meta = _parse_multipart(fp, size, m.group(1).encode('latin-1'),
+                                            file_fields, json_fields, multi)
+    return file_bytes, {**_header_meta(handler), **meta}
+
+
+def read_upload(handler, max_bytes, file_fields=('data',), json_fields=()):
+    """
+    Read a file upload in any of the accepted shapes, enforcing max_bytes on
+    the transferred body, the decompressed body and the decoded file.
+
+    file_fields: JSON / multipart field names that may carry the file
+    json_fields: multipart fields whose text value is JSON (e.g. legend_context)
+
+    Returns (file_bytes, meta) – meta holds the remaining metadata fields.
+    Raises UploadError for oversize / malformed requests.
+    """
+    length = int(handler.headers.get('Content-Length', 0) or 0)
+    content_type = handler.headers.get('Content-Type', '') or ''
+    ctype = content_type.split(';')[0].strip().lower()
+
+    if ctype == 'multipart/form-data':
+        limit = max_bytes + _MULTIPART_OVERHEAD
+        if length > limit:
+            raise _too_large(length, max_bytes)
+        file_bytes, meta = _read_multipart(handler, length, limit, content_type, file_fields, json_fields)
+    elif ctype in ('application/json', 'text/plain', ''):
+        # Legacy JSON + base64 path (base64 is ~4/3 of the file size).
+        # text/plain is what fetch() sends for a string body; a non-JSON text
+        # body is the bare base64 of the file.
+        limit = max_bytes * 4 // 3 + _MULTIPART_OVERHEAD
+        if length > limit:
+            raise _too_large(length * 3 // 4, max_bytes)
+        body = b''.join(_iter_body(handler, length, limit))
+        if ctype == 'text/plain' and not body.lstrip().startswith(b'{'):
+            file_bytes, meta = (base64.b64decode(body) if body.strip() else None), _header_meta(handler)
+        else:
+            payload = json.loads(body or b'{}')
+            del body
+            if not isinstance(payload, dict):
+                raise UploadError(400, 'Érvénytelen JSON kérés.')
+            b64 = next((payload[f] for f in file_fields if payload.get(f)), '')
+            for f in file_fields:
+                payload.pop(f, None)
+            file_bytes = base64.b64decode(b64) if b64 else None
+            meta = payload
+    else:
+        # Raw body: the file itself
+        if length > max_bytes:
+            raise _too_large(length, max_bytes)
+        file_bytes = b''.join(_iter_body(handler, length, max_bytes)) or None
+        meta = _header_meta(handler)
+
+    if file_bytes is not None and len(file_bytes) > max_bytes:
+        raise _too_large(len(file_bytes), max_bytes)
+    return file_bytes, meta
+
+
+def read_batch_upload(handler, max_file_bytes, max_total_bytes, max_files,
+                      file_fields=('files',), json_fields=()):
+    """
+    Read several files sent in one request (batch modes): multipart with one
+    part per file, or JSON {files: [{name, data: base64}, …], …}.
+    max_total_bytes bounds the whole body, max_file_bytes each file.
+
+    Returns ([(name, file_bytes), …], meta). Raises UploadError.
+    """
+    length = int(handler.headers.get('Content-Length', 0) or 0)
+    content_type = handler.headers.get('Content-Type', '') or ''
+    ctype = content_type.split(';')[0].strip().lower()
+
+    if ctype == 'multipart/form-data':
+        limit = max_total_bytes + _MULTIPART_OVERHEAD
+        if length > limit:
+            raise _too_large(length, max_total_bytes)
+        files, meta = _read_multipart(handler, length, limit, content_type, file_fields, json_fields, multi=True)
+    elif ctype in ('application/json', 'text/plain', ''):
+        limit = max_total_bytes * 4 // 3 + _MULTIPART_OVERHEAD
+        if length > limit:
+            raise _too_large(length * 3 // 4, max_total_bytes)
+        payload = json.loads(b''.join(_iter_body(handler, length, limit)) or b'{}')
+        items = payload.pop('files', None) if isinstance(payload, dict) else None
+        if not isinstance(items, list):
+            raise UploadError(400, 'Érvénytelen kötegelt kérés (files: [{name, data}, …]).')
+        files = []
+        for i, item in enumerate(items):
+            if not isinstance(item, dict) or not item.get('data'):
+                raise UploadError(400, f'Hiányzó fájltartalom: files[{i}].')
+            files.append((str(item.get('name') or f'file-{i + 1}'), base64.b64decode(item['data'])))
+        meta = payload
+    else:
+        raise UploadError(415, 'Kötegelt feltöltés csak multipart vagy JSON formában küldhető.')
+
+    if not files:
+        raise UploadError(400, 'Nincs feltöltött fájl.')
+    if len(files) > max_files:
+        raise UploadError(413, f'Egy kötegben legfeljebb {max_files} fájl küldhető.')
+    for _, data in files:
+        if len(data) > max_file_bytes:
+            raise _too_large(len(data), max_file_bytes)
+    return files, meta
+
+
+# ── JSON responses ───────────────────────────────────────────────────────────
+# Parse results (lineGeom / polylineGeom / inserts) are large and repetitive
+# JSON; they are compressed when the client's Accept-Encoding allows it.
+
+_COMPRESS_MIN_BYTES = 1024
+_GZIP_LEVEL = 6
+_BROTLI_QUALITY = 5                     # ~gzip speed, smaller output
+_ENCODING_PREFERENCE = ('br', 'gzip', 'deflate')
+
+
+def _negotiate_encoding(accept_encoding):
+    """Pick the best supported coding from an Accept-Encoding header, or None."""
+    best, best_q = None, 0.0
+    for item in (accept_encoding or '').lower().split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip()
+        q = 1.0
+        m = re.search(r'q\s*=\s*([0-9.]+)', params)
+        if m:
+            try:
+                q = float(m.group(1))
+            except ValueError:
+                continue
+        candidates = _ENCODING_PREFERENCE if name == '*' else (name,)
+        for enc in candidates:
+            if enc not in _ENCODING_PREFERENCE or (enc == 'br' and brotli is None):
+                continue
+            if q > best_q or (q == best_q and best is not None
+                              and _ENCODING_PREFERENCE.index(enc) < _ENCODING_PREFERENCE.index(best)):
+                best, best_q = enc, q
+    return best
+
+
+def compress_body(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=_BROTLI_QUALITY)
+    if encoding == 'gzip':
+        z = zlib.compressobj(_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return z.compress(body) + z.flush()
+    if encoding == 'deflate':
+        return zlib.compress(body, _GZIP_LEVEL)
+    return body
+
+
+def send_json(handler, status, data, headers=None, ensure_ascii=True):
+    """
+    Write a JSON response (dict, or already-serialized bytes) with CORS headers,
+    compressed per the request's Accept-Encoding. headers: extra response headers.
+    """
+    body = data if isinstance(data, bytes) else json.dumps(data, ensure_ascii=ensure_ascii).encode()
+    encoding = None
+    if len(body) >= _COMPRESS_MIN_BYTES:
+        encoding = _negotiate_encoding(handler.headers.get('Accept-Encoding', ''))
+        if encoding:
+            body = compress_body(body, encoding)
+    handler.send_response(status)
+    send_cors_headers(handler)
+    handler.send_header('Content-Type', 'application/json')
+    handler.send_header('Vary', 'Accept-Encoding')
+    if encoding:
+        handler.send_header('Content-Encoding', encoding)
+    handler.send_header('Content-Length', str(len(body)))
+    for k, v in (headers or {}).items():
+        if v is not None:
+            handler.send_header(k, v)
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+def send_ndjson(handler, status, lines, headers=None):
+    """
+    Stream newline-delimited JSON: one object per line from the lines
+    iterable, flushed as it is produced (batch modes report each file as it
+    completes). No Content-Length – the connection closes after the last line.
+    """
+    handler.send_response(status)
+    send_cors_headers(handler)
+    handler.send_header('Content-Type', 'application/x-ndjson')
+    handler.send_header('Cache-Control', 'no-store')
+    handler.send_header('X-Accel-Buffering', 'no')     # proxies: do not hold back the stream
+    handler.send_header('Connection', 'close')
+    for k, v in (headers or {}).items():
+        if v is not None:
+            handler.send_header(k, v)
+    handler.end_headers()
+    handler.close_connection = True
+    for obj in lines:
+        handler.wfile.write((obj if isinstance(obj, bytes) else json.dumps(obj, ensure_ascii=False).encode()) + b'\n')
+        handler.wfile.flush()
+
+
 # ── Safe error response ──────────────────────────────────────────────────────
 
 def safe_error_response(handler, status_code, error_msg, exc=None):
@@ -0,0 +1,31 @@
+"""
+pytest setup for the Python serverless handlers (api/*.py) and their shared
+root modules.
+
+The modules read their configuration from the environment at import, so the
+stores (plan store, parse cache) are pointed at a throwaway directory and the
+worker pool / result cache are switched off before anything is imported.
+Tests that need them enable them locally (monkeypatch). Requests go through
+the local-dev auth path (no Supabase configuration, no VERCEL_ENV).
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_TMP = tempfile.mkdtemp(prefix='takeoffpro-tests-')
+
+os.environ.setdefault('DXF_TILE_DIR', os.path.join(_TMP, 'tiles'))
+os.environ.setdefault('PARSE_CACHE_DIR', os.path.join(_TMP, 'cache'))
+os.environ.setdefault('PARSE_CACHE_DISABLED', '1')
+os.environ.setdefault('PARSE_WORKER_DISABLED', '1')
+
+for path in (ROOT, os.path.dirname(os.path.abspath(__file__))):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_TMP, ignore_errors=True)
@@ -0,0 +1,527 @@
+"""
+Synthetic DWG writer for the dwg_reader tests: bit-level object encoding for
+R2000 / R2004 / R2010 / R2013 / R2018, the R2000 flat file layout and the
+R2004-style paged container (with a test encoder for its LZ77 compression).
+
+compress() is a simple greedy encoder (it picks among the opcode forms at
+random to exercise the decoder), slow on large inputs – keep drawings small.
+"""
+
+import math
+import random
+import struct
+
+R2000, R2004, R2007, R2010, R2013, R2018 = range(6)
+VERS = {R2000: b'AC1015', R2004: b'AC1018', R2010: b'AC1024', R2013: b'AC1027', R2018: b'AC1032'}
+
+
+class BitWriter:
+    """MSB-first bit stream with the DWG bit-coded types (B, BB, BS, BL, BD, DD, H, …)."""
+
+    def __init__(self):
+        self.bits = []
+
+    def put(self, v, n):
+        for i in range(n - 1, -1, -1):
+            self.bits.append((v >> i) & 1)
+
+    def b(self, v): self.put(1 if v else 0, 1)
+    def bb(self, v): self.put(v, 2)
+    def rc(self, v): self.put(v & 0xFF, 8)
+    def raw(self, bs):
+        for c in bs: self.rc(c)
+    def rs(self, v): self.raw(struct.pack('<H', v))
+    def rl(self, v): self.raw(struct.pack('<I', v))
+    def rd(self, v): self.raw(struct.pack('<d', v))
+    def bs(self, v):
+        if v == 0: self.bb(2)
+        elif v == 256: self.bb(3)
+        elif v < 256: self.bb(1); self.rc(v)
+        else: self.bb(0); self.rs(v)
+    def bl(self, v):
+        if v == 0: self.bb(2)
+        elif v < 256: self.bb(1); self.rc(v)
+        else: self.bb(0); self.rl(v)
+    def bll(self, v):
+        n = (v.bit_length() + 7) // 8
+        self.put(n, 3); self.raw(v.to_bytes(n, 'little'))
+    def bd(self, v):
+        if v == 1.0: self.bb(1)
+        elif v == 0.0: self.bb(2)
+        else: self.bb(0); self.rd(v)
+    def dd(self, v, default):
+        if v == default: self.bb(0); return
+        a, d = struct.pack('<d', v), struct.pack('<d', default)
+        if a[4:] == d[4:]:
+            self.bb(1); self.raw(a[0:4])
+        elif a[6:] == d[6:]:
+            self.bb(2); self.raw(a[4:6]); self.raw(a[0:4])
+        else:
+            self.bb(3); self.rd(v)
+    def bd3(self, p): [self.bd(c) for c in p]
+    def umc(self, v):
+        while True:
+            byte = v & 0x7F; v >>= 7
+            if v: self.rc(byte | 0x80)
+            else: self.rc(byte); return
+    def ot(self, t):
+        if t < 256: self.bb(0); self.rc(t)
+        elif 0x1F0 <= t < 0x1F0 + 256: self.bb(1); self.rc(t - 0x1F0)
+        else: self.bb(2); self.rs(t)
+    def h(self, code, value):
+        n = (value.bit_length() + 7) // 8
+        self.rc(code << 4 | n); self.raw(value.to_bytes(n, 'big') if n else b'')
+    def tv(self, s, codec):
+        bs = s.encode(codec) + b'\0'
+        self.bs(len(bs)); self.raw(bs)
+    def tu(self, s):
+        self.bs(len(s) + 1); self.raw((s + '\0').encode('utf-16-le'))
+    def extend(self, other): self.bits.extend(other.bits)
+    def tobytes(self):
+        bits = self.bits + [0] * (-len(self.bits) % 8)
+        return bytes(int(''.join(map(str, bits[i:i + 8])), 2) for i in range(0, len(bits), 8))
+
+
+def ms(n):
+    """Modular short: the object size prefix."""
+    if n < 0x8000: return struct.pack('<H', n)
+    return struct.pack('<HH', (n & 0x7FFF) | 0x8000, n >> 15)
+
+
+def href(w, own, target, style):
+    """write a handle reference using various codes"""
+    if style == 'abs' or target == own: w.h(5, target)
+    elif target == own + 1: w.h(6, 0)
+    elif target == own - 1: w.h(8, 0)
+    elif target > own: w.h(0xA, target - own)
+    else: w.h(0xC, own - target)
+
+
+def build_object(ver, otype, own, write_data, write_handles, strings=None, codec='cp1252'):
+    """write_data(w) after common header; write_handles(h)"""
+    d = BitWriter()
+    if ver >= R2010:
+        d.ot(otype)
+    else:
+        d.bs(otype)
+    head_after_type = BitWriter()
+    head_after_type.h(0, own)
+    # EED: one dummy item
+    head_after_type.bs(3); head_after_type.h(5, 0x12); head_after_type.raw(b'abc')
+    head_after_type.bs(0)
+    write_data(head_after_type)
+    h = BitWriter(); write_handles(h)
+    if ver >= R2007:
+        s = BitWriter()
+        if strings:
+            for t in strings: s.tu(t)
+            head_after_type.extend(s)
+            head_after_type.rs(len(s.bits))
+            head_after_type.b(1)
+        else:
+            head_after_type.b(0)
+    if ver >= R2010:
+        # data = UMC(hs) + type + rest; hs = total*8 - databits
+        for umc_len in range(1, 5):
+            databits = umc_len * 8 + len(d.bits) + len(head_after_type.bits)
+            total = (databits + len(h.bits) + 7) // 8
+            hs = total * 8 - databits
+            u = BitWriter(); u.umc(hs)
+            if len(u.bits) == umc_len * 8:
+                break
+        full = BitWriter(); full.extend(u); full.extend(d); full.extend(head_after_type); full.extend(h)
+        body = full.tobytes()
+        assert len(body) == total
+    else:
+        bitsize = len(d.bits) + 32 + len(head_after_type.bits)
+        full = BitWriter(); full.extend(d); full.rl(bitsize); full.extend(head_after_type); full.extend(h)
+        body = full.tobytes()
+    return ms(len(body)) + body + b'\x00\x00'
+
+
+def entity(ver, otype, own, layer, owner, write_fields, extra_handles=None, ltype=0, style='abs'):
+    entmode = 0 if owner is not None else 2
+    def data(w):
+        w.b(0)              # no graphic
+        w.bb(entmode)
+        w.bl(1)             # one reactor
+        if ver >= R2004: w.b(0)     # xdic present
+        if ver >= R2013: w.b(0)
+        if ver == R2000: w.b(0)     # nolinks = 0 → prev/next present
+        if ver >= R2004:
+            w.bs(0x8000 | 0x2000 | 7); w.bl(0xFF00FF); w.bl(0x02000080)
+        else:
+            w.bs(7)
+        w.bd(1.0)
+        w.bb(ltype)
+        w.bb(0)
+        if ver >= R2007: w.bb(0); w.rc(0)
+        if ver >= R2010: w.b(1); w.b(0); w.b(0)
+        w.bs(0); w.rc(0x1D)
+        write_fields(w)
+    def handles(h):
+        if owner is not None: href(h, own, owner, style)
+        h.h(4, 0x99)        # reactor
+        h.h(3, 0x98)        # xdic
+        if ver == R2000: h.h(4, 0); h.h(4, 0)
+        href(h, own, layer, style)
+        if ltype == 3: h.h(5, 0x14)
+        if ver >= R2010: h.h(5, 0x33)   # full visual style
+        if extra_handles: extra_handles(h)
+    return build_object(ver, otype, own, data, handles)
+
+
+def table_entry(ver, otype, own, name, codec, base=(0.0, 0.0), units=None):
+    def data(w):
+        w.bl(0)
+        if ver >= R2004: w.b(1)
+        if ver >= R2013: w.b(0)
+        if ver < R2007: w.tv(name, codec)
+        if otype == 49:
+            w.b(0); w.bs(0); w.b(0)
+            w.b(0); w.b(0); w.b(0); w.b(0)
+            w.b(0)
+            if ver >= R2004: w.bl(3)
+            w.bd3((base[0], base[1], 0.0))
+            if ver < R2007: w.tv('', codec)
+            w.rc(5); w.rc(0)
+            if ver < R2007: w.tv('leírás', codec)
+            w.bl(3); w.raw(b'PNG')
+            if ver >= R2007: w.bs(units or 0); w.b(1); w.rc(0)
+        else:
+            w.b(0); w.bs(0); w.b(0); w.bs(0); w.bs(7)
+    strings = [name, '', 'leírás'] if otype == 49 else [name]
+    return build_object(ver, otype, own, data, lambda h: h.h(4, 1), strings if ver >= R2007 else None)
+
+
+def insert_obj(ver, own, layer, owner, block, x, y, sx=1.0, sy=1.0, rot=0.0, minsert=None, attribs=False, style='abs'):
+    def f(w):
+        w.bd3((x, y, 0.0))
+        if sx == 1.0 and sy == 1.0: w.bb(3)
+        elif sx == 1.0: w.bb(1); w.dd(sy, 1.0); w.dd(1.0, 1.0)
+        elif sx == sy: w.bb(2); w.rd(sx)
+        else: w.bb(0); w.rd(sx); w.dd(sy, sx); w.dd(sx, sx)
+        w.bd(rot)
+        w.bd3((0.0, 0.0, 1.0))
+        w.b(attribs)
+        if ver >= R2004 and attribs: w.bl(2)
+        if minsert: w.bs(minsert[0]); w.bs(minsert[1]); w.bd(10.0); w.bd(5.0)
+    def extra(h):
+        href(h, own, block, style)
+        if attribs:
+            if ver >= R2004: h.h(3, 0x500); h.h(3, 0x501)
+            else: h.h(4, 0x500); h.h(4, 0x501)
+        h.h(3, 0x502)
+    return entity(ver, 8 if minsert else 7, own, layer, owner, f, extra, ltype=3 if attribs else 0, style=style)
+
+
+def line_obj(ver, own, layer, owner, x1, y1, x2, y2, z=None):
+    def f(w):
+        w.b(z is None)
+        w.rd(x1); w.dd(x2, x1); w.rd(y1); w.dd(y2, y1)
+        if z is not None: w.rd(z); w.dd(z, z)
+        w.b(1); w.b(1)
+    return entity(ver, 19, own, layer, owner, f)
+
+
+def arc_obj(ver, own, layer, owner, cx, cy, r, a0=None, a1=None):
+    def f(w):
+        w.bd3((cx, cy, 0.0)); w.bd(r); w.b(1); w.b(1)
+        if a0 is not None: w.bd(a0); w.bd(a1)
+    return entity(ver, 17 if a0 is not None else 18, own, layer, owner, f)
+
+
+def lwpoly_obj(ver, own, layer, owner, verts, closed=False):
+    def f(w):
+        flag = (512 if closed else 0) | (16 if any(v[2] for v in verts) else 0) | 8 | 32
+        if ver >= R2010: flag |= 1024
+        w.bs(flag)
+        w.bd(2.5)               # elevation
+        w.bl(len(verts))
+        if flag & 16: w.bl(len(verts))
+        if flag & 1024: w.bl(len(verts))
+        w.bl(1)                 # widths
+        w.rd(verts[0][0]); w.rd(verts[0][1])
+        px, py = verts[0][0], verts[0][1]
+        for v in verts[1:]:
+            w.dd(v[0], px); w.dd(v[1], py); px, py = v[0], v[1]
+        if flag & 16:
+            for v in verts: w.bd(v[2])
+        if flag & 1024:
+            for k in range(len(verts)): w.bl(k)
+        w.bd(0.1); w.bd(0.2)
+    return entity(ver, 77, own, layer, owner, f)
+
+
+def other_obj(ver, own, otype=42):
+    def data(w):
+        w.bl(0)
+        if ver >= R2004: w.b(0)
+        if ver >= R2013: w.b(0)
+        w.raw(b'junkdata')
+    return build_object(ver, otype, own, data, lambda h: h.h(4, 1))
+
+
+def object_map(entries):
+    """entries: sorted [(handle, offset)]"""
+    out = bytearray()
+    page = bytearray(); lh = lo = 0
+    def mcs(v):
+        neg = v < 0; v = abs(v); bs = []
+        while True:
+            if v < 0x40:
+                bs.append(v | (0x40 if neg else 0)); break
+            bs.append((v & 0x7F) | 0x80); v >>= 7
+        return bytes(bs)
+    def umcb(v):
+        bs = []
+        while True:
+            byte = v & 0x7F; v >>= 7
+            if v: bs.append(byte | 0x80)
+            else: bs.append(byte); return bytes(bs)
+    for hnd, off in entries:
+        item = umcb(hnd - lh) + mcs(off - lo)
+        if len(page) + len(item) > 2030:
+            out += struct.pack('>H', len(page) + 2) + page + b'\x12\x34'
+            page = bytearray(); lh = lo = 0
+            item = umcb(hnd - lh) + mcs(off - lo)
+        page += item; lh, lo = hnd, off
+    out += struct.pack('>H', len(page) + 2) + page + b'\x12\x34'
+    out += struct.pack('>H', 2) + b'\x12\x34'
+    return bytes(out)
+
+
+# ── R2004 compression (test encoder) ─────────────────────────────────────────
+
+def _lit_len_bytes(n):
+    assert n >= 4
+    if n <= 18: return bytes([n - 3])
+    v = n - 3 - 0x0F
+    out = [0]
+    while v > 0xFF: out.append(0); v -= 0xFF
+    out.append(v)
+    return bytes(out)
+
+
+def _long_len(v):
+    assert v >= 1
+    if v <= 0xFF: return bytes([v])
+    v -= 0xFF
+    out = [0]
+    while v > 0xFF: out.append(0); v -= 0xFF
+    out.append(v)
+    return bytes(out)
+
+
+def compress(data, seed=0):
+    rnd = random.Random(seed)
+    n = len(data)
+    tokens = []  # ('lit', bytes) / ('match', dist, count)
+    i = 0; lit_start = 0
+    table = {}
+    while i < n:
+        if i >= 4 and i + 3 <= n:
+            key = data[i:i + 3]
+            cand = table.get(key)
+            if cand is not None and i - cand <= 0x3FFF + 0xFFFF - 10:
+                dist = i - cand
+                c = 0
+                while i + c < n and data[cand + c] == data[i + c] and c < 600:
+                    c += 1
+                if c >= 3 and not (dist > 0x4000 and c < 10) and rnd.random() < 0.95:
+                    if lit_start < i or not tokens:
+                        tokens.append(('lit', data[lit_start:i]))
+                    tokens.append(('match', dist, c))
+                    for k in range(i, i + c):
+                        if k + 3 <= n: table[data[k:k + 3]] = k
+                    i += c; lit_start = i
+                    continue
+            table[key] = i
+        i += 1
+    if lit_start < n:
+        tokens.append(('lit', data[lit_start:n]))
+    # Merge: ensure first literal >= 4 (or whole data)
+    out = bytearray()
+    k = 0
+    if tokens and tokens[0][0] == 'lit':
+        first = tokens[0][1]
+        if len(first) < 4:
+            raise ValueError('first literal too short')
+        out += _lit_len_bytes(len(first)) + first
+        k = 1
+    while k < len(tokens):
+        t = tokens[k]
+        assert t[0] == 'match'
+        nxt = tokens[k + 1][1] if k + 1 < len(tokens) and tokens[k + 1][0] == 'lit' else b''
+        # split literal >3 that follow? fine – use literal-length
+        dist, c = t[1], t[2]
+        o = dist - 1
+        litbits = len(nxt) if 1 <= len(nxt) <= 3 else 0
+        if 3 <= c <= 14 and o <= 0x3FF and rnd.random() < 0.7:
+            out += bytes([((c + 1) << 4) | ((o & 3) << 2) | litbits, o >> 2])
+        elif o <= 0x3FFF:
+            if 3 <= c <= 33 and rnd.random() < 0.8:
+                out.append(c + 0x1E)
+            else:
+                if c < 0x22:
+                    # must use 0x21..0x3F form
+                    out.append(c + 0x1E)
+                else:
+                    out.append(0x20); out += _long_len(c - 0x21)
+            out += bytes([((o & 0x3F) << 2) | litbits, o >> 6])
+        else:
+            o2 = o - 0x3FFF
+            assert o2 <= 0xFFFF
+            if 4 <= c <= 17 and rnd.random() < 0.6:
+                out.append(0x10 | (c - 2))
+            else:
+                assert c >= 10
+                out.append(0x10); out += _long_len(c - 9)
+            out += bytes([((o2 & 0x3F) << 2) | litbits, o2 >> 6])
+        if nxt:
+            if not litbits:
+                out += _lit_len_bytes(len(nxt))
+            out += nxt
+            k += 2
+        else:
+            k += 1
+    out.append(0x11)
+    return bytes(out)
+
+
+def _xor_seq(bs):
+    out = bytearray(len(bs)); seed = 1
+    for i, c in enumerate(bs):
+        seed = (seed * 0x343FD + 0x269EC3) & 0xFFFFFFFF
+        out[i] = c ^ (seed >> 16) & 0xFF
+    return bytes(out)
+
+
+def container_2004(ver, sections, codepage=30, page_size=0x7400, seed=0):
+    """sections: [(name, bytes)] → file bytes"""
+    body = bytearray()   # from 0x100
+    page_entries = []    # (number, size) in file order
+    number = 1
+    descs = []
+    for sec_id, (name, data) in enumerate(sections, 1):
+        pages = []
+        for off in range(0, max(len(data), 1), page_size):
+            chunk = data[off:off + page_size]
+            comp = compress(bytes(chunk), seed + off)
+            addr = 0x100 + len(body)
+            mask = 0x4164536B ^ addr
+            head = [0x4163043B, sec_id, len(comp), len(chunk), off, 0, 0, 0]
+            page = struct.pack('<8I', *[v ^ mask for v in head]) + comp
+            page += b'\0' * (-len(page) % 32)
+            body += page
+            page_entries.append((number, len(page)))
+            pages.append((number, len(comp), off))
+            number += 1
+        descs.append((name, len(data), pages, sec_id))
+    # a gap entry for realism
+    gap = b'\0' * 64
+    body += gap
+    page_entries.append((-1, len(gap)))
+    # section info
+    info = struct.pack('<5I', len(descs), 2, 0x7400, 0, len(descs))
+    for name, size, pages, sec_id in descs:
+        info += struct.pack('<Q6I', size, len(pages), page_size, 1, 2, sec_id, 0)
+        info += name.encode('latin-1').ljust(64, b'\0')
+        for pn, cs, off in pages:
+            info += struct.pack('<IIQ', pn, cs, off)
+    comp = compress(info + b'\0' * 8, seed + 1)
+    sm_addr = 0x100 + len(body)
+    sm_page = struct.pack('<5I', 0x4163003B, len(info) + 8, len(comp), 2, 0) + comp
+    sm_page += b'\0' * (-len(sm_page) % 32)
+    body += sm_page
+    sm_number = number; number += 1
+    page_entries.append((sm_number, len(sm_page)))
+    # page map (its own entry included)
+    pm_number = number
+    pm_addr = 0x100 + len(body)
+    entries = page_entries + [(pm_number, 0)]
+    for _ in range(3):
+        raw = b''.join(struct.pack('<iI', a, b) + (b'\0' * 16 if a < 0 else b'') for a, b in entries)
+        comp = compress(raw + b'\0' * 4, seed + 2)
+        pm_page = struct.pack('<5I', 0x41630E3B, len(raw), len(comp), 2, 0) + comp
+        pm_page += b'\0' * (-len(pm_page) % 32)
+        entries[-1] = (pm_number, len(pm_page))
+    body += pm_page
+    header = bytearray(0x100)
+    header[0:6] = VERS[ver]
+    struct.pack_into('<H', header, 0x13, codepage)
+    hdr = bytearray(0x6C)
+    hdr[0:12] = b'AcFssFcAJMB\0'
+    struct.pack_into('<I', hdr, 0x0C, 0); struct.pack_into('<I', hdr, 0x10, 0x6C)
+    struct.pack_into('<Q', hdr, 0x54, pm_addr - 0x100)
+    struct.pack_into('<I', hdr, 0x50, pm_number)
+    struct.pack_into('<I', hdr, 0x5C, sm_number)
+    header[0x80:0x80 + 0x6C] = _xor_seq(bytes(hdr))
+    return bytes(header) + bytes(body)
+
+
+def build(ver, objects, codepage=30):
+    """objects: [(handle, object bytes)] → DWG file of release ver"""
+    if ver == R2000:
+        base = 0x100
+        blob = bytearray(); entries = []
+        for hnd, ob in objects:
+            entries.append((hnd, base + len(blob))); blob += ob
+        omap = object_map(sorted(entries))
+        head = bytearray(base)
+        head[0:6] = VERS[ver]
+        struct.pack_into('<H', head, 0x13, codepage)
+        struct.pack_into('<I', head, 0x15, 3)
+        struct.pack_into('<BII', head, 0x19, 0, 0x60, 4)
+        struct.pack_into('<BII', head, 0x19 + 9, 1, 0x64, 4)
+        struct.pack_into('<BII', head, 0x19 + 18, 2, base + len(blob), len(omap))
+        return bytes(head) + bytes(blob) + omap
+    blob = bytearray(b'\xca\x0d\x00\x00'); entries = []
+    for hnd, ob in objects:
+        entries.append((hnd, len(blob))); blob += ob
+    omap = object_map(sorted(entries))
+    return container_2004(ver, [('AcDb:Header', b'header-vars' * 5), ('AcDb:Handles', omap),
+                                ('AcDb:AcDbObjects', bytes(blob))], codepage)
+
+
+def sample(ver, n_extra=0, codepage=28):
+    """
+    The reference drawing of the tests: three layers, a nested block, INSERT /
+    MINSERT, LINE, LWPOLYLINE with a bulge, ARC and CIRCLE, plus n_extra
+    line + insert + non-entity triples.
+    """
+    codec = {28: 'cp1250', 30: 'cp1252'}[codepage]
+    L0, LV, LK = 0x10, 0x11, 0x12
+    MS, PS, DUG, LAMPA, PANEL = 0x1F, 0x20, 0x30, 0x31, 0x32
+    objs = [
+        (L0, table_entry(ver, 51, L0, '0', codec)),
+        (LV, table_entry(ver, 51, LV, 'VILLAMOS', codec)),
+        (LK, table_entry(ver, 51, LK, 'KÁBEL_ŐŰ', codec)),
+        (MS, table_entry(ver, 49, MS, '*Model_Space', codec, units=4)),
+        (PS, table_entry(ver, 49, PS, '*Paper_Space', codec)),
+        (DUG, table_entry(ver, 49, DUG, 'DUGALJ', codec, base=(1.0, 2.0))),
+        (LAMPA, table_entry(ver, 49, LAMPA, 'LÁMPA', codec)),
+        (PANEL, table_entry(ver, 49, PANEL, 'PANEL', codec)),
+        (0x40, other_obj(ver, 0x40)),
+        # nested: PANEL contains 2 DUGALJ on layer 0 and a 100-long line on layer 0
+        (0x41, insert_obj(ver, 0x41, L0, PANEL, DUG, 1, 1, style='rel')),
+        (0x42, insert_obj(ver, 0x42, L0, PANEL, DUG, 2, 1)),
+        (0x43, line_obj(ver, 0x43, L0, PANEL, 0, 0, 100, 0)),
+        # top level
+        (0x50, insert_obj(ver, 0x50, LV, None, DUG, 1000, 2000, style='rel')),
+        (0x51, insert_obj(ver, 0x51, LV, None, DUG, 1500.5, 2000, sx=2.0, sy=2.0, rot=math.pi / 2)),
+        (0x52, insert_obj(ver, 0x52, LV, None, LAMPA, 3000, 100, sx=1.0, sy=0.5, attribs=True)),
+        (0x53, insert_obj(ver, 0x53, LK, None, PANEL, 500, 500, sx=3.0, sy=2.0, style='rel')),
+        (0x54, insert_obj(ver, 0x54, LV, None, LAMPA, 0, 0, minsert=(3, 2))),
+        (0x55, line_obj(ver, 0x55, LK, None, 0, 0, 3000, 4000)),
+        (0x56, line_obj(ver, 0x56, LK, None, 10, 10, 10.5, 10, z=5.0)),
+        (0x57, lwpoly_obj(ver, 0x57, LK, None, [(0, 0, 0), (1000, 0, 1.0), (1000, 1000, 0), (0, 1000, 0)], closed=True)),
+        (0x58, arc_obj(ver, 0x58, LV, None, 100, 100, 50, 0.0, math.pi / 2)),
+        (0x59, arc_obj(ver, 0x59, LV, None, 100, 100, 10)),
+    ]
+    h = 0x100
+    for k in range(n_extra):
+        objs.append((h, line_obj(ver, h, LK, None, k, 0, k, 10))); h += 1
+        objs.append((h, insert_obj(ver, h, LV, None, DUG, k * 10.0, 5.0))); h += 1
+        objs.append((h, other_obj(ver, h, 79))); h += 1
+    return build(ver, objs, codepage)
@@ -0,0 +1,183 @@
+"""
+Shared helpers for the Python tests: loading the hyphenated api/ handler
+modules, driving a handler without a socket, and building small DXF files.
+"""
+
+import io
+import json
+import os
+import random
+import importlib.util
+
+import security_helpers
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_modules = {}
+
+
+def load_api(name):
+    """api/<name>.py as a module (cached – the handlers register worker tasks at import)."""
+    mod = _modules.get(name)
+    if mod is None:
+        spec = importlib.util.spec_from_file_location(name.replace('-', '_'), os.path.join(ROOT, 'api', f'{name}.py'))
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        _modules[name] = mod
+    return mod
+
+
+class _Headers(dict):
+    def get(self, key, default=None):
+        for k, v in self.items():
+            if k.lower() == key.lower():
+                return v
+        return default
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status, self.headers, self.body = status, headers, body
+
+    def header(self, name):
+        return next((v for k, v in self.headers if k.lower() == name.lower()), None)
+
+    def json(self):
+        return json.loads(self.body)
+
+    def ndjson(self):
+        return [json.loads(line) for line in self.body.splitlines() if line.strip()]
+
+
+def call(mod, body, headers=None, path='/', method='do_POST'):
+    """Run one request through mod.handler; body is bytes or a JSON-able object."""
+    if not isinstance(body, (bytes, bytearray)):
+        body = json.dumps(body).encode()
+        headers = {'Content-Type': 'application/json', **(headers or {})}
+    security_helpers._rate_store.clear()
+    h = mod.handler.__new__(mod.handler)
+    h.headers = _Headers({'Origin': 'http://localhost:5173', 'Authorization': 'Bearer ' + 'x' * 32,
+                          'Content-Length': str(len(body)), **(headers or {})})
+    h.rfile, h.wfile = io.BytesIO(body), io.BytesIO()
+    h.client_address, h.path = ('127.0.0.1', 1), path
+    h.request_version, h.requestline, h.command = 'HTTP/1.1', 'POST', 'POST'
+    sent = {'status': None, 'headers': []}
+    h.send_response = lambda code, msg=None: sent.__setitem__('status', code)
+    h.send_header = lambda k, v: sent['headers'].append((k, v))
+    h.end_headers = lambda: None
+    getattr(h, method)()
+    return Response(sent['status'], sent['headers'], h.wfile.getvalue())
+
+
+# ── DXF builders ─────────────────────────────────────────────────────────────
+
+class DxfWriter:
+    """Minimal ASCII DXF writer: group code / value pairs, one per line."""
+
+    def __init__(self, insunits=4, crlf=False):
+        self.lines, self.eol = [], '\r\n' if crlf else '\n'
+        self.pair(0, 'SECTION'); self.pair(2, 'HEADER')
+        self.pair(9, '$ACADVER'); self.pair(1, 'AC1015')
+        self.pair(9, '$INSUNITS'); self.pair(70, insunits)
+        self.pair(0, 'ENDSEC')
+
+    def pair(self, code, value):
+        self.lines.append(f'{code:>3}')
+        self.lines.append(str(value))
+
+    def section(self, name):
+        self.pair(0, 'SECTION'); self.pair(2, name)
+
+    def endsec(self):
+        self.pair(0, 'ENDSEC')
+
+    def line(self, layer, x1, y1, x2, y2):
+        self.pair(0, 'LINE'); self.pair(8, layer)
+        self.pair(10, x1); self.pair(20, y1); self.pair(30, 0.0)
+        self.pair(11, x2); self.pair(21, y2); self.pair(31, 0.0)
+
+    def lwpolyline(self, layer, points, closed=False, bulges=None):
+        self.pair(0, 'LWPOLYLINE'); self.pair(8, layer)
+        self.pair(90, len(points)); self.pair(70, 1 if closed else 0)
+        for k, (x, y) in enumerate(points):
+            self.pair(10, x); self.pair(20, y)
+            if bulges and bulges[k]:
+                self.pair(42, bulges[k])
+
+    def insert(self, layer, name, x, y, handle=None, sx=1.0, sy=1.0, rot=0.0, attribs=()):
+        self.pair(0, 'INSERT')
+        if handle is not None:
+            self.pair(5, f'{handle:X}')
+        self.pair(8, layer); self.pair(2, name)
+        if attribs:
+            self.pair(66, 1)
+        self.pair(10, x); self.pair(20, y); self.pair(30, 0.0)
+        if sx != 1.0: self.pair(41, sx)
+        if sy != 1.0: self.pair(42, sy)
+        if rot: self.pair(50, rot)
+        if attribs:
+            for tag, value in attribs:
+                self.pair(0, 'ATTRIB'); self.pair(8, layer)
+                self.pair(10, x); self.pair(20, y); self.pair(1, value); self.pair(2, tag)
+            self.pair(0, 'SEQEND'); self.pair(8, layer)
+
+    def text(self, layer, value, x, y, height=2.5, mtext=False):
+        self.pair(0, 'MTEXT' if mtext else 'TEXT'); self.pair(8, layer)
+        self.pair(10, x); self.pair(20, y); self.pair(30, 0.0); self.pair(40, height); self.pair(1, value)
+
+    def circle(self, layer, x, y, r):
+        self.pair(0, 'CIRCLE'); self.pair(8, layer)
+        self.pair(10, x); self.pair(20, y); self.pair(30, 0.0); self.pair(40, r)
+
+    def arc(self, layer, x, y, r, a0, a1):
+        self.pair(0, 'ARC'); self.pair(8, layer)
+        self.pair(10, x); self.pair(20, y); self.pair(30, 0.0); self.pair(40, r)
+        self.pair(50, a0); self.pair(51, a1)
+
+    def block(self, name, base=(0.0, 0.0)):
+        self.pair(0, 'BLOCK'); self.pair(8, '0'); self.pair(2, name); self.pair(70, 0)
+        self.pair(10, base[0]); self.pair(20, base[1]); self.pair(30, 0.0)
+
+    def endblk(self):
+        self.pair(0, 'ENDBLK'); self.pair(8, '0')
+
+    def bytes(self):
+        return (self.eol.join(self.lines + ['  0', 'EOF']) + self.eol).encode()
+
+
+def random_plan(n=300, seed=1, crlf=False, extent=(50000.0, 30000.0), blocks=True):
+    """
+    Mixed plan in mm: LIGHT/SOCKET block definitions, INSERTs (with handles),
+    LINEs on cable layers, LWPOLYLINEs with bulges, circles, arcs and texts.
+    """
+    r = random.Random(seed)
+    w = DxfWriter(crlf=crlf)
+    if blocks:
+        w.section('BLOCKS')
+        w.block('LIGHT'); w.circle('0', 0, 0, 150); w.line('0', -150, 0, 150, 0); w.endblk()
+        w.block('SOCKET', (10, 10)); w.lwpolyline('0', [(0, 0), (200, 0), (200, 100), (0, 100)], closed=True)
+        w.insert('0', 'LIGHT', 100, 50); w.endblk()
+        w.endsec()
+    w.section('ENTITIES')
+    X, Y = extent
+    for i in range(n):
+        k = i % 6
+        x, y = r.uniform(0, X), r.uniform(0, Y)
+        if k == 0:
+            w.insert('VILAGITAS', 'LIGHT' if blocks else f'B{i % 5}', x, y, handle=0x100 + i,
+                     sx=r.choice((1.0, 2.0)), rot=r.choice((0.0, 90.0)))
+        elif k == 1:
+            w.line(f'KABEL{i % 3}', x, y, r.uniform(0, X), r.uniform(0, Y))
+        elif k == 2:
+            pts = [(x + r.uniform(-2000, 2000), y + r.uniform(-2000, 2000)) for _ in range(r.randint(2, 40))]
+            w.lwpolyline('TALCA', pts, closed=i % 4 == 0,
+                         bulges=[r.choice((0.0, 0.0, 0.5)) for _ in pts])
+        elif k == 3:
+            w.insert('ERŐSÁRAM', 'SOCKET' if blocks else 'DUGALJ', x, y, handle=0x100 + i,
+                     attribs=(('KOR', f'F{i % 7}'),))
+        elif k == 4:
+            w.circle('SZERELVENY', x, y, r.uniform(50, 500)) if i % 12 == 4 else \
+                w.arc('SZERELVENY', x, y, r.uniform(50, 500), r.uniform(0, 360), r.uniform(0, 360))
+        else:
+            w.text('FELIRAT', f'F{i % 7}', x + 100, y)
+    w.endsec()
+    return w.bytes()
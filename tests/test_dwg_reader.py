@@ -0,0 +1,165 @@
+"""
+dwg_reader: native reading of every supported release (synthetic drawings
+from dwg_writer), the R2007 refusal, broken files, and the parse-dwg routing
+between native read and text fallback.
+"""
+
+import base64
+import os
+import random
+
+import pytest
+
+import dwg_reader
+import dwg_writer as w
+from dwg_reader import DwgError, DwgUnsupported, read_dwg
+from helpers import call, load_api
+
+dwg = load_api('parse-dwg')
+
+RELEASES = [(w.R2000, 'AC1015', 'R2000'), (w.R2004, 'AC1018', 'R2004'), (w.R2010, 'AC1024', 'R2010'),
+            (w.R2013, 'AC1027', 'R2013'), (w.R2018, 'AC1032', 'R2018')]
+
+
+def _upload(data, filename='a.dwg'):
+    return call(dwg, {'dwg_base64': base64.b64encode(data).decode(), 'filename': filename})
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_r2004_decompression_round_trips(seed):
+    r = random.Random(seed)
+    data = (bytes(r.choice(b'abcdefgh') for _ in range(r.randint(4, 20000)))
+            + os.urandom(r.randint(0, 300)) + b'x' * r.randint(0, 5000))
+    assert dwg_reader.decompress_r2004(w.compress(data, seed), len(data)) == data
+
+
+@pytest.mark.parametrize('ver, version, release', RELEASES)
+def test_every_supported_release_reads_natively(ver, version, release):
+    r = read_dwg(w.sample(ver))
+    assert (r['version'], r['release'], r['objects'], r['skipped']) == (version, release, 22, 0)
+    assert sorted(r['layers'].values()) == ['0', 'KÁBEL_ŐŰ', 'VILLAMOS']
+    assert sorted(b['name'] for b in r['blocks'].values()) == [
+        '*Model_Space', '*Paper_Space', 'DUGALJ', 'LÁMPA', 'PANEL']
+    kinds = sorted(kind for kind, *_ in r['entities'])
+    assert kinds == ['ARC', 'ARC', 'INSERT', 'INSERT', 'INSERT', 'INSERT', 'INSERT', 'INSERT', 'INSERT',
+                     'LINE', 'LINE', 'LINE', 'LWPOLYLINE']
+
+
+@pytest.mark.parametrize('ver, version, release', RELEASES)
+def test_native_parse_counts_blocks_and_lengths(ver, version, release):
+    res = dwg.parse_dwg_native(w.sample(ver))
+    assert {(b['name'], b['layer']): b['count'] for b in res['blocks']} == {
+        ('LÁMPA', 'VILLAMOS'): 7,               # INSERT + 3×2 MINSERT
+        ('DUGALJ', 'VILLAMOS'): 2, ('PANEL', 'KÁBEL_ŐŰ'): 1}
+    assert res['nested_blocks'] == [{'name': 'DUGALJ', 'layer': 'KÁBEL_ŐŰ', 'count': 2}]
+    lengths = {l['layer']: l['length_raw'] for l in res['lengths']}
+    # 5000 + 0.5 line, 3×1000 + a bulge-1 half circle, the block's line × √(3·2)
+    assert lengths['KÁBEL_ŐŰ'] == pytest.approx(5000.5 + 3000 + 500 * 3.141592653589793 + 100 * 6 ** 0.5, abs=1e-3)
+    assert lengths['VILLAMOS'] == pytest.approx(3.141592653589793 * (25 + 20), abs=1e-3)
+    assert res['geomBounds'] == {'minX': 0.0, 'maxX': 3000.0, 'minY': 0.0, 'maxY': 4000.0,
+                                 'width': 3000.0, 'height': 4000.0}
+    assert res['dwg']['release'] == release
+
+
+def test_native_parse_nesting_deeper_than_the_recursion_limit(monkeypatch):
+    depth = 1500
+    blocks = {10: {'name': '*Model_Space', 'base': (0.0, 0.0), 'units': 0}}
+    blocks.update({100 + i: {'name': f'B{i}', 'base': (0.0, 0.0), 'units': 0} for i in range(depth + 1)})
+    entities = [('LINE', 100, 1, None, [0.0, 0.0, 1.0, 0.0]),
+                ('INSERT', 100, 1, 100 + depth, [0.0, 0.0, 1.0, 1.0, 0.0, 1])]       # closes a cycle
+    entities += [('INSERT', 100 + i, 1, 99 + i, [0.0, 0.0, 1.0, 1.0, 0.0, 1]) for i in range(1, depth + 1)]
+    entities.append(('INSERT', 10, 2, 100 + depth, [0.0, 0.0, 1.0, 1.0, 0.0, 1]))
+    monkeypatch.setattr(dwg, 'read_dwg', lambda data: {
+        'version': 'AC1032', 'release': 'R2018', 'objects': len(entities), 'skipped': 0,
+        'layers': {1: '0', 2: 'EROS'}, 'blocks': blocks, 'entities': entities})
+    res = dwg.parse_dwg_native(b'')
+    assert res['lengths'][0]['layer'] == 'EROS' and res['lengths'][0]['length_raw'] == 1.0
+    assert all(b['count'] == 1 for b in res['nested_blocks'])
+
+
+def test_many_objects_across_object_map_pages():
+    res = read_dwg(w.sample(w.R2018, n_extra=400))
+    assert res['objects'] == 22 + 3 * 400 and res['skipped'] == 0
+
+
+def test_r2007_is_unsupported():
+    data = b'AC1021' + bytes(0x400)
+    with pytest.raises(DwgUnsupported):
+        read_dwg(data)
+    with pytest.raises(DwgUnsupported):
+        dwg_reader.object_data(data)
+
+
+@pytest.mark.parametrize('ver', [v for v, _, _ in RELEASES])
+def test_truncated_files_raise_dwg_error(ver):
+    data = w.sample(ver)
+    for cut in range(0, len(data) - 40, 5):
+        for read in (read_dwg, dwg_reader.object_data):
+            try:
+                read(data[:cut])
+            except DwgError:
+                pass
+
+
+@pytest.mark.parametrize('ver', [w.R2004, w.R2010, w.R2013, w.R2018])
+def test_corrupt_r2004_containers_raise_dwg_error(ver):
+    data = w.sample(ver)
+    for at in range(0, len(data), 3):
+        broken = data[:at] + bytes([data[at] ^ 0xFF]) + data[at + 1:]
+        for read in (read_dwg, dwg_reader.object_data):
+            try:
+                read(broken)
+            except DwgError:
+                pass
+
+
+def test_section_map_shorter_than_its_page_list():
+    data = bytearray(w.sample(w.R2004))
+    data[0x56e] ^= 0xFF                          # page count of the last section descriptor
+    with pytest.raises(DwgError, match='section map truncated'):
+        read_dwg(bytes(data))
+
+
+# ── parse-dwg routing ────────────────────────────────────────────────────────
+
+@pytest.fixture
+def native(monkeypatch):
+    monkeypatch.setattr(dwg, 'DWG_NATIVE_READ', True)
+
+
+def test_handler_scans_text_unless_native_read_is_enabled():
+    body = _upload(w.sample(w.R2004)).json()
+    assert body['success'] and body['_source'] == 'dwg_text'
+    assert not any(x.startswith('Natív') for x in body['warnings'])
+    assert body['dwg'] == {'version': 'AC1018', 'release': 'R2004', 'strategy': 'sections'}
+
+
+@pytest.mark.parametrize('ver, version, release', RELEASES)
+def test_handler_reads_supported_releases_natively(ver, version, release, native):
+    body = _upload(w.sample(ver)).json()
+    assert body['success'] and body['_source'] == 'dwg_native' and body['warnings'] == []
+    assert body['dwg']['release'] == release and body['_filename'] == 'a.dwg'
+
+
+def test_handler_r2007_asks_for_a_dxf_export(native):
+    body = _upload(b'AC1021' + bytes(0x400)).json()
+    assert body['success'] and body['_source'] == 'dwg_text'
+    assert body['dwg'] == {'version': 'AC1021', 'release': 'R2007', 'strategy': 'convert'}
+    assert 'nem támogatott' in body['warnings'][0]
+
+
+def test_handler_truncated_r2018_falls_back(native):
+    data = w.sample(w.R2018)
+    body = _upload(data[:len(data) // 2]).json()
+    assert body['success'] and body['_source'] == 'dwg_text'
+    assert body['dwg']['strategy'] == 'convert'
+    assert body['warnings'][0].startswith('Natív DWG olvasás sikertelen')
+
+
+def test_handler_truncated_r2000_scans_the_raw_text(native):
+    data = w.sample(w.R2000)[:0x100] + b'\0' * 8 + b'24 db dugalj, kabel 120 m' + b'\0' * 8
+    body = _upload(data).json()
+    assert body['success'] and body['_source'] == 'dwg_text'
+    assert body['dwg']['strategy'] == 'ascii'
+    assert {b['name']: b['count'] for b in body['blocks']} == {'dugalj': 24, 'kabel': 1}
+    assert body['lengths'][0]['length'] == 120.0
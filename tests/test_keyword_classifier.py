@@ -0,0 +1,95 @@
+"""
+keyword_classifier: the compiled matcher counts what one str.count() per
+keyword would, for str and encoded bytes text.
+"""
+
+import random
+
+import pytest
+
+from keyword_classifier import SYMBOL_KEYWORDS, KeywordClassifier
+from helpers import load_api
+
+
+def _reference(table, text, encoding=None):
+    """Per-symbol sum of text.count(keyword) – the scan the classifier replaces."""
+    out = {}
+    for symbol, keywords in table.items():
+        n = 0
+        for kw in keywords:
+            kw = kw.lower()
+            if encoding:
+                try:
+                    kw = kw.encode(encoding)
+                except UnicodeEncodeError:
+                    continue
+            n += text.count(kw)
+        if n:
+            out[symbol] = n
+    return out
+
+
+def _text(table, seed, n=400):
+    """Keywords, keyword fragments and filler glued together at random."""
+    r = random.Random(seed)
+    words = [kw.lower() for kws in table.values() for kw in kws]
+    parts = []
+    for _ in range(n):
+        w = r.choice(words)
+        parts.append(r.choice((w, w, w[:r.randint(1, len(w))], w[r.randint(0, len(w) - 1):],
+                               r.choice(' ,.\n-x'), 'xy')))
+    return ''.join(parts)
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_counts_equal_str_count(seed):
+    text = _text(SYMBOL_KEYWORDS, seed)
+    assert KeywordClassifier(SYMBOL_KEYWORDS).counts(text) == _reference(SYMBOL_KEYWORDS, text)
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_bytes_counts_equal_bytes_count(seed):
+    text = _text(SYMBOL_KEYWORDS, seed).encode('latin-1', 'replace')
+    clf = KeywordClassifier(SYMBOL_KEYWORDS, encoding='latin-1')
+    assert clf.counts(text) == _reference(SYMBOL_KEYWORDS, text, 'latin-1')
+
+
+TRICKY = {
+    'a': ['aba', 'ab', 'b'],            # self-overlapping keyword, prefixes of each other
+    'b': ['ababa', 'aa'],
+    'c': ['ab', 'kő'],                  # keyword shared by two symbols; 'kő' not in latin-1
+}
+
+
+@pytest.mark.parametrize('text', ['', 'ababababa', 'aaaa', 'abaabababa kő kőkő', 'b' * 7, 'xyz'])
+def test_overlapping_and_shared_keywords(text):
+    assert KeywordClassifier(TRICKY).counts(text) == _reference(TRICKY, text)
+    data = text.encode('latin-1', 'replace')
+    assert KeywordClassifier(TRICKY, encoding='latin-1').counts(data) == _reference(TRICKY, data, 'latin-1')
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_random_tables(seed):
+    r = random.Random(seed)
+    table = {f's{i}': [''.join(r.choice('ab') for _ in range(r.randint(1, 4))) for _ in range(3)] for i in range(4)}
+    clf = KeywordClassifier(table)
+    for _ in range(20):
+        text = ''.join(r.choice('abc') for _ in range(r.randint(0, 60)))
+        assert clf.counts(text) == _reference(table, text), (table, text)
+
+
+def test_scan_positions_and_order():
+    clf = KeywordClassifier(SYMBOL_KEYWORDS)
+    text = 'kábeltálca, 2 lámpa tábla mellett; socket kábel'
+    found = clf.scan(text)
+    assert list(found) == [s for s in SYMBOL_KEYWORDS if s in found]
+    assert found['kabel'] == [0, text.rindex('kábel')] and found['panel'] == [text.index('tábla')]
+    assert found['lampa'] == [text.index('lámpa')] and found['dugalj'] == [text.index('socket')]
+    assert clf.symbols_in('nincs itt semmi') == []
+    assert clf.symbols_in('Lámpa'.lower()) == ['lampa']
+
+
+def test_pdf_classifier_on_its_extended_table():
+    pdf = load_api('parse-pdf')
+    text = _text(pdf.SYMBOL_KEYWORDS, 3)
+    assert pdf.SYMBOL_CLASSIFIER.counts(text) == _reference(pdf.SYMBOL_KEYWORDS, text)
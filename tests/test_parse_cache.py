@@ -0,0 +1,122 @@
+"""
+parse_cache: memory and disk tiers, keys, eviction, and cache hits through
+the parse-dxf handler.
+"""
+
+import base64
+import json
+import os
+
+import pytest
+
+import parse_cache
+from parse_cache import cache_key, cached_json
+from helpers import DxfWriter, call, load_api
+
+dxf = load_api('parse-dxf')
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    """An enabled, empty cache in its own directory."""
+    monkeypatch.setattr(parse_cache, 'PARSE_CACHE_DISABLED', False)
+    monkeypatch.setattr(parse_cache, 'PARSE_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(parse_cache, '_memory', parse_cache.OrderedDict())
+    monkeypatch.setattr(parse_cache, '_memory_bytes', 0)
+    return monkeypatch
+
+
+class _Compute:
+    def __init__(self, result):
+        self.result, self.calls = result, 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.result
+
+
+def test_hits_come_from_memory_then_disk(cache):
+    compute = _Compute({'success': True, 'n': 1})
+    first = cached_json('ns', b'file', compute, 'v1')
+    assert first == (b'{"success": true, "n": 1}', 'MISS')
+    assert cached_json('ns', b'file', compute, 'v1') == (first[0], 'HIT-MEMORY')
+    parse_cache._memory.clear()
+    assert cached_json('ns', b'file', compute, 'v1') == (first[0], 'HIT-DISK')
+    assert cached_json('ns', b'file', compute, 'v1') == (first[0], 'HIT-MEMORY')
+    assert compute.calls == 1
+
+
+def test_key_covers_file_namespace_version_and_params():
+    base = cache_key('ns', b'file', 'v1', {'a': 1, 'b': 2})
+    assert cache_key('ns', b'file', 'v1', {'b': 2, 'a': 1}) == base
+    for other in (cache_key('ns', b'file2', 'v1', {'a': 1, 'b': 2}), cache_key('ns2', b'file', 'v1', {'a': 1, 'b': 2}),
+                  cache_key('ns', b'file', 'v2', {'a': 1, 'b': 2}), cache_key('ns', b'file', 'v1', {'a': 1})):
+        assert other != base
+
+
+def test_failures_vetoed_and_stale_results_are_recomputed(cache):
+    failed = _Compute({'success': False})
+    cached_json('ns', b'a', failed, 'v1'); cached_json('ns', b'a', failed, 'v1')
+    assert failed.calls == 2
+    partial = _Compute({'success': True, 'partial': True})
+    for _ in range(2):
+        cached_json('ns', b'b', partial, 'v1', cacheable=lambda r: not r.get('partial'))
+    assert partial.calls == 2
+    ok = _Compute({'success': True})
+    cached_json('ns', b'c', ok, 'v1')
+    assert cached_json('ns', b'c', ok, 'v1', fresh=lambda: False)[1] == 'MISS' and ok.calls == 2
+
+
+def test_memory_tier_is_bounded_by_items(cache):
+    cache.setattr(parse_cache, 'PARSE_CACHE_MEMORY_ITEMS', 3)
+    for i in range(5):
+        parse_cache.cache_put(f'k{i}', b'x')
+    assert list(parse_cache._memory) == ['k2', 'k3', 'k4']
+    assert parse_cache.cache_get('k0') == (b'x', 'HIT-DISK')
+
+
+def test_disk_tier_evicts_the_least_recently_used(cache, tmp_path):
+    cache.setattr(parse_cache, 'PARSE_CACHE_DISK_MB', 1)
+    chunk = b'x' * 400 * 1024
+    for i in range(3):
+        parse_cache.cache_put(f'k{i}', chunk)
+        os.utime(tmp_path / f'k{i}.json', (i, i))
+    parse_cache.cache_put('k3', chunk)
+    assert sorted(os.listdir(tmp_path)) == ['k2.json', 'k3.json']
+
+
+def test_disabled_cache_always_misses(cache):
+    cache.setattr(parse_cache, 'PARSE_CACHE_DISABLED', True)
+    compute = _Compute({'success': True})
+    assert [cached_json('ns', b'f', compute, 'v1')[1] for _ in range(2)] == ['MISS', 'MISS']
+
+
+# ── parse-dxf ────────────────────────────────────────────────────────────────
+
+def _dxf():
+    w = DxfWriter()
+    w.section('ENTITIES')
+    w.line('KABEL', 0, 0, 3, 4)
+    w.insert('EROS', 'DUGALJ', 1, 1)
+    w.endsec()
+    return w.bytes()
+
+
+def test_parse_dxf_serves_a_repeat_upload_from_the_cache(cache):
+    body = {'data': base64.b64encode(_dxf()).decode()}
+    first, second = call(dxf, body), call(dxf, body)
+    assert first.header('X-Parse-Cache') == 'MISS' and second.header('X-Parse-Cache') == 'HIT-MEMORY'
+    assert first.json() == second.json() and first.json()['success']
+    # Options that change the result are part of the key
+    third = call(dxf, {**body, 'layers': ['KABEL']})
+    assert third.header('X-Parse-Cache') == 'MISS'
+    assert [b['name'] for b in third.json()['blocks']] == []
+
+
+def test_parse_dxf_reparses_when_the_stored_plan_is_gone(cache):
+    body = {'data': base64.b64encode(_dxf()).decode()}
+    plan_id = call(dxf, body).json()['spatialIndex']['id']
+    dxf.PLAN_STORE.delete(f'{plan_id}.json')
+    again = call(dxf, body)
+    assert again.header('X-Parse-Cache') == 'MISS'
+    assert json.loads(again.body)['spatialIndex']['id'] == plan_id
@@ -0,0 +1,180 @@
+"""
+parse-dwg text fallback: keyword counts, quantities and lengths from the
+8-bit and the R2010+ (UTF-16LE) string scans, and the routing by version
+magic.
+"""
+
+import base64
+import random
+import re
+from collections import Counter
+
+import pytest
+
+import dwg_reader
+import dwg_writer
+from helpers import call, load_api
+from keyword_classifier import SYMBOL_KEYWORDS
+
+dwg = load_api('parse-dwg')
+
+TEXTS = ['KÁBEL NYY-J 3x2,5', '24 db kábel', '6 db KAPCSOLÓ', 'MÉTER 120 méter',
+         'Lámpa downlight', 'kábeltálca 35 fm', 'szekrény elosztó tábla']
+
+
+def _garbage(r, n):
+    return bytes(r.choice((0, 1, 2, 7, 0x80, 0x91, 0xfe)) for _ in range(n))
+
+
+def _utf16_buffer(texts, seed=0):
+    r = random.Random(seed)
+    return b''.join(_garbage(r, 17) + t.encode('utf-16-le') for t in texts) + _garbage(r, 9)
+
+
+def _by_name(blocks):
+    return {b['name']: b['count'] for b in blocks}
+
+
+def test_utf16_hungarian_keywords_quantities_and_lengths():
+    blocks, lengths, found = dwg.extract_text_from_dwg(_utf16_buffer(TEXTS), 'utf-16-le')
+    assert found
+    counts = _by_name(blocks)
+    assert counts['kabel'] == 24                    # '24 db kábel' wins over the keyword count
+    assert counts['kapcsolo'] == 6                  # '6 db KAPCSOLÓ'
+    assert counts['lampa'] == 3                     # 'lámpa', 'downlight' and its 'light'
+    assert counts['panel'] == 3                     # 'szekrény', 'elosztó', 'tábla'
+    assert sorted(l['length'] for l in lengths) == [35.0, 120.0]
+
+
+def test_ascii_text_reads_the_same_in_both_scans():
+    texts = ['24 db dugalj', 'konnektor aljzat', 'cable 350 m', 'switch: 4 db']
+    r = random.Random(1)
+    ascii_buf = b''.join(_garbage(r, 11) + t.encode() for t in texts)
+    assert (dwg.extract_text_from_dwg(_utf16_buffer(texts), 'utf-16-le')
+            == dwg.extract_text_from_dwg(ascii_buf, 'latin-1'))
+
+
+def test_utf16_batches_split_at_the_window(monkeypatch):
+    whole = dwg.extract_text_from_dwg(_utf16_buffer(TEXTS * 5), 'utf-16-le')
+    monkeypatch.setattr(dwg, '_SCAN_WINDOW_BYTES', 32)
+    assert len(list(dwg._text_batches(_utf16_buffer(TEXTS * 5), 'utf-16-le'))) > 5
+    assert dwg.extract_text_from_dwg(_utf16_buffer(TEXTS * 5), 'utf-16-le') == whole
+
+
+# ── Windowed 8-bit scan ──────────────────────────────────────────────────────
+
+def _reference_extract(file_bytes):
+    """The whole-buffer str scan the windowed bytes scan replaced (8-bit path)."""
+    raw = file_bytes.decode('latin-1')
+    strings = [s for s in re.findall(r'[ -~\t]{5,}', raw) if re.search(r'[A-Za-z]{3,}', s)]
+    text = ' '.join(strings).lower()
+    counts = Counter()
+    for symbol, keywords in SYMBOL_KEYWORDS.items():
+        for kw in keywords:
+            counts[symbol] += text.count(kw)
+    explicit = Counter()
+    for pat in (r'(\d+)\s*db\s+(\w+)', r'(\w+)[:\s]+(\d+)\s*db'):
+        for m in re.finditer(pat, text):
+            try:
+                qty = int(m.group(1))
+            except ValueError:
+                continue
+            if qty <= 500:
+                for symbol, keywords in SYMBOL_KEYWORDS.items():
+                    if any(kw in m.group(2) for kw in keywords):
+                        explicit[symbol] = max(explicit[symbol], qty)
+    final = {s: c for s, c in counts.items() if c}
+    final.update(explicit)
+    lengths, seen = [], set()
+    for m in re.finditer(r'(\d+[\.,]?\d*)\s*(fm|m\b|méter|lm)', text):
+        val = float(m.group(1).replace(',', '.'))
+        if 5 < val < 50000 and val not in seen:
+            seen.add(val)
+            lengths.append(val)
+    return final, lengths
+
+
+# Whole phrases, none ending in a quantity: a match never spans two runs, so
+# cutting the buffer between runs cannot change the result
+PHRASES = ['24 db dugalj', 'konnektor', 'SWITCH 2', 'light', 'downlight x', 'FI RELE', 'rcd',
+           'nyy-j 3x2,5 120 m', 'cable 35,5 fm', '7 db kismegszakito', 'panel tabla', 'aljzat 12 lm',
+           'ab', 'x', 'villanykapcsolo: 3 db kapcsolo', 'mcb rcbo', 'ELOSZTO', 'kabel 1200 m']
+
+
+def _ascii_buffer(seed, n):
+    r = random.Random(seed)
+    out = []
+    for _ in range(n):
+        out.append(_garbage(r, r.randint(1, 6)))
+        out.append(' '.join(r.choice(PHRASES) for _ in range(r.randint(1, 3))).encode())
+    return b''.join(out)
+
+
+@pytest.mark.parametrize('seed', range(8))
+@pytest.mark.parametrize('window', [16, 64, 4 * 1024 * 1024])
+def test_windowed_scan_matches_the_whole_buffer_scan(seed, window, monkeypatch):
+    buf = _ascii_buffer(seed, 300)
+    monkeypatch.setattr(dwg, '_SCAN_WINDOW_BYTES', window)
+    if window < 100:
+        assert len(list(dwg._text_batches(buf, 'latin-1'))) > 10
+    blocks, lengths, found = dwg.extract_text_from_dwg(memoryview(buf))
+    final, ref_lengths = _reference_extract(buf)
+    assert _by_name(blocks) == final
+    assert [l['length'] for l in lengths] == ref_lengths
+    assert found == bool(final or ref_lengths)
+
+
+def test_window_cut_falls_on_a_non_text_byte(monkeypatch):
+    monkeypatch.setattr(dwg, '_SCAN_WINDOW_BYTES', 8)
+    buf = b'\0konnektor konnektor\0\0dugalj dugalj dugalj\1'
+    batches = list(dwg._text_batches(buf, 'latin-1'))
+    assert batches == [b'konnektor konnektor', b'dugalj dugalj dugalj']
+
+
+# ── Version routing ──────────────────────────────────────────────────────────
+
+@pytest.mark.parametrize('data, version', [
+    (b'AC1015\0\0\0', 'AC1015'), (memoryview(b'AC1032xyz'), 'AC1032'), (b'AC1040', 'AC1040'),
+    (b'AC10', None), (b'ACAD15', None), (b'  0\nSECTION', None), (b'', None),
+])
+def test_dwg_version(data, version):
+    assert dwg.dwg_version(data) == version
+
+
+@pytest.mark.parametrize('version, strategy', [
+    (None, 'ascii'), ('AC1009', 'ascii'), ('AC1012', 'ascii'), ('AC1014', 'ascii'), ('AC1015', 'ascii'),
+    ('AC1018', 'sections'), ('AC1021', 'convert'), ('AC1024', 'utf16'), ('AC1027', 'utf16'),
+    ('AC1032', 'utf16'), ('AC1040', 'convert'),
+])
+def test_scan_strategy(version, strategy):
+    assert dwg.scan_strategy(version) == strategy
+
+
+def _upload(data):
+    return call(dwg, {'dwg_base64': base64.b64encode(data).decode(), 'filename': 'a.dwg'}).json()
+
+
+def test_unknown_newer_release_answers_without_scanning(monkeypatch):
+    def no_scan(*args):
+        raise AssertionError('scanned')
+    monkeypatch.setattr(dwg, 'extract_text_from_dwg', no_scan)
+    body = _upload(b'AC1040' + b'24 db dugalj' * 1000)
+    assert body['dwg'] == {'version': 'AC1040', 'release': None, 'strategy': 'convert'}
+    assert body['blocks'] == [] and body['_confidence'] == 0.1
+
+
+def test_non_dwg_bytes_are_scanned_as_8_bit_text():
+    body = _upload(b'\0\x01' + b'24 db dugalj\0kabel 35 m\0')
+    assert body['dwg'] == {'version': None, 'release': None, 'strategy': 'ascii'}
+    assert _by_name(body['blocks'])['dugalj'] == 24
+
+
+@pytest.mark.parametrize('ver, strategy', [(dwg_writer.R2004, 'sections'), (dwg_writer.R2010, 'utf16')])
+def test_failed_native_read_scans_the_decompressed_objects(ver, strategy, monkeypatch):
+    def broken(name, *args, **kwargs):
+        raise dwg_reader.DwgError('broken')
+    monkeypatch.setattr(dwg, 'DWG_NATIVE_READ', True)
+    monkeypatch.setattr(dwg, 'run_task', broken)
+    body = _upload(dwg_writer.sample(ver))
+    assert body['_source'] == 'dwg_text' and body['dwg']['strategy'] == strategy
+    assert body['warnings'][0] == 'Natív DWG olvasás sikertelen: broken'
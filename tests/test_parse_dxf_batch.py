@@ -0,0 +1,104 @@
+"""
+parse-dxf ?mode=batch: NDJSON lines per file, the merged project summary and
+per-file failures.
+"""
+
+import base64
+
+import pytest
+
+import parse_cache
+from helpers import DxfWriter, call, load_api
+from parse_worker import WorkerLimitError
+
+dxf = load_api('parse-dxf')
+
+
+def _sheet(n_sockets, cable, insunits=4):
+    w = DxfWriter(insunits=insunits)
+    w.section('ENTITIES')
+    for i in range(n_sockets):
+        w.insert('EROS', 'DUGALJ', i * 100, 0)
+    w.insert('VILAGITAS', 'LAMPA', 0, 500)
+    w.line('KABEL', 0, 0, cable, 0)
+    w.endsec()
+    return w.bytes()
+
+
+SHEETS = [('fsz.dxf', _sheet(3, 12000)), ('emelet.dxf', _sheet(5, 8000)), ('pince.dxf', _sheet(1, 2.5, insunits=6))]
+
+
+def _batch(files=SHEETS, **options):
+    body = {'files': [{'name': n, 'data': base64.b64encode(d).decode()} for n, d in files], **options}
+    return call(dxf, body, path='/api/parse-dxf?mode=batch')
+
+
+def test_one_line_per_file_then_the_summary():
+    res = _batch()
+    assert res.status == 200 and res.header('Content-Type') == 'application/x-ndjson'
+    lines = res.ndjson()
+    assert [l['type'] for l in lines] == ['file', 'file', 'file', 'summary']
+    files = {l['index']: l for l in lines[:-1]}
+    assert [files[i]['name'] for i in range(3)] == ['fsz.dxf', 'emelet.dxf', 'pince.dxf']
+    for i, (_, data) in enumerate(SHEETS):
+        single = call(dxf, {'data': base64.b64encode(data).decode()}).json()
+        assert files[i]['result'] == single
+    summary = lines[-1]
+    assert (summary['files'], summary['parsed'], summary['failed'], summary['partial']) == (3, 3, [], [])
+    assert summary['blocks'] == [{'name': 'DUGALJ', 'layer': 'EROS', 'count': 9},
+                                 {'name': 'LAMPA', 'layer': 'VILAGITAS', 'count': 3}]
+    assert summary['lengths'] == [{'layer': 'KABEL', 'length': 22.5}]     # mm and m sheets in metres
+    assert summary['summary']['total_blocks'] == 12
+
+
+def test_multipart_batch_with_options():
+    parts = [f'--b\r\nContent-Disposition: form-data; name="files"; filename="{n}"\r\n\r\n'.encode() + d + b'\r\n'
+             for n, d in SHEETS[:2]]
+    body = b''.join(parts) + b'--b\r\nContent-Disposition: form-data; name="fields"\r\n\r\nblocks\r\n--b--\r\n'
+    res = call(dxf, body, {'Content-Type': 'multipart/form-data; boundary=b'}, path='/?mode=batch')
+    lines = res.ndjson()
+    assert sorted(l['name'] for l in lines[:-1]) == ['emelet.dxf', 'fsz.dxf'] and lines[-1]['type'] == 'summary'
+    assert all(set(l['result']) <= {'blocks', *dxf._ALWAYS_FIELDS} for l in lines[:-1])
+    assert lines[-1]['blocks'][0] == {'name': 'DUGALJ', 'layer': 'EROS', 'count': 8}
+
+
+def test_failed_files_are_reported_and_left_out_of_the_summary(monkeypatch):
+    run_task = dxf.run_task
+
+    def limited(name, file_bytes, *args, **kwargs):
+        if file_bytes == SHEETS[1][1]:
+            raise WorkerLimitError('memory', {'peakRssMb': 999})
+        return run_task(name, file_bytes, *args, **kwargs)
+
+    monkeypatch.setattr(dxf, 'run_task', limited)
+    lines = _batch().ndjson()
+    failed = next(l for l in lines if l.get('index') == 1)
+    assert failed['result']['code'] == 'too_complex' and failed['result']['reason'] == 'memory'
+    assert (lines[-1]['parsed'], lines[-1]['failed']) == (2, [1])
+    assert lines[-1]['blocks'][0]['count'] == 4
+
+
+def test_files_past_the_batch_budget(monkeypatch):
+    monkeypatch.setattr(dxf, 'DXF_BATCH_BUDGET_S', 0.5)
+    lines = _batch().ndjson()
+    assert {l['result']['code'] for l in lines[:-1]} == {'batch_deadline'}
+    assert lines[-1]['failed'] == [0, 1, 2]
+
+
+def test_repeat_batch_is_served_from_the_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(parse_cache, 'PARSE_CACHE_DISABLED', False)
+    monkeypatch.setattr(parse_cache, 'PARSE_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(parse_cache, '_memory', parse_cache.OrderedDict())
+    first, second = _batch().ndjson(), _batch().ndjson()
+    assert {l['cache'] for l in first[:-1]} == {'MISS'}
+    assert {l['cache'] for l in second[:-1]} == {'HIT-MEMORY'}
+    assert second[-1] == first[-1]
+
+
+@pytest.mark.parametrize('options', [{'cursor': 10}, {'format': 'svg'}, {'fields': 5}])
+def test_invalid_batch_options_are_400(options):
+    assert _batch(**options).status == 400
+
+
+def test_empty_batch_is_400():
+    assert _batch(files=[]).status == 400
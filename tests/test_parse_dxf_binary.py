@@ -0,0 +1,78 @@
+"""
+parse-dxf binary DXF: records written from an ASCII plan parse to the same
+result as the ASCII file.
+"""
+
+import struct
+
+import pytest
+
+from helpers import DxfWriter, load_api, random_plan
+
+dxf = load_api('parse-dxf')
+
+
+def _to_binary(text, wide=True):
+    """Binary DXF with the same records as an ASCII DXF (R13+ wide or R12 narrow group codes)."""
+    out = [dxf.BINARY_DXF_SENTINEL]
+    for code, val in dxf.iter_dxf_tokens(text):
+        if wide:
+            out.append(struct.pack('<H', code))
+        else:
+            out.append(bytes([code]) if code < 255 else b'\xff' + struct.pack('<H', code))
+        kind = dxf._binary_group_kind(code)
+        if kind == 's':
+            out.append(val + b'\x00')
+        elif kind == 'b':
+            chunk = bytes.fromhex(val.decode())
+            out.append(bytes([len(chunk)]) + chunk)
+        elif kind == 'd':
+            out.append(struct.pack('<d', float(val)))
+        else:
+            out.append(struct.pack('<' + kind, int(val)))
+    return b''.join(out)
+
+
+def _values(tokens):
+    """Token values compared as numbers where the binary record is typed."""
+    for code, val in tokens:
+        kind = dxf._binary_group_kind(code)
+        yield code, val if kind in 'sb' else (float(val) if kind == 'd' else int(val))
+
+
+@pytest.mark.parametrize('wide', [True, False])
+def test_binary_tokens_match_the_ascii_tokens(wide):
+    text = random_plan(200, seed=3)
+    binary = _to_binary(text, wide)
+    assert list(_values(dxf.iter_binary_dxf_tokens(binary))) == list(_values(dxf.iter_dxf_tokens(text)))
+
+
+@pytest.mark.parametrize('wide', [True, False])
+def test_binary_plan_parses_like_the_ascii_plan(wide):
+    text = random_plan(600, seed=4)
+    a = dxf.parse_dxf_bytes(text)
+    b = dxf.parse_dxf_bytes(_to_binary(text, wide))
+    assert b['success']
+    for key in ('units', 'layers', 'blocks', 'inserts', 'lineGeom', 'geomBounds', 'summary', 'texts'):
+        assert b.get(key) == a.get(key), key
+    for la, lb in zip(a['lengths'], b['lengths']):
+        assert (la['layer'], la['length_raw']) == (lb['layer'], pytest.approx(lb['length_raw'], rel=1e-12))
+
+
+def test_binary_chunks_and_wide_codes():
+    w = DxfWriter()
+    w.section('ENTITIES')
+    w.line('KABEL', 0, 0, 3, 4)
+    w.pair(310, '00FF10')                                 # binary chunk
+    w.pair(1001, 'APPNAME')                               # code escaped past 255 in R12
+    w.endsec()
+    for wide in (True, False):
+        tokens = list(dxf.iter_binary_dxf_tokens(_to_binary(w.bytes(), wide)))
+        assert (310, b'\x00\xff\x10') in tokens and (1001, b'APPNAME') in tokens
+        assert dxf.parse_dxf_bytes(_to_binary(w.bytes(), wide))['lengths'][0]['length_raw'] == 5.0
+
+
+def test_truncated_binary_does_not_raise():
+    binary = _to_binary(random_plan(50, seed=5))
+    for cut in range(len(dxf.BINARY_DXF_SENTINEL), len(binary), 97):
+        assert isinstance(dxf.parse_dxf_bytes(binary[:cut]), dict)
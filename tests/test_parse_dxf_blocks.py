@@ -0,0 +1,151 @@
+"""
+parse-dxf BLOCKS: nested INSERT expansion through memoized block summaries,
+layer-0 inheritance, scales, cycles and block extents in geomBounds.
+"""
+
+import random
+import time
+
+import pytest
+
+from helpers import DxfWriter, load_api
+
+dxf = load_api('parse-dxf')
+
+
+def _panel_plan(sx=2.0):
+    w = DxfWriter()
+    w.section('BLOCKS')
+    w.block('DUGALJ'); w.line('0', 0, 0, 2, 0); w.endblk()
+    w.block('PANEL')
+    for i in range(3):
+        w.insert('0', 'DUGALJ', i * 5, 0)
+    w.line('KABEL', 0, 0, 10, 0)
+    w.endblk()
+    w.endsec()
+    w.section('ENTITIES')
+    w.insert('EROS', 'PANEL', 0, 0, sx=sx, sy=sx)
+    w.insert('EROS', 'PANEL', 100, 0, sx=sx, sy=sx)
+    w.endsec()
+    return w.bytes()
+
+
+def test_nested_inserts_are_expanded():
+    r = dxf.parse_dxf_bytes(_panel_plan())
+    assert r['blocks'] == [{'name': 'PANEL', 'layer': 'EROS', 'count': 2}]
+    # Layer '0' inside both blocks resolves to the top-level INSERT's layer
+    assert r['nested_blocks'] == [{'name': 'DUGALJ', 'layer': 'EROS', 'count': 6}]
+    lengths = {l['layer']: l['length_raw'] for l in r['lengths']}
+    assert lengths == {'KABEL': pytest.approx(2 * 2 * 10), 'EROS': pytest.approx(2 * 2 * 3 * 2)}
+
+
+def _reference(defs, top):
+    """Brute-force walk of every placed block instance: (lengths, nested counts)."""
+    lengths, counts = {}, {}
+
+    def walk(name, layer, k):
+        d = defs[name]
+        for l, v in d['lines']:
+            t = layer if l == '0' else l
+            lengths[t] = lengths.get(t, 0.0) + v * k
+        for child, cl, s in d['inserts']:
+            t = layer if cl == '0' else cl
+            counts[(child, t)] = counts.get((child, t), 0) + 1
+            walk(child, t, k * s)
+
+    for name, layer, s in top:
+        walk(name, layer, s)
+    return lengths, counts
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_random_block_trees_match_a_brute_force_walk(seed):
+    r = random.Random(seed)
+    names = [f'B{i}' for i in range(8)]
+    defs = {}
+    w = DxfWriter()
+    w.section('BLOCKS')
+    for i, name in enumerate(names):
+        d = defs[name] = {'lines': [], 'inserts': []}
+        w.block(name)
+        for _ in range(r.randint(0, 3)):
+            layer, v = r.choice(('0', 'KABEL', 'TALCA')), float(r.randint(1, 50))
+            w.line(layer, 0, 0, v, 0)
+            d['lines'].append((layer, v))
+        for _ in range(r.randint(0, 3) if i else 0):            # children only from earlier blocks: no cycles
+            child, layer, s = r.choice(names[:i]), r.choice(('0', 'EROS')), r.choice((1.0, 2.0))
+            w.insert(layer, child, r.uniform(0, 100), 0, sx=s, sy=s)
+            d['inserts'].append((child, layer, s))
+        w.endblk()
+    w.endsec()
+    w.section('ENTITIES')
+    top = [(r.choice(names), r.choice(('VILAGITAS', '0')), r.choice((1.0, 0.5))) for _ in range(30)]
+    for name, layer, s in top:
+        w.insert(layer, name, r.uniform(0, 1000), r.uniform(0, 1000), sx=s, sy=s)
+    w.endsec()
+    res = dxf.parse_dxf_bytes(w.bytes())
+    lengths, counts = _reference(defs, top)
+    got = {l['layer']: l['length_raw'] for l in res['lengths']}
+    assert got == pytest.approx({l: v for l, v in lengths.items() if v > 0})
+    assert {(b['name'], b['layer']): b['count'] for b in res['nested_blocks']} == counts
+
+
+def test_deep_doubling_chain_is_summarized_once_per_block():
+    # B60 holds 2^60 instances of B0: only memoization makes this finish
+    w = DxfWriter()
+    w.section('BLOCKS')
+    w.block('B0'); w.line('KABEL', 0, 0, 1, 0); w.endblk()
+    for i in range(1, 61):
+        w.block(f'B{i}'); w.insert('0', f'B{i - 1}', 0, 0); w.insert('0', f'B{i - 1}', 1, 0); w.endblk()
+    w.endsec()
+    w.section('ENTITIES')
+    w.insert('EROS', 'B60', 0, 0)
+    w.endsec()
+    t0 = time.monotonic()
+    r = dxf.parse_dxf_bytes(w.bytes())
+    assert time.monotonic() - t0 < 5
+    assert r['lengths'][0]['length_raw'] == 2.0 ** 60
+    assert {b['name']: b['count'] for b in r['nested_blocks']}['B0'] == 2 ** 60
+
+
+def test_recursive_blocks_do_not_loop():
+    w = DxfWriter()
+    w.section('BLOCKS')
+    w.block('A'); w.insert('0', 'B', 0, 0); w.line('KABEL', 0, 0, 1, 0); w.endblk()
+    w.block('B'); w.insert('0', 'A', 0, 0); w.endblk()
+    w.endsec()
+    w.section('ENTITIES')
+    w.insert('EROS', 'A', 0, 0)
+    w.endsec()
+    r = dxf.parse_dxf_bytes(w.bytes())
+    assert r['success'] and r['blocks'] == [{'name': 'A', 'layer': 'EROS', 'count': 1}]
+
+
+def test_nesting_deeper_than_the_recursion_limit():
+    depth = 1500                # > sys.getrecursionlimit(); every level counts all below it
+    w = DxfWriter()
+    w.section('BLOCKS')
+    w.block('B0'); w.line('KABEL', 0, 0, 1, 0); w.insert('0', f'B{depth}', 0, 0); w.endblk()   # closes a cycle
+    for i in range(1, depth + 1):
+        w.block(f'B{i}'); w.insert('0', f'B{i - 1}', 1, 0); w.endblk()
+    w.endsec()
+    w.section('ENTITIES')
+    w.insert('EROS', f'B{depth}', 0, 0)
+    w.endsec()
+    r = dxf.parse_dxf_bytes(w.bytes())
+    assert r['success'] and r['lengths'][0]['length_raw'] == 1.0
+    assert all(b['count'] == 1 for b in r['nested_blocks'])
+    assert r['geomBounds']['maxX'] == pytest.approx(depth + 1)
+
+
+def test_block_extents_are_placed_into_geom_bounds():
+    w = DxfWriter()
+    w.section('BLOCKS')
+    w.block('LAMPA', (5, 0)); w.line('0', 5, 0, 15, 0); w.endblk()
+    w.endsec()
+    w.section('ENTITIES')
+    w.insert('VILAGITAS', 'LAMPA', 100, 100, rot=90.0)      # the block's 10-unit line now points up
+    w.endsec()
+    b = dxf.parse_dxf_bytes(w.bytes())['geomBounds']
+    assert (b['minX'], b['minY'], b['maxX']) == pytest.approx((100, 100, 100))
+    assert b['maxY'] == pytest.approx(110)
@@ -0,0 +1,84 @@
+"""
+parse-dxf time budget: partial scans, resume cursors and the finish deadline.
+"""
+
+import time
+
+import pytest
+
+from helpers import load_api, random_plan
+
+dxf = load_api('parse-dxf')
+
+
+class _Clock:
+    """time module stand-in whose monotonic() advances one second per call."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        self.now += 1.0
+        return self.now
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+@pytest.fixture
+def plan():
+    return random_plan(3000, seed=16)
+
+
+def _totals(result):
+    blocks = {(b['name'], b['layer']): b['count'] for b in result['blocks']}
+    lengths = {l['layer']: l['length_raw'] for l in result['lengths']}
+    return blocks, lengths
+
+
+def test_partial_scan_and_resume_add_up_to_the_full_parse(plan, monkeypatch):
+    full = dxf.parse_dxf_bytes(plan, time_budget=None)
+    assert not full['partial'] and full['cursor'] is None
+
+    # The scan reads the clock every 1024 entities: stops before entity 2048
+    monkeypatch.setattr(dxf, 'time', _Clock())
+    first = dxf.parse_dxf_bytes(plan, time_budget=2.5)
+    monkeypatch.undo()
+    assert first['partial'] and first['progress']['entitiesProcessed'] == 2048
+    assert 0 < first['cursor'] < len(plan)
+    assert first['progress']['bytesProcessed'] == first['cursor']
+
+    rest = dxf.parse_dxf_bytes(plan, time_budget=None, cursor=first['cursor'])
+    assert not rest['partial'] and rest['progress']['start'] == first['cursor']
+    assert (first['progress']['entitiesProcessed'] + rest['progress']['entitiesProcessed']
+            == full['progress']['entitiesProcessed'])
+
+    (b1, l1), (b2, l2), (bf, lf) = _totals(first), _totals(rest), _totals(full)
+    assert {k: b1.get(k, 0) + b2.get(k, 0) for k in bf} == bf
+    for layer, v in lf.items():
+        assert l1.get(layer, 0) + l2.get(layer, 0) == pytest.approx(v, abs=1e-3)
+    assert first['geomTiles'] is None or first['geomTiles']['id'] != full['geomTiles']['id']
+
+
+def test_bad_cursor_is_rejected(plan):
+    assert not dxf.parse_dxf_bytes(plan, cursor=5)['success']
+    assert not dxf.parse_dxf_bytes(plan, cursor=len(plan) + 10)['success']
+
+
+def test_finish_past_its_deadline_drops_the_overlay(plan, monkeypatch, tmp_path):
+    monkeypatch.setattr(dxf, 'PLAN_STORE', dxf.FileSystemPlanStore(str(tmp_path)))
+    monkeypatch.setattr(dxf, 'DXF_FINISH_BUDGET_S', -3600.0)
+    r = dxf.parse_dxf_bytes(plan, time_budget=60)
+    assert r['success'] and r['partial'] and r['cursor'] is None
+    assert r['progress']['stage'] == 'finish'
+    assert r['geomTiles'] is None and r['spatialIndex'] is None
+    assert r['lineGeom'] == [] and r['polylineGeom'] == []
+    # Nothing was stored; counts and lengths are complete
+    assert list(tmp_path.iterdir()) == []
+    assert _totals(r) == _totals(dxf.parse_dxf_bytes(plan, time_budget=None))
+
+
+def test_pyramid_build_stops_at_its_deadline():
+    geo = dxf._scan_dxf(dxf.iter_dxf_tokens(random_plan(6000, seed=17)), dxf._parse_options(None))['geo']
+    assert dxf.build_geometry_pyramid(geo, deadline=time.monotonic() - 1) is None
+    assert dxf.build_geometry_pyramid(geo, deadline=time.monotonic() + 60) is not None
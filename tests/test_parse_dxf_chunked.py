@@ -0,0 +1,64 @@
+"""
+parse-dxf parallel ENTITIES scan: chunked (forked) scans give the serial
+result.
+"""
+
+import os
+
+import pytest
+
+from helpers import DxfWriter, load_api, random_plan
+
+dxf = load_api('parse-dxf')
+
+
+def _parse(data, monkeypatch, workers):
+    """Serial parse for workers=None, else the chunked scan with that many processes."""
+    monkeypatch.setattr(dxf, 'DXF_PARALLEL_MIN_MB', 1e9 if workers is None else 0)
+    monkeypatch.setattr(dxf, 'DXF_PARSE_WORKERS', workers or 1)
+    return dxf.parse_dxf_bytes(data, time_budget=None)
+
+
+def _plan_with_blocks_and_text():
+    w = DxfWriter()
+    w.section('BLOCKS')
+    w.block('DUGALJ')
+    w.line('0', 0, 0, 10, 0)
+    w.endblk()
+    w.endsec()
+    w.section('ENTITIES')
+    for i in range(300):
+        w.insert('EROS', 'DUGALJ', i * 10, 0, handle=0x100 + i, attribs=[('TAG', f'D{i}')])
+        w.line('KABEL', i, 0, i, 5)
+        w.lwpolyline('TALCA', [(i, 0), (i + 1, 1), (i + 2, 0)], bulges=[0.5, 0, 0])
+        w.arc('KABEL', i, i, 2, 0, 90)
+        w.text('FELIRAT', f'K{i}', i * 10, 2)
+    w.endsec()
+    return w.bytes()
+
+
+@pytest.mark.parametrize('workers', [1, 2, 4])
+def test_chunked_scan_equals_the_serial_scan(workers, monkeypatch):
+    data = random_plan(3000, seed=15, blocks=True)
+    serial = _parse(data, monkeypatch, None)
+    chunked = _parse(data, monkeypatch, workers)
+    assert chunked['success'] and not chunked['partial']
+    for key in ('blocks', 'inserts', 'lineGeom', 'polylineGeom', 'layers', 'units', 'summary', 'geomBounds'):
+        assert chunked[key] == serial[key], key
+    # Per-chunk sums are added in chunk order: equal up to float rounding
+    assert [l['layer'] for l in chunked['lengths']] == [l['layer'] for l in serial['lengths']]
+    for a, b in zip(chunked['lengths'], serial['lengths']):
+        assert a['length_raw'] == pytest.approx(b['length_raw'], rel=1e-9)
+
+
+def test_chunked_scan_keeps_blocks_attribs_and_text(monkeypatch):
+    data = _plan_with_blocks_and_text()
+    serial = _parse(data, monkeypatch, None)
+    chunked = _parse(data, monkeypatch, 3)
+    for key in ('blocks', 'inserts', 'texts', 'circuits', 'summary'):
+        assert chunked.get(key) == serial.get(key), key
+
+
+def test_default_chunk_processes_share_the_cpus():
+    assert dxf.DXF_PARSE_WORKERS >= 1
+    assert dxf.DXF_PARSE_WORKERS * max(1, dxf.PARSE_WORKERS) <= max(dxf.PARSE_WORKERS, os.cpu_count() or 1)
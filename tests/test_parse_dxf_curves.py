@@ -0,0 +1,116 @@
+"""
+parse-dxf curve lengths: arcs, circles, ellipses, splines, bulges and
+old-style POLYLINE/VERTEX runs against closed-form values.
+"""
+
+import math
+import random
+
+import pytest
+
+from helpers import DxfWriter, load_api
+
+dxf = load_api('parse-dxf')
+
+
+def _length(build):
+    """Raw length on layer KABEL (rounded to 1e-4) of a plan whose ENTITIES section build() writes."""
+    w = DxfWriter()
+    w.section('ENTITIES')
+    build(w)
+    w.endsec()
+    lengths = {l['layer']: l['length_raw'] for l in dxf.parse_dxf_bytes(w.bytes())['lengths']}
+    return lengths.get('KABEL', 0.0)
+
+
+def _ellipse(w, ratio, t0=0.0, t1=2 * math.pi, major=(10.0, 0.0)):
+    w.pair(0, 'ELLIPSE'); w.pair(8, 'KABEL')
+    w.pair(10, 5.0); w.pair(20, 5.0); w.pair(30, 0.0)
+    w.pair(11, major[0]); w.pair(21, major[1]); w.pair(31, 0.0)
+    w.pair(40, ratio); w.pair(41, t0); w.pair(42, t1)
+
+
+def _spline(w, degree, ctrl, knots=None, weights=None, fit=None):
+    w.pair(0, 'SPLINE'); w.pair(8, 'KABEL'); w.pair(70, 8); w.pair(71, degree)
+    for k in knots or ():
+        w.pair(40, k)
+    for v in weights or ():
+        w.pair(41, v)
+    for x, y in ctrl:
+        w.pair(10, x); w.pair(20, y); w.pair(30, 0.0)
+    for x, y in fit or ():
+        w.pair(11, x); w.pair(21, y); w.pair(31, 0.0)
+
+
+def _polyline(w, verts, flags=0):
+    w.pair(0, 'POLYLINE'); w.pair(8, 'KABEL'); w.pair(66, 1); w.pair(70, flags)
+    for x, y, bulge in verts:
+        w.pair(0, 'VERTEX'); w.pair(8, 'KABEL'); w.pair(10, x); w.pair(20, y)
+        if bulge:
+            w.pair(42, bulge)
+    w.pair(0, 'SEQEND'); w.pair(8, 'KABEL')
+
+
+@pytest.mark.parametrize('a0, a1, sweep', [(0, 90, 90), (350, 10, 20), (90, 0, 270), (30, 30, 360)])
+def test_arc_length(a0, a1, sweep):
+    assert _length(lambda w: w.arc('KABEL', 1, 2, 4, a0, a1)) == pytest.approx(math.radians(sweep) * 4, abs=1e-4)
+
+
+def test_circle_length():
+    assert _length(lambda w: w.circle('KABEL', 0, 0, 3)) == pytest.approx(6 * math.pi, abs=1e-4)
+
+
+@pytest.mark.parametrize('ratio', [1.0, 0.5, 0.1])
+def test_full_ellipse_length(ratio):
+    a, b = 10.0, 10.0 * ratio
+    h = ((a - b) / (a + b)) ** 2
+    ramanujan = math.pi * (a + b) * (1 + 3 * h / (10 + math.sqrt(4 - 3 * h)))
+    assert _length(lambda w: _ellipse(w, ratio, major=(6.0, 8.0))) == pytest.approx(ramanujan, rel=1e-3)
+
+
+def test_elliptical_arc_length():
+    # Quarter of a circle-shaped ellipse, parameter range wrapping past 2π
+    assert _length(lambda w: _ellipse(w, 1.0, 7 * math.pi / 4, math.pi / 4)) == pytest.approx(
+        10 * math.pi / 2, rel=1e-3)
+
+
+def test_linear_spline_is_its_control_polygon():
+    ctrl = [(0, 0), (3, 4), (3, 10), (10, 10)]
+    assert _length(lambda w: _spline(w, 1, ctrl, knots=[0, 0, 1, 2, 3, 3])) == pytest.approx(5 + 6 + 7)
+
+
+def test_rational_quadratic_spline_is_a_quarter_circle():
+    ctrl = [(10, 0), (10, 10), (0, 10)]
+    weights = [1.0, math.sqrt(0.5), 1.0]
+    length = _length(lambda w: _spline(w, 2, ctrl, knots=[0, 0, 0, 1, 1, 1], weights=weights))
+    assert length == pytest.approx(10 * math.pi / 2, rel=1e-3)
+
+
+def test_fit_point_spline_without_knots_follows_its_fit_points():
+    fit = [(0, 0), (3, 4), (6, 0)]
+    assert _length(lambda w: _spline(w, 3, [], fit=fit)) == pytest.approx(10)
+
+
+@pytest.mark.parametrize('bulge', [1.0, -1.0, math.tan(math.radians(90) / 4)])
+def test_lwpolyline_bulge_is_an_arc(bulge):
+    theta = 4 * math.atan(abs(bulge))
+    radius = 1.0 / math.sin(theta / 2)                   # chord of 2
+    length = _length(lambda w: w.lwpolyline('KABEL', [(0, 0), (2, 0), (2, 5)], bulges=[bulge, 0, 0]))
+    assert length == pytest.approx(radius * theta + 5, abs=1e-4)
+
+
+def test_old_style_polyline_with_bulges_and_closing_segment():
+    verts = [(0, 0, 0), (4, 0, 1.0), (4, 4, 0), (0, 4, 0)]
+    assert _length(lambda w: _polyline(w, verts, flags=1)) == pytest.approx(4 + 2 * math.pi + 4 + 4, abs=1e-4)
+
+
+def test_polyface_meshes_and_frame_vertices_are_not_runs():
+    assert _length(lambda w: _polyline(w, [(0, 0, 0), (4, 0, 0)], flags=64)) == 0.0
+    assert _length(lambda w: _polyline(w, [(0, 0, 0), (4, 0, 0)], flags=16)) == 0.0
+
+
+def test_batched_straight_runs_match_a_sum_of_segments():
+    r = random.Random(5)
+    pts = [(r.uniform(0, 1e5), r.uniform(0, 1e5)) for _ in range(5000)]
+    expected = math.fsum(math.dist(a, b) for a, b in zip(pts, pts[1:]))
+    assert _length(lambda w: w.lwpolyline('KABEL', pts)) == pytest.approx(expected, abs=1e-4)
@@ -0,0 +1,102 @@
+"""
+parse-dxf revision diff: edited copies of a plan against the original, paired
+by handle and by position.
+"""
+
+import base64
+import random
+
+import pytest
+
+from helpers import DxfWriter, call, load_api
+
+dxf = load_api('parse-dxf')
+
+
+def _plan(inserts, cable=(0, 0, 40000, 0), handles=True):
+    """inserts: [(handle, name, layer, x, y)]"""
+    w = DxfWriter()
+    w.section('ENTITIES')
+    w.line('KABEL', 0, 0, 30000, 30000)                    # fixes the extent: 30 m, move radius 300 mm
+    w.line('KABEL2', *cable)
+    for handle, name, layer, x, y in inserts:
+        w.insert(layer, name, x, y, handle=handle if handles else None)
+    w.endsec()
+    return w.bytes()
+
+
+@pytest.fixture(scope='module')
+def base():
+    r = random.Random(14)
+    return [(0x100 + i, r.choice(('DUGALJ', 'LAMPA')), 'EROS', r.uniform(0, 30000), r.uniform(0, 30000))
+            for i in range(300)]
+
+
+def _diff(base_bytes, head_bytes, **options):
+    res = call(dxf, {'mode': 'diff', 'base_data': base64.b64encode(base_bytes).decode(),
+                     'data': base64.b64encode(head_bytes).decode(), **options})
+    assert res.status == 200, res.body
+    return res.json()
+
+
+def test_identical_plans_have_no_differences(base):
+    d = _diff(_plan(base), _plan(base))
+    assert d['inserts']['summary'] == {'added': 0, 'removed': 0, 'moved': 0, 'unchanged': 300}
+    assert d['counts'] == [] and d['lengths'] == [] and d['base'] == d['head']
+
+
+def test_edits_are_paired_by_handle(base):
+    head = list(base)
+    removed = [head.pop(10), head.pop(20), head.pop(30)]
+    moved = {}
+    for k in (0, 1, 2):
+        h, name, layer, x, y = head[k]
+        head[k] = (h, name, layer, x + 5000, y)             # far beyond the move radius: only the handle pairs it
+        moved[format(h, 'X')] = 5000.0
+    h, name, layer, x, y = head[3]
+    head[3] = (h, 'PANEL' if name != 'PANEL' else 'DUGALJ', layer, x, y)   # same handle, other block
+    head += [(0x900, 'LAMPA', 'VILAGITAS', 1, 1), (0x901, 'LAMPA', 'VILAGITAS', 2, 2)]
+    d = _diff(_plan(base), _plan(head, cable=(0, 0, 45000, 0)))
+    ins = d['inserts']
+    assert ins['summary'] == {'added': 3, 'removed': 4, 'moved': 3, 'unchanged': 300 - 3 - 3 - 1}
+    assert {m['handle']: m['distance'] for m in ins['moved']} == pytest.approx(moved)
+    assert {r['handle'] for r in ins['removed']} == {format(h, 'X') for h, *_ in removed} | {format(head[3][0], 'X')}
+    assert {a['handle'] for a in ins['added']} == {'900', '901', format(head[3][0], 'X')}
+    counts = {(c['name'], c['layer']): c['delta'] for c in d['counts']}
+    assert counts[('LAMPA', 'VILAGITAS')] == 2 and counts[('PANEL', 'EROS')] == 1
+    assert sum(counts.values()) == len(head) - len(base)
+    assert d['lengths'] == [{'layer': 'KABEL2', 'base': 40.0, 'head': 45.0, 'delta': 5.0,
+                             'base_raw': 40000.0, 'head_raw': 45000.0}]
+
+
+def test_re_exported_plan_is_paired_by_position(base):
+    # No handles: exact positions are unchanged, small shifts are moves
+    head = [(h, name, layer, x + (100 if k < 5 else 0), y) for k, (h, name, layer, x, y) in enumerate(base)]
+    d = _diff(_plan(base), _plan(head, handles=False))
+    assert d['inserts']['summary'] == {'added': 0, 'removed': 0, 'moved': 5, 'unchanged': 295}
+    assert [m['distance'] for m in d['inserts']['moved']] == pytest.approx([100.0] * 5)
+    # Beyond an explicit move radius the shifted inserts are removed + added
+    d = _diff(_plan(base), _plan(head, handles=False), move_radius=50)
+    assert d['inserts']['summary'] == {'added': 5, 'removed': 5, 'moved': 0, 'unchanged': 295}
+
+
+def test_diff_by_stored_plan_ids(base):
+    base_id = call(dxf, {'data': base64.b64encode(_plan(base)).decode()}).json()['spatialIndex']['id']
+    head_id = call(dxf, {'data': base64.b64encode(_plan(base[1:])).decode()}).json()['spatialIndex']['id']
+    res = call(dxf, {'mode': 'diff', 'base': base_id, 'head': head_id})
+    assert res.json()['inserts']['summary']['removed'] == 1
+    assert call(dxf, {'mode': 'diff', 'base': 'nope', 'head': head_id}).status == 400
+    assert call(dxf, {'mode': 'diff', 'base': base_id, 'head': head_id, 'tolerance': 'x'}).status == 400
+
+
+@pytest.mark.parametrize('base_data', ['nem base64!', 'QUJD\n$$', 'árvíztűrő', 12345, ['QUJD']])
+def test_malformed_base_data_is_a_bad_request(base, base_data):
+    res = call(dxf, {'mode': 'diff', 'base_data': base_data, 'data': base64.b64encode(_plan(base)).decode()})
+    assert res.status == 400 and not res.json()['success']
+
+
+def test_plan_missing_after_parsing_is_expired(base, monkeypatch):
+    monkeypatch.setattr(dxf, 'load_geometry_pyramid', lambda plan_id: None)
+    res = call(dxf, {'mode': 'diff', 'base_data': base64.b64encode(_plan(base)).decode(),
+                     'data': base64.b64encode(_plan(base[1:])).decode()})
+    assert res.status == 404 and res.json()['code'] == 'tiles_expired'
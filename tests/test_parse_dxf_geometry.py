@@ -0,0 +1,142 @@
+"""
+parse-dxf overlay geometry encodings: the columnar format decodes to the JSON
+overlay exactly, the quantized format to within half a grid step.
+"""
+
+import base64
+from array import array
+
+import pytest
+
+from helpers import DxfWriter, call, load_api, random_plan
+
+dxf = load_api('parse-dxf')
+
+
+def _column(typecode, text):
+    arr = array(typecode)
+    arr.frombytes(base64.b64decode(text))
+    return arr
+
+
+def _xy(geometry, text):
+    """An xy column as f64 values (quantized: grid deltas restored to coordinates)."""
+    if geometry['format'] == 'columnar-1':
+        return list(_column('d', text))
+    (ox, oy), step = geometry['origin'], geometry['step']
+    out, acc = [], [0, 0]
+    for k, d in enumerate(_column('i', text)):
+        acc[k % 2] += d
+        out.append((ox, oy)[k % 2] + step * acc[k % 2])
+    return out
+
+
+def _decode(geometry):
+    """Columnar / quantized geometry → (lineGeom, polylineGeom, inserts) in the JSON format's shape."""
+    layers, names = geometry['layers'], geometry['names']
+    ln = geometry['lines']
+    xy = _xy(geometry, ln['xy'])
+    lines = [{'layer': layers[l], 'x1': xy[4 * i], 'y1': xy[4 * i + 1], 'x2': xy[4 * i + 2], 'y2': xy[4 * i + 3]}
+             for i, l in enumerate(_column('I', ln['layer']))]
+    pl = geometry['polylines']
+    xy, offsets = _xy(geometry, pl['xy']), _column('I', pl['offsets'])
+    polys = [{'layer': layers[l], 'points': [(xy[2 * k], xy[2 * k + 1]) for k in range(offsets[i], offsets[i + 1])],
+              'closed': bool(c)}
+             for i, (l, c) in enumerate(zip(_column('I', pl['layer']), _column('B', pl['closed'])))]
+    ins = geometry['inserts']
+    xy = _xy(geometry, ins['xy'])
+    inserts = [{'name': names[n], 'layer': layers[l], 'x': xy[2 * i], 'y': xy[2 * i + 1],
+                'attribs': ins['attribs'].get(str(i))}
+               for i, (n, l) in enumerate(zip(_column('I', ins['name']), _column('I', ins['layer'])))]
+    return lines, polys, inserts
+
+
+@pytest.fixture(scope='module')
+def plan():
+    return random_plan(600, seed=10)
+
+
+def test_columnar_decodes_to_the_json_overlay(plan):
+    js = dxf.parse_dxf_bytes(plan)
+    col = dxf.parse_dxf_bytes(plan, geometry_format='columnar')
+    assert 'lineGeom' not in col and col['geometry']['format'] == 'columnar-1'
+    lines, polys, inserts = _decode(col['geometry'])
+    assert lines == js['lineGeom'] and polys == js['polylineGeom'] and inserts == js['inserts']
+    assert any(i['attribs'] for i in inserts)
+    for key in ('blocks', 'lengths', 'geomBounds', 'spatialIndex'):
+        assert col[key] == js[key], key
+
+
+def test_geometry_state_round_trips(plan):
+    geo = dxf._Geometry()
+    geo.add_line('A', 0.1, 0.2, 1e9 + 0.5, -3.25)
+    geo.add_poly('B', [(1, 2), (3, 4), (5, 6)], True)
+    geo.add_insert('LAMPA', 'A', 7.5, 8.5, handle=0xFFFFFFFFFF)
+    geo.insert_attribs[0] = [{'tag': 'KOR', 'value': 'F1'}]
+    back = dxf._Geometry.from_state(geo.to_state())
+    assert back.columnar() == geo.columnar()
+    assert back.insert_handle.tolist() == [0xFFFFFFFFFF]
+
+
+def test_extend_remaps_layer_and_name_ids():
+    a, b = dxf._Geometry(), dxf._Geometry()
+    a.add_line('A', 0, 0, 1, 1); a.add_insert('X', 'A', 0, 0)
+    b.add_line('B', 2, 2, 3, 3); b.add_poly('A', [(0, 0), (1, 0)], False)
+    b.add_insert('Y', 'B', 1, 1); b.add_insert('X', 'A', 2, 2)
+    b.insert_attribs[1] = [{'tag': 'T', 'value': 'v'}]
+    a.extend(b)
+    assert [a.line(i)[0] for i in range(a.line_count)] == ['A', 'B']
+    assert a.poly(0) == ('A', [(0.0, 0.0), (1.0, 0.0)], False)
+    assert [(d['name'], d['layer'], d['attribs']) for d in a.insert_dicts()] == [
+        ('X', 'A', None), ('Y', 'B', None), ('X', 'A', [{'tag': 'T', 'value': 'v'}])]
+
+
+# ── Quantized ────────────────────────────────────────────────────────────────
+
+def _max_error(a, b):
+    """Largest coordinate difference between two decoded overlays."""
+    err = 0.0
+    for la, lb in zip(a[0], b[0]):
+        err = max(err, *(abs(la[k] - lb[k]) for k in ('x1', 'y1', 'x2', 'y2')))
+    for pa, pb in zip(a[1], b[1]):
+        assert len(pa['points']) == len(pb['points'])
+        err = max([err] + [abs(u - v) for p, q in zip(pa['points'], pb['points']) for u, v in zip(p, q)])
+    for ia, ib in zip(a[2], b[2]):
+        err = max(err, abs(ia['x'] - ib['x']), abs(ia['y'] - ib['y']))
+    return err
+
+
+@pytest.mark.parametrize('quantize_mm', [None, 0.1, 10.0])
+def test_quantized_round_trip_is_within_half_a_step(plan, quantize_mm):
+    js = dxf.parse_dxf_bytes(plan)
+    kwargs = {} if quantize_mm is None else {'quantize_mm': quantize_mm}
+    q = dxf.parse_dxf_bytes(plan, geometry_format='quantized', **kwargs)['geometry']
+    step = (quantize_mm or dxf.QUANTIZE_MM) * 0.001 / js['units']['factor']
+    assert q['format'] == 'quantized-1' and q['step'] == pytest.approx(step)
+    decoded = _decode(q)
+    assert [l['layer'] for l in decoded[0]] == [l['layer'] for l in js['lineGeom']]
+    assert [(i['name'], i['attribs']) for i in decoded[2]] == [(i['name'], i['attribs']) for i in js['inserts']]
+    assert _max_error(decoded, (js['lineGeom'], js['polylineGeom'], js['inserts'])) <= step / 2 * (1 + 1e-9)
+
+
+def test_quantized_step_grows_to_keep_deltas_in_int32():
+    w = DxfWriter(insunits=6)                               # metres: 1 mm = 0.001 units
+    w.section('ENTITIES')
+    w.line('KABEL', -4e9, 0, 4e9, 1)
+    w.insert('EROS', 'DUGALJ', 0.25, 0.5)
+    w.endsec()
+    res = dxf.parse_dxf_bytes(w.bytes(), geometry_format='quantized')
+    q = res['geometry']
+    assert q['step'] == pytest.approx(8e9 / dxf._QUANTIZE_MAX_STEPS)
+    lines, _, inserts = _decode(q)
+    assert abs(lines[0]['x2'] - 4e9) <= q['step'] / 2 and abs(inserts[0]['x'] - 0.25) <= q['step'] / 2
+
+
+def test_quantize_params_and_request_validation():
+    assert dxf.quantize_params(0.001, [10.0, 20.0, 110.0, 70.0]) == (10.0, 20.0, 1.0)
+    assert dxf.quantize_params(None, [0.0, 0.0, 1.0, 1.0], 5.0) == (0.0, 0.0, 0.005)
+    data = base64.b64encode(random_plan(20, seed=19)).decode()
+    for bad in (0, -1, 5000, 'x'):
+        assert call(dxf, {'data': data, 'format': 'quantized', 'quantize_mm': bad}).status == 400
+    res = call(dxf, {'data': data, 'format': 'quantized', 'quantize_mm': 2})
+    assert res.status == 200 and res.json()['geometry']['step'] == pytest.approx(2.0)
@@ -0,0 +1,59 @@
+"""
+parse-dxf plan index sidecar: stored on complete parses, served by file hash
+(mode='index'), ignored when stale.
+"""
+
+import base64
+import hashlib
+import json
+
+from helpers import call, load_api, random_plan
+
+dxf = load_api('parse-dxf')
+
+
+def _parse(data, **options):
+    return call(dxf, {'data': base64.b64encode(data).decode(), **options})
+
+
+def test_index_is_404_until_the_file_is_parsed_then_served():
+    data = random_plan(120, seed=20)
+    plan_id = hashlib.sha256(data).hexdigest()
+    missing = call(dxf, {'mode': 'index', 'id': plan_id})
+    assert missing.status == 404 and missing.json()['code'] == 'index_missing'
+
+    parsed = _parse(data).json()
+    r = call(dxf, {'mode': 'index', 'id': plan_id})
+    assert r.status == 200
+    index = r.json()
+    assert index['id'] == plan_id and index['fileBytes'] == len(data)
+    assert index['version'] == dxf.PLAN_INDEX_VERSION and index['parser'] == dxf.PARSER_VERSION
+    for key in ('blocks', 'lengths', 'layers', 'units', 'summary', 'geomBounds', 'spatialIndex'):
+        assert index[key] == parsed[key], key
+    assert index['tiles']['id'] == plan_id
+
+
+def test_partial_and_projected_parses_store_no_index():
+    data = random_plan(120, seed=21)
+    plan_id = hashlib.sha256(data).hexdigest()
+    _parse(data, fields=['blocks'])
+    _parse(data, layers=['KABEL*'])
+    assert dxf.load_plan_index(plan_id) is None
+    assert call(dxf, {'mode': 'index', 'id': plan_id}).status == 404
+
+
+def test_stale_index_reads_as_missing():
+    data = random_plan(60, seed=22)
+    plan_id = hashlib.sha256(data).hexdigest()
+    _parse(data)
+    stored = json.loads(dxf.PLAN_STORE.get(f'{plan_id}.index.json'))
+    for stale in ({'version': dxf.PLAN_INDEX_VERSION + 1}, {'parser': 'dxf-0'}):
+        dxf.PLAN_STORE.put(f'{plan_id}.index.json', json.dumps({**stored, **stale}).encode())
+        assert dxf.load_plan_index(plan_id) is None
+        assert call(dxf, {'mode': 'index', 'id': plan_id}).status == 404
+    dxf.PLAN_STORE.put(f'{plan_id}.index.json', b'{not json')
+    assert dxf.load_plan_index(plan_id) is None
+
+
+def test_index_request_validates_the_id():
+    assert call(dxf, {'mode': 'index', 'id': 'ABC'}).status == 400
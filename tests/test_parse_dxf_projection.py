@@ -0,0 +1,107 @@
+"""
+parse-dxf projection (layers / exclude_layers / entities / fields) and the
+stored plan ids it keeps apart.
+"""
+
+import base64
+import hashlib
+
+import pytest
+
+import parse_cache
+from helpers import DxfWriter, call, load_api, random_plan
+
+dxf = load_api('parse-dxf')
+
+
+def _upload(data, **options):
+    return {'data': base64.b64encode(data).decode(), **options}
+
+
+@pytest.fixture
+def plan():
+    return random_plan(240, seed=12)
+
+
+# ── Projection ───────────────────────────────────────────────────────────────
+
+def test_parse_projection_normalizes_lists_and_strings():
+    assert dxf.parse_projection({}) is None
+    assert dxf.parse_projection({'layers': 'B, A,A', 'entities': ['line', 'Insert']}) == {
+        'layers': ['A', 'B'], 'entities': ['INSERT', 'LINE']}
+    with pytest.raises(ValueError):
+        dxf.parse_projection({'fields': [1, 2]})
+
+
+def test_layer_and_entity_filters_match_a_filtered_drawing():
+    w = DxfWriter()
+    w.section('ENTITIES')
+    w.line('KABEL1', 0, 0, 100, 0)
+    w.line('FAL', 0, 0, 0, 50)
+    w.insert('KABEL1', 'LIGHT', 5, 5)
+    w.endsec()
+    full = dxf.parse_dxf_bytes(w.bytes())
+    kabel = dxf.parse_dxf_bytes(w.bytes(), projection={'layers': ['KAB*']})
+    lines = dxf.parse_dxf_bytes(w.bytes(), projection={'entities': ['LINE']})
+    assert {l['layer'] for l in full['lengths']} == {'KABEL1', 'FAL'}
+    assert [l['layer'] for l in kabel['lengths']] == ['KABEL1']
+    assert kabel['blocks'] == full['blocks']
+    assert lines['blocks'] == [] and len(lines['lengths']) == 2
+
+
+def test_fields_keep_only_requested_keys(plan):
+    r = dxf.parse_dxf_bytes(plan, projection={'fields': ['blocks']})
+    assert set(r) == {'blocks', *dxf._ALWAYS_FIELDS} - {'error'}
+    assert r['blocks'] == dxf.parse_dxf_bytes(plan)['blocks']
+
+
+# ── Stored plan ids ──────────────────────────────────────────────────────────
+
+def test_narrowed_parse_does_not_replace_the_full_plan(plan):
+    file_id = hashlib.sha256(plan).hexdigest()
+    full = call(dxf, _upload(plan)).json()
+    assert full['spatialIndex']['id'] == file_id
+    inserts = full['summary']['total_inserts']
+
+    projected = call(dxf, _upload(plan, fields=['lineGeom'])).json()
+    assert 'inserts' not in projected and projected['success']
+    dxf._pyramids.clear()       # the next requests read the stored plan
+
+    hits = call(dxf, {'mode': 'query', 'id': file_id, 'query': 'bbox', 'kinds': ['insert'],
+                      'bbox': [-1e9, -1e9, 1e9, 1e9]})
+    assert hits.status == 200 and hits.json()['total'] == inserts
+    index = call(dxf, {'mode': 'index', 'id': file_id})
+    assert index.status == 200 and index.json()['summary']['total_inserts'] == inserts
+    diff = call(dxf, {'mode': 'diff', 'base': file_id, 'head': file_id}).json()
+    assert diff['inserts']['summary']['unchanged'] == inserts
+
+
+def test_plan_id_depends_on_what_is_captured(plan):
+    full = dxf._parse_options(None)
+    ids = {
+        dxf.plan_id_for(plan, None, full),
+        dxf.plan_id_for(plan, {'fields': ['lineGeom']}, dxf._parse_options({'fields': ['lineGeom']})),
+        dxf.plan_id_for(plan, {'fields': ['inserts']}, dxf._parse_options({'fields': ['inserts']})),
+        dxf.plan_id_for(plan, {'layers': ['A']}, dxf._parse_options({'layers': ['A']})),
+        dxf.plan_id_for(plan, None, full, start=10),
+    }
+    assert len(ids) == 5
+    # A projection that still captures everything shares the full plan
+    wide = {'fields': ['inserts', 'spatialIndex', 'lineGeom']}
+    assert dxf.plan_id_for(plan, wide, dxf._parse_options(wide)) == hashlib.sha256(plan).hexdigest()
+
+
+def test_cache_hit_reparses_when_the_stored_plan_is_gone(plan, monkeypatch, tmp_path):
+    monkeypatch.setattr(parse_cache, 'PARSE_CACHE_DISABLED', False)
+    monkeypatch.setattr(parse_cache, 'PARSE_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(parse_cache, '_memory', parse_cache.OrderedDict())
+    file_id = hashlib.sha256(plan).hexdigest()
+    first = call(dxf, _upload(plan))
+    assert first.header(parse_cache.CACHE_HEADER) == 'MISS'
+    assert call(dxf, _upload(plan)).header(parse_cache.CACHE_HEADER) == 'HIT-MEMORY'
+
+    dxf.PLAN_STORE.delete(f'{file_id}.index.json')
+    again = call(dxf, _upload(plan))
+    assert again.header(parse_cache.CACHE_HEADER) == 'MISS'
+    assert again.body == first.body
+    assert call(dxf, {'mode': 'index', 'id': file_id}).status == 200
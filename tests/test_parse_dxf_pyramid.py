@@ -0,0 +1,140 @@
+"""
+parse-dxf level-of-detail pyramid: tree invariants, overview simplification
+and the tiles mode.
+"""
+
+import base64
+import hashlib
+import json
+import random
+
+import pytest
+
+from helpers import DxfWriter, call, load_api, random_plan
+
+dxf = load_api('parse-dxf')
+
+
+def _geometry(data):
+    return dxf._scan_dxf(dxf.iter_dxf_tokens(data), dxf._parse_options(None))['geo']
+
+
+def _tile_rect(pyr, key):
+    z, x, y = (int(v) for v in key.split('/'))
+    side = pyr['size'] / (1 << z)
+    ox, oy = pyr['origin']
+    return ox + x * side, oy + y * side, ox + (x + 1) * side, oy + (y + 1) * side
+
+
+# ── Douglas–Peucker ranks ────────────────────────────────────────────────────
+
+@pytest.mark.parametrize('seed', range(6))
+def test_dp_ranks_match_simplify_dp_at_every_tolerance(seed):
+    r = random.Random(seed)
+    pts = [(r.uniform(0, 100), r.uniform(0, 100)) for _ in range(r.randint(2, 200))]
+    if seed == 0:
+        pts = [(float(i), 0.0) for i in range(50)]          # collinear
+    flat = dxf.array('d', [c for p in pts for c in p])
+    ranks = dxf._DpRanks(flat)
+    # Coarse and fine tolerances in mixed order, as tiles at several levels ask
+    for tol in (40.0, 0.5, 10.0, 2.0, 60.0, 0.01):
+        mask = ranks.keep(tol * tol)
+        assert [p for p, k in zip(pts, mask) if k] == dxf._simplify_dp(pts, tol)
+
+
+# ── Tree ─────────────────────────────────────────────────────────────────────
+
+def test_small_drawing_is_one_leaf():
+    pyr = dxf.build_geometry_pyramid(_geometry(random_plan(30)))
+    assert list(pyr['tiles']) == ['0/0/0']
+    root = pyr['tiles']['0/0/0']
+    assert root['leaf'] and not root.get('pending')
+    assert len(root['l']) == pyr['geometry'].line_count
+
+
+def test_every_feature_reaches_the_leaves_it_touches():
+    geo = _geometry(random_plan(6000, seed=6))
+    pyr = dxf.build_geometry_pyramid(geo)
+    assert len(pyr['tiles']) > 1 and pyr['maxZoom'] >= 1
+    leaf_lines, leaf_polys = set(), set()
+    for key, t in pyr['tiles'].items():
+        z = int(key.split('/')[0])
+        assert z <= dxf.TILE_MAX_ZOOM
+        if t['leaf']:
+            leaf_lines.update(t['l'])
+            leaf_polys.update(i for i, _ in t['p'])
+            assert all(pts is None for _, pts in t['p'])
+            x0, y0, x1, y1 = _tile_rect(pyr, key)
+            for i in t['l']:
+                _, ax, ay, bx, by = geo.line(i)
+                assert dxf._segment_hits_rect(ax, ay, bx, by, x0, y0, x1, y1)
+        else:
+            assert t['pending']
+    assert leaf_lines == set(range(geo.line_count))
+    assert leaf_polys == set(range(geo.poly_count))
+
+
+def test_overviews_stay_within_the_vertex_budget():
+    pyr = dxf.build_geometry_pyramid(_geometry(random_plan(6000, seed=7)))
+    geo = pyr['geometry']
+    split = [k for k, t in pyr['tiles'].items() if not t['leaf']]
+    assert split
+    for key in split:
+        t = dxf.tile_overview(pyr, key)
+        assert not t.get('pending') and dxf.tile_overview(pyr, key) is t
+        cost = 2 * len(t['l']) + sum(geo.poly_len(i) if pts is None else len(pts) for i, pts in t['p'])
+        assert 0 < cost <= dxf.TILE_VERTEX_BUDGET
+        for i, pts in t['p']:
+            if pts is not None:
+                full = geo.poly_points(i)
+                assert pts[0] == full[0] and pts[-1] == full[-1] and len(pts) < len(full)
+
+
+def test_stored_plan_keeps_pending_tiles_and_drops_rank_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(dxf, 'PLAN_STORE', dxf.FileSystemPlanStore(str(tmp_path)))
+    pyr = dxf.build_geometry_pyramid(_geometry(random_plan(6000, seed=8)))
+    dxf.tile_overview(pyr, '0/0/0')
+    dxf.save_geometry_pyramid('a' * 64, pyr)
+    dxf._pyramids.clear()
+    loaded = dxf.load_geometry_pyramid('a' * 64)
+    assert 'ranks' not in loaded
+    assert loaded['tiles'] == json.loads(json.dumps(pyr['tiles']))
+    key = next(k for k, t in loaded['tiles'].items() if t.get('pending'))
+    assert json.dumps(dxf.pyramid_tile(loaded, key)) == json.dumps(dxf.pyramid_tile(pyr, key))
+
+
+# ── mode='tiles' ─────────────────────────────────────────────────────────────
+
+def test_tiles_mode_serves_the_stored_pyramid():
+    data = random_plan(6000, seed=9)
+    parsed = call(dxf, {'data': base64.b64encode(data).decode()}).json()
+    tiles = parsed['geomTiles']
+    assert tiles['id'] == hashlib.sha256(data).hexdigest() and tiles['tileCount'] > 1
+    assert len(parsed['polylineGeom']) < tiles['totalPolylines']
+
+    dxf._pyramids.clear()
+    r = call(dxf, {'mode': 'tiles', 'id': tiles['id'], 'tiles': [[0, 0, 0], [1, 0, 0], [1, 1, 1], [9, 500, 500]]})
+    body = r.json()
+    assert r.status == 200
+    root = body['tiles']['0/0/0']
+    assert [{k: v for k, v in g.items() if k != 'id'} for g in root['polylineGeom']] == parsed['polylineGeom']
+    assert [{k: v for k, v in g.items() if k != 'id'} for g in root['lineGeom']] == parsed['lineGeom']
+    assert body['tiles']['9/500/500'] is None
+    assert all('leaf' in body['tiles'][k] for k in ('1/0/0', '1/1/1') if body['tiles'][k])
+
+
+def test_tiles_mode_unknown_plan_is_404():
+    r = call(dxf, {'mode': 'tiles', 'id': '0' * 64, 'tiles': [[0, 0, 0]]})
+    assert r.status == 404 and r.json()['code'] == 'tiles_expired'
+    assert call(dxf, {'mode': 'tiles', 'id': 'nope', 'tiles': []}).status == 400
+
+
+def test_single_tile_plan_returns_everything_inline():
+    w = DxfWriter()
+    w.section('ENTITIES')
+    w.line('A', 0, 0, 10, 0)
+    w.lwpolyline('B', [(0, 0), (5, 5), (10, 0)])
+    w.endsec()
+    r = dxf.parse_dxf_bytes(w.bytes())
+    assert r['geomTiles'] is None
+    assert len(r['lineGeom']) == 1 and r['polylineGeom'][0]['points'] == [(0.0, 0.0), (5.0, 5.0), (10.0, 0.0)]
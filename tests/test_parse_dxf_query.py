@@ -0,0 +1,139 @@
+"""
+parse-dxf spatial index: bbox, radius and nearest queries against a
+brute-force scan of every feature, and mode='query'.
+"""
+
+import math
+import random
+
+import pytest
+
+from helpers import DxfWriter, call, load_api, random_plan
+
+dxf = load_api('parse-dxf')
+
+
+def _seg_dist(px, py, a, b):
+    (x1, y1), (x2, y2) = a, b
+    dx, dy = x2 - x1, y2 - y1
+    t = 0.0 if not (dx or dy) else max(0.0, min(1.0, ((px - x1) * dx + (py - y1) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(x1 + t * dx - px, y1 + t * dy - py)
+
+
+def _brute(geo, px, py):
+    """(distance, kind, id, layer) for every feature."""
+    out = []
+    for i, d in enumerate(geo.insert_dicts()):
+        out.append((math.hypot(d['x'] - px, d['y'] - py), 'insert', i, d['layer']))
+    for i in range(geo.line_count):
+        layer, x1, y1, x2, y2 = geo.line(i)
+        out.append((_seg_dist(px, py, (x1, y1), (x2, y2)), 'line', i, layer))
+    for i in range(geo.poly_count):
+        layer, pts, closed = geo.poly(i)
+        segs = list(zip(pts, pts[1:])) + ([(pts[-1], pts[0])] if closed and len(pts) > 2 else [])
+        out.append((min(_seg_dist(px, py, a, b) for a, b in segs), 'polyline', i, layer))
+    return out
+
+
+def _seg_hits_rect(a, b, x0, y0, x1, y1):
+    """Liang–Barsky clip of segment a-b against the rectangle."""
+    (ax, ay), (bx, by) = a, b
+    t0, t1 = 0.0, 1.0
+    for p, q in ((ax - bx, ax - x0), (bx - ax, x1 - ax), (ay - by, ay - y0), (by - ay, y1 - ay)):
+        if p == 0:
+            if q < 0:
+                return False
+        elif p < 0:
+            t0 = max(t0, q / p)
+        else:
+            t1 = min(t1, q / p)
+    return t0 <= t1
+
+
+def _brute_rect(geo, x0, y0, x1, y1):
+    out = {('insert', i) for i, d in enumerate(geo.insert_dicts()) if x0 <= d['x'] <= x1 and y0 <= d['y'] <= y1}
+    for i in range(geo.line_count):
+        _, ax, ay, bx, by = geo.line(i)
+        if _seg_hits_rect((ax, ay), (bx, by), x0, y0, x1, y1):
+            out.add(('line', i))
+    for i in range(geo.poly_count):
+        _, pts, closed = geo.poly(i)
+        segs = list(zip(pts, pts[1:])) + ([(pts[-1], pts[0])] if closed and len(pts) > 2 else [])
+        if any(_seg_hits_rect(a, b, x0, y0, x1, y1) for a, b in segs):
+            out.add(('polyline', i))
+    return out
+
+
+@pytest.fixture(scope='module')
+def plan():
+    w = DxfWriter()
+    w.section('ENTITIES')
+    w.line('HATAR', -1e5, -1e5, 1e5, 1e5)                  # spans the whole grid: an oversize feature
+    w.endsec()
+    data = random_plan(1500, seed=11, blocks=False).replace(b'  0\nEOF\n', b'')
+    data += w.bytes()[w.bytes().index(b'  0\nSECTION\n  2\nENTITIES'):]
+    res = dxf.parse_dxf_bytes(data)
+    pyr = dxf.load_geometry_pyramid(res['spatialIndex']['id'])
+    assert pyr['index'].big
+    return res['spatialIndex']['id'], pyr
+
+
+def _points(n=10):
+    r = random.Random(4)
+    return [(r.uniform(-5000, 55000), r.uniform(-5000, 35000)) for _ in range(n)]
+
+
+def _key(f):
+    return f['kind'], f['id']
+
+
+@pytest.mark.parametrize('k', [1, 7, 50])
+def test_nearest_matches_brute_force(plan, k):
+    _, pyr = plan
+    for px, py in _points():
+        got, total = dxf.query_spatial_index(pyr, {'query': 'nearest', 'point': [px, py], 'k': k})
+        want = sorted(_brute(pyr['geometry'], px, py))[:k]
+        assert total == k
+        assert [f['distance'] for f in got] == pytest.approx([d for d, *_ in want], abs=1e-6)
+
+
+def test_radius_matches_brute_force(plan):
+    _, pyr = plan
+    for px, py in _points():
+        for radius in (10.0, 800.0, 4000.0):
+            got, total = dxf.query_spatial_index(pyr, {'query': 'radius', 'point': [px, py], 'radius': radius})
+            want = {(kind, i) for d, kind, i, _ in _brute(pyr['geometry'], px, py) if d <= radius}
+            assert {_key(f) for f in got} == want and total == len(want)
+            assert all(f['distance'] <= radius for f in got)
+            assert [f['distance'] for f in got] == sorted(f['distance'] for f in got)
+
+
+def test_bbox_matches_brute_force(plan):
+    _, pyr = plan
+    for px, py in _points():
+        x0, y0, x1, y1 = px, py, px + 6000, py + 3000
+        got, total = dxf.query_spatial_index(pyr, {'query': 'bbox', 'bbox': [x1, y1, x0, y0]})
+        want = _brute_rect(pyr['geometry'], x0, y0, x1, y1)
+        assert {_key(f) for f in got} == want and total == len(want)
+
+
+def test_filters_apply_to_every_query(plan):
+    _, pyr = plan
+    px, py = _points(1)[0]
+    got, _ = dxf.query_spatial_index(pyr, {'query': 'nearest', 'point': [px, py], 'k': 5,
+                                           'layers': ['KABEL1'], 'kinds': ['line']})
+    want = sorted(b for b in _brute(pyr['geometry'], px, py) if b[1] == 'line' and b[3] == 'KABEL1')[:5]
+    assert [_key(f) for f in got] == [(kind, i) for _, kind, i, _ in want]
+    got, _ = dxf.query_spatial_index(pyr, {'query': 'radius', 'point': [px, py], 'radius': 1e6,
+                                           'names': ['B1'], 'limit': 3})
+    assert len(got) == 3 and {(f['kind'], f['name']) for f in got} == {('insert', 'B1')}
+
+
+def test_query_mode(plan):
+    plan_id, _ = plan
+    res = call(dxf, {'mode': 'query', 'id': plan_id, 'query': 'nearest', 'point': [0, 0], 'k': 2})
+    assert res.status == 200 and res.json()['total'] == 2
+    assert call(dxf, {'mode': 'query', 'id': plan_id, 'query': 'ring', 'point': [0, 0]}).status == 400
+    assert call(dxf, {'mode': 'query', 'id': plan_id, 'query': 'radius', 'point': [0, 0]}).status == 400
+    assert call(dxf, {'mode': 'query', 'id': 'x' * 64, 'query': 'bbox'}).status == 400
+    assert call(dxf, {'mode': 'query', 'id': '0' * 64, 'query': 'bbox', 'bbox': [0, 0, 1, 1]}).status == 404
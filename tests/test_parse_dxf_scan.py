@@ -0,0 +1,81 @@
+"""
+parse-dxf single pass: units from HEADER, section boundaries, EOF and the
+running geomBounds.
+"""
+
+import random
+
+import pytest
+
+from helpers import DxfWriter, load_api
+
+dxf = load_api('parse-dxf')
+
+
+def _plan(insunits=6, crlf=False):
+    w = DxfWriter(insunits=insunits, crlf=crlf)
+    w.line('ELOTT', 0, 0, 1, 0)                          # outside any section
+    w.section('TABLES')
+    w.line('TABLA', 0, 0, 100, 0)
+    w.endsec()
+    w.section('ENTITIES')
+    w.line('KABEL', 0, 0, 3, 4)
+    w.insert('EROS', 'DUGALJ', 10, 20)
+    w.pair(9, '$INSUNITS'); w.pair(70, 1)                # header variable outside HEADER
+    w.endsec()
+    w.pair(0, 'EOF')
+    w.section('ENTITIES')
+    w.line('UTANA', 0, 0, 1000, 0)
+    w.endsec()
+    return w.bytes()
+
+
+def test_units_come_from_the_header_only():
+    r = dxf.parse_dxf_bytes(_plan(insunits=6))
+    assert (r['units']['insunits'], r['units']['name'], r['units']['factor']) == (6, 'm', 1.0)
+    assert r['lengths'][0]['length'] == 5.0
+
+
+def test_only_the_entities_section_before_eof_is_counted():
+    r = dxf.parse_dxf_bytes(_plan())
+    assert r['layers'] == ['EROS', 'KABEL']
+    assert [(l['layer'], l['length_raw']) for l in r['lengths']] == [('KABEL', 5.0)]
+    assert r['blocks'] == [{'name': 'DUGALJ', 'layer': 'EROS', 'count': 1}]
+    assert r['geomBounds'] == {'minX': 0.0, 'maxX': 10.0, 'minY': 0.0, 'maxY': 20.0,
+                               'width': 10.0, 'height': 20.0}
+
+
+def test_crlf_and_lf_give_the_same_result():
+    crlf, lf = dxf.parse_dxf_bytes(_plan(crlf=True)), dxf.parse_dxf_bytes(_plan())
+    for key in ('units', 'layers', 'lengths', 'blocks', 'inserts', 'lineGeom', 'geomBounds', 'summary'):
+        assert crlf[key] == lf[key], key
+
+
+def test_geom_bounds_cover_every_line_and_insert():
+    r = random.Random(2)
+    w = DxfWriter()
+    w.section('ENTITIES')
+    xs, ys = [], []
+    for i in range(5000):
+        x1, y1, x2, y2 = (r.uniform(-1e5, 1e5) for _ in range(4))
+        w.line('KABEL', x1, y1, x2, y2)
+        xs += [x1, x2]; ys += [y1, y2]
+        if i % 10 == 0:
+            x, y = r.uniform(-2e5, 2e5), r.uniform(-2e5, 2e5)
+            w.insert('EROS', 'DUGALJ', x, y)
+            xs.append(x); ys.append(y)
+    w.endsec()
+    bounds = dxf.parse_dxf_bytes(w.bytes())['geomBounds']
+    assert bounds['minX'] == pytest.approx(min(xs)) and bounds['maxX'] == pytest.approx(max(xs))
+    assert bounds['minY'] == pytest.approx(min(ys)) and bounds['maxY'] == pytest.approx(max(ys))
+    assert bounds['width'] == pytest.approx(max(xs) - min(xs))
+
+
+@pytest.mark.parametrize('span, name', [(50000, 'mm (guessed)'), (5000, 'cm (guessed)'), (50, 'm (guessed)')])
+def test_units_are_guessed_from_the_extent_without_insunits(span, name):
+    w = DxfWriter(insunits=0)
+    w.section('ENTITIES')
+    w.insert('EROS', 'DUGALJ', 0, 0)
+    w.insert('EROS', 'DUGALJ', span, 0)
+    w.endsec()
+    assert dxf.parse_dxf_bytes(w.bytes())['units']['name'] == name
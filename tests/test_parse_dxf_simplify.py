@@ -0,0 +1,98 @@
+"""
+parse-dxf display simplification of overlay polylines: the DP / VW error
+bounds, the request options and the simplified response.
+"""
+
+import math
+import random
+
+import pytest
+
+from helpers import load_api, random_plan
+
+dxf = load_api('parse-dxf')
+
+
+def _seg_dist(p, a, b):
+    (px, py), (ax, ay), (bx, by) = p, a, b
+    dx, dy = bx - ax, by - ay
+    t = 0.0 if not (dx or dy) else max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(ax + t * dx - px, ay + t * dy - py)
+
+
+def _wiggle(seed, n=400):
+    r = random.Random(seed)
+    x, y, pts = 0.0, 0.0, []
+    for _ in range(n):
+        x += r.uniform(0, 10); y += r.uniform(-5, 5)
+        pts.append((x, y))
+    return pts
+
+
+def _kept_indices(points, simple):
+    it = iter(range(len(points)))
+    out = [next(k for k in it if points[k] == p) for p in simple]       # raises if not a subsequence
+    assert out[0] == 0 and out[-1] == len(points) - 1
+    return out
+
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('tol', [0.5, 3.0, 20.0])
+def test_dp_keeps_every_dropped_vertex_within_the_tolerance(seed, tol):
+    pts = _wiggle(seed)
+    kept = _kept_indices(pts, dxf._simplify_dp(pts, tol))
+    for i, j in zip(kept, kept[1:]):
+        assert all(_seg_dist(pts[k], pts[i], pts[j]) <= tol + 1e-9 for k in range(i + 1, j))
+
+
+@pytest.mark.parametrize('method', ['dp', 'vw'])
+def test_coarser_tolerance_keeps_fewer_vertices(method):
+    fn = dxf.SIMPLIFY_METHODS[method]
+    pts = _wiggle(7)
+    sizes = [len(fn(pts, tol)) for tol in (0.5, 1.0, 5.0, 25.0, 1000.0)]
+    assert sizes == sorted(sizes, reverse=True) and sizes[0] < len(pts) and sizes[-1] == 2
+    for tol in (0.5, 5.0):
+        _kept_indices(pts, fn(pts, tol))
+
+
+@pytest.mark.parametrize('method', ['dp', 'vw'])
+def test_collinear_points_collapse_and_short_input_is_untouched(method):
+    fn = dxf.SIMPLIFY_METHODS[method]
+    assert fn([(i, 2 * i) for i in range(50)], 1e-6) == [(0, 0), (49, 98)]
+    assert fn([(0, 0), (1, 5)], 10) == [(0, 0), (1, 5)]
+    pts = _wiggle(1, 20)
+    assert fn(pts, 0) == pts
+
+
+def test_vw_drops_vertices_below_the_area_limit_only():
+    pts = [(0, 0), (10, 0.5), (20, 0), (30, 20), (40, 0)]
+    # triangle area at (10, 0.5) is 5; at (30, 20) it is 200
+    assert dxf._simplify_vw(pts, math.sqrt(2 * 6)) == [(0, 0), (20, 0), (30, 20), (40, 0)]
+
+
+def test_parse_simplify_options():
+    assert dxf.parse_simplify({}) is None
+    assert dxf.parse_simplify({'viewport': 1024}) == {'method': 'dp', 'viewport': [1024.0, 1024.0]}
+    assert dxf.parse_simplify({'viewport': [800, 600], 'simplify': 'vw', 'simplify_tolerance': 2}) == {
+        'method': 'vw', 'tolerance': 2.0}
+    for bad in ({'viewport': [0, 600]}, {'viewport': [1, 2, 3]}, {'viewport': 99999},
+                {'simplify_tolerance': -1}, {'viewport': 100, 'simplify': 'rdp'}):
+        with pytest.raises(ValueError):
+            dxf.parse_simplify(bad)
+    assert dxf.simplify_tolerance({'viewport': [800, 600]}, 8000, 3000) == 5.0
+    assert dxf.simplify_tolerance({'tolerance': 2.0}, 8000, 3000) == 2.0
+
+
+@pytest.mark.parametrize('method', ['dp', 'vw'])
+def test_simplified_response_keeps_measurements_and_end_points(method):
+    data = random_plan(300, seed=18)
+    full = dxf.parse_dxf_bytes(data)
+    simple = dxf.parse_dxf_bytes(data, simplify=dxf.parse_simplify({'viewport': [800, 600], 'simplify': method}))
+    s = simple['simplification']
+    assert s['method'] == method and s['verticesOut'] < s['verticesIn']
+    assert sum(len(p['points']) for p in simple['polylineGeom']) == s['verticesOut']
+    for a, b in zip(full['polylineGeom'], simple['polylineGeom']):
+        assert (b['points'][0], b['points'][-1]) == (a['points'][0], a['points'][-1])
+        _kept_indices(a['points'], b['points'])
+    for key in ('lengths', 'blocks', 'lineGeom', 'inserts', 'geomBounds'):
+        assert simple[key] == full[key], key
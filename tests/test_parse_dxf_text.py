@@ -0,0 +1,100 @@
+"""
+parse-dxf text: TEXT / MTEXT / ATTRIB extraction and the circuit labels
+joined to INSERTs.
+"""
+
+import math
+import random
+
+import pytest
+
+from helpers import DxfWriter, load_api
+
+dxf = load_api('parse-dxf')
+
+
+def _parse(build):
+    w = DxfWriter()
+    w.section('ENTITIES')
+    build(w)
+    w.endsec()
+    return dxf.parse_dxf_bytes(w.bytes())
+
+
+@pytest.mark.parametrize('raw, mtext, plain', [
+    (b'\\A1;{\\fArial|b0;Kapcsol\\U+00F3}\\Psor', True, 'Kapcsoló sor'),
+    (b'\\H2.5x;\\C1;L1-3\\~A', True, 'L1-3 A'),
+    (b'%%c20 %%p1%%d', False, 'Ø20 ±1°'),
+    (b'  \xc3\xa1ram  ', False, 'áram'),
+    (b'\\P literal', False, '\\P literal'),
+])
+def test_plain_text(raw, mtext, plain):
+    assert dxf._plain_text(raw, mtext) == plain
+
+
+def test_texts_mtext_chunks_and_title_block():
+    def build(w):
+        w.text('FELIRAT', 'Konyha', 10, 20)
+        w.pair(0, 'MTEXT'); w.pair(8, 'FELIRAT'); w.pair(10, 1); w.pair(20, 2); w.pair(40, 2.5)
+        w.pair(3, 'Első darab,'); w.pair(3, '\\Pmásodik'); w.pair(1, '\\Pvége')
+        w.text('FELIRAT', 'x', 0, 0)                        # single characters are dropped
+        w.text('CIM_KERET', 'Földszint', 0, 0)
+    r = _parse(build)
+    assert r['textEntities'] == [
+        {'text': 'Konyha', 'x': 10.0, 'y': 20.0, 'layer': 'FELIRAT'},
+        {'text': 'Első darab, második vége', 'x': 1.0, 'y': 2.0, 'layer': 'FELIRAT'},
+        {'text': 'Földszint', 'x': 0.0, 'y': 0.0, 'layer': 'CIM_KERET'}]
+    assert r['all_text'] == ['Konyha', 'Első darab, második vége', 'Földszint']
+    assert r['title_block'] == {'CIM_KERET': ['Földszint']}
+
+
+def test_texts_inside_blocks_are_not_listed():
+    w = DxfWriter()
+    w.section('BLOCKS'); w.block('LAMPA'); w.text('0', 'Belső', 0, 0); w.endblk(); w.endsec()
+    w.section('ENTITIES'); w.insert('VILAGITAS', 'LAMPA', 0, 0); w.endsec()
+    assert dxf.parse_dxf_bytes(w.bytes())['textEntities'] == []
+
+
+def test_circuit_from_attribs_before_nearby_text():
+    def build(w):
+        w.insert('EROS', 'DUGALJ', 0, 0, attribs=[('MEGJ', 'X1'), ('KOR', 'F3')])    # tagged attrib wins
+        w.insert('EROS', 'DUGALJ', 100, 0, attribs=[('MEGJ', 'L2.1')])               # untagged label
+        w.insert('EROS', 'DUGALJ', 200, 0, attribs=[('KOR', 'nem kör')])
+        w.text('FELIRAT', 'F7', 200, 10, height=2.5)        # 10 from the insert, radius 15
+        w.text('FELIRAT', 'F8', 200, 14, height=2.5)
+        w.insert('EROS', 'DUGALJ', 300, 0)
+        w.text('FELIRAT', 'F9', 300, 16, height=2.5)        # out of reach
+    r = _parse(build)
+    assert [(c['insert'], c['circuit'], c['source']) for c in r['circuits']] == [
+        (0, 'F3', 'attrib'), (1, 'L2.1', 'attrib'), (2, 'F7', 'text')]
+    assert r['circuits'][2]['distance'] == pytest.approx(10.0)
+    assert r['inserts'][0]['attribs'] == [{'tag': 'MEGJ', 'value': 'X1'}, {'tag': 'KOR', 'value': 'F3'}]
+
+
+def test_text_join_matches_brute_force():
+    r = random.Random(13)
+    inserts = [(r.uniform(0, 5000), r.uniform(0, 5000)) for _ in range(400)]
+    labels = [(f'F{i}', r.uniform(0, 5000), r.uniform(0, 5000), r.choice((2.5, 10.0, 40.0))) for i in range(300)]
+
+    def build(w):
+        for x, y in inserts:
+            w.insert('EROS', 'DUGALJ', x, y)
+        for text, x, y, h in labels:
+            w.text('FELIRAT', text, x, y, height=h)
+    got = {c['insert']: c['circuit'] for c in _parse(build)['circuits']}
+    want = {}
+    for i, (x, y) in enumerate(inserts):
+        hits = [(math.hypot(lx - x, ly - y), t) for t, lx, ly, h in labels if math.hypot(lx - x, ly - y) <= 6 * h]
+        if hits:
+            want[i] = min(hits)[1]
+    assert got == want and want
+
+
+def test_circuits_and_texts_follow_the_projection():
+    def build(w):
+        w.insert('EROS', 'DUGALJ', 0, 0, attribs=[('KOR', 'F3')])
+        w.text('FELIRAT', 'Konyha', 0, 0)
+    w = DxfWriter()
+    w.section('ENTITIES'); build(w); w.endsec()
+    r = dxf.parse_dxf_bytes(w.bytes(), projection=dxf.parse_projection({'fields': ['circuits']}))
+    assert [c['circuit'] for c in r['circuits']] == ['F3'] and 'textEntities' not in r
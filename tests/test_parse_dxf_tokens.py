@@ -0,0 +1,86 @@
+"""
+parse-dxf ASCII tokenizer: the windowed split against a line-by-line
+reference walk.
+"""
+
+import random
+
+import pytest
+
+from helpers import DxfWriter, load_api, random_plan
+
+dxf = load_api('parse-dxf')
+
+
+def _reference_tokens(data, start=0, end=None):
+    """Line-by-line walk: every (code line, value line) pair, pairs with a bad code skipped."""
+    pos, end = start, len(data) if end is None else end
+    while pos < end:
+        nl = data.find(b'\n', pos)
+        nl = end if nl < 0 else nl
+        code_raw, pos = data[pos:nl], nl + 1
+        nl = data.find(b'\n', pos)
+        nl = end if nl < 0 else nl
+        val, pos = data[pos:nl].strip(), nl + 1
+        try:
+            yield int(code_raw), val
+        except ValueError:
+            continue
+
+
+EDGE_CASES = [
+    b'',
+    b'  0\nSECTION',                                    # no trailing newline
+    b'  0\nSECTION\n',
+    b'  0\r\nSECTION\r\n  2\r\nENTITIES\r\n',
+    b'  0\nLINE\n  8\n',                                # code without its value
+    b'  0\nLINE\n  8\n\n 10\n  1.5 \n',                 # empty value
+    b'  0\nLINE\nxx\nbad\n 10\n1.0\n',                  # malformed group code
+    b' 999\n' + b'c' * 5000 + b'\n  0\nEOF\n',          # a line longer than the window
+    b'\n\n\n\n',
+]
+
+
+@pytest.mark.parametrize('data', EDGE_CASES)
+@pytest.mark.parametrize('window', [1, 7, 64, 1 << 20])
+def test_edge_cases_match_the_reference(data, window, monkeypatch):
+    monkeypatch.setattr(dxf, '_TOKEN_WINDOW_BYTES', window)
+    assert list(dxf.iter_dxf_tokens(data)) == list(_reference_tokens(data))
+
+
+@pytest.mark.parametrize('crlf', [False, True])
+@pytest.mark.parametrize('window', [13, 4096])
+def test_random_plan_matches_the_reference(crlf, window, monkeypatch):
+    data = random_plan(400, seed=1, crlf=crlf)
+    monkeypatch.setattr(dxf, '_TOKEN_WINDOW_BYTES', window)
+    assert list(dxf.iter_dxf_tokens(data)) == list(_reference_tokens(data))
+
+
+def test_byte_range_matches_the_reference(monkeypatch):
+    data = random_plan(200, seed=2)
+    monkeypatch.setattr(dxf, '_TOKEN_WINDOW_BYTES', 100)
+    lines = [0]
+    for _ in range(600):
+        lines.append(data.index(b'\n', lines[-1]) + 1)
+    r = random.Random(3)
+    for _ in range(20):
+        a, b = sorted(r.sample(lines[::2], 2))
+        assert list(dxf.iter_dxf_tokens(data, a, b)) == list(_reference_tokens(data, a, b))
+
+
+def test_values_are_stripped_bytes():
+    tokens = list(dxf.iter_dxf_tokens(b'  0\r\nLINE  \r\n 10\r\n 1.25\r\n'))
+    assert tokens == [(0, b'LINE'), (10, b'1.25')]
+    assert float(tokens[1][1]) == 1.25
+
+
+def test_parse_is_independent_of_the_window(monkeypatch):
+    w = DxfWriter()
+    w.section('ENTITIES')
+    for i in range(50):
+        w.line('KABEL', 0, i, 10 + i, i)
+        w.insert('EROS', 'DUGALJ', i, i)
+    w.endsec()
+    full = dxf.parse_dxf_bytes(w.bytes())
+    monkeypatch.setattr(dxf, '_TOKEN_WINDOW_BYTES', 11)
+    assert dxf.parse_dxf_bytes(w.bytes()) == full
@@ -0,0 +1,151 @@
+"""
+parse_worker: the isolated worker pool – results, limits, the fork server and
+the wait for a free worker.
+"""
+
+import os
+import threading
+import time
+
+import pytest
+
+import parse_worker
+from parse_worker import WorkerLimitError, run_batch, run_task
+
+
+def _echo(value):
+    return value, os.getpid(), os.getppid()
+
+
+def _fail(message):
+    raise KeyError(message)
+
+
+def _sleep(seconds):
+    parse_worker.report_progress(stage='sleeping', seconds=seconds)
+    time.sleep(seconds)
+    return seconds
+
+
+def _allocate(mb):
+    return len(bytearray(mb * 1024 * 1024))
+
+
+def _spin():
+    while True:
+        pass
+
+
+for _name, _func in (('test-echo', _echo), ('test-fail', _fail), ('test-sleep', _sleep),
+                     ('test-allocate', _allocate), ('test-spin', _spin)):
+    parse_worker.register(_name, _func)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """A fresh pool and fork server with the limits patched in before it starts."""
+    monkeypatch.setattr(parse_worker, 'PARSE_WORKER_DISABLED', False)
+    monkeypatch.setattr(parse_worker, '_server', None)
+    monkeypatch.setattr(parse_worker, '_idle', [])
+    monkeypatch.setattr(parse_worker, '_live', 0)
+    yield monkeypatch
+    parse_worker._shutdown()
+    server = parse_worker._server
+    if server is not None:
+        server.conn.close()
+        os.waitpid(server.pid, 0)
+
+
+def test_task_runs_in_a_worker_forked_by_the_fork_server(pool):
+    value, pid, ppid = run_task('test-echo', {'a': [1, 2]}, timeout=10)
+    assert value == {'a': [1, 2]}
+    assert pid != os.getpid() and ppid == parse_worker._server.pid != os.getpid()
+    assert run_task('test-echo', 2, timeout=10)[1] == pid          # reused
+
+
+def test_task_exception_is_re_raised(pool):
+    with pytest.raises(KeyError):
+        run_task('test-fail', 'nope', timeout=10)
+    assert run_task('test-echo', 1, timeout=10)[0] == 1
+
+
+def test_timeout_kills_the_worker_and_keeps_its_progress(pool):
+    with pytest.raises(WorkerLimitError) as e:
+        run_task('test-sleep', 30, timeout=0.5)
+    assert e.value.reason == 'timeout'
+    assert e.value.stats['progress'] == {'stage': 'sleeping', 'seconds': 30}
+    assert e.value.stats['peakRssMb'] > 0
+    assert run_task('test-echo', 1, timeout=10)[0] == 1            # replaced
+
+
+def test_memory_limit(pool):
+    pool.setattr(parse_worker, 'PARSE_WORKER_MEMORY_MB', 256)
+    with pytest.raises(WorkerLimitError) as e:
+        run_task('test-allocate', 512, timeout=10)
+    assert e.value.reason == 'memory'
+    assert run_task('test-allocate', 16, timeout=10) == 16 * 1024 * 1024
+
+
+def test_cpu_limit(pool):
+    pool.setattr(parse_worker, 'PARSE_WORKER_CPU_S', 1)
+    with pytest.raises(WorkerLimitError) as e:
+        run_task('test-spin', timeout=20)
+    assert e.value.reason == 'cpu'
+
+
+def test_waiting_for_a_busy_pool_is_bounded_by_the_timeout(pool):
+    pool.setattr(parse_worker, 'PARSE_WORKERS', 1)
+    busy = threading.Thread(target=run_task, args=('test-sleep', 1.5), kwargs={'timeout': 10})
+    busy.start()
+    time.sleep(0.3)
+    t0 = time.monotonic()
+    with pytest.raises(WorkerLimitError) as e:
+        run_task('test-echo', 1, timeout=0.3)
+    assert e.value.reason == 'deadline' and time.monotonic() - t0 < 1.0
+    busy.join()
+    assert run_task('test-echo', 1, timeout=10)[0] == 1
+
+
+def test_batch_starts_the_fork_server_before_its_threads(pool):
+    seen = []
+
+    def parse_one(item, remaining):
+        seen.append(parse_worker._server)
+        return run_task('test-echo', item, timeout=remaining)[0]
+
+    results = sorted((i, v, err) for i, v, err in run_batch(parse_one, [10, 20, 30], 10))
+    assert results == [(0, 10, None), (1, 20, None), (2, 30, None)]
+    assert seen and all(s is seen[0] is not None for s in seen)
+
+
+def test_batch_items_past_the_deadline(pool):
+    results = dict((i, err) for i, _, err in run_batch(
+        lambda item, remaining: run_task('test-sleep', item, timeout=remaining), [0.6, 0.6, 0.6, 0.01], 0.4))
+    assert all(isinstance(err, WorkerLimitError) for err in results.values())
+    assert {err.reason for err in results.values()} <= {'timeout', 'deadline'}
+
+
+def _children():
+    """Live (non-zombie) child processes of the test process."""
+    pids = set()
+    for entry in os.listdir('/proc'):
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                stat = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(stat[1]) == os.getpid() and stat[0] != 'Z':
+            pids.add(int(entry))
+    return pids
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc'), reason='needs /proc')
+def test_registering_again_replaces_the_fork_server(pool):
+    pool.setattr(parse_worker, '_registry', dict(parse_worker._registry))
+    first = run_task('test-echo', 1, timeout=10)[2]
+    parse_worker.register('test-echo-again', _echo)
+    parse_worker.register('test-echo-twice', _echo)
+    assert parse_worker._idle == [] and parse_worker._live == 0
+    value, _, second = run_task('test-echo-again', 2, timeout=10)
+    assert value == 2 and second != first
+    assert _children() == {second} == {parse_worker._server.pid}
@@ -0,0 +1,81 @@
+"""
+plan_store: the file-system blob store behind stored plans and plan indexes.
+"""
+
+import os
+import time
+
+import pytest
+
+from plan_store import FileSystemPlanStore, PlanStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FileSystemPlanStore(str(tmp_path / 'plans'))
+
+
+def _age(store, name, seconds):
+    """Backdate an object's mtime (the LRU clock) by seconds."""
+    path = os.path.join(store.root, name)
+    t = time.time() - seconds
+    os.utime(path, (t, t))
+
+
+def test_put_get_delete(store):
+    assert store.get('a.json') is None
+    assert store.put('a.json', b'{"x": 1}')
+    assert store.get('a.json') == b'{"x": 1}'
+    store.delete('a.json')
+    assert store.get('a.json') is None
+    store.delete('a.json')                  # missing: no error
+
+
+def test_overwrite_is_atomic_and_leaves_no_temp_files(store):
+    store.put('a.json', b'old')
+    assert store.put('a.json', b'new' * 1000)
+    assert store.get('a.json') == b'new' * 1000
+    assert os.listdir(store.root) == ['a.json']
+
+
+def test_names_are_checked():
+    for bad in ('', '../x', '.hidden', 'a/b', 'a..b', 'x' * 200):
+        with pytest.raises(ValueError):
+            PlanStore.check_name(bad)
+    assert PlanStore.check_name('ab12.index.json') == 'ab12.index.json'
+
+
+def test_touch_reports_presence_and_refreshes(store):
+    assert not store.touch('a.json')
+    store.put('a.json', b'1')
+    _age(store, 'a.json', 3600)
+    assert store.touch('a.json')
+    assert time.time() - os.path.getmtime(os.path.join(store.root, 'a.json')) < 60
+
+
+def test_least_recently_used_objects_are_evicted_first(tmp_path):
+    store = FileSystemPlanStore(str(tmp_path), max_mb=1)
+    chunk = b'x' * (300 * 1024)
+    for k, name in enumerate(('a.json', 'a.index.json', 'b.json')):
+        store.put(name, chunk)
+        _age(store, name, 300 - k)
+    store.get('a.json')                     # read: most recently used now
+    store.put('c.json', chunk)              # 4 × 300 KiB > 1 MiB
+    assert sorted(os.listdir(tmp_path)) == ['a.json', 'b.json', 'c.json']
+    store.put('d.index.json', chunk)        # index sidecars share the budget
+    assert sorted(os.listdir(tmp_path)) == ['a.json', 'c.json', 'd.index.json']
+
+
+def test_expired_objects_are_dropped_on_write(tmp_path):
+    store = FileSystemPlanStore(str(tmp_path), max_age_h=1)
+    store.put('old.json', b'1')
+    _age(store, 'old.json', 2 * 3600)
+    store.put('new.json', b'2')
+    assert os.listdir(tmp_path) == ['new.json']
+
+
+def test_object_over_the_budget_is_not_stored(tmp_path):
+    store = FileSystemPlanStore(str(tmp_path), max_mb=1)
+    store.put('keep.json', b'1')
+    assert not store.put('big.json', b'x' * (2 * 1024 * 1024))
+    assert os.listdir(tmp_path) == ['keep.json']
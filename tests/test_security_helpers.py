@@ -0,0 +1,223 @@
+"""
+security_helpers upload reading: the accepted upload shapes (JSON + base64,
+raw bytes, multipart, batches), Content-Encoding decoding and the size
+limits.
+"""
+
+import base64
+import gzip
+import io
+import json
+import types
+import zlib
+
+import pytest
+
+import security_helpers
+from helpers import DxfWriter, _Headers, call, load_api
+from security_helpers import UploadError, read_batch_upload, read_upload
+
+LIMIT = 1024 * 1024
+BOMB = b'\0' * (8 * LIMIT)
+
+
+def _request(body, encoding, content_type='application/octet-stream', **headers):
+    h = types.SimpleNamespace()
+    h.headers = _Headers({'Content-Type': content_type, 'Content-Encoding': encoding,
+                          'Content-Length': str(len(body)), **headers})
+    h.rfile = io.BytesIO(body)
+    return h
+
+
+class _CappedDecompressor:
+    """brotli >= 1.2 Decompressor contract over zlib; records its largest output."""
+
+    largest = 0
+
+    def __init__(self):
+        self._z, self._tail = zlib.decompressobj(), b''
+
+    def process(self, data, output_buffer_limit=0):
+        if data and self._tail:
+            raise zlib.error('input while output is pending')
+        out = self._z.decompress(self._tail + data, output_buffer_limit)
+        self._tail = self._z.unconsumed_tail
+        _CappedDecompressor.largest = max(_CappedDecompressor.largest, len(out))
+        return out
+
+    def can_accept_more_data(self):
+        return not self._tail
+
+
+@pytest.fixture
+def capped_brotli(monkeypatch):
+    monkeypatch.setattr(security_helpers, 'brotli', types.SimpleNamespace(
+        Decompressor=_CappedDecompressor, error=zlib.error))
+    monkeypatch.setattr(security_helpers, '_BROTLI_BOUNDED', True)
+    _CappedDecompressor.largest = 0
+
+
+def _multipart(parts, boundary='xYz'):
+    """parts: (name, value, filename or None) → (body, content type)."""
+    out = []
+    for name, value, filename in parts:
+        disp = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else '')
+        out.append(f'--{boundary}\r\nContent-Disposition: {disp}\r\n\r\n'.encode() + value + b'\r\n')
+    return b''.join(out) + f'--{boundary}--\r\n'.encode(), f'multipart/form-data; boundary={boundary}'
+
+
+FILE = bytes(range(256)) * 40 + b'\r\n--xY'           # binary, with a near-miss of the boundary
+
+
+# ── Upload shapes ────────────────────────────────────────────────────────────
+
+def test_json_base64_upload():
+    body = json.dumps({'data': base64.b64encode(FILE).decode(), 'filename': 'a.dxf', 'mode': 'x'}).encode()
+    assert read_upload(_request(body, '', 'application/json'), LIMIT) == (FILE, {'filename': 'a.dxf', 'mode': 'x'})
+
+
+def test_text_plain_bare_base64_upload_takes_its_meta_from_the_header():
+    meta = '%7B%22filename%22%3A%20%22%C3%A1.dxf%22%7D'       # {"filename": "á.dxf"}, URL-encoded
+    h = _request(base64.b64encode(FILE), '', 'text/plain;charset=UTF-8', **{'X-Upload-Meta': meta})
+    assert read_upload(h, LIMIT) == (FILE, {'filename': 'á.dxf'})
+
+
+@pytest.mark.parametrize('content_type', ['application/dxf', 'application/octet-stream'])
+def test_raw_upload(content_type):
+    h = _request(FILE, '', content_type, **{'X-Upload-Meta': '{"filename": "a.dxf"}'})
+    assert read_upload(h, LIMIT) == (FILE, {'filename': 'a.dxf'})
+
+
+def test_raw_upload_over_the_limit_is_413_before_reading():
+    h = _request(b'x' * (LIMIT + 1), '')
+    with pytest.raises(UploadError) as e:
+        read_upload(h, LIMIT)
+    assert e.value.status == 413 and h.rfile.tell() == 0
+
+
+def test_bad_upload_meta_is_400():
+    with pytest.raises(UploadError) as e:
+        read_upload(_request(FILE, '', **{'X-Upload-Meta': '[1'}), LIMIT)
+    assert e.value.status == 400
+
+
+def test_multipart_upload_with_fields():
+    body, ctype = _multipart([('mode', b'tiles', None), ('file', FILE, 'terv.dxf'),
+                              ('legend_context', b'{"a": [1]}', None)])
+    file_bytes, meta = read_upload(_request(body, '', ctype), LIMIT, json_fields=('legend_context',))
+    assert file_bytes == FILE
+    assert meta == {'mode': 'tiles', 'filename': 'terv.dxf', 'legend_context': {'a': [1]}}
+
+
+def test_multipart_file_field_without_a_filename():
+    body, ctype = _multipart([('data', FILE, None)])
+    assert read_upload(_request(body, '', ctype), LIMIT) == (FILE, {})
+
+
+@pytest.mark.parametrize('body, ctype', [
+    (b'--xYz\r\nContent-Disposition: form-data; name="data"\r\n\r\nabc', 'multipart/form-data; boundary=xYz'),
+    (b'abc', 'multipart/form-data'),
+    (_multipart([('legend_context', b'{', None)])[0], 'multipart/form-data; boundary=xYz'),
+])
+def test_malformed_multipart_is_400(body, ctype):
+    with pytest.raises(UploadError) as e:
+        read_upload(_request(body, '', ctype), LIMIT, json_fields=('legend_context',))
+    assert e.value.status == 400
+
+
+def test_multipart_file_over_the_limit_is_413():
+    body, ctype = _multipart([('data', b'x' * (LIMIT + 1), 'a.dxf')])
+    with pytest.raises(UploadError) as e:
+        read_upload(_request(body, '', ctype), LIMIT)
+    assert e.value.status == 413
+
+
+def test_batch_multipart_keeps_every_file_part():
+    body, ctype = _multipart([('files', b'A', 'a.dxf'), ('format', b'columnar', None),
+                              ('files', b'B', None), ('other', b'C', 'c.dxf')])
+    files, meta = read_batch_upload(_request(body, '', ctype), LIMIT, 4 * LIMIT, 5)
+    assert files == [('a.dxf', b'A'), ('files-2', b'B'), ('c.dxf', b'C')] and meta == {'format': 'columnar'}
+
+
+def test_batch_json_and_its_limits():
+    items = [{'name': f'{i}.dxf', 'data': base64.b64encode(b'x' * 10).decode()} for i in range(3)]
+    body = json.dumps({'files': items, 'format': 'json'}).encode()
+    files, meta = read_batch_upload(_request(body, '', 'application/json'), LIMIT, 4 * LIMIT, 5)
+    assert [n for n, _ in files] == ['0.dxf', '1.dxf', '2.dxf'] and meta == {'format': 'json'}
+    for max_file, max_files in ((5, 5), (LIMIT, 2)):
+        with pytest.raises(UploadError) as e:
+            read_batch_upload(_request(body, '', 'application/json'), max_file, 4 * LIMIT, max_files)
+        assert e.value.status == 413
+    with pytest.raises(UploadError) as e:
+        read_batch_upload(_request(b'x', '', 'application/dxf'), LIMIT, 4 * LIMIT, 5)
+    assert e.value.status == 415
+
+
+def test_parse_dxf_gives_the_same_result_for_every_upload_shape():
+    w = DxfWriter()
+    w.section('ENTITIES'); w.line('KABEL', 0, 0, 3, 4); w.insert('EROS', 'DUGALJ', 1, 1); w.endsec()
+    dxf, data = load_api('parse-dxf'), w.bytes()
+    body, ctype = _multipart([('file', data, 'a.dxf'), ('format', b'columnar', None)])
+    results = [call(dxf, {'data': base64.b64encode(data).decode(), 'format': 'columnar'}),
+               call(dxf, data, {'Content-Type': 'application/dxf', 'X-Upload-Meta': '{"format": "columnar"}'}),
+               call(dxf, body, {'Content-Type': ctype})]
+    assert [r.status for r in results] == [200, 200, 200]
+    assert results[0].json()['geometry'] == results[1].json()['geometry'] == results[2].json()['geometry']
+    assert results[0].json()['geometry']['format'] == 'columnar-1'
+
+
+# ── Decompression bombs ──────────────────────────────────────────────────────
+
+@pytest.mark.parametrize('encoding, pack', [
+    ('gzip', gzip.compress),
+    ('deflate', zlib.compress),
+    ('deflate', lambda b: zlib.compress(b)[2:-4]),         # raw deflate
+])
+def test_compressed_bomb_is_413(encoding, pack):
+    with pytest.raises(UploadError) as e:
+        read_upload(_request(pack(BOMB), encoding), LIMIT)
+    assert e.value.status == 413
+
+
+@pytest.mark.parametrize('encoding, pack', [('gzip', gzip.compress), ('deflate', zlib.compress)])
+def test_compressed_body_within_the_limit_is_decoded(encoding, pack):
+    data = bytes(range(256)) * 1000
+    assert read_upload(_request(pack(data), encoding), LIMIT)[0] == data
+
+
+def test_json_body_limit_applies_after_decompression():
+    body = b'{"data": "' + b'A' * (4 * LIMIT) + b'"}'
+    with pytest.raises(UploadError) as e:
+        read_upload(_request(gzip.compress(body), 'gzip', 'application/json'), LIMIT)
+    assert e.value.status == 413
+
+
+def test_br_bomb_is_413_with_bounded_output(capped_brotli):
+    with pytest.raises(UploadError) as e:
+        read_upload(_request(zlib.compress(BOMB), 'br'), LIMIT)
+    assert e.value.status == 413
+    assert _CappedDecompressor.largest <= LIMIT + 1
+    data = bytes(range(256)) * 1000
+    assert read_upload(_request(zlib.compress(data), 'br'), LIMIT)[0] == data
+
+
+def test_br_is_refused_without_a_bounded_decoder(monkeypatch):
+    monkeypatch.setattr(security_helpers, '_BROTLI_BOUNDED', False)
+    with pytest.raises(UploadError) as e:
+        read_upload(_request(b'\x0b\x00\x80hello\x03', 'br'), LIMIT)
+    assert e.value.status == 415
+
+
+def test_real_brotli_bomb_is_413():
+    brotli = pytest.importorskip('brotli')
+    if not security_helpers._BROTLI_BOUNDED:
+        pytest.skip('installed brotli cannot bound its output')
+    with pytest.raises(UploadError) as e:
+        read_upload(_request(brotli.compress(BOMB), 'br'), LIMIT)
+    assert e.value.status == 413
+
+
+def test_unknown_encoding_is_415():
+    with pytest.raises(UploadError) as e:
+        read_upload(_request(b'x', 'compress'), LIMIT)
+    assert e.value.status == 415